@@ -0,0 +1,276 @@
+"""
+High-throughput analytics ingestion
+Validates events/pageviews against a schema compiled once from the models and
+buffers them in-process; a background thread flushes them with multi-row
+INSERTs so tracking beacons return without touching the database.
+"""
+
+import atexit
+import json
+import queue
+import threading
+import time
+import zlib
+from contextlib import nullcontext
+from datetime import datetime, timezone
+from sqlalchemy import String
+from database import db
+from models import AnalyticsEvent, PageView
+
+# Decompressed payload cap for a single batch request
+MAX_BATCH_BYTES = 5 * 1024 * 1024
+# Events accepted in one request
+MAX_BATCH_EVENTS = 5000
+# Rows per INSERT ... VALUES statement
+INSERT_CHUNK_SIZE = 500
+
+
+def _compile_schema(model, fields):
+    """
+    Compile a field spec into a flat tuple list once at import time.
+
+    Each entry is (column, source_keys, kind, max_length, default) where kind is
+    'str', 'int', 'json' or 'timestamp'. String limits come from the model's
+    column lengths so validation can never produce a row the DB rejects.
+    """
+    compiled = []
+    for column, source_keys, kind, default in fields:
+        max_length = None
+        col_type = model.__table__.c[column].type
+        if kind == 'str' and isinstance(col_type, String):
+            max_length = col_type.length
+        compiled.append((column, source_keys, kind, max_length, default))
+    return tuple(compiled)
+
+
+EVENT_SCHEMA = _compile_schema(AnalyticsEvent, [
+    ('event_type', ('event_type',), 'str', 'custom'),
+    ('event_name', ('event_name',), 'str', 'unknown'),
+    ('properties', ('properties',), 'json', None),
+    ('session_id', ('session_id',), 'str', ''),
+    ('page_url', ('page_url',), 'str', ''),
+    ('page_title', ('page_title',), 'str', None),
+    ('timestamp', ('timestamp',), 'timestamp', None),
+    ('user_agent', ('user_agent',), 'str', None),
+    ('device_type', ('device_type',), 'str', None),
+    ('browser', ('browser',), 'str', None),
+    ('os', ('os',), 'str', None),
+    ('referrer', ('referrer',), 'str', None),
+])
+
+PAGEVIEW_SCHEMA = _compile_schema(PageView, [
+    ('session_id', ('session_id',), 'str', ''),
+    ('page_url', ('page_url',), 'str', ''),
+    ('page_title', ('page_title',), 'str', None),
+    ('timestamp', ('timestamp',), 'timestamp', None),
+    ('duration', ('duration',), 'int', None),
+    ('referrer', ('referrer',), 'str', None),
+    ('user_agent', ('user_agent',), 'str', None),
+    ('device_type', ('device_type',), 'str', None),
+    ('browser', ('browser',), 'str', None),
+    ('os', ('os',), 'str', None),
+])
+
+
+def parse_timestamp(value, default):
+    """ISO-8601 (with optional Z/offset) -> naive UTC datetime, or default"""
+    if not isinstance(value, str) or not value:
+        return default
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return default
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def validate_row(schema, data, user_id, now):
+    """
+    Build an insert row from a raw dict using a compiled schema.
+
+    Returns:
+        dict ready for a multi-row INSERT, or None if the payload is not an object
+    """
+    if not isinstance(data, dict):
+        return None
+    row = {'user_id': user_id, 'created_at': now}
+    for column, source_keys, kind, max_length, default in schema:
+        value = None
+        for key in source_keys:
+            value = data.get(key)
+            if value is not None:
+                break
+        if kind == 'timestamp':
+            row[column] = parse_timestamp(value, now)
+        elif value is None:
+            row[column] = default
+        elif kind == 'str':
+            value = value if isinstance(value, str) else str(value)
+            row[column] = value[:max_length] if max_length else value
+        elif kind == 'int':
+            try:
+                row[column] = int(value)
+            except (TypeError, ValueError):
+                row[column] = default
+        else:
+            row[column] = value if isinstance(value, (dict, list)) else default
+    return row
+
+
+def decode_payload(raw, content_encoding=''):
+    """
+    Decode a (possibly gzip/deflate compressed) JSON or NDJSON request body.
+
+    Raises:
+        ValueError: payload too large or not valid JSON
+    """
+    content_encoding = (content_encoding or '').lower()
+    if content_encoding == 'gzip' or raw[:2] == b'\x1f\x8b':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        raw = decompressor.decompress(raw, MAX_BATCH_BYTES + 1)
+    elif content_encoding == 'deflate':
+        decompressor = zlib.decompressobj()
+        raw = decompressor.decompress(raw, MAX_BATCH_BYTES + 1)
+    if len(raw) > MAX_BATCH_BYTES:
+        raise ValueError('Payload too large')
+
+    text = raw.decode('utf-8')
+    stripped = text.lstrip()
+    if stripped.startswith('{') or stripped.startswith('['):
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError:
+            if not stripped.startswith('{'):
+                raise ValueError('Invalid JSON payload')
+    # NDJSON: one event per line
+    try:
+        return {'events': [json.loads(line) for line in text.splitlines() if line.strip()]}
+    except json.JSONDecodeError:
+        raise ValueError('Invalid JSON payload')
+
+
+class AnalyticsIngestBuffer:
+    """Bounded in-process buffer flushed by a background thread with multi-row INSERTs"""
+
+    def __init__(self, app=None, max_queue=50000, flush_interval=2.0, flush_size=2000):
+        self.app = None
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._worker_thread = None
+        self._flush_lock = threading.Lock()
+        self.stats = {'enqueued': 0, 'flushed': 0, 'sync_writes': 0, 'errors': 0, 'requeued': 0, 'dropped': 0}
+
+        if app:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Bind to the Flask app and start the flush thread"""
+        self.app = app
+        if not self._worker_thread or not self._worker_thread.is_alive():
+            self._worker_thread = threading.Thread(target=self._flush_worker, daemon=True)
+            self._worker_thread.start()
+            atexit.register(self.flush)
+            print("[Analytics] Ingest flush thread started.")
+
+    @property
+    def running(self):
+        return self._worker_thread is not None and self._worker_thread.is_alive()
+
+    def enqueue(self, table, rows):
+        """
+        Queue rows for `table` (AnalyticsEvent.__table__ / PageView.__table__).
+        Falls back to a synchronous bulk insert if the buffer is not running or full.
+        """
+        if not rows:
+            return
+        if not self.running:
+            self._write(table, rows)
+            self.stats['sync_writes'] += len(rows)
+            return
+        overflow = []
+        for row in rows:
+            try:
+                self._queue.put_nowait((table, row))
+            except queue.Full:
+                overflow.append(row)
+        self.stats['enqueued'] += len(rows) - len(overflow)
+        if overflow:
+            self._write(table, overflow)
+            self.stats['sync_writes'] += len(overflow)
+
+    def _drain(self, limit):
+        """Pop up to `limit` queued rows grouped by table"""
+        grouped = {}
+        for _ in range(limit):
+            try:
+                table, row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            grouped.setdefault(table, []).append(row)
+        return grouped
+
+    @staticmethod
+    def _write(table, rows):
+        """Multi-row INSERT in chunks, one transaction"""
+        try:
+            for start in range(0, len(rows), INSERT_CHUNK_SIZE):
+                db.session.execute(table.insert().values(rows[start:start + INSERT_CHUNK_SIZE]))
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+    def _requeue(self, table, rows):
+        """Put rows of a failed write back for the next flush; rows that no longer fit are dropped and counted"""
+        for index, row in enumerate(rows):
+            try:
+                self._queue.put_nowait((table, row))
+            except queue.Full:
+                self.stats['dropped'] += len(rows) - index
+                break
+            self.stats['requeued'] += 1
+
+    def flush(self):
+        """
+        Write everything currently queued; returns rows written.
+        Rows of a table whose write fails go back on the queue and the flush
+        stops until the next interval (e.g. the database is briefly down).
+        """
+        written = 0
+        with self._flush_lock:
+            failed = False
+            while not failed:
+                grouped = self._drain(self.flush_size)
+                if not grouped:
+                    break
+                with (self.app.app_context() if self.app is not None else nullcontext()):
+                    for table, rows in grouped.items():
+                        try:
+                            self._write(table, rows)
+                        except Exception as e:
+                            failed = True
+                            self.stats['errors'] += 1
+                            print(f"[Analytics] Error flushing {len(rows)} {table.name} rows, requeued: {e}")
+                            self._requeue(table, rows)
+                            continue
+                        written += len(rows)
+                        self.stats['flushed'] += len(rows)
+        return written
+
+    def _flush_worker(self):
+        """Flush every flush_interval seconds, or sooner once flush_size rows are waiting"""
+        last_flush = time.time()
+        while True:
+            try:
+                if self._queue.qsize() >= self.flush_size or time.time() - last_flush >= self.flush_interval:
+                    self.flush()
+                    last_flush = time.time()
+                time.sleep(0.1)
+            except Exception as worker_err:
+                print(f"[Analytics] Ingest worker error: {worker_err}")
+                time.sleep(1)
+
+# Global instance
+ingest_buffer = AnalyticsIngestBuffer()
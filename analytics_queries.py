@@ -0,0 +1,201 @@
+"""
+Set-based query layer for the analytics detail views.
+Per-session page views/events are fetched with row_number() windows (top N per
+session in one query), counts and breakdowns with GROUP BY, and sessions are
+paged with a keyset cursor on (start_time, id) instead of loading everything.
+"""
+import base64
+from datetime import datetime
+from urllib.parse import urlparse
+from sqlalchemy import func, desc, and_, or_
+from database import db
+from models import AnalyticsEvent, PageView, UserSession
+
+
+def session_filter_condition(filter_type, filter_value, start_time):
+    """
+    WHERE clause selecting sessions for a /details filter.
+    page/event filters use IN (subquery) so matching rows are never loaded.
+
+    Returns:
+        SQLAlchemy condition, or None for an unknown filter type
+    """
+    condition = UserSession.start_time >= start_time
+    if filter_type == 'device':
+        return and_(condition, UserSession.device_type == filter_value)
+    if filter_type == 'browser':
+        return and_(condition, UserSession.browser == filter_value)
+    if filter_type == 'os':
+        return and_(condition, UserSession.os == filter_value)
+    if filter_type == 'country':
+        return and_(condition, UserSession.country == filter_value)
+    if filter_type == 'city':
+        # "city, country" or just "city"
+        if ',' in filter_value:
+            city_name, country_name = [p.strip() for p in filter_value.split(',', 1)]
+            if country_name:
+                return and_(condition, UserSession.city == city_name, UserSession.country == country_name)
+            return and_(condition, UserSession.city == city_name)
+        return and_(condition, UserSession.city == filter_value)
+    if filter_type == 'page':
+        matching = db.session.query(PageView.session_id).filter(
+            PageView.timestamp >= start_time,
+            PageView.page_url == filter_value
+        )
+        return and_(condition, UserSession.id.in_(matching))
+    if filter_type == 'event':
+        matching = db.session.query(AnalyticsEvent.session_id).filter(
+            AnalyticsEvent.timestamp >= start_time,
+            AnalyticsEvent.event_name == filter_value
+        )
+        return and_(condition, UserSession.id.in_(matching))
+    return None
+
+
+def encode_cursor(session):
+    """Opaque keyset cursor for the last session on a page"""
+    raw = f"{session.start_time.isoformat()}|{session.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(start_time, session_id) from a cursor; raises ValueError when malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        start_time, session_id = raw.split('|', 1)
+        return datetime.fromisoformat(start_time), session_id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def fetch_sessions_page(condition, cursor=None, limit=50):
+    """
+    One page of sessions ordered by (start_time DESC, id DESC).
+
+    Returns:
+        (sessions, next_cursor) - next_cursor is None on the last page
+    """
+    limit = max(1, limit)
+    query = UserSession.query.filter(condition)
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            UserSession.start_time < cursor_time,
+            and_(UserSession.start_time == cursor_time, UserSession.id < cursor_id)
+        ))
+    sessions = query.order_by(
+        desc(UserSession.start_time), desc(UserSession.id)
+    ).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(sessions) > limit:
+        sessions = sessions[:limit]
+        next_cursor = encode_cursor(sessions[-1])
+    return sessions, next_cursor
+
+
+def fetch_top_per_session(model, columns, session_ids, start_time, per_session=20):
+    """
+    Most recent `per_session` rows of `model` for each session in one query,
+    using row_number() OVER (PARTITION BY session_id ORDER BY timestamp DESC).
+
+    Returns:
+        dict of session_id -> list of row tuples (session_id first, then `columns`)
+    """
+    if not session_ids:
+        return {}
+    row_number = func.row_number().over(
+        partition_by=model.session_id,
+        order_by=(desc(model.timestamp), desc(model.id))
+    ).label('rn')
+    ranked = db.session.query(
+        model.session_id.label('session_id'),
+        *[getattr(model, name).label(name) for name in columns],
+        row_number
+    ).filter(
+        model.timestamp >= start_time,
+        model.session_id.in_(session_ids)
+    ).subquery()
+
+    rows = db.session.query(
+        ranked.c.session_id,
+        *[ranked.c[name] for name in columns]
+    ).filter(
+        ranked.c.rn <= per_session
+    ).order_by(
+        ranked.c.session_id, ranked.c.rn
+    ).all()
+
+    grouped = {}
+    for row in rows:
+        grouped.setdefault(row[0], []).append(row)
+    return grouped
+
+
+def count_per_session(model, session_ids, start_time):
+    """dict of session_id -> row count since start_time (single GROUP BY)"""
+    if not session_ids:
+        return {}
+    return dict(db.session.query(
+        model.session_id,
+        func.count(model.id)
+    ).filter(
+        model.timestamp >= start_time,
+        model.session_id.in_(session_ids)
+    ).group_by(model.session_id).all())
+
+
+def _matching_session_ids(condition):
+    return db.session.query(UserSession.id).filter(condition)
+
+
+def session_aggregates(condition, start_time):
+    """
+    Totals and breakdowns across every session matching `condition`,
+    computed with COUNT/GROUP BY so no rows are materialized.
+    """
+    session_ids = _matching_session_ids(condition)
+
+    total_sessions = db.session.query(func.count(UserSession.id)).filter(condition).scalar() or 0
+
+    location_rows = db.session.query(
+        UserSession.city, UserSession.country, func.count(UserSession.id)
+    ).filter(condition).group_by(UserSession.city, UserSession.country).all()
+    location_breakdown = {}
+    for city, country, count in location_rows:
+        key = f"{city or 'Unknown'}, {country or 'Unknown'}"
+        location_breakdown[key] = location_breakdown.get(key, 0) + count
+
+    page_rows = db.session.query(
+        PageView.page_url, func.count(PageView.id)
+    ).filter(
+        PageView.timestamp >= start_time,
+        PageView.session_id.in_(session_ids)
+    ).group_by(PageView.page_url).all()
+    total_page_views = 0
+    pages_breakdown = {}
+    for page_url, count in page_rows:
+        total_page_views += count
+        try:
+            page_path = urlparse(page_url).path or '/'
+        except Exception:
+            page_path = page_url[:50] if page_url else '/'
+        pages_breakdown[page_path] = pages_breakdown.get(page_path, 0) + count
+
+    event_rows = db.session.query(
+        AnalyticsEvent.event_name, func.count(AnalyticsEvent.id)
+    ).filter(
+        AnalyticsEvent.timestamp >= start_time,
+        AnalyticsEvent.session_id.in_(session_ids)
+    ).group_by(AnalyticsEvent.event_name).all()
+    events_breakdown = {name: count for name, count in event_rows}
+
+    return {
+        'total_sessions': total_sessions,
+        'total_page_views': total_page_views,
+        'total_events': sum(events_breakdown.values()),
+        'location_breakdown': location_breakdown,
+        'pages_breakdown': pages_breakdown,
+        'events_breakdown': events_breakdown
+    }
+
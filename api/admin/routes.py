@@ -274,6 +274,7 @@ def get_usage_stats():
     try:
         from database import db
         from models import User, UsageLog
+        from usage_service import get_call_summary, get_users_usage_page, get_tier_summary, month_start_utc
         
         # Time range
         days = request.args.get('days', 30, type=int)
@@ -283,19 +284,8 @@ def get_usage_stats():
         total_users = User.query.count()
         active_users = User.query.filter_by(is_active=True).count()
         
-        # Total API calls
-        total_calls = UsageLog.query.filter(UsageLog.timestamp >= start_date).count()
-        
-        # Calls by status
-        success_calls = UsageLog.query.filter(
-            UsageLog.timestamp >= start_date,
-            UsageLog.status_code.between(200, 299)
-        ).count()
-        
-        error_calls = UsageLog.query.filter(
-            UsageLog.timestamp >= start_date,
-            UsageLog.status_code >= 400
-        ).count()
+        # Total / success / error calls in one pass
+        total_calls, success_calls, error_calls = get_call_summary(start_date)
         
         # Popular endpoints
         popular_endpoints = db.session.query(
@@ -335,37 +325,17 @@ def get_usage_stats():
             func.count(UsageLog.id).desc()
         ).limit(10).all()
         
-        # Users by tier with monthly usage
-        users_usage = []
-        all_users = User.query.all()
-        for user in all_users:
-            # Get monthly usage from UsageLog
-            month_start = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-            monthly_calls = UsageLog.query.filter(
-                UsageLog.user_id == user.id,
-                UsageLog.timestamp >= month_start
-            ).count()
-            
-            users_usage.append({
-                'id': user.id,
-                'email': user.email,
-                'subscription_tier': user.subscription_tier or 'free',
-                'monthly_used': user.monthly_used,
-                'monthly_limit': user.monthly_call_limit,
-                'monthly_remaining': user.monthly_call_limit - user.monthly_used if user.monthly_call_limit != -1 else -1,
-                'has_exceeded': user.monthly_used >= user.monthly_call_limit if user.monthly_call_limit != -1 else False,
-                'actual_monthly_calls': monthly_calls
-            })
+        # Users with monthly usage (grouped query, paginated)
+        users_page = request.args.get('users_page', 1, type=int)
+        users_per_page = min(request.args.get('users_per_page', 100, type=int), 1000)
+        users_usage, users_pagination = get_users_usage_page(
+            page=users_page,
+            per_page=users_per_page,
+            since=month_start_utc()
+        )
         
         # Summary by tier
-        users_by_tier = {}
-        monthly_calls = 0
-        for user in all_users:
-            tier = user.subscription_tier or 'free'
-            if tier not in users_by_tier:
-                users_by_tier[tier] = 0
-            users_by_tier[tier] += 1
-            monthly_calls += user.monthly_used
+        users_by_tier, monthly_calls = get_tier_summary()
         
         return jsonify({
             'summary': {
@@ -390,12 +360,60 @@ def get_usage_stats():
                 {'email': email, 'count': count} 
                 for email, count in top_users
             ],
-            'users_usage': users_usage
+            'users_usage': users_usage,
+            'users_pagination': users_pagination
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@admin_api.route('/export/<source>', methods=['GET'])
+@require_admin
+def export_data(source):
+    """
+    Stream usage_logs / analytics_events / page_views as NDJSON, CSV or Parquet.
+    Query params: format (ndjson|csv|parquet), start/end (ISO dates) or days, gzip (default true)
+    """
+    try:
+        from flask import Response, stream_with_context
+        from export_service import stream_export, export_filename, EXPORT_FORMATS
+
+        fmt = request.args.get('format', 'ndjson').lower()
+        compress = request.args.get('gzip', 'true').lower() != 'false'
+
+        start = end = None
+        try:
+            if request.args.get('start'):
+                start = datetime.fromisoformat(request.args['start'].replace('Z', '+00:00')).replace(tzinfo=None)
+            elif request.args.get('days'):
+                start = datetime.utcnow() - timedelta(days=int(request.args['days']))
+            if request.args.get('end'):
+                end = datetime.fromisoformat(request.args['end'].replace('Z', '+00:00')).replace(tzinfo=None)
+        except (ValueError, OverflowError):
+            return jsonify({'error': 'start/end must be ISO dates and days an integer'}), 400
+
+        try:
+            chunks = stream_export(source, fmt=fmt, start=start, end=end, compress=compress)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        mimetype, _ = EXPORT_FORMATS[fmt]
+        if compress and fmt != 'parquet':
+            mimetype = 'application/gzip'
+        filename = export_filename(source, fmt, compress=compress, start=start, end=end)
+
+        return Response(
+            stream_with_context(chunks),
+            mimetype=mimetype,
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @admin_api.route('/jobs', methods=['GET'])
 @require_admin
 def list_jobs():
@@ -829,8 +847,8 @@ def delete_campaign(id_or_public_id):
 def list_free_tier_keys():
     """List all free tier API keys"""
     try:
-        from models import APIKey, User
-        from database import db
+        from models import APIKey
+        from usage_service import get_free_tier_keys_page
         
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -857,36 +875,8 @@ def list_free_tier_keys():
         # Order by creation date (newest first)
         query = query.order_by(desc(APIKey.created_at))
         
-        # Paginate
-        pagination = query.paginate(page=page, per_page=per_page, error_out=False)
-        keys = pagination.items
-        
-        # Get usage stats for each key
-        from models import UsageLog
-        from sqlalchemy import func
-        
-        result = []
-        for key in keys:
-            # Get usage stats
-            total_usage = UsageLog.query.filter_by(api_key_id=key.id).count()
-            recent_usage = UsageLog.query.filter(
-                UsageLog.api_key_id == key.id,
-                UsageLog.timestamp >= datetime.utcnow() - timedelta(days=30)
-            ).count()
-            
-            key_dict = key.to_dict(include_key=False)
-            key_dict['usage'] = {
-                'total': total_usage,
-                'last_30_days': recent_usage
-            }
-            
-            # Add granted by user email if available
-            if key.granted_by:
-                granted_by_user = User.query.get(key.granted_by)
-                if granted_by_user:
-                    key_dict['granted_by_email'] = granted_by_user.email
-            
-            result.append(key_dict)
+        # Paginate and attach usage with grouped queries
+        result, pagination = get_free_tier_keys_page(query, page=page, per_page=per_page)
         
         return jsonify({
             'keys': result,
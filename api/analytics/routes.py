@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, g
 from sqlalchemy import func, desc, and_, or_
 from datetime import datetime, timedelta
+from zlib import error as zlib_error
 from database import db
 from models import AnalyticsEvent, PageView, UserSession, User
 
@@ -48,6 +49,8 @@ def load_user():
 def track_event():
     """Track analytics events"""
     try:
+        from analytics_ingest import ingest_buffer, validate_row, EVENT_SCHEMA
+        
         data = request.get_json()
         
         if not data:
@@ -62,27 +65,12 @@ def track_event():
         if hasattr(g, 'current_user') and g.current_user:
             user_id = g.current_user.id
         
-        # Process each event
-        for event_data in events:
-            event = AnalyticsEvent(
-                user_id=user_id,
-                event_type=event_data.get('event_type', 'custom'),
-                event_name=event_data.get('event_name', 'unknown'),
-                properties=event_data.get('properties'),
-                session_id=event_data.get('session_id', ''),
-                page_url=event_data.get('page_url', ''),
-                page_title=event_data.get('page_title'),
-                timestamp=datetime.fromisoformat(event_data.get('timestamp', datetime.utcnow().isoformat()).replace('Z', '+00:00')) if isinstance(event_data.get('timestamp'), str) else datetime.utcnow(),
-                user_agent=event_data.get('user_agent'),
-                device_type=event_data.get('device_type'),
-                browser=event_data.get('browser'),
-                os=event_data.get('os'),
-                referrer=event_data.get('referrer')
-            )
-            db.session.add(event)
+        # Validate and hand off to the ingest buffer (multi-row INSERT in the background)
+        now = datetime.utcnow()
+        rows = [row for row in (validate_row(EVENT_SCHEMA, event_data, user_id, now) for event_data in events) if row]
+        ingest_buffer.enqueue(AnalyticsEvent.__table__, rows)
         
-        db.session.commit()
-        return jsonify({'success': True, 'processed': len(events)}), 200
+        return jsonify({'success': True, 'processed': len(rows)}), 200
         
     except Exception as e:
         db.session.rollback()
@@ -93,6 +81,8 @@ def track_event():
 def track_pageview():
     """Track page views"""
     try:
+        from analytics_ingest import ingest_buffer, validate_row, PAGEVIEW_SCHEMA
+        
         data = request.get_json()
         
         if not data:
@@ -103,21 +93,10 @@ def track_pageview():
         if hasattr(g, 'current_user') and g.current_user:
             user_id = g.current_user.id
         
-        pageview = PageView(
-            user_id=user_id,
-            session_id=data.get('session_id', ''),
-            page_url=data.get('page_url', ''),
-            page_title=data.get('page_title'),
-            timestamp=datetime.fromisoformat(data.get('timestamp', datetime.utcnow().isoformat()).replace('Z', '+00:00')) if isinstance(data.get('timestamp'), str) else datetime.utcnow(),
-            duration=data.get('duration'),
-            referrer=data.get('referrer'),
-            user_agent=data.get('user_agent'),
-            device_type=data.get('device_type'),
-            browser=data.get('browser'),
-            os=data.get('os')
-        )
-        db.session.add(pageview)
-        db.session.commit()
+        row = validate_row(PAGEVIEW_SCHEMA, data, user_id, datetime.utcnow())
+        if not row:
+            return jsonify({'error': 'Invalid pageview'}), 400
+        ingest_buffer.enqueue(PageView.__table__, [row])
         
         return jsonify({'success': True}), 200
         
@@ -126,29 +105,57 @@ def track_pageview():
         print(f"Error tracking pageview: {e}")
         return jsonify({'error': str(e)}), 500
 
-def get_location_from_ip(ip_address):
-    """Get detailed location from IP address using free IP geolocation API"""
-    if not ip_address or ip_address == 'unknown' or ip_address.startswith('127.') or ip_address.startswith('::1'):
-        return None, None, None, None
-    
+@analytics_api.route('/batch', methods=['POST'])
+def track_batch():
+    """
+    Bulk ingestion for beacons: JSON {"events": [...], "pageviews": [...]} or NDJSON events,
+    optionally gzip/deflate compressed (Content-Encoding or gzip magic bytes).
+    Returns 202 as soon as rows are validated and buffered.
+    """
     try:
-        import requests
-        # Use ip-api.com (free, no API key required, 45 requests/minute limit)
-        # Get more fields: country, city, regionName (state/province), timezone
-        response = requests.get(f'http://ip-api.com/json/{ip_address}?fields=status,country,countryCode,city,regionName,timezone,lat,lon', timeout=3)
-        if response.status_code == 200:
-            data = response.json()
-            if data.get('status') == 'success':
-                country = data.get('country')
-                city = data.get('city')
-                region = data.get('regionName')  # State/Province
-                timezone = data.get('timezone')
-                # Format: "City, Region, Country" for better precision
-                return country, city, region, timezone
+        from analytics_ingest import (
+            ingest_buffer, validate_row, decode_payload,
+            EVENT_SCHEMA, PAGEVIEW_SCHEMA, MAX_BATCH_EVENTS
+        )
+        
+        try:
+            payload = decode_payload(request.get_data(cache=False), request.headers.get('Content-Encoding'))
+        except (ValueError, UnicodeDecodeError, zlib_error) as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if isinstance(payload, list):
+            payload = {'events': payload}
+        if not isinstance(payload, dict):
+            return jsonify({'error': 'Payload must be an object or array'}), 400
+        
+        events = payload.get('events') or []
+        pageviews = payload.get('pageviews') or []
+        if not isinstance(events, list) or not isinstance(pageviews, list):
+            return jsonify({'error': 'events and pageviews must be arrays'}), 400
+        if len(events) + len(pageviews) > MAX_BATCH_EVENTS:
+            return jsonify({'error': f'Batch exceeds {MAX_BATCH_EVENTS} items'}), 413
+        
+        user_id = None
+        if hasattr(g, 'current_user') and g.current_user:
+            user_id = g.current_user.id
+        
+        now = datetime.utcnow()
+        event_rows = [row for row in (validate_row(EVENT_SCHEMA, item, user_id, now) for item in events) if row]
+        pageview_rows = [row for row in (validate_row(PAGEVIEW_SCHEMA, item, user_id, now) for item in pageviews) if row]
+        ingest_buffer.enqueue(AnalyticsEvent.__table__, event_rows)
+        ingest_buffer.enqueue(PageView.__table__, pageview_rows)
+        
+        accepted = len(event_rows) + len(pageview_rows)
+        return jsonify({
+            'success': True,
+            'accepted': accepted,
+            'rejected': len(events) + len(pageviews) - accepted
+        }), 202
+        
     except Exception as e:
-        print(f"Error getting location from IP {ip_address}: {e}")
-    
-    return None, None, None, None
+        db.session.rollback()
+        print(f"Error tracking analytics batch: {e}")
+        return jsonify({'error': str(e)}), 500
 
 @analytics_api.route('/session', methods=['POST'])
 def track_session():
@@ -171,18 +178,20 @@ def track_session():
         # Get IP address from request or data
         ip_address = data.get('ip_address') or request.headers.get('X-Forwarded-For', '').split(',')[0].strip() or request.remote_addr
         
-        # Resolve location from IP if not provided
+        # Resolve location from IP if not provided (cache/local DB only - remote lookups are deferred)
         country = data.get('country')
         city = data.get('city')
         region = data.get('region')  # State/Province
+        needs_enrichment = False
         if not country or not city:
-            resolved_country, resolved_city, resolved_region, timezone = get_location_from_ip(ip_address)
+            from geolocation import geo_resolver, format_city
+            (resolved_country, resolved_city, resolved_region, timezone), resolved = geo_resolver.lookup(ip_address)
+            needs_enrichment = not resolved
             country = country or resolved_country
             city = city or resolved_city
             region = region or resolved_region
             # Store region in city field if we have it for better precision
-            if city and region and region not in city:
-                city = f"{city}, {region}"
+            city = format_city(city, region)
         
         # Check if session exists
         existing_session = UserSession.query.get(session_id)
@@ -222,6 +231,11 @@ def track_session():
             db.session.add(new_session)
         
         db.session.commit()
+        
+        # Backfill country/city in the background once the session row exists
+        if needs_enrichment:
+            geo_resolver.enqueue_enrichment(session_id, ip_address)
+        
         return jsonify({'success': True}), 200
         
     except Exception as e:
@@ -765,100 +779,36 @@ def get_detailed_metrics():
             else:
                 start_time = now - timedelta(hours=24)
         
-        # Build filter condition
-        filter_condition = UserSession.start_time >= start_time
-        if filter_type == 'device':
-            filter_condition = and_(filter_condition, UserSession.device_type == filter_value)
-        elif filter_type == 'browser':
-            filter_condition = and_(filter_condition, UserSession.browser == filter_value)
-        elif filter_type == 'os':
-            filter_condition = and_(filter_condition, UserSession.os == filter_value)
-        elif filter_type == 'country':
-            filter_condition = and_(filter_condition, UserSession.country == filter_value)
-        elif filter_type == 'city':
-            # For city, we need to handle the format "city, country" or just "city"
-            # Check if value contains a comma (city, country format)
-            if ',' in filter_value:
-                parts = [p.strip() for p in filter_value.split(',', 1)]
-                city_name = parts[0]
-                country_name = parts[1] if len(parts) > 1 else None
-                if country_name:
-                    filter_condition = and_(
-                        filter_condition,
-                        UserSession.city == city_name,
-                        UserSession.country == country_name
-                    )
-                else:
-                    filter_condition = and_(filter_condition, UserSession.city == city_name)
-            else:
-                filter_condition = and_(filter_condition, UserSession.city == filter_value)
-        elif filter_type == 'page':
-            # For page filtering, we need to filter sessions that have page views matching the URL
-            # First get session IDs that have this page URL
-            matching_page_views = PageView.query.filter(
-                and_(
-                    PageView.timestamp >= start_time,
-                    PageView.page_url == filter_value
-                )
-            ).all()
-            session_ids_from_pages = [pv.session_id for pv in matching_page_views]
-            if session_ids_from_pages:
-                filter_condition = and_(
-                    filter_condition,
-                    UserSession.id.in_(session_ids_from_pages)
-                )
-            else:
-                # No sessions found for this page, return empty result
-                filter_condition = and_(filter_condition, UserSession.id == None)  # This will return no results
-        elif filter_type == 'event':
-            # For event filtering, we need to filter sessions that have events matching the event name
-            # First get session IDs that have this event name
-            matching_events = AnalyticsEvent.query.filter(
-                and_(
-                    AnalyticsEvent.timestamp >= start_time,
-                    AnalyticsEvent.event_name == filter_value
-                )
-            ).all()
-            session_ids_from_events = [e.session_id for e in matching_events if e.session_id]
-            if session_ids_from_events:
-                filter_condition = and_(
-                    filter_condition,
-                    UserSession.id.in_(session_ids_from_events)
-                )
-            else:
-                # No sessions found for this event, return empty result
-                filter_condition = and_(filter_condition, UserSession.id == None)  # This will return no results
-        else:
+        from analytics_queries import (
+            session_filter_condition, fetch_sessions_page, fetch_top_per_session,
+            count_per_session, session_aggregates
+        )
+        
+        # Build filter condition (page/event filters become IN (subquery))
+        filter_condition = session_filter_condition(filter_type, filter_value, start_time)
+        if filter_condition is None:
             return jsonify({'error': 'Invalid filter type. Must be device, browser, os, country, city, page, or event'}), 400
         
-        # Get sessions matching the filter
-        sessions = UserSession.query.filter(filter_condition).order_by(desc(UserSession.start_time)).all()
+        # Keyset-paginated sessions matching the filter
+        per_page = max(1, min(request.args.get('per_page', 50, type=int), 200))
+        try:
+            sessions, next_cursor = fetch_sessions_page(filter_condition, cursor=request.args.get('cursor'), limit=per_page)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Get session IDs
         session_ids = [s.id for s in sessions]
         
-        # Get page views for these sessions
-        page_views = PageView.query.filter(
-            and_(
-                PageView.timestamp >= start_time,
-                PageView.session_id.in_(session_ids)
-            )
-        ).order_by(desc(PageView.timestamp)).all()
-        
-        # Get events for these sessions
-        events = AnalyticsEvent.query.filter(
-            and_(
-                AnalyticsEvent.timestamp >= start_time,
-                AnalyticsEvent.session_id.in_(session_ids)
-            )
-        ).order_by(desc(AnalyticsEvent.timestamp)).all()
+        # Top 20 page views / events per session (window query) and per-session counts
+        page_view_columns = ['page_url', 'page_title', 'timestamp', 'duration']
+        event_columns = ['event_name', 'event_type', 'page_url', 'page_title', 'timestamp', 'properties']
+        recent_page_views = fetch_top_per_session(PageView, page_view_columns, session_ids, start_time)
+        recent_events = fetch_top_per_session(AnalyticsEvent, event_columns, session_ids, start_time)
+        page_view_counts = count_per_session(PageView, session_ids, start_time)
+        event_counts = count_per_session(AnalyticsEvent, session_ids, start_time)
         
         # Build detailed data
         sessions_data = []
         for session in sessions:
-            session_page_views = [pv for pv in page_views if pv.session_id == session.id]
-            session_events = [e for e in events if e.session_id == session.id]
-            
             duration = 0
             if session.last_activity and session.start_time:
                 duration = int((session.last_activity - session.start_time).total_seconds())
@@ -868,8 +818,8 @@ def get_detailed_metrics():
                 'start_time': session.start_time.isoformat() if session.start_time else None,
                 'last_activity': session.last_activity.isoformat() if session.last_activity else None,
                 'duration': duration,
-                'page_views': len(session_page_views),
-                'events': len(session_events),
+                'page_views': page_view_counts.get(session.id, 0),
+                'events': event_counts.get(session.id, 0),
                 'country': session.country or 'Unknown',
                 'city': session.city or 'Unknown',
                 'device_type': session.device_type or 'Unknown',
@@ -878,63 +828,41 @@ def get_detailed_metrics():
                 'ip_address': session.ip_address or 'Unknown',
                 'pages_visited': [
                     {
-                        'url': pv.page_url,
-                        'title': pv.page_title,
-                        'timestamp': pv.timestamp.isoformat() if pv.timestamp else None,
-                        'duration': pv.duration
+                        'url': page_url,
+                        'title': page_title,
+                        'timestamp': timestamp.isoformat() if timestamp else None,
+                        'duration': pv_duration
                     }
-                    for pv in session_page_views[:20]  # Limit to 20 most recent
+                    for _, page_url, page_title, timestamp, pv_duration in recent_page_views.get(session.id, [])
                 ],
                 'events_list': [
                     {
-                        'event_name': e.event_name,
-                        'event_type': e.event_type,
-                        'page_url': e.page_url,
-                        'page_title': e.page_title,
-                        'timestamp': e.timestamp.isoformat() if e.timestamp else None,
-                        'properties': e.properties or {}
+                        'event_name': event_name,
+                        'event_type': event_type,
+                        'page_url': page_url,
+                        'page_title': page_title,
+                        'timestamp': timestamp.isoformat() if timestamp else None,
+                        'properties': properties or {}
                     }
-                    for e in session_events[:20]  # Limit to 20 most recent
+                    for _, event_name, event_type, page_url, page_title, timestamp, properties in recent_events.get(session.id, [])
                 ]
             })
         
-        # Aggregate statistics
-        total_sessions = len(sessions)
-        total_page_views = len(page_views)
-        total_events = len(events)
-        
-        # Location breakdown
-        location_breakdown = {}
-        for session in sessions:
-            location_key = f"{session.city or 'Unknown'}, {session.country or 'Unknown'}"
-            location_breakdown[location_key] = location_breakdown.get(location_key, 0) + 1
-        
-        # Pages visited breakdown
-        pages_breakdown = {}
-        for pv in page_views:
-            try:
-                from urllib.parse import urlparse
-                parsed = urlparse(pv.page_url)
-                page_path = parsed.path or '/'
-            except:
-                page_path = pv.page_url[:50] if pv.page_url else '/'
-            pages_breakdown[page_path] = pages_breakdown.get(page_path, 0) + 1
-        
-        # Events breakdown
-        events_breakdown = {}
-        for event in events:
-            events_breakdown[event.event_name] = events_breakdown.get(event.event_name, 0) + 1
+        # Aggregate statistics across all matching sessions (GROUP BY, not per-row)
+        aggregates = session_aggregates(filter_condition, start_time)
         
         return jsonify({
             'filter_type': filter_type,
             'filter_value': filter_value,
-            'total_sessions': total_sessions,
-            'total_page_views': total_page_views,
-            'total_events': total_events,
+            'total_sessions': aggregates['total_sessions'],
+            'total_page_views': aggregates['total_page_views'],
+            'total_events': aggregates['total_events'],
             'sessions': sessions_data,
-            'location_breakdown': location_breakdown,
-            'pages_breakdown': pages_breakdown,
-            'events_breakdown': events_breakdown
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'location_breakdown': aggregates['location_breakdown'],
+            'pages_breakdown': aggregates['pages_breakdown'],
+            'events_breakdown': aggregates['events_breakdown']
         }), 200
         
     except Exception as e:
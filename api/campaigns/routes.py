@@ -240,33 +240,57 @@ const detector = new CompanyDetector();
 @campaigns_api.route('', methods=['POST'])
 @jwt_required(optional=True)
 def create_campaign():
-    """Create a new campaign (supports both authenticated and guest users)"""
+    """
+    Create a new campaign (supports both authenticated and guest users).
+
+    Companies come either as JSON ('companies': [...]) or as a multipart CSV/XLSX
+    upload ('file' plus the other fields as form values). Rows are deduplicated
+    by site and bulk inserted (campaign_ingest); pass 'upload_id' to follow
+    progress at /ingest/<upload_id>/events (as the same user or guest session).
+    """
+    progress_stream = None
     try:
-        from models import Campaign, Company
+        from models import Campaign
         from database import db
+        from campaign_ingest import (
+            iter_spreadsheet_rows, prepare_companies, insert_companies, publish_progress, ingest_stream_name, IngestError,
+        )
         
         # Get user ID if authenticated, otherwise None for guest
         current_user_id = get_jwt_identity()
         
-        data = request.get_json()
+        upload = request.files.get('file')
+        data = request.form if upload else (request.get_json() or {})
         name = data.get('name')
         message_template = data.get('message_template')
-        companies_data = data.get('companies', [])
-        auto_detect_names = data.get('auto_detect_names', True)
+        auto_detect_names = str(data.get('auto_detect_names', True)).lower() not in ('false', '0')
         session_id = data.get('session_id')  # For guest users
         
         # Validate input
         if not name or not message_template:
             return jsonify({'error': 'Name and message template are required'}), 400
         
-        if not companies_data or len(companies_data) == 0:
-            return jsonify({'error': 'At least one company is required'}), 400
-        
         # For guests, session_id is required
         if not current_user_id and not session_id:
             return jsonify({'error': 'Session ID is required for guest users'}), 400
 
-        # Daily limit: enforce before creating (enterprise/client = unlimited)
+        # Optional progress stream: the client picks upload_id, scoped to this user/guest session
+        progress_stream = ingest_stream_name(data.get('upload_id'), current_user_id, session_id)
+
+        # Parse (streamed for uploads), normalize URLs, drop blank rows and repeated sites
+        publish_progress(progress_stream, status='parsing')
+        try:
+            rows = iter_spreadsheet_rows(upload.stream, upload.filename) if upload else data.get('companies', [])
+            companies_data, ingest_stats = prepare_companies(rows, auto_detect_names=auto_detect_names)
+        except IngestError as e:
+            publish_progress(progress_stream, status='failed', error=str(e))
+            return jsonify({'error': str(e)}), 400
+        
+        if not companies_data:
+            publish_progress(progress_stream, status='failed', error='At least one company is required')
+            return jsonify({'error': 'At least one company is required'}), 400
+
+        # Daily limit: enforce before creating (enterprise/client = unlimited, no usage count needed)
         tier = 'guest'
         if current_user_id:
             from models import User
@@ -274,42 +298,18 @@ def create_campaign():
             if user:
                 tier = (user.subscription_tier or 'free').strip().lower()
         daily_limit = get_daily_limit(tier)
-        daily_used = get_daily_used(user_id=current_user_id, session_id=session_id if not current_user_id else None)
-        if daily_limit != float('inf') and daily_used + len(companies_data) > daily_limit:
-            print(f"[Create Campaign] Daily limit reached: user_id={current_user_id} tier={tier!r} daily_limit={int(daily_limit)} daily_used={daily_used} companies={len(companies_data)}")
-            return jsonify({
-                'error': 'Daily limit reached',
-                'message': f'You can process {int(daily_limit)} companies per day. You have used {daily_used} today. Resets at midnight UTC.',
-                'daily_used': daily_used,
-                'daily_limit': int(daily_limit),
-                'daily_remaining': max(0, int(daily_limit) - daily_used),
-            }), 403
-        
-        # Auto-detect missing company names if enabled
-        if auto_detect_names:
-            urls_to_detect = []
-            for company_data in companies_data:
-                if not company_data.get('company_name') or company_data.get('company_name').strip() == '':
-                    urls_to_detect.append(company_data.get('website_url'))
-            
-            if urls_to_detect:
-                print(f"Auto-detecting company names for {len(urls_to_detect)} URLs...")
-                # This will be handled by the worker later
-                # For now, use domain name as fallback
-                for company_data in companies_data:
-                    if not company_data.get('company_name') or company_data.get('company_name').strip() == '':
-                        url = company_data.get('website_url', '')
-                        # Extract domain and use as company name
-                        try:
-                            from urllib.parse import urlparse
-                            parsed = urlparse(url if url.startswith('http') else f'https://{url}')
-                            domain = parsed.hostname or url
-                            domain = domain.replace('www.', '')
-                            company_name = domain.split('.')[0].capitalize()
-                            company_data['company_name'] = company_name
-                            print(f"Auto-detected company name: {company_name} from {url}")
-                        except:
-                            company_data['company_name'] = url
+        if daily_limit != float('inf'):
+            daily_used = get_daily_used(user_id=current_user_id, session_id=session_id if not current_user_id else None)
+            if daily_used + len(companies_data) > daily_limit:
+                print(f"[Create Campaign] Daily limit reached: user_id={current_user_id} tier={tier!r} daily_limit={int(daily_limit)} daily_used={daily_used} companies={len(companies_data)}")
+                publish_progress(progress_stream, status='failed', error='Daily limit reached')
+                return jsonify({
+                    'error': 'Daily limit reached',
+                    'message': f'You can process {int(daily_limit)} companies per day. You have used {daily_used} today. Resets at midnight UTC.',
+                    'daily_used': daily_used,
+                    'daily_limit': int(daily_limit),
+                    'daily_remaining': max(0, int(daily_limit) - daily_used),
+                }), 403
         
         # Create campaign with user_id or session_id
         campaign = Campaign(
@@ -318,30 +318,26 @@ def create_campaign():
             name=name,
             message_template=message_template,
             status='draft',
+            spreadsheet_filename=upload.filename[:500] if upload and upload.filename else None,
             total_companies=len(companies_data)
         )
         db.session.add(campaign)
         db.session.flush()  # Get campaign ID
         
-        # Create companies
-        for company_data in companies_data:
-            company = Company(
-                campaign_id=campaign.id,
-                company_name=company_data.get('company_name', ''),
-                website_url=company_data.get('website_url', ''),
-                contact_email=company_data.get('contact_email'),
-                contact_person=company_data.get('contact_person'),
-                phone=company_data.get('phone'),
-                additional_data=company_data.get('additional_data', {})
-            )
-            db.session.add(company)
+        # Create companies (chunked multi-row inserts, not one ORM object per row)
+        ingest_stats['inserted'] = insert_companies(campaign.id, companies_data, progress_stream=progress_stream)
         
         db.session.commit()
+        publish_progress(progress_stream, status='completed', campaign_id=campaign.public_id, **ingest_stats)
+        if ingest_stats['duplicates'] or ingest_stats['blank']:
+            print(f"[Create Campaign] Campaign {campaign.id}: {ingest_stats['inserted']} companies "
+                  f"({ingest_stats['duplicates']} duplicate sites, {ingest_stats['blank']} blank rows skipped)")
         
         return jsonify({
             'success': True,
             'message': 'Campaign created successfully',
-            'campaign': campaign.to_dict()
+            'campaign': campaign.to_dict(),
+            'ingest': ingest_stats
         }), 201
         
     except Exception as e:
@@ -349,8 +345,21 @@ def create_campaign():
         import traceback
         traceback.print_exc()
         db.session.rollback()
+        if progress_stream:
+            publish_progress(progress_stream, status='failed', error=str(e))
         return jsonify({'error': str(e)}), 500
 
+@campaigns_api.route('/ingest/<upload_id>/events', methods=['GET'])
+@jwt_required(optional=True)
+def campaign_ingest_events(upload_id):
+    """SSE progress of the caller's create_campaign call made with this upload_id. Guest: pass session_id in query."""
+    from job_events import sse_stream, sse_response, last_event_id_from
+    from campaign_ingest import ingest_stream_name
+    stream = ingest_stream_name(upload_id, get_jwt_identity(), request.args.get('session_id'))
+    if not stream:
+        return jsonify({'error': 'Session ID is required for guest users'}), 400
+    return sse_response(sse_stream('campaign_ingest', stream, last_event_id=last_event_id_from(request)))
+
 @campaigns_api.route('/<id_or_public_id>', methods=['GET'])
 def get_campaign(id_or_public_id):
     """Get a specific campaign with details (supports ID or matching public_id)"""
@@ -553,20 +562,8 @@ def update_company(company_id):
         
         db.session.commit()
         
-        # Update campaign statistics (processed = finished only, exclude "processing")
+        # Campaign counters were updated by the status change in the same commit (campaign_counters)
         campaign = company.campaign
-        campaign.processed_count = Company.query.filter(
-            Company.campaign_id == campaign.id,
-            Company.status != 'pending',
-            Company.status != 'processing'
-        ).count()
-        # Count success as both 'success' status and companies with emails_sent (email fallback)
-        success_companies = Company.query.filter_by(campaign_id=campaign.id).filter(
-            db.or_(Company.status == 'success', Company.emails_sent.isnot(None))
-        ).count()
-        campaign.success_count = success_companies
-        campaign.failed_count = Company.query.filter_by(campaign_id=campaign.id, status='failed').count()
-        campaign.captcha_count = Company.query.filter_by(campaign_id=campaign.id, status='captcha').count()
         
         # Check if all companies are processed and update campaign status
         total_companies = campaign.total_companies
@@ -948,6 +945,7 @@ def rapid_process_batch(id_or_public_id):
         from models import Campaign, Company, User
         from database import db
         from campaign_sequential import process_campaign_sequential  # no Celery/Redis
+        from campaign_scheduler import get_scheduler, AdmissionRejected
         
         data = request.get_json() or {}
         company_ids = data.get('company_ids')  # Optional: if None, processes all pending up to processing_limit
@@ -997,6 +995,18 @@ def rapid_process_batch(id_or_public_id):
                 'daily_remaining': remaining,
             }), 403
 
+        # Admission control: the shared campaign scheduler caps how much work may be queued
+        scheduler = get_scheduler()
+        try:
+            scheduler.check_admission(to_process)
+        except AdmissionRejected as e:
+            print(f"[Rapid Process] Admission rejected: campaign_id={campaign_id} to_process={to_process}: {e}")
+            return jsonify({
+                'error': 'Processing queue is full',
+                'message': str(e),
+                'queue': scheduler.stats(),
+            }), 429
+
         # PERMANENT FIX: Clear any company still "processing" before starting so we never inherit stuck state from a previous run
         try:
             n_stale = Company.query.filter_by(campaign_id=campaign_id, status='processing').update({'status': 'pending'})
@@ -1017,7 +1027,7 @@ def rapid_process_batch(id_or_public_id):
         def run_in_background(campaign_id_arg, company_ids_arg, processing_limit_arg, skip_submit_arg, app_obj):
             with app_obj.app_context():
                 try:
-                    process_campaign_sequential(campaign_id_arg, company_ids_arg, processing_limit_arg, skip_submit_arg)
+                    process_campaign_sequential(campaign_id_arg, company_ids_arg, processing_limit_arg, skip_submit_arg, tier=tier)
                 except BaseException as e:
                     print(f"Background thread error: {e}")
                     import traceback
@@ -1050,7 +1060,9 @@ def rapid_process_batch(id_or_public_id):
             'success': True,
             'message': 'Sequential processing started in background thread',
             'campaign_id': campaign_id,
-            'to_process': to_process
+            'to_process': to_process,
+            'queue': scheduler.stats(),
+            'queue_url': f'/api/campaigns/{campaign.public_id or campaign_id}/queue-position',
         }), 202
 
     except Exception as e:
@@ -1059,6 +1071,30 @@ def rapid_process_batch(id_or_public_id):
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+@campaigns_api.route('/<id_or_public_id>/queue-position', methods=['GET'])
+def get_queue_position(id_or_public_id):
+    """
+    Where a campaign stands in the shared campaign scheduler: waiting (with its
+    position) or running (with its fair share of the worker budget).
+    """
+    try:
+        from models import Campaign
+        from campaign_scheduler import get_scheduler
+
+        campaign = Campaign.query.filter_by(public_id=id_or_public_id).first()
+        if not campaign and id_or_public_id.isdigit():
+            campaign = Campaign.query.get(int(id_or_public_id))
+        if not campaign:
+            return jsonify({'error': 'Campaign not found'}), 404
+
+        scheduler = get_scheduler()
+        status = scheduler.status(campaign.id) or {'state': 'idle', 'position': None}
+        return jsonify({'campaign_id': campaign.id, **status, 'scheduler': scheduler.stats()}), 200
+
+    except Exception as e:
+        print(f"[Queue Position] Error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @campaigns_api.route('/<id_or_public_id>/reset-stuck', methods=['POST'])
 def reset_stuck_processing(id_or_public_id):
     """
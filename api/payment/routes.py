@@ -3,7 +3,7 @@ Payment webhook routes for handling subscription upgrades
 """
 from flask import Blueprint, request, jsonify
 from database import db
-from models import User, Notification
+from models import User
 from email_service import send_upgrade_email, generate_invoice_pdf, get_file_invoice_email_html
 from notification_service import create_subscription_notification, create_payment_notification
 import base64
@@ -266,7 +266,8 @@ def upgrade_subscription():
                     user_id=user.id,
                     user_email=user.email,
                     amount=amount,
-                    notification_type='payment'
+                    notification_type='payment',
+                    tier=new_tier
                 )
         except Exception as e:
             print(f"[WARN] Failed to create notification: {e}")
@@ -412,10 +413,15 @@ def get_file_invoice_email_html_endpoint():
 @payment_api.route('/billing-history', methods=['GET'])
 def get_billing_history():
     """
-    Get user's billing history from payment/subscription notifications
+    Get user's billing history from the per-user billing ledger
     Requires authentication via Authorization header
+
+    Query params: user_id or user_email, limit (default 50, max 200), cursor (next_cursor of the previous page)
+    Pages walk from newest to oldest; entries within a page are sorted oldest first.
     """
     try:
+        from billing_ledger import fetch_ledger_page, latest_paid_entry_date
+
         # Get auth token from header
         auth_header = request.headers.get('Authorization')
         if not auth_header or not auth_header.startswith('Bearer '):
@@ -430,9 +436,11 @@ def get_billing_history():
         
         if not user_id and not user_email:
             return jsonify({'error': 'user_id or user_email required'}), 400
+
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        cursor = request.args.get('cursor') or None
         
         # Get user to check their subscription tier and created date
-        from models import User
         user = None
         if user_id:
             try:
@@ -446,71 +454,22 @@ def get_billing_history():
             return jsonify({'error': 'User not found'}), 404
         
         # CRITICAL: Only show invoices for the CURRENT user account
-        # Filter by user ID (not just email) to prevent old invoices from deleted accounts
-        # Also only show invoices created AFTER the user's account was created
+        # Ledger rows are keyed by user ID (not email), and only entries created AFTER
+        # the user's account was created are shown (guards against reused IDs)
         user_account_created_at = user.created_at if user.created_at else datetime.now()
+
+        try:
+            entries, next_cursor = fetch_ledger_page(user.id, user_account_created_at, cursor=cursor, limit=limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        billing_history = [entry.to_dict() for entry in entries]
+        print(f"[INFO] [BILLING HISTORY] Found {len(entries)} ledger entries for user {user.id} (cursor: {bool(cursor)}, more: {next_cursor is not None})")
         
-        # Query notifications for this user with payment/subscription category
-        # SQLite stores JSON as text, so we'll filter in Python
-        all_notifications = Notification.query.filter(
-            db.or_(
-                Notification.category == 'payment',
-                Notification.category == 'subscription'
-            )
-        ).order_by(Notification.created_at.desc()).all()
-        
-        # Filter by user_id AND ensure notification was created after user account creation
-        # This prevents old invoices from deleted accounts from appearing
-        notifications = []
-        for notif in all_notifications:
-            metadata = notif.notification_metadata or {}
-            notif_user_id = metadata.get('user_id')
-            
-            # CRITICAL: Only include notifications that:
-            # 1. Belong to the current user (by ID, not email)
-            # 2. Were created AFTER the user's account was created
-            if notif_user_id and (notif_user_id == user.id or str(notif_user_id) == str(user.id)):
-                # Check if notification was created after user account creation
-                if notif.created_at and notif.created_at >= user_account_created_at:
-                    notifications.append(notif)
-                else:
-                    print(f"[WARN] [BILLING HISTORY] Skipping notification {notif.id} - created before user account ({notif.created_at} < {user_account_created_at})")
-        
-        # Transform notifications to billing history format
-        billing_history = []
-        for notif in notifications:
-            metadata = notif.notification_metadata or {}
-            amount = metadata.get('amount', 0.0)
-            payment_id = metadata.get('payment_id', '')
-            tier = metadata.get('new_tier') or metadata.get('tier', 'free')
-            plan_name = notif.title.replace('Payment Received: ', '').replace('Subscription Upgraded: ', '')
-            
-            billing_history.append({
-                'id': str(notif.id),
-                'invoice': plan_name or f"Invoice #{payment_id[:8] if payment_id else notif.id}",
-                'amount': float(amount),
-                'date': notif.created_at.isoformat() if notif.created_at else datetime.now().isoformat(),
-                'status': 'Paid' if amount > 0 else 'Free',
-                'payment_id': payment_id,
-                'tier': tier,
-                'notification_id': notif.id,
-                'metadata': metadata
-            })
-        
-        print(f"[INFO] [BILLING HISTORY] Found {len(notifications)} notifications for user {user.id} (account created: {user_account_created_at}), created {len(billing_history)} billing history entries")
-        
-        # Always add initial free tier subscription (from signup)
-        # This shows when they first signed up, regardless of current tier
-        # Check if we already have an initial subscription in the history
-        has_initial = any(
-            item.get('metadata', {}).get('is_initial') or 
-            (item.get('amount', 0) == 0 and item.get('tier', '').lower() == 'free' and item.get('notification_id') is None)
-            for item in billing_history
-        )
-        
-        if not has_initial:
+        # Initial free tier subscription (from signup) is the oldest item - add it on the last page
+        if next_cursor is None:
             subscription_date = user.created_at if user.created_at else datetime.now()
-            billing_history.insert(0, {
+            billing_history.append({
                 'id': f"initial_{user.id}",
                 'invoice': 'Free Tier - Initial Subscription',
                 'amount': 0.0,
@@ -526,55 +485,48 @@ def get_billing_history():
                     'is_initial': True
                 }
             })
-            print(f"[OK] [BILLING HISTORY] Added initial free tier subscription for user {user.email} (signup: {subscription_date})")
-        
-        # If user is on premium/enterprise but has no payment notifications, add current subscription
-        # This handles cases where upgrade notifications weren't created
-            current_tier = user.subscription_tier or 'free'
-            has_payment_notification = any(
-                item.get('amount', 0) > 0 and item.get('status') == 'Paid'
-                for item in billing_history
-            )
+        
+        # If user is on premium/enterprise but has no paid ledger entries, add current subscription
+        # This handles cases where upgrade notifications weren't created (first page only)
+        current_tier = user.subscription_tier or 'free'
+        if cursor is None and current_tier.lower() in ['premium', 'production', 'enterprise'] \
+                and latest_paid_entry_date(user.id, user_account_created_at) is None:
+            tier_name = {'free': 'Free Tier', 'premium': 'Production Plan', 'enterprise': 'Enterprise Plan', 'production': 'Production Plan'}
+            plan_name = tier_name.get(current_tier.lower(), current_tier)
             
-            # Only add current subscription if user is on paid tier but has no payment notifications
-            if current_tier.lower() in ['premium', 'production', 'enterprise'] and not has_payment_notification:
-                tier_name = {'free': 'Free Tier', 'premium': 'Production Plan', 'enterprise': 'Enterprise Plan', 'production': 'Production Plan'}
-                plan_name = tier_name.get(current_tier.lower(), current_tier)
-                
-                # Determine amount based on tier
-                tier_amounts = {'free': 0.0, 'premium': 9.0, 'production': 9.0, 'enterprise': 19.0}
-                subscription_amount = tier_amounts.get(current_tier.lower(), 0.0)
-                
-                # Use most recent notification date or user created_at
-                latest_notification_date = None
-                if notifications:
-                    latest_notification_date = max((n.created_at for n in notifications if n.created_at), default=None)
-                subscription_date = latest_notification_date or user.created_at or datetime.now()
-                
-                billing_history.append({
-                    'id': f"current_{user.id}",
-                    'invoice': f"{plan_name} - Subscription",
-                    'amount': subscription_amount,
-                    'date': subscription_date.isoformat(),
-                    'status': 'Paid' if subscription_amount > 0 else 'Free',
-                    'payment_id': '',
+            # Determine amount based on tier
+            tier_amounts = {'free': 0.0, 'premium': 9.0, 'production': 9.0, 'enterprise': 19.0}
+            subscription_amount = tier_amounts.get(current_tier.lower(), 0.0)
+            
+            # Use most recent ledger date or user created_at
+            subscription_date = entries[0].created_at if entries else (user.created_at or datetime.now())
+            
+            billing_history.append({
+                'id': f"current_{user.id}",
+                'invoice': f"{plan_name} - Subscription",
+                'amount': subscription_amount,
+                'date': subscription_date.isoformat(),
+                'status': 'Paid' if subscription_amount > 0 else 'Free',
+                'payment_id': '',
+                'tier': current_tier,
+                'notification_id': None,
+                'metadata': {
+                    'user_id': user.id,
+                    'user_email': user.email,
                     'tier': current_tier,
-                    'notification_id': None,
-                    'metadata': {
-                        'user_id': user.id,
-                        'user_email': user.email,
-                        'tier': current_tier,
-                        'is_current': True
-                    }
-                })
-                print(f"[OK] [BILLING HISTORY] Added current {current_tier} subscription for user {user.email} (amount: ${subscription_amount})")
+                    'is_current': True
+                }
+            })
+            print(f"[OK] [BILLING HISTORY] Added current {current_tier} subscription for user {user.email} (amount: ${subscription_amount})")
         
         # Sort by date (oldest first)
         billing_history.sort(key=lambda x: x['date'])
         
         return jsonify({
             'success': True,
-            'billing_history': billing_history
+            'billing_history': billing_history,
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None
         }), 200
         
     except Exception as e:
@@ -583,6 +535,16 @@ def get_billing_history():
         traceback.print_exc()
         return jsonify({'error': str(e)}), 500
 
+def _token_user():
+    """User for an app-issued JWT in the Authorization header; None for other bearer tokens"""
+    try:
+        from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        return db.session.get(User, int(identity)) if identity else None
+    except Exception:
+        return None
+
 @payment_api.route('/download-invoice', methods=['POST'])
 def download_invoice():
     """
@@ -603,6 +565,42 @@ def download_invoice():
         # Extract invoice details from request
         payment_id = data.get('payment_id', '')
         user_email = data.get('user_email', '')
+
+        # Ledger entries (billing-history items with a ledger_id) are rendered once and cached
+        ledger_id = data.get('ledger_id')
+        if ledger_id:
+            from models import BillingLedgerEntry
+            from billing_ledger import get_invoice_pdf
+            try:
+                entry = db.session.get(BillingLedgerEntry, int(ledger_id))
+            except (TypeError, ValueError):
+                entry = None
+            owner = db.session.get(User, entry.user_id) if entry else None
+            # The caller must own the entry: the JWT user when the token is ours, else the stated email
+            caller = _token_user()
+            if caller is not None:
+                owns = owner is not None and owner.id == caller.id
+            else:
+                owns = owner is not None and bool(user_email) and \
+                    owner.email.strip().lower() == user_email.strip().lower()
+            if not entry or not owns:
+                return jsonify({'error': 'Invoice not found'}), 404
+
+            invoice_pdf, cached = get_invoice_pdf(entry, owner.email)
+            if not invoice_pdf:
+                print(f"[ERROR] [DOWNLOAD INVOICE] Failed to generate invoice PDF for ledger entry {entry.id}")
+                return jsonify({
+                    'success': False,
+                    'error': 'Failed to generate invoice PDF'
+                }), 500
+            print(f"[OK] [DOWNLOAD INVOICE] Invoice PDF for ledger entry {entry.id} ({len(invoice_pdf)} bytes, cached: {cached})")
+            return jsonify({
+                'success': True,
+                'pdf_base64': base64.b64encode(invoice_pdf).decode('utf-8'),
+                'size': len(invoice_pdf),
+                'cached': cached,
+                'filename': f'invoice_{entry.tier}_{entry.created_at.strftime("%Y%m%d")}.pdf'
+            }), 200
         amount = data.get('amount', 0.0)
         tier = data.get('tier', 'free')
         payment_date_str = data.get('payment_date')
@@ -621,7 +619,8 @@ def download_invoice():
         print(f" [DOWNLOAD INVOICE] Generating invoice PDF for {user_email} (tier: {tier}, amount: {amount})")
         
         # Determine which template to use based on tier
-        template_name = 'subscription-invoice.html' if tier in ['premium', 'production', 'enterprise', 'client'] else 'emails/invoice.html'
+        from billing_ledger import invoice_template_for
+        template_name = invoice_template_for(tier)
         
         # Generate invoice PDF
         invoice_pdf = generate_invoice_pdf(
@@ -5,7 +5,6 @@ import uuid
 import time
 from datetime import datetime
 import subprocess
-import threading
 import base64
 
 from api_auth import require_api_key, require_rate_limit, log_api_usage, should_bypass_monthly_limit, increment_monthly_usage
@@ -122,6 +121,9 @@ def update_job_status(job_id, status, output_file_path=None, error_message=None,
             job.completed_at = datetime.utcnow()
         
         db.session.commit()
+        
+        from job_events import publish_event
+        publish_event('job', job_id, job.to_dict(), event_type='status')
 
 @api_v1.route('/convert/video', methods=['POST'])
 @require_api_key
@@ -200,72 +202,10 @@ def convert_video():
         print(f" [JOB] Created job ID: {job.job_id}")
         
         if async_mode or file_size > 50 * 1024 * 1024:  # 50MB threshold for async
-            # Process asynchronously
-            update_job_status(job.job_id, 'processing')
-            
-            def process_video():
-                try:
-                    # Video conversion logic (simplified)
-                    output_filename = f"{uuid.uuid4().hex[:8]}_converted.{output_format}"
-                    output_path = os.path.join(VIDEO_FOLDER, output_filename)
-                    
-                    # FFmpeg command
-                    quality_map = {95: 18, 85: 23, 75: 28, 60: 32, 40: 35}
-                    preset_map = {'ultrafast': 'ultrafast', 'fast': 'fast', 'medium': 'medium', 'slow': 'slow', 'veryslow': 'veryslow'}
-                    
-                    crf = quality_map.get(quality, 28)
-                    preset = preset_map.get(compression, 'medium')
-                    
-                    cmd = [
-                        'ffmpeg', '-i', input_path,
-                        '-c:v', 'libx264', '-crf', str(crf), '-preset', preset,
-                        '-c:a', 'aac', '-b:a', '128k',
-                        '-y', output_path
-                    ]
-                    
-                    # COMPREHENSIVE BACKEND LOGGING - FFMPEG START
-                    ffmpeg_start_time = time.time()
-                    ffmpeg_start_timestamp = datetime.now().isoformat()
-                    print(" [BACKEND FFMPEG START] ==================================")
-                    print(f"⏰ [TIMESTAMP] {ffmpeg_start_timestamp}")
-                    print(f"⏰ [TIMING] FFmpeg started at: {ffmpeg_start_time}")
-                    print(f" [FFMPEG] Command: {' '.join(cmd)}")
-                    print(f" [FFMPEG] Input: {input_path}")
-                    print(f" [FFMPEG] Output: {output_path}")
-                    print(f" [FFMPEG] CRF: {crf}, Preset: {preset}")
-                    print(" [BACKEND FFMPEG START] ==================================")
-                    
-                    result = subprocess.run(cmd, capture_output=True, text=True)
-                    
-                    # COMPREHENSIVE BACKEND LOGGING - FFMPEG COMPLETE
-                    ffmpeg_end_time = time.time()
-                    ffmpeg_duration = ffmpeg_end_time - ffmpeg_start_time
-                    ffmpeg_end_timestamp = datetime.now().isoformat()
-                    print(" [BACKEND FFMPEG COMPLETE] ==============================")
-                    print(f"⏰ [TIMESTAMP] {ffmpeg_end_timestamp}")
-                    print(f"⏰ [TIMING] FFmpeg duration: {ffmpeg_duration:.3f}s")
-                    print(f"⏰ [TIMING] FFmpeg duration: {ffmpeg_duration:.1f} seconds")
-                    print(f" [FFMPEG] Return code: {result.returncode}")
-                    print(f" [FFMPEG] Success: {result.returncode == 0}")
-                    if result.stderr:
-                        print(f" [FFMPEG] Error output: {result.stderr[:200]}...")
-                    print(" [BACKEND FFMPEG COMPLETE] ==============================")
-                    
-                    if result.returncode == 0:
-                        update_job_status(job.job_id, 'completed', output_path)
-                    else:
-                        update_job_status(job.job_id, 'failed', error_message=result.stderr)
-                    
-                    # Clean up input file
-                    if os.path.exists(input_path):
-                        os.remove(input_path)
-                        
-                except Exception as e:
-                    update_job_status(job.job_id, 'failed', error_message=str(e))
-            
-            # Start background thread
-            thread = threading.Thread(target=process_video)
-            thread.start()
+            # Process asynchronously on the video queue; the job survives web worker restarts
+            from job_runner import enqueue_job
+            from tasks import convert_video_async
+            enqueue_job(convert_video_async, job.job_id, input_path, output_format, quality, compression)
             
             processing_time = time.time() - start_time
             log_api_usage('/api/v1/convert/video', 'POST', 202, file_size, processing_time)
@@ -286,7 +226,8 @@ def convert_video():
                 'job_id': job.job_id,
                 'status': 'processing',
                 'message': 'Video conversion started',
-                'check_status_url': f'/api/v1/jobs/{job.job_id}/status'
+                'check_status_url': f'/api/v1/jobs/{job.job_id}/status',
+                'events_url': f'/api/v1/jobs/{job.job_id}/events'
             }), 202
         
         else:
@@ -1051,6 +992,24 @@ def get_job_status(job_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api_v1.route('/jobs/<job_id>/events', methods=['GET'])
+@require_api_key
+def stream_job_events(job_id):
+    """Server-Sent Events stream of a job's status changes (resumable via Last-Event-ID)"""
+    try:
+        from models import Job
+        from job_events import sse_stream, sse_response, last_event_id_from
+        
+        job = Job.query.filter_by(job_id=job_id, user_id=g.current_user.id).first()
+        if not job:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return sse_response(sse_stream('job', job_id, last_event_id=last_event_id_from(request),
+                                       snapshot=job.to_dict()))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @api_v1.route('/jobs/<job_id>/download', methods=['GET'])
 @require_api_key
 def download_job_result(job_id):
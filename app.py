@@ -16,34 +16,8 @@ import subprocess
 import shutil
 import threading
 
-# Try to import HTML to PDF conversion libraries
-WEASYPRINT_AVAILABLE = False
-XHTML2PDF_AVAILABLE = False
-PLAYWRIGHT_AVAILABLE = False
-
-# Try WeasyPrint (requires GTK+ on Windows - often problematic)
-try:
-    from weasyprint import HTML, CSS
-    WEASYPRINT_AVAILABLE = True
-    print("[OK] WeasyPrint available")
-except (ImportError, OSError) as e:
-    print(f"[WARN] WeasyPrint not available: {e}")
-
-# Try xhtml2pdf (pure Python, works on Windows)
-try:
-    from xhtml2pdf import pisa
-    XHTML2PDF_AVAILABLE = True
-    print("[OK] xhtml2pdf available")
-except ImportError:
-    print("[WARN] xhtml2pdf not available")
-
-# Try Playwright (browser-based, most accurate but requires browser installation)
-try:
-    from playwright.sync_api import sync_playwright
-    PLAYWRIGHT_AVAILABLE = True
-    print("[OK] Playwright available")
-except ImportError:
-    print("[WARN] Playwright not available")
+# HTML to PDF renderers (converters and availability flags live in html_renderers)
+from html_renderers import renderer_registry
 
 # Import new API modules
 import sys
@@ -71,6 +45,8 @@ try:
     # Explicitly import Notification to ensure it's registered
     from models import Notification
     print("[OK] Notification model imported successfully")
+    import campaign_counters
+    campaign_counters.install()  # Keeps Campaign counters in step with Company status changes
     from auth import jwt
     print("[OK] Auth module imported successfully")
 except ImportError as e:
@@ -356,8 +332,9 @@ def test_ffmpeg():
             "message": f"Error testing FFmpeg: {str(e)}"
         })
 
-# Global progress tracking
-conversion_progress = {}
+# Global progress tracking (assignments are pushed to /conversion_progress/<filename>/events)
+from job_events import ProgressRegistry
+conversion_progress = ProgressRegistry()
 
 # Global process tracking for cancellation
 running_processes = {}
@@ -2099,49 +2076,11 @@ def convert_html_to_pdf():
         pdf_filename = f"{base_name}_converted.pdf"
         pdf_path = os.path.join(EDITED_FOLDER, pdf_filename)
         
-        # Convert HTML to PDF - use step-by-step PyMuPDF method first (most accurate for our HTML format)
-        # This method parses the HTML and recreates the PDF using the same library that created it
-        conversion_success = False
-        
-        # Method 1: Try step-by-step PyMuPDF reconstruction (best for HTML generated from PDF)
-        try:
-            conversion_success = convert_html_to_pdf_pymupdf_step_by_step(filepath, pdf_path)
-            if conversion_success:
-                print("[OK] Successfully converted using PyMuPDF step-by-step method")
-        except Exception as e:
-            print(f"PyMuPDF step-by-step conversion error: {e}")
-        
-        # Method 2: Try Playwright (most accurate, browser-based)
-        if not conversion_success and PLAYWRIGHT_AVAILABLE:
-            try:
-                conversion_success = convert_html_to_pdf_playwright(filepath, pdf_path)
-                if conversion_success:
-                    print("[OK] Successfully converted using Playwright")
-            except Exception as e:
-                print(f"Playwright conversion error: {e}")
-        
-        # Method 3: Try WeasyPrint (good CSS support, but requires GTK+ on Windows)
-        if not conversion_success and WEASYPRINT_AVAILABLE:
-            try:
-                conversion_success = convert_html_to_pdf_weasyprint(filepath, pdf_path)
-                if conversion_success:
-                    print("[OK] Successfully converted using WeasyPrint")
-            except Exception as e:
-                print(f"WeasyPrint conversion error: {e}")
-        
-        # Method 4: Try xhtml2pdf (pure Python, works on Windows)
-        if not conversion_success and XHTML2PDF_AVAILABLE:
-            try:
-                conversion_success = convert_html_to_pdf_xhtml2pdf(filepath, pdf_path)
-                if conversion_success:
-                    print("[OK] Successfully converted using xhtml2pdf")
-            except Exception as e:
-                print(f"xhtml2pdf conversion error: {e}")
-        
-        # Method 5: Fallback to PyMuPDF insert_htmlbox
-        if not conversion_success:
-            print("Trying PyMuPDF insert_htmlbox fallback...")
-            conversion_success = convert_html_to_pdf_pymupdf(filepath, pdf_path)
+        # Convert HTML to PDF - the registry classifies the HTML (our own .pdf-page output vs
+        # arbitrary HTML) and tries the fastest renderers that preserve fidelity for that class
+        conversion_success, renderer_name, html_class = renderer_registry.render(filepath, pdf_path, html_content)
+        if conversion_success:
+            print(f"[OK] Successfully converted using {renderer_name} ({html_class} HTML)")
         
         if not conversion_success:
             return jsonify({
@@ -2236,732 +2175,6 @@ def convert_html_to_pdf():
             "error": str(e)
         }), 500
 
-def convert_html_to_pdf_playwright(html_path, output_path):
-    """Convert HTML to PDF using Playwright - most accurate, browser-based rendering"""
-    try:
-        # Read HTML content first to check structure
-        with open(html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-        
-        # Get the directory of the HTML file for resolving relative paths (images, CSS, etc.)
-        html_dir = os.path.dirname(os.path.abspath(html_path))
-        # Convert to file:// URL format (Windows compatible)
-        if os.sep == '\\':
-            # Fix: Cannot use backslash in f-string expression, so do replace first
-            html_dir_normalized = html_dir.replace('\\', '/')
-            base_url = f"file:///{html_dir_normalized}/"
-        else:
-            base_url = f"file://{html_dir}/"
-        
-        with sync_playwright() as p:
-            # Launch browser with proper settings for accurate rendering
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-web-security',
-                    '--disable-features=IsolateOrigins,site-per-process',
-                    '--disable-dev-shm-usage',
-                    '--no-sandbox'
-                ]
-            )
-            
-            # Create a new page - use device scale factor of 1 to ensure 1:1 pixel mapping
-            browser_page = browser.new_page(
-                viewport={'width': 4000, 'height': 4000},  # Very large to avoid clipping
-                device_scale_factor=1  # Ensure 1:1 pixel mapping
-            )
-            
-            # Inject CSS to remove any transforms/scaling that might affect layout
-            # and ensure pages are visible and properly positioned
-            prepended_css = """
-            <style id="pdf-conversion-override">
-                /* Remove all transforms that might affect layout */
-                .pdf-page, .page {
-                    transform: none !important;
-                    transform-origin: unset !important;
-                    margin: 0 !important;
-                    padding: 0 !important;
-                    display: block !important;
-                    visibility: visible !important;
-                    opacity: 1 !important;
-                    position: relative !important;
-                    width: auto !important;
-                    height: auto !important;
-                }
-                /* Ensure container doesn't add padding/margins */
-                .pdf-container {
-                    padding: 0 !important;
-                    margin: 0 !important;
-                    width: auto !important;
-                    height: auto !important;
-                }
-                /* Ensure body doesn't add spacing */
-                body {
-                    margin: 0 !important;
-                    padding: 0 !important;
-                    width: auto !important;
-                    height: auto !important;
-                }
-                /* Ensure absolute positioned elements maintain their positions */
-                .text-span, .editable-text, .editable-image {
-                    position: absolute !important;
-                }
-            </style>
-            """
-            
-            # Prepend the override CSS to the HTML
-            html_with_override = html_content.replace('<head>', f'<head>{prepended_css}')
-            
-            # Load HTML content - this preserves all CSS and absolute positioning
-            browser_page.set_content(html_with_override, base_url=base_url, wait_until="networkidle", timeout=60000)
-            
-            # Wait for rendering to complete
-            browser_page.wait_for_timeout(3000)
-            
-            # Get page information - use data attributes if available, otherwise detect
-            page_info = browser_page.evaluate("""
-                () => {
-                    // Find all page containers
-                    const pageElements = document.querySelectorAll('.pdf-page, .page');
-                    
-                    if (pageElements.length === 0) {
-                        // Single page - use body dimensions
-                        const body = document.body;
-                        const rect = body.getBoundingClientRect();
-                        return {
-                            singlePage: true,
-                            width: Math.max(rect.width, body.scrollWidth, 595),
-                            height: Math.max(rect.height, body.scrollHeight, 842)
-                        };
-                    }
-                    
-                    // Try to get dimensions from data attributes first (most accurate)
-                    const firstPage = pageElements[0];
-                    let width = parseFloat(firstPage.getAttribute('data-width'));
-                    let height = parseFloat(firstPage.getAttribute('data-height'));
-                    
-                    // If data attributes not available, use rendered dimensions
-                    if (!width || !height || isNaN(width) || isNaN(height)) {
-                        const rect = firstPage.getBoundingClientRect();
-                        width = rect.width;
-                        height = rect.height;
-                        
-                        // Get the actual content bounds within the page
-                        const content = firstPage.querySelector('.page-content');
-                        if (content) {
-                            const contentRect = content.getBoundingClientRect();
-                            width = Math.max(contentRect.width, rect.width);
-                            height = Math.max(contentRect.height, rect.height);
-                        }
-                    }
-                    
-                    // Ensure minimum A4 size
-                    width = Math.max(width, 595);
-                    height = Math.max(height, 842);
-                    
-                    return {
-                        singlePage: false,
-                        pageCount: pageElements.length,
-                        width: width,
-                        height: height
-                    };
-                }
-            """)
-            
-            page_width = int(page_info.get('width', 595))
-            page_height = int(page_info.get('height', 842))
-            is_single_page = page_info.get('singlePage', True)
-            page_count = page_info.get('pageCount', 1)
-            
-            print(f"Detected: {page_count} page(s), dimensions: {page_width}x{page_height}px")
-            
-            # For multi-page HTML, we need to create a multi-page PDF
-            # Playwright's PDF generation can handle this if we set the right height
-            # But we might need to handle each page separately
-            
-            if not is_single_page and page_count > 1:
-                # Multi-page: calculate total height
-                total_height = page_height * page_count
-                print(f"Multi-page document: total height = {total_height}px")
-                
-                # Generate PDF with full document height
-                pdf_options = {
-                    "path": output_path,
-                    "print_background": True,
-                    "margin": {"top": "0", "right": "0", "bottom": "0", "left": "0"},
-                    "width": f"{page_width}px",
-                    "height": f"{total_height}px",  # Full document height
-                    "scale": 1.0,
-                    "prefer_css_page_size": False
-                }
-            else:
-                # Single page
-                pdf_options = {
-                    "path": output_path,
-                    "print_background": True,
-                    "margin": {"top": "0", "right": "0", "bottom": "0", "left": "0"},
-                    "width": f"{page_width}px",
-                    "height": f"{page_height}px",
-                    "scale": 1.0,
-                    "prefer_css_page_size": False
-                }
-            
-            browser_page.pdf(**pdf_options)
-            browser.close()
-        
-        # Verify the PDF was created
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            print(f"Successfully converted HTML to PDF using Playwright: {output_path}")
-            print(f"PDF size: {os.path.getsize(output_path)} bytes")
-            return True
-        else:
-            print("Playwright conversion failed: PDF file not created or empty")
-            return False
-            
-    except Exception as e:
-        print(f"Error in Playwright conversion: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-def convert_html_to_pdf_xhtml2pdf(html_path, output_path):
-    """Convert HTML to PDF using xhtml2pdf - pure Python, works on Windows"""
-    try:
-        from xhtml2pdf import pisa
-        
-        # Read HTML content
-        with open(html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-        
-        # Ensure output directory exists
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-        
-        # Convert HTML to PDF
-        with open(output_path, "wb") as pdf_file:
-            pisa_status = pisa.CreatePDF(
-                html_content,
-                dest=pdf_file,
-                encoding='utf-8'
-            )
-        
-        # Check for errors
-        if pisa_status.err:
-            print(f"xhtml2pdf conversion errors: {pisa_status.err}")
-            return False
-        
-        # Verify the PDF was created
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            print(f"Successfully converted HTML to PDF using xhtml2pdf: {output_path}")
-            return True
-        else:
-            print("xhtml2pdf conversion failed: PDF file not created or empty")
-            return False
-            
-    except Exception as e:
-        print(f"Error in xhtml2pdf conversion: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-def convert_html_to_pdf_weasyprint(html_path, output_path):
-    """Convert HTML to PDF using WeasyPrint - best for preserving CSS and layout"""
-    try:
-        # Read HTML content
-        with open(html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-        
-        # Get the directory of the HTML file for resolving relative paths (images, CSS, etc.)
-        html_dir = os.path.dirname(os.path.abspath(html_path))
-        # Convert Windows path to file:// URL format
-        if os.sep == '\\':
-            # Fix: Cannot use backslash in f-string expression, so do replace first
-            html_dir_normalized = html_dir.replace('\\', '/')
-            base_url = f"file:///{html_dir_normalized}/"
-        else:
-            base_url = f"file://{html_dir}/"
-        
-        # Ensure output directory exists
-        output_dir = os.path.dirname(output_path)
-        if output_dir and not os.path.exists(output_dir):
-            os.makedirs(output_dir, exist_ok=True)
-        
-        # Convert HTML to PDF using WeasyPrint
-        # WeasyPrint supports modern CSS features and preserves layout accurately
-        # It handles:
-        # - CSS positioning (absolute, relative, fixed)
-        # - Flexbox and Grid layouts
-        # - Fonts and typography
-        # - Colors and backgrounds
-        # - Images (including base64 encoded)
-        # - Page breaks and pagination
-        
-        html_doc = HTML(
-            string=html_content,
-            base_url=base_url  # Helps resolve relative URLs in HTML (images, CSS files, etc.)
-        )
-        
-        # Write PDF with default settings (good quality)
-        html_doc.write_pdf(
-            output_path,
-            # Optional: You can add stylesheets here if needed
-            # stylesheets=[CSS(string='@page { size: A4; margin: 0; }')]
-        )
-        
-        # Verify the PDF was created
-        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
-            print(f"Successfully converted HTML to PDF using WeasyPrint: {output_path}")
-            print(f"PDF size: {os.path.getsize(output_path)} bytes")
-            return True
-        else:
-            print("WeasyPrint conversion failed: PDF file not created or empty")
-            return False
-            
-    except Exception as e:
-        print(f"Error in WeasyPrint conversion: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-def convert_html_to_pdf_pymupdf_step_by_step(html_path, output_path):
-    """
-    Convert HTML to PDF by parsing the HTML structure and recreating the PDF page by page.
-    This method extracts absolute positioned elements and places them exactly where they were.
-    This is the most accurate method for HTML generated from PDF using PyMuPDF.
-    """
-    try:
-        import re
-        from html import unescape
-        
-        # Read HTML content
-        with open(html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-        
-        # Create new PDF document
-        doc = fitz.open()
-        
-        # Find all page divs - HTML can use either .pdf-page with data attributes OR .page with style attributes
-        pages = []
-        
-        # Method 1: Try to find .pdf-page divs with data attributes (from convert_pdf_to_html endpoint)
-        page_openings = []
-        for match in re.finditer(r'<div[^>]*class="[^"]*pdf-page[^"]*"[^>]*data-page="(\d+)"[^>]*data-width="([\d.]+)"[^>]*data-height="([\d.]+)"[^>]*>', html_content, re.IGNORECASE):
-            page_num = int(match.group(1))
-            page_width = float(match.group(2))
-            page_height = float(match.group(3))
-            start_pos = match.end()
-            page_openings.append((page_num, page_width, page_height, start_pos))
-        
-        if page_openings:
-            # Extract content for each page
-            for i, (page_num, page_width, page_height, start_pos) in enumerate(page_openings):
-                if i + 1 < len(page_openings):
-                    end_pos = page_openings[i + 1][3] - len('<div')
-                    closing_match = re.search(r'</div>\s*(?=<div[^>]*class="[^"]*pdf-page)', html_content[start_pos:end_pos], re.IGNORECASE)
-                    if closing_match:
-                        end_pos = start_pos + closing_match.start()
-                else:
-                    closing_match = re.search(r'</div>\s*(?=</div>\s*</div>\s*</div>|$)', html_content[start_pos:], re.IGNORECASE)
-                    if closing_match:
-                        end_pos = start_pos + closing_match.start()
-                    else:
-                        end_pos = len(html_content)
-                
-                page_html = html_content[start_pos:end_pos]
-                pages.append((page_num, page_width, page_height, page_html))
-        else:
-            # Method 2: Find .page divs with style attributes (from convert_with_pymupdf)
-            page_matches = list(re.finditer(r'<div[^>]*class="[^"]*page[^"]*"[^>]*style="[^"]*width:\s*([\d.]+)pt[^"]*min-height:\s*([\d.]+)pt[^"]*"[^>]*>', html_content, re.IGNORECASE))
-            
-            if not page_matches:
-                # Try alternative pattern without min-height
-                page_matches = list(re.finditer(r'<div[^>]*class="[^"]*page[^"]*"[^>]*style="[^"]*width:\s*([\d.]+)pt[^"]*"[^>]*>', html_content, re.IGNORECASE))
-            
-            if page_matches:
-                for i, match in enumerate(page_matches):
-                    page_width = float(match.group(1))
-                    
-                    # Get page content div to extract height
-                    start_pos = match.end()
-                    content_match = re.search(r'<div[^>]*class="[^"]*page-content[^"]*"[^>]*style="[^"]*height:\s*([\d.]+)pt', html_content[start_pos:], re.IGNORECASE)
-                    if content_match:
-                        page_height = float(content_match.group(1))
-                        start_pos = start_pos + content_match.end()
-                    else:
-                        # Try to get from min-height in page div
-                        page_height = float(match.group(2)) if len(match.groups()) > 1 else 842.0  # Default A4 height
-                        # Find page-content div start
-                        content_match = re.search(r'<div[^>]*class="[^"]*page-content[^"]*"[^>]*>', html_content[start_pos:], re.IGNORECASE)
-                        if content_match:
-                            start_pos = start_pos + content_match.end()
-                    
-                    # Find end of page
-                    if i + 1 < len(page_matches):
-                        end_pos = page_matches[i + 1].start()
-                    else:
-                        end_pos = len(html_content)
-                    
-                    # Find closing divs
-                    closing_match = re.search(r'</div>\s*</div>\s*(?=<div[^"]*class="[^"]*page|$)', html_content[start_pos:end_pos], re.IGNORECASE)
-                    if closing_match:
-                        end_pos = start_pos + closing_match.start()
-                    
-                    page_html = html_content[start_pos:end_pos]
-                    pages.append((i + 1, page_width, page_height, page_html))
-        
-        print(f"Found {len(pages)} pages in HTML")
-        
-        if not pages:
-            print("No pages found in HTML, trying single page approach")
-            # Single page - extract dimensions from body or first page element
-            width_match = re.search(r'data-width="([\d.]+)"', html_content)
-            height_match = re.search(r'data-height="([\d.]+)"', html_content)
-            width = float(width_match.group(1)) if width_match else 595.0
-            height = float(height_match.group(1)) if height_match else 842.0
-            
-            page = doc.new_page(width=width, height=height)
-            _add_elements_to_page(html_content, page, width, height)
-        else:
-            # Process each page
-            for page_num, page_width_str, page_height_str, page_html in pages:
-                page_num = int(page_num)
-                page_width = float(page_width_str)
-                page_height = float(page_height_str)
-                
-                print(f"Processing page {page_num}: {page_width}x{page_height}pt")
-                
-                # Create new PDF page with exact dimensions
-                page = doc.new_page(width=page_width, height=page_height)
-                
-                # Add all elements to this page
-                _add_elements_to_page(page_html, page, page_width, page_height)
-        
-        # Save PDF
-        doc.save(output_path)
-        doc.close()
-        
-        # Verify the PDF was created and has content
-        if not os.path.exists(output_path):
-            print("Step-by-step conversion failed: PDF file not created")
-            return False
-        
-        pdf_size = os.path.getsize(output_path)
-        if pdf_size < 1000:  # PDF should be at least 1KB
-            print(f"Step-by-step conversion failed: PDF file is too small ({pdf_size} bytes)")
-            return False
-        
-        # Verify PDF has pages with content
-        try:
-            verify_doc = fitz.open(output_path)
-            page_count = len(verify_doc)
-            if page_count == 0:
-                verify_doc.close()
-                print("Step-by-step conversion failed: PDF has no pages")
-                return False
-            
-            # Check if pages have content
-            total_text = 0
-            total_images = 0
-            for page_num in range(page_count):
-                page = verify_doc[page_num]
-                text = page.get_text()
-                total_text += len(text.strip())
-                images = page.get_images()
-                total_images += len(images)
-            
-            verify_doc.close()
-            
-            if total_text == 0 and total_images == 0:
-                print(f"Step-by-step conversion failed: PDF has {page_count} pages but no content (no text or images)")
-                return False
-            
-            print(f"[OK] Successfully converted HTML to PDF using step-by-step method: {output_path}")
-            print(f"PDF size: {pdf_size} bytes, {page_count} pages, {total_text} chars text, {total_images} images")
-            return True
-        except Exception as e:
-            print(f"Error verifying PDF content: {e}")
-            # If verification fails, still return True if file exists and has size
-            if pdf_size > 1000:
-                print(f"PDF file exists and has size ({pdf_size} bytes), assuming success despite verification error")
-                return True
-            return False
-            
-    except Exception as e:
-        print(f"Error in step-by-step conversion: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-
-def _add_elements_to_page(page_html, page, page_width, page_height):
-    """Helper function to add text spans and images to a PDF page"""
-    import re
-    from html import unescape
-    from io import BytesIO
-    
-    # Extract all text spans with absolute positioning
-    # Pattern: <span style="position: absolute; left: Xpt; top: Ypt; font-size: Spt; font-family: F;">text</span>
-    # Note: HTML uses 'pt' units, not 'px' - coordinates are already in points (PyMuPDF units)
-    text_pattern = r'<span[^>]*style="([^"]*)"[^>]*>(.*?)</span>'
-    
-    all_spans = re.findall(text_pattern, page_html, re.DOTALL | re.IGNORECASE)
-    text_spans = []
-    
-    for style_attr, text_content in all_spans:
-        # Check if it's an absolute positioned span
-        if 'position: absolute' not in style_attr and 'position:absolute' not in style_attr:
-            continue
-        
-        # Extract coordinates and font info from style - handle both 'pt' and 'px' units
-        left_match = re.search(r'left:\s*([\d.]+)(pt|px)', style_attr, re.IGNORECASE)
-        top_match = re.search(r'top:\s*([\d.]+)(pt|px)', style_attr, re.IGNORECASE)
-        size_match = re.search(r'font-size:\s*([\d.]+)(pt|px)', style_attr, re.IGNORECASE)
-        font_match = re.search(r"font-family:\s*['\"]?([^;'\"]+)['\"]?", style_attr, re.IGNORECASE)
-        
-        if left_match and top_match and size_match:
-            left_val = float(left_match.group(1))
-            top_val = float(top_match.group(1))
-            size_val = float(size_match.group(1))
-            
-            # Coordinates are already in points (pt), so use directly
-            # If px units are found, we'd need to convert, but HTML from PDF uses pt
-            text_spans.append((
-                str(left_val),
-                str(top_val),
-                str(size_val),
-                font_match.group(1).strip() if font_match else 'Arial',
-                style_attr,
-                text_content
-            ))
-    
-    # Process text spans
-    for left_str, top_str, size_str, font_family, style_attr, text_content in text_spans:
-        try:
-            left = float(left_str)
-            top = float(top_str)
-            size = float(size_str)
-            
-            # Extract font-weight and font-style from style
-            is_bold = 'font-weight: bold' in style_attr or 'font-weight:bold' in style_attr or 'font-weight:700' in style_attr
-            is_italic = 'font-style: italic' in style_attr or 'font-style:italic' in style_attr
-            
-            # Decode HTML entities
-            text = unescape(text_content)
-            text = text.replace('&nbsp;', ' ')
-            text = text.strip()
-            
-            if text:
-                # Insert text at exact position
-                # The HTML uses 'pt' (points) units, which is the same unit PyMuPDF uses
-                # So coordinates are already in the correct format - use directly
-                point = fitz.Point(left, top)
-                
-                # Clean up font name - remove variants like 'Arial,Bold' -> 'Arial'
-                font_name = font_family.split(',')[0].strip().strip("'\"")
-                # Remove any variant suffixes
-                font_name = re.sub(r'[,;].*$', '', font_name).strip()
-                
-                # Map common font names to PyMuPDF font names
-                font_map = {
-                    'Arial': 'helv',
-                    'Helvetica': 'helv',
-                    'Times': 'times',
-                    'Times New Roman': 'times',
-                    'Courier': 'cour',
-                    'Courier New': 'cour',
-                    'ArialMT': 'helv',
-                    'Arial,Bold': 'helv',
-                    'Arial,Italic': 'helv'
-                }
-                
-                pdf_font = font_map.get(font_name, 'helv')
-                
-                # Build font flags
-                font_flags = 0
-                if is_bold:
-                    font_flags |= 16  # Bold flag
-                if is_italic:
-                    font_flags |= 2   # Italic flag
-                
-                # Insert text with proper font and flags
-                try:
-                    page.insert_text(
-                        point,
-                        text,
-                        fontsize=size,
-                        fontname=pdf_font,
-                        render_mode=0,  # Fill text
-                        fontfile=None
-                    )
-                    elements_added += 1
-                    # Apply font flags if needed
-                    if font_flags:
-                        # Note: PyMuPDF's insert_text doesn't directly support flags, 
-                        # but we can use insert_font and insert_textbox for better control
-                        # For now, we'll use the basic method
-                        pass
-                except Exception as e:
-                    print(f"Warning: Could not insert text with font {pdf_font}, trying default: {e}")
-                    # Fallback to default font
-                    try:
-                        page.insert_text(point, text, fontsize=size, fontname='helv', render_mode=0)
-                        elements_added += 1
-                    except Exception as e2:
-                        print(f"Error inserting text even with default font: {e2}")
-        except Exception as e:
-            print(f"Error adding text span: {e}")
-            continue
-    
-    print(f"Added {len(text_spans)} text spans to page, {elements_added} successfully inserted")
-    
-    # Extract all images with absolute positioning
-    # Pattern: <img style="position: absolute; left: Xpt; top: Ypt; width: Wpt; height: Hpt;" src="data:image/png;base64,...">
-    # Note: HTML uses 'pt' units, not 'px'
-    # The src attribute might come before or after style, so we need a more flexible pattern
-    img_pattern = r'<img[^>]*src="data:image/([^;]+);base64,([^"]+)"[^>]*style="([^"]*)"'
-    img_pattern2 = r'<img[^>]*style="([^"]*)"[^>]*src="data:image/([^;]+);base64,([^"]+)"'
-    
-    all_images = re.findall(img_pattern, page_html, re.IGNORECASE)
-    all_images2 = re.findall(img_pattern2, page_html, re.IGNORECASE)
-    
-    # Combine both patterns
-    all_image_matches = []
-    for match in all_images:
-        all_image_matches.append((match[2], match[0], match[1]))  # style, format, data
-    for match in all_images2:
-        all_image_matches.append((match[0], match[1], match[2]))  # style, format, data
-    
-    images = []
-    print(f"Found {len(all_image_matches)} image tags in HTML")
-    
-    for style_attr, img_format, base64_data in all_image_matches:
-        # Check if it's an absolute positioned image
-        if 'position: absolute' not in style_attr and 'position:absolute' not in style_attr:
-            continue
-        
-        # Extract coordinates and dimensions from style - handle both 'pt' and 'px' units
-        left_match = re.search(r'left:\s*([\d.]+)(pt|px)', style_attr, re.IGNORECASE)
-        top_match = re.search(r'top:\s*([\d.]+)(pt|px)', style_attr, re.IGNORECASE)
-        width_match = re.search(r'width:\s*([\d.]+)(pt|px)', style_attr, re.IGNORECASE)
-        height_match = re.search(r'height:\s*([\d.]+)(pt|px)', style_attr, re.IGNORECASE)
-        
-        if left_match and top_match and width_match and height_match:
-            left_val = float(left_match.group(1))
-            top_val = float(top_match.group(1))
-            width_val = float(width_match.group(1))
-            height_val = float(height_match.group(1))
-            
-            # Coordinates are already in points (pt), so use directly
-            images.append((
-                str(left_val),
-                str(top_val),
-                str(width_val),
-                str(height_val),
-                img_format,
-                base64_data
-            ))
-        else:
-            print(f"Warning: Image missing required style attributes. Style: {style_attr[:100]}")
-    
-    print(f"Extracted {len(images)} images with absolute positioning")
-    
-    for left_str, top_str, width_str, height_str, img_format, base64_data in images:
-        try:
-            left = float(left_str)
-            top = float(top_str)
-            width = float(width_str)
-            height = float(height_str)
-            
-            # Decode base64 image
-            image_data = base64.b64decode(base64_data)
-            
-            # Create rectangle for image placement
-            rect = fitz.Rect(left, top, left + width, top + height)
-            
-            # Insert image - use stream parameter for base64 decoded data
-            page.insert_image(rect, stream=image_data, keep_proportion=False)
-            elements_added += 1
-            print(f"Inserted image at ({left}, {top}) with size {width}x{height}")
-        except Exception as e:
-            print(f"Error adding image at ({left_str}, {top_str}): {e}")
-            import traceback
-            traceback.print_exc()
-            continue
-    
-    print(f"Total elements added to page: {elements_added} (text spans: {len(text_spans)}, images: {len(images)})")
-    
-    if elements_added == 0:
-        print(f"[WARN] WARNING: No elements were added to the page! Page HTML length: {len(page_html)}")
-        print(f"Page HTML preview (first 500 chars): {page_html[:500]}")
-        print(f"Text spans found: {len(text_spans)}, Images found: {len(images)}")
-
-def convert_html_to_pdf_pymupdf(html_path, output_path):
-    """Convert HTML to PDF using PyMuPDF"""
-    try:
-        # Read HTML content
-        with open(html_path, "r", encoding="utf-8") as f:
-            html_content = f.read()
-        
-        # Create a new PDF document
-        doc = fitz.open()
-        
-        # Create a page (A4 size: 595 x 842 points)
-        page = doc.new_page(width=595, height=842)
-        rect = page.rect
-        
-        # Use PyMuPDF's insert_htmlbox to render HTML
-        # This method renders HTML content into the PDF
-        try:
-            # Insert HTML content into the page
-            # insert_htmlbox renders HTML with CSS support
-            # Parameters: rect, text (HTML content), css (optional)
-            page.insert_htmlbox(
-                rect,  # Rectangle to fill
-                html_content,  # HTML content (parameter name is 'text' but accepts HTML)
-                css=""  # Additional CSS if needed
-            )
-            
-        except Exception as e:
-            print(f"Warning: insert_htmlbox failed, trying alternative: {e}")
-            # Fallback: Try with file path instead
-            try:
-                # Convert to absolute path for file:// URL
-                abs_html_path = os.path.abspath(html_path)
-                file_url = f"file:///{abs_html_path.replace(os.sep, '/')}"
-                
-                # Try rendering from file URL
-                page.insert_htmlbox(rect, file_url)
-                
-            except Exception as e2:
-                print(f"Warning: File URL method failed, using text extraction: {e2}")
-                # Last resort: Extract text and add as plain text
-                import re
-                from html import unescape
-                # Remove HTML tags and decode entities
-                text_content = re.sub(r'<[^>]+>', ' ', html_content)
-                text_content = unescape(text_content)
-                # Clean up whitespace
-                text_content = ' '.join(text_content.split())
-                
-                # Insert text with basic formatting
-                if text_content:
-                    page.insert_text((50, 50), text_content[:10000], fontsize=11)
-                else:
-                    print("ERROR: No text content extracted from HTML")
-                    return False
-        
-        # Save PDF
-        doc.save(output_path)
-        doc.close()
-        
-        return True
-        
-    except Exception as e:
-        print(f"ERROR in HTML to PDF conversion: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return False
-
 @app.route("/convert_image_to_pdf", methods=["POST"])
 def convert_image_to_pdf():
     if "pdf" not in request.files:
@@ -4092,14 +3305,12 @@ def convert_video_background(filename, filepath, converted_path, crf, preset):
                             # Calculate real progress percentage
                             if total_duration and total_duration > 0:
                                 progress = max(1, min(99, int((current_time_pos / total_duration) * 100)))
-                                conversion_progress[filename]["message"] = f"Processing video... {time_str} ({progress}%)"
-                                conversion_progress[filename]["progress"] = progress
+                                conversion_progress.update_fields(filename, message=f"Processing video... {time_str} ({progress}%)", progress=progress)
                                 print(f"DEBUG: Real progress: {progress}% - {time_str} / {total_duration:.2f}s")
                             else:
                                 # Fallback to time-based if no duration
                                 progress = min(95, max(1, 1 + int(elapsed_time * 3.2)))
-                                conversion_progress[filename]["message"] = f"Processing video... {time_str} ({elapsed_time:.0f}s)"
-                                conversion_progress[filename]["progress"] = progress
+                                conversion_progress.update_fields(filename, message=f"Processing video... {time_str} ({elapsed_time:.0f}s)", progress=progress)
                                 print(f"DEBUG: Fallback progress: {progress}% - {elapsed_time:.0f}s")
                     except Exception as e:
                         print(f"DEBUG: Error parsing time: {e}")
@@ -4108,7 +3319,7 @@ def convert_video_background(filename, filepath, converted_path, crf, preset):
                     try:
                         frame_part = [part for part in line.split() if part.startswith('frame=')][0]
                         frame_num = int(frame_part.split('=')[1])
-                        conversion_progress[filename]["message"] = f"Processing frame {frame_num}... ({elapsed_time:.0f}s)"
+                        conversion_progress.update_fields(filename, message=f"Processing frame {frame_num}... ({elapsed_time:.0f}s)")
                     except:
                         pass
                 
@@ -4116,14 +3327,12 @@ def convert_video_background(filename, filepath, converted_path, crf, preset):
                 elif current_time - last_update >= 2.0:
                     if not total_duration:
                         progress = min(95, max(1, 1 + int(elapsed_time * 3.2)))
-                        conversion_progress[filename]["message"] = f"Processing video... {elapsed_time:.0f}s elapsed"
-                        conversion_progress[filename]["progress"] = progress
+                        conversion_progress.update_fields(filename, message=f"Processing video... {elapsed_time:.0f}s elapsed", progress=progress)
                         print(f"DEBUG: Fallback progress update: {progress}% - {elapsed_time:.0f}s elapsed")
                     last_update = current_time
         
         # Set progress to 99% before waiting for completion
-        conversion_progress[filename]["progress"] = 99
-        conversion_progress[filename]["message"] = "Finalizing conversion..."
+        conversion_progress.update_fields(filename, progress=99, message="Finalizing conversion...")
         print(f"DEBUG: Progress set to 99% - finalizing conversion")
         
         # Wait for process to complete with timeout
@@ -4397,16 +3606,9 @@ def get_conversion_progress(filename):
         from urllib.parse import unquote
         decoded_filename = unquote(filename)
         
-        # Try to find progress by exact match first
-        progress = conversion_progress.get(decoded_filename)
-        
-        # If not found, try to find by partial match (for unique filenames)
-        if not progress:
-            for key, value in conversion_progress.items():
-                if decoded_filename in key or key in decoded_filename:
-                    progress = value
-                    print(f"DEBUG: Found progress by partial match: {key} -> {decoded_filename}")
-                    break
+        # Exact match, else a partial match (for unique filenames) remembered per name
+        key = conversion_progress.resolve(decoded_filename)
+        progress = conversion_progress.get(key) if key else None
         
         if not progress:
             progress = {
@@ -4430,6 +3632,19 @@ def get_conversion_progress(filename):
         print(f"DEBUG: Progress error: {e}")
         return jsonify({"error": str(e)}), 500
 
+@app.route("/conversion_progress/<filename>/events")
+def stream_conversion_progress(filename):
+    """Server-Sent Events stream of a video conversion's progress (resumable via Last-Event-ID)"""
+    from urllib.parse import unquote
+    from job_events import sse_stream, sse_response, last_event_id_from
+    decoded_filename = unquote(filename)
+    key = conversion_progress.resolve(decoded_filename) or decoded_filename
+    return sse_response(sse_stream(
+        'conversion', key,
+        last_event_id=last_event_id_from(request),
+        snapshot=conversion_progress.get(key),
+    ))
+
 @app.route("/cancel_conversion/<filename>", methods=["POST"])
 def cancel_conversion(filename):
     """Cancel a running video conversion"""
@@ -5215,6 +4430,22 @@ try:
     print("[OK] WebSocket manager initialized for live monitoring")
 except Exception as e:
     print(f"[WARN] WebSocket manager initialization failed: {e}")
+
+# Initialize buffered analytics ingestion (multi-row inserts off the request path)
+try:
+    from analytics_ingest import ingest_buffer
+    ingest_buffer.init_app(app)
+    print("[OK] Analytics ingest buffer initialized")
+except Exception as e:
+    print(f"[WARN] Analytics ingest buffer initialization failed: {e}")
+
+# Initialize IP geolocation (cached lookups, background session enrichment)
+try:
+    from geolocation import geo_resolver
+    geo_resolver.init_app(app)
+    print("[OK] Geolocation resolver initialized")
+except Exception as e:
+    print(f"[WARN] Geolocation resolver initialization failed: {e}")
 if test_bp:
     app.register_blueprint(test_bp)
     print("[OK] test_bp registered")
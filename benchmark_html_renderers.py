@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Benchmark the HTML->PDF renderers over the corpus in benchmarks/html_to_pdf/.
+Runs every available renderer eligible for each file's HTML class, prints
+latency/success per renderer and which renderer the registry would pick.
+
+    python benchmark_html_renderers.py [--runs 5] [--corpus benchmarks/html_to_pdf]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from html_renderers import classify_html, renderer_registry
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'html_to_pdf')
+
+
+def benchmark_file(html_path, runs, out_dir):
+    """(html_class, [(renderer, fidelity, ok_runs, median_ms, pdf_bytes)])"""
+    with open(html_path, "r", encoding="utf-8") as f:
+        html_class = classify_html(f.read())
+
+    results = []
+    for renderer in renderer_registry.candidates(html_class):
+        timings = []
+        ok_runs = 0
+        pdf_bytes = 0
+        output_path = os.path.join(out_dir, f"{os.path.basename(html_path)}.{renderer.name}.pdf")
+        for _ in range(runs):
+            start = time.perf_counter()
+            try:
+                ok = bool(renderer.convert(html_path, output_path))
+            except Exception:
+                ok = False
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            renderer_registry.record(renderer, html_class, elapsed_ms, ok)
+            timings.append(elapsed_ms)
+            if ok and os.path.exists(output_path):
+                ok_runs += 1
+                pdf_bytes = os.path.getsize(output_path)
+        results.append((renderer.name, renderer.fidelity[html_class], ok_runs,
+                        statistics.median(timings), pdf_bytes))
+    return html_class, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML->PDF renderers')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.corpus, '*.html')))
+    if not files:
+        print(f"[ERROR] No HTML files in {args.corpus}")
+        return False
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        for html_path in files:
+            html_class, results = benchmark_file(html_path, args.runs, out_dir)
+            print(f"\n{os.path.basename(html_path)} ({html_class})")
+            print(f"   {'renderer':<22}{'fidelity':>9}{'ok':>7}{'median ms':>12}{'pdf bytes':>12}")
+            for name, fidelity, ok_runs, median_ms, pdf_bytes in results:
+                print(f"   {name:<22}{fidelity:>9}{ok_runs:>4}/{args.runs:<2}{median_ms:>12.1f}{pdf_bytes:>12}")
+            chosen = renderer_registry.candidates(html_class)
+            print(f"   registry picks: {chosen[0].name if chosen else 'none'}")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark cookie overlay detection over the saved pages in
+benchmarks/cookie_overlays/. For each fixture, compares the old sequential
+loop (one locator(...).first.is_visible(timeout=50) per rule) with the single
+OVERLAY_JS evaluate, and prints the median latency and the element each one
+would click. Needs Playwright + Chromium.
+
+    python benchmark_overlay_detection.py [--runs 20] [--corpus benchmarks/cookie_overlays]
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.overlay_detect import DEFAULT_RULES, find_candidates
+
+try:
+    from playwright.sync_api import sync_playwright
+    PLAYWRIGHT_AVAILABLE = True
+except ImportError:
+    PLAYWRIGHT_AVAILABLE = False
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'cookie_overlays')
+
+
+def sequential_hit(page):
+    """The old handle_cookie_modal loop without the click: first visible rule wins"""
+    for selector in DEFAULT_RULES:
+        try:
+            element = page.locator(selector).first
+            if element.is_visible(timeout=50):
+                return selector, (element.inner_text(timeout=500) or '').strip()[:40]
+        except Exception:
+            continue
+    return None, ''
+
+
+def batched_hit(page):
+    candidates = find_candidates(page)
+    if not candidates:
+        return None, ''
+    return candidates[0]['rule'], candidates[0]['text'][:40]
+
+
+def measure(page, html, detect, runs):
+    timings, hit = [], None
+    for _ in range(runs):
+        page.set_content(html)
+        start = time.perf_counter()
+        hit = detect(page)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), hit
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark cookie overlay detection')
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--corpus', default=DEFAULT_CORPUS)
+    args = parser.parse_args()
+
+    if not PLAYWRIGHT_AVAILABLE:
+        print("[ERROR] Playwright is not installed (pip install playwright && playwright install chromium)")
+        return False
+    files = sorted(glob.glob(os.path.join(args.corpus, '*.html')))
+    if not files:
+        print(f"[ERROR] No HTML files in {args.corpus}")
+        return False
+
+    with sync_playwright() as p:
+        browser = p.chromium.launch(headless=True)
+        page = browser.new_page()
+        for html_path in files:
+            with open(html_path, "r", encoding="utf-8") as f:
+                html = f.read()
+            print(f"\n{os.path.basename(html_path)}")
+            print(f"   {'method':<12}{'median ms':>11}   click")
+            for name, detect in (('sequential', sequential_hit), ('batched', batched_hit)):
+                median_ms, (rule, text) = measure(page, html, detect, args.runs)
+                target = f'{rule} -> "{text}"' if rule else 'none'
+                print(f"   {name:<12}{median_ms:>11.1f}   {target}")
+        browser.close()
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,204 @@
+"""
+Per-user billing ledger.
+Payment/subscription notifications are mirrored into billing_ledger rows keyed
+by user_id, so billing history is an indexed range scan over one user's entries
+(keyset-paginated on (created_at, id)) instead of a scan of every notification's
+JSON metadata. Rendered invoice PDFs are cached on the ledger row.
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_, desc
+from database import db
+from models import BillingLedgerEntry, Notification, User
+
+LEDGER_CATEGORIES = ('payment', 'subscription')
+TITLE_PREFIXES = ('Payment Received: ', 'Subscription Upgraded: ')
+PAID_TEMPLATE_TIERS = ('premium', 'production', 'enterprise', 'client')
+
+
+def _metadata_user_id(metadata):
+    try:
+        return int(metadata.get('user_id'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _entry_fields(notification, user_id):
+    metadata = notification.notification_metadata or {}
+    invoice = notification.title or ''
+    for prefix in TITLE_PREFIXES:
+        invoice = invoice.replace(prefix, '')
+    try:
+        amount = float(metadata.get('amount') or 0.0)
+    except (TypeError, ValueError):
+        amount = 0.0
+    return {
+        'user_id': user_id,
+        'notification_id': notification.id,
+        'entry_type': notification.category,
+        'invoice': invoice[:200],
+        'amount': amount,
+        'payment_id': (metadata.get('payment_id') or '')[:100] or None,
+        'tier': metadata.get('new_tier') or metadata.get('tier') or 'free',
+        'entry_metadata': metadata,
+        'created_at': notification.created_at or datetime.utcnow(),
+    }
+
+
+def ledger_entry_for(notification):
+    """
+    Ledger row for a flushed payment/subscription notification.
+
+    Returns:
+        BillingLedgerEntry (not yet added to the session), or None when the
+        notification is not billable or its user does not exist
+    """
+    if notification.category not in LEDGER_CATEGORIES:
+        return None
+    user_id = _metadata_user_id(notification.notification_metadata or {})
+    if user_id is None or db.session.get(User, user_id) is None:
+        return None
+    return BillingLedgerEntry(**_entry_fields(notification, user_id))
+
+
+def _unledgered_notifications():
+    """Payment/subscription notifications without a ledger row (anti-join)"""
+    return db.session.query(Notification).outerjoin(
+        BillingLedgerEntry, BillingLedgerEntry.notification_id == Notification.id
+    ).filter(
+        Notification.category.in_(LEDGER_CATEGORIES),
+        BillingLedgerEntry.id.is_(None)
+    )
+
+
+def backfill_pending():
+    """True while some billable notification has no ledger row (orphaned users' rows stay pending)"""
+    return db.session.query(_unledgered_notifications().exists()).scalar()
+
+
+def backfill_ledger(batch_size=500):
+    """
+    Copy payment/subscription notifications that have no ledger row yet into the ledger.
+    Driven by the missing rows and committed per batch, so it is safe to re-run and an
+    interrupted run resumes where it stopped (run on every startup by init_db).
+
+    Returns:
+        Number of ledger rows created
+    """
+    pending = _unledgered_notifications().order_by(Notification.id)
+
+    created = 0
+    last_id = 0
+    while True:
+        batch = pending.filter(Notification.id > last_id).limit(batch_size).all()
+        if not batch:
+            break
+        last_id = batch[-1].id
+
+        by_user = {}
+        for notification in batch:
+            user_id = _metadata_user_id(notification.notification_metadata or {})
+            if user_id is not None:
+                by_user.setdefault(user_id, []).append(notification)
+        existing = {
+            row[0] for row in db.session.query(User.id).filter(User.id.in_(list(by_user))).all()
+        } if by_user else set()
+
+        rows = [
+            _entry_fields(notification, user_id)
+            for user_id, notifications in by_user.items() if user_id in existing
+            for notification in notifications
+        ]
+        if rows:
+            db.session.execute(BillingLedgerEntry.__table__.insert(), rows)
+            created += len(rows)
+        db.session.commit()
+
+    if created:
+        print(f"[OK] [BILLING LEDGER] Backfilled {created} ledger entries")
+    return created
+
+
+def encode_cursor(entry):
+    """Opaque keyset cursor for the last (oldest) entry on a page"""
+    raw = f"{entry.created_at.isoformat()}|{entry.id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """(created_at, entry_id) from a cursor; raises ValueError when malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, entry_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), int(entry_id)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def fetch_ledger_page(user_id, since, cursor=None, limit=50):
+    """
+    One page of a user's ledger, newest first, ordered by (created_at DESC, id DESC).
+
+    Returns:
+        (entries, next_cursor) - next_cursor is None on the last page
+    """
+    query = BillingLedgerEntry.query.filter(
+        BillingLedgerEntry.user_id == user_id,
+        BillingLedgerEntry.created_at >= since
+    )
+    if cursor:
+        cursor_time, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            BillingLedgerEntry.created_at < cursor_time,
+            and_(BillingLedgerEntry.created_at == cursor_time, BillingLedgerEntry.id < cursor_id)
+        ))
+    entries = query.order_by(
+        desc(BillingLedgerEntry.created_at), desc(BillingLedgerEntry.id)
+    ).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(entries) > limit:
+        entries = entries[:limit]
+        next_cursor = encode_cursor(entries[-1])
+    return entries, next_cursor
+
+
+def latest_paid_entry_date(user_id, since):
+    """created_at of the user's most recent paid entry, or None"""
+    return db.session.query(db.func.max(BillingLedgerEntry.created_at)).filter(
+        BillingLedgerEntry.user_id == user_id,
+        BillingLedgerEntry.created_at >= since,
+        BillingLedgerEntry.amount > 0
+    ).scalar()
+
+
+def invoice_template_for(tier):
+    """Invoice template used for a tier (paid tiers get the subscription invoice)"""
+    return 'subscription-invoice.html' if tier in PAID_TEMPLATE_TIERS else 'emails/invoice.html'
+
+
+def get_invoice_pdf(entry, user_email):
+    """
+    Invoice PDF for a ledger entry, rendered once and cached on the row.
+
+    Returns:
+        (pdf_bytes, cached) - pdf_bytes is None if rendering failed
+    """
+    if entry.invoice_pdf:
+        return entry.invoice_pdf, True
+
+    from email_service import generate_invoice_pdf
+    pdf = generate_invoice_pdf(
+        tier=entry.tier,
+        amount=entry.amount,
+        user_email=user_email,
+        payment_id=entry.payment_id or '',
+        payment_date=entry.created_at,
+        item_description=f"{entry.tier.title()} Plan - Monthly Subscription",
+        template_name=invoice_template_for(entry.tier)
+    )
+    if pdf:
+        entry.invoice_pdf = pdf
+        entry.invoice_pdf_generated_at = datetime.utcnow()
+        db.session.commit()
+    return pdf, False
@@ -0,0 +1,347 @@
+"""
+Persistent headless-browser pool for HTML->PDF rendering.
+N worker threads each own a Playwright driver and a warm Chromium; jobs are
+queued to them and run on a recycled context/page instead of launching a
+browser per conversion. Browsers are restarted after BROWSER_MAX_JOBS jobs,
+when their process tree grows past BROWSER_MAX_RSS_MB, when a health check
+finds them disconnected, or when a job overruns its timeout.
+
+    from browser_pool import browser_pool
+    pdf_bytes = browser_pool.html_to_pdf(html)
+    browser_pool.run(lambda page: page.title(), timeout=10)
+"""
+import os
+import time
+import queue
+import atexit
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+POOL_SIZE = int(os.getenv('BROWSER_POOL_SIZE', '2'))
+MAX_JOBS_PER_BROWSER = int(os.getenv('BROWSER_MAX_JOBS', '200'))
+MAX_JOBS_PER_CONTEXT = int(os.getenv('BROWSER_MAX_JOBS_PER_CONTEXT', '25'))
+MAX_RSS_MB = int(os.getenv('BROWSER_MAX_RSS_MB', '1024'))
+JOB_TIMEOUT = float(os.getenv('BROWSER_JOB_TIMEOUT', '60'))
+HEALTH_CHECK_INTERVAL = float(os.getenv('BROWSER_HEALTH_CHECK_INTERVAL', '30'))
+EXECUTABLE_PATH = os.getenv('BROWSER_EXECUTABLE_PATH') or None
+
+LAUNCH_ARGS = [
+    '--disable-web-security',
+    '--disable-features=IsolateOrigins,site-per-process',
+    '--disable-dev-shm-usage',
+    '--no-sandbox'
+]
+DEFAULT_VIEWPORT = {'width': 1280, 'height': 1024}
+
+
+class BrowserPoolError(RuntimeError):
+    """Job could not be run (timed out, pool stopped or browser unavailable)"""
+
+
+def _launch_chromium():
+    """Start a Playwright driver and a headless Chromium; returns (playwright, browser)"""
+    from playwright.sync_api import sync_playwright
+    playwright = sync_playwright().start()
+    try:
+        browser = playwright.chromium.launch(headless=True, args=LAUNCH_ARGS, executable_path=EXECUTABLE_PATH)
+    except Exception:
+        playwright.stop()
+        raise
+    return playwright, browser
+
+
+class _Job:
+    __slots__ = ('fn', 'future', 'timeout', 'deadline', 'worker')
+
+    def __init__(self, fn, timeout):
+        self.fn = fn
+        self.future = Future()
+        self.timeout = timeout
+        self.deadline = time.monotonic() + timeout
+        self.worker = None
+
+
+class BrowserWorker(threading.Thread):
+    """Owns one browser; Playwright sync objects are only touched from this thread"""
+
+    def __init__(self, pool, index):
+        super().__init__(name=f'browser-pool-{index}', daemon=True)
+        self.pool = pool
+        self.playwright = None
+        self.browser = None
+        self.context = None
+        self.page = None
+        self.jobs_done = 0
+        self.context_jobs = 0
+        self.processes = []  # Playwright driver process(es) started for this worker
+        self.restart_reason = None
+
+    # --- lifecycle -------------------------------------------------------
+
+    def run(self):
+        while not self.pool._stopping:
+            try:
+                job = self.pool._queue.get(timeout=self.pool.health_check_interval)
+            except queue.Empty:
+                self._health_check()
+                continue
+            if job is None:
+                break
+            self._run_job(job)
+            if self.restart_reason:
+                self._restart(self.restart_reason)
+        self._close()
+
+    def _ensure_browser(self):
+        if self.browser is not None:
+            return
+        # Launches are serialized so the new driver process can be attributed to this worker
+        with self.pool._launch_lock:
+            before = self._child_pids()
+            self.playwright, self.browser = self.pool.launcher()
+            self.processes = [pid for pid in self._child_pids() if pid not in before]
+        self.jobs_done = 0
+        self.pool._record('launches')
+
+    def _close(self):
+        for closer in (
+            lambda: self.context and self.context.close(),
+            lambda: self.browser and self.browser.close(),
+            lambda: self.playwright and self.playwright.stop(),
+        ):
+            try:
+                closer()
+            except Exception:
+                pass
+        self.playwright = self.browser = self.context = self.page = None
+        self.processes = []
+
+    def _restart(self, reason):
+        print(f"[RELOAD] [BROWSER POOL] {self.name}: restarting browser ({reason})")
+        self.restart_reason = None
+        self._close()
+        self.pool._record('restarts')
+
+    def _health_check(self):
+        if self.browser is None:
+            return
+        if not self.browser.is_connected():
+            self._restart('disconnected')
+        elif self.rss_mb() > self.pool.max_rss_mb:
+            self._restart('memory')
+
+    # --- jobs ------------------------------------------------------------
+
+    def _get_page(self):
+        """Warm page on a context that is recycled every MAX_JOBS_PER_CONTEXT jobs"""
+        if self.context is not None and self.context_jobs >= self.pool.max_jobs_per_context:
+            try:
+                self.context.close()
+            except Exception:
+                pass
+            self.context = self.page = None
+        if self.context is None:
+            self.context = self.browser.new_context(viewport=DEFAULT_VIEWPORT, device_scale_factor=1)
+            self.context_jobs = 0
+        if self.page is None or self.page.is_closed():
+            self.page = self.context.new_page()
+        return self.page
+
+    def _discard_page(self):
+        try:
+            if self.page is not None:
+                self.page.close()
+        except Exception:
+            pass
+        self.page = None
+
+    def _run_job(self, job):
+        if not job.future.set_running_or_notify_cancel():
+            return
+        remaining = job.deadline - time.monotonic()
+        if remaining <= 0:
+            self.pool._record('timeouts')
+            job.future.set_exception(BrowserPoolError('Job timed out waiting for a browser'))
+            return
+
+        job.worker = self
+        started = time.perf_counter()
+        try:
+            self._ensure_browser()
+            page = self._get_page()
+            page.set_default_timeout(remaining * 1000)
+            result = job.fn(page)
+            job.future.set_result(result)
+            self.pool._record('completed', time.perf_counter() - started)
+        except Exception as e:
+            self.pool._record('failed', time.perf_counter() - started)
+            job.future.set_exception(e)
+            # The page may be mid-navigation or crashed - never hand it to the next job
+            self._discard_page()
+            if self.browser is not None and not self.browser.is_connected():
+                self.restart_reason = 'disconnected'
+        finally:
+            job.worker = None
+
+        self.jobs_done += 1
+        self.context_jobs += 1
+        if self.jobs_done >= self.pool.max_jobs:
+            self.restart_reason = self.restart_reason or f'{self.jobs_done} jobs'
+        elif self.rss_mb() > self.pool.max_rss_mb:
+            self.restart_reason = self.restart_reason or 'memory'
+
+    # --- process accounting ----------------------------------------------
+
+    @staticmethod
+    def _child_pids():
+        if not PSUTIL_AVAILABLE:
+            return set()
+        try:
+            return {child.pid for child in psutil.Process().children()}
+        except Exception:
+            return set()
+
+    def _process_tree(self):
+        processes = []
+        for pid in self.processes:
+            try:
+                root = psutil.Process(pid)
+                processes.append(root)
+                processes.extend(root.children(recursive=True))
+            except Exception:
+                continue
+        return processes
+
+    def rss_mb(self):
+        """Resident memory of this worker's driver + browser processes (0 without psutil)"""
+        if not PSUTIL_AVAILABLE or not self.processes:
+            return 0
+        total = 0
+        for process in self._process_tree():
+            try:
+                total += process.memory_info().rss
+            except Exception:
+                continue
+        return total / (1024 * 1024)
+
+    def kill_browser(self):
+        """Kill the browser processes from another thread (unblocks a hung job)"""
+        if not PSUTIL_AVAILABLE:
+            return False
+        for process in self._process_tree():
+            if process.pid in self.processes:
+                continue  # keep the driver; the worker restarts it cleanly
+            try:
+                process.kill()
+            except Exception:
+                continue
+        self.restart_reason = 'job timeout'
+        return True
+
+
+class BrowserPool:
+    """Fixed-size pool of warm browsers with a shared job queue"""
+
+    def __init__(self, size=POOL_SIZE, max_jobs=MAX_JOBS_PER_BROWSER, max_jobs_per_context=MAX_JOBS_PER_CONTEXT,
+                 max_rss_mb=MAX_RSS_MB, job_timeout=JOB_TIMEOUT, health_check_interval=HEALTH_CHECK_INTERVAL,
+                 launcher=_launch_chromium):
+        self.size = max(size, 1)
+        self.max_jobs = max_jobs
+        self.max_jobs_per_context = max_jobs_per_context
+        self.max_rss_mb = max_rss_mb
+        self.job_timeout = job_timeout
+        self.health_check_interval = health_check_interval
+        self.launcher = launcher
+        self.workers = []
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._launch_lock = threading.Lock()
+        self._stopping = False
+        self._stats = {'completed': 0, 'failed': 0, 'timeouts': 0, 'launches': 0, 'restarts': 0, 'busy_seconds': 0.0}
+
+    def start(self):
+        """Start the worker threads (browsers launch lazily on their first job)"""
+        with self._lock:
+            if self.workers:
+                return
+            self._stopping = False
+            self.workers = [BrowserWorker(self, i) for i in range(self.size)]
+            for worker in self.workers:
+                worker.start()
+            print(f"[OK] [BROWSER POOL] Started {self.size} browser worker(s)")
+
+    def run(self, fn, timeout=None):
+        """
+        Run fn(page) on a warm browser page and return its result.
+
+        Raises:
+            BrowserPoolError: if the job times out or the pool is stopped
+            Exception: whatever fn raised
+        """
+        if self._stopping:
+            raise BrowserPoolError('Browser pool is stopped')
+        self.start()
+        job = _Job(fn, timeout or self.job_timeout)
+        self._queue.put(job)
+        try:
+            return job.future.result(timeout=job.timeout)
+        except FutureTimeoutError:
+            if not job.future.cancel():
+                # Already running: kill its browser so the worker is freed and restarted
+                worker = job.worker
+                if worker is not None:
+                    worker.kill_browser()
+            self._record('timeouts')
+            raise BrowserPoolError(f'Browser job timed out after {job.timeout:.0f}s')
+
+    def html_to_pdf(self, html, pdf_options=None, timeout=None):
+        """Render an HTML string to PDF bytes on a pooled page"""
+        options = {'print_background': True, 'prefer_css_page_size': True}
+        options.update(pdf_options or {})
+
+        def render(page):
+            page.set_content(html, wait_until='load')
+            page.evaluate('document.fonts.ready.then(() => true)')
+            return page.pdf(**options)
+
+        return self.run(render, timeout=timeout)
+
+    def _record(self, key, seconds=None):
+        with self._lock:
+            self._stats[key] += 1
+            if seconds is not None:
+                self._stats['busy_seconds'] += seconds
+
+    def stats(self):
+        """Counters plus per-worker state, for health endpoints and logs"""
+        with self._lock:
+            stats = dict(self._stats)
+        jobs = stats['completed'] + stats['failed']
+        stats['avg_job_ms'] = round(stats['busy_seconds'] * 1000 / jobs, 1) if jobs else 0.0
+        stats['queued'] = self._queue.qsize()
+        stats['workers'] = [
+            {'name': w.name, 'alive': w.is_alive(), 'browser': w.browser is not None,
+             'jobs': w.jobs_done, 'rss_mb': round(w.rss_mb(), 1)}
+            for w in self.workers
+        ]
+        return stats
+
+    def shutdown(self, timeout=10):
+        """Stop the workers and close their browsers"""
+        with self._lock:
+            workers, self.workers = self.workers, []
+            self._stopping = True
+        for _ in workers:
+            self._queue.put(None)
+        for worker in workers:
+            worker.join(timeout=timeout)
+
+
+browser_pool = BrowserPool()
+atexit.register(browser_pool.shutdown)
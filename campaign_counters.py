@@ -0,0 +1,210 @@
+"""
+Incremental campaign counters.
+
+Campaign.processed_count / success_count / failed_count / captcha_count are
+kept current on every Company status transition instead of being recomputed
+with COUNT queries (watchdog GROUP BY each cycle, four count()s per websocket
+result and per PATCH /companies/<id>). A flush listener diffs each Company's
+status history (old value always loaded, see _track_prior_status) and
+applies the delta with one atomic
+`UPDATE campaigns SET x = x + :delta` in the same transaction, so reading the
+counters is a primary-key lookup regardless of campaign size. The listeners
+are registered by install(), which app.py calls once at startup.
+
+Bulk writes that bypass the ORM (bulk_update_mappings, Query.update) must
+call record_bulk_transitions() (or record_bulk_moves() when the rows' prior
+statuses are mixed); processing <-> pending resets need nothing
+since neither status is counted. reconcile_counters() recomputes from the
+companies table and fixes any drift (run periodically by the sentinel).
+"""
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import event, func, inspect
+from sqlalchemy.orm import Session
+from database import db
+from models import Campaign, Company
+
+COUNTER_COLUMNS = ('processed_count', 'success_count', 'failed_count', 'captcha_count')
+UNPROCESSED_STATUSES = ('pending', 'processing')
+SUCCESS_STATUSES = ('completed', 'contact_info_found', 'success')
+
+RECONCILE_INTERVAL_SEC = int(os.getenv('CAMPAIGN_COUNTER_RECONCILE_INTERVAL', '300'))
+# Completed campaigns stay in the reconciliation set this long (late PATCHes, retries)
+RECONCILE_RECENT_HOURS = 24
+
+
+def contributions(status):
+    """Counter -> 0/1 for a company in `status` (None = no company)"""
+    if status is None:
+        return dict.fromkeys(COUNTER_COLUMNS, 0)
+    return {
+        'processed_count': int(status not in UNPROCESSED_STATUSES),
+        'success_count': int(status in SUCCESS_STATUSES),
+        'failed_count': int(status == 'failed'),
+        'captcha_count': int(status == 'captcha'),
+    }
+
+
+def counter_deltas(old_status, new_status):
+    """Non-zero counter changes for one company moving old_status -> new_status"""
+    before, after = contributions(old_status), contributions(new_status)
+    return {col: after[col] - before[col] for col in COUNTER_COLUMNS if after[col] != before[col]}
+
+
+def apply_deltas(connection, deltas_by_campaign):
+    """One atomic increment UPDATE per campaign: {campaign_id: {column: delta}}"""
+    table = Campaign.__table__
+    for campaign_id, deltas in deltas_by_campaign.items():
+        deltas = {col: d for col, d in deltas.items() if d}
+        if deltas:
+            connection.execute(table.update().where(table.c.id == campaign_id)
+                               .values({col: table.c[col] + d for col, d in deltas.items()}))
+
+
+def _status_transitions(session):
+    """(campaign_id, old_status, new_status) for every Company added, deleted or re-statused in this flush"""
+    for obj in session.new:
+        if isinstance(obj, Company) and obj.campaign_id is not None:
+            yield obj.campaign_id, None, obj.status
+    for obj in session.deleted:
+        if isinstance(obj, Company):
+            # Only loaded values: the row is gone, and an unloaded status is left to reconciliation
+            state = inspect(obj)
+            history = state.attrs.status.history
+            old = history.deleted[0] if history.deleted else state.dict.get('status')
+            if old is not None and state.dict.get('campaign_id') is not None:
+                yield state.dict['campaign_id'], old, None
+    for obj in session.dirty:
+        if not isinstance(obj, Company):
+            continue
+        history = inspect(obj).attrs.status.history
+        if history.added and history.deleted:
+            yield obj.campaign_id, history.deleted[0], history.added[0]
+
+
+def _after_flush(session, flush_context):
+    totals = defaultdict(lambda: defaultdict(int))
+    for campaign_id, old, new in _status_transitions(session):
+        for col, delta in counter_deltas(old, new).items():
+            totals[campaign_id][col] += delta
+    if totals:
+        apply_deltas(session.connection(), totals)
+        session.info.setdefault('campaign_counters_touched', set()).update(totals)
+
+
+def _after_flush_postexec(session, flush_context):
+    # In-memory Campaign rows now hold stale counters: reload them on next access
+    for campaign_id in session.info.pop('campaign_counters_touched', ()):
+        campaign = session.identity_map.get((Campaign, (campaign_id,), None))
+        if campaign is not None:
+            session.expire(campaign, COUNTER_COLUMNS)
+
+
+def _track_prior_status(target, value, oldvalue, initiator):
+    """No-op; registered with active_history so a status set on an expired row loads the old value first"""
+
+
+def install():
+    """Register the flush listeners once per process (app.py calls this next to the model imports)"""
+    if not event.contains(Session, 'after_flush', _after_flush):
+        event.listen(Company.status, 'set', _track_prior_status, active_history=True)
+        event.listen(Session, 'after_flush', _after_flush)
+        event.listen(Session, 'after_flush_postexec', _after_flush_postexec)
+
+
+def record_bulk_transitions(campaign_id, old_status, new_status, count):
+    """Counter update for `count` companies moved by a bulk write (bulk_update_mappings, Query.update)"""
+    deltas = {col: d * count for col, d in counter_deltas(old_status, new_status).items()}
+    if deltas:
+        apply_deltas(db.session.connection(), {campaign_id: deltas})
+        campaign = db.session.identity_map.get((Campaign, (campaign_id,), None))
+        if campaign is not None:
+            db.session.expire(campaign, COUNTER_COLUMNS)
+
+
+def record_bulk_moves(campaign_id, company_ids, new_status):
+    """
+    record_bulk_transitions() for companies about to be bulk-set to
+    `new_status` whose current statuses differ (e.g. a preflight over a
+    retried mix of pending and failed rows). Call before the bulk write:
+    companies are grouped by their status in the database, one GROUP BY.
+    """
+    if not company_ids:
+        return
+    rows = db.session.query(Company.status, func.count(Company.id)) \
+        .filter(Company.id.in_(list(company_ids))) \
+        .group_by(Company.status).all()
+    for old_status, count in rows:
+        record_bulk_transitions(campaign_id, old_status, new_status, count)
+
+
+def counts_from_companies(campaign_ids):
+    """{campaign_id: {column: value}} recomputed with one GROUP BY over companies"""
+    counts = {cid: dict.fromkeys(COUNTER_COLUMNS, 0) for cid in campaign_ids}
+    rows = db.session.query(Company.campaign_id, Company.status, func.count(Company.id)) \
+        .filter(Company.campaign_id.in_(list(campaign_ids))) \
+        .group_by(Company.campaign_id, Company.status).all()
+    for campaign_id, status, n in rows:
+        for col, flag in contributions(status).items():
+            counts[campaign_id][col] += flag * n
+    return counts
+
+
+def reconcile_counters(campaign_ids=None):
+    """
+    Correct counter drift from the companies table.
+
+    Args:
+        campaign_ids: Campaigns to check; default: processing campaigns plus
+            those completed in the last RECONCILE_RECENT_HOURS
+
+    Returns:
+        {campaign_id: {column: (stored, actual)}} for every corrected campaign
+    """
+    if campaign_ids is None:
+        recent = datetime.utcnow() - timedelta(hours=RECONCILE_RECENT_HOURS)
+        campaign_ids = [cid for (cid,) in db.session.query(Campaign.id).filter(
+            db.or_(Campaign.status == 'processing', Campaign.completed_at >= recent)).all()]
+    campaign_ids = list(campaign_ids)
+    if not campaign_ids:
+        return {}
+    actual = counts_from_companies(campaign_ids)
+    stored = {row.id: row for row in db.session.query(Campaign.id, *[getattr(Campaign, c) for c in COUNTER_COLUMNS])
+              .filter(Campaign.id.in_(campaign_ids)).all()}
+    drift = {}
+    table = Campaign.__table__
+    for campaign_id, counts in actual.items():
+        row = stored.get(campaign_id)
+        if row is None:
+            continue
+        changed = {col: (getattr(row, col), counts[col]) for col in COUNTER_COLUMNS if getattr(row, col) != counts[col]}
+        if changed:
+            drift[campaign_id] = changed
+            # Set from a snapshot: a transition racing this write is corrected on the next pass
+            db.session.execute(table.update().where(table.c.id == campaign_id).values(counts))
+    db.session.commit()
+    for campaign_id, changed in drift.items():
+        print(f"[COUNTERS] Campaign {campaign_id} drift corrected: "
+              + ', '.join(f"{col} {old}->{new}" for col, (old, new) in changed.items()))
+    return drift
+
+
+class Reconciler:
+    """Runs reconcile_counters at most every RECONCILE_INTERVAL_SEC (called from a periodic loop)"""
+
+    def __init__(self, interval=RECONCILE_INTERVAL_SEC):
+        self.interval = interval
+        self.last_run = 0.0
+
+    def maybe_run(self):
+        if time.time() - self.last_run < self.interval:
+            return None
+        self.last_run = time.time()
+        try:
+            return reconcile_counters()
+        except Exception as e:
+            print(f"[COUNTERS] Reconciliation failed: {e}")
+            db.session.rollback()
+            return None
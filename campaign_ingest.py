@@ -0,0 +1,244 @@
+"""
+Bulk company ingestion for campaign creation.
+
+create_campaign used to build one Company ORM object per row (plus a
+per-row urlparse for fallback names), which for a 50k-row list meant 50k
+unit-of-work entries and a request that timed out. Here rows are:
+
+1. streamed from the upload (CSV via csv.reader, XLSX via openpyxl in
+   read-only mode) or taken from the JSON list, and consumed in chunks of
+   INGEST_CHUNK_SIZE rows - the raw sheet is never loaded whole, only the
+   deduplicated insert-ready records are kept;
+2. normalized one chunk of the URL column at a time: one compiled regex,
+   memoized per distinct URL, yields the dedup key (host without www + path)
+   and the fallback company name; blank rows and repeated sites are dropped;
+3. inserted with Core multi-row INSERTs in chunks of INGEST_CHUNK_SIZE
+   (SQLAlchemy sends each chunk as multi-row VALUES on PostgreSQL).
+
+Progress for a client-chosen upload_id is published as 'campaign_ingest'
+events (job_events) on a stream scoped to the caller (ingest_stream_name), and
+streamed by GET /api/campaigns/ingest/<upload_id>/events to that caller only.
+
+    rows = iter_spreadsheet_rows(upload.stream, upload.filename)
+    records, stats = prepare_companies(rows)
+    insert_companies(campaign.id, records, ingest_stream_name(upload_id, user_id, session_id))
+"""
+import os
+import io
+import re
+import csv
+from itertools import islice
+from job_events import publish_event
+
+try:
+    import openpyxl
+    OPENPYXL_AVAILABLE = True
+except ImportError:
+    OPENPYXL_AVAILABLE = False
+
+INGEST_CHUNK_SIZE = int(os.getenv('CAMPAIGN_INGEST_CHUNK_SIZE', '1000'))
+
+COMPANY_FIELDS = ('company_name', 'website_url', 'contact_email', 'contact_person', 'phone')
+# Column lengths from models.Company: a long cell is cut instead of failing the whole insert
+FIELD_LENGTHS = {'company_name': 300, 'website_url': 500, 'contact_email': 200, 'contact_person': 200, 'phone': 50}
+
+# Spreadsheet header (lowercased, separators -> '_') -> Company field; other columns go to additional_data
+HEADER_ALIASES = {
+    'website_url': ('website_url', 'website', 'url', 'web', 'site', 'domain', 'homepage', 'web_site', 'company_website'),
+    'company_name': ('company_name', 'company', 'name', 'business', 'business_name', 'organisation', 'organization'),
+    'contact_email': ('contact_email', 'email', 'e_mail', 'email_address'),
+    'contact_person': ('contact_person', 'contact', 'contact_name', 'person', 'full_name'),
+    'phone': ('phone', 'phone_number', 'telephone', 'tel', 'mobile'),
+}
+_FIELD_BY_HEADER = {alias: field for field, aliases in HEADER_ALIASES.items() for alias in aliases}
+
+# scheme? userinfo? host port? path - enough for a dedup key, not a validator (preflight does that)
+_URL_RE = re.compile(r'^(?:[a-z][a-z0-9+.-]*://)?(?:[^@/?#]*@)?([^/?#:\s]*)(?::\d*)?([^?#]*)', re.IGNORECASE)
+
+
+class IngestError(ValueError):
+    """Upload that cannot be read as a company list (unsupported type, no URL column)"""
+
+
+def field_for_header(header):
+    """Company field for a spreadsheet header, or None for an additional_data column"""
+    key = re.sub(r'[\s\-./]+', '_', str(header or '').strip().lower())
+    return _FIELD_BY_HEADER.get(key)
+
+
+def _rows_from_table(header, rows):
+    """Map header + row tuples to company dicts; unknown columns are kept in additional_data"""
+    fields = [field_for_header(h) for h in header]
+    if 'website_url' not in fields:
+        raise IngestError('No website/URL column found in the spreadsheet header')
+    for values in rows:
+        row = {'additional_data': {}}
+        for header_name, field, value in zip(header, fields, values):
+            if value is None or value == '':
+                continue
+            if field and field not in row:
+                row[field] = str(value).strip()
+            elif header_name:
+                row['additional_data'][str(header_name)] = value if isinstance(value, (int, float, bool)) else str(value)
+        yield row
+
+
+def iter_spreadsheet_rows(stream, filename):
+    """
+    Company dicts from an uploaded CSV or XLSX, one row at a time.
+
+    Args:
+        stream: Seekable binary file object (werkzeug FileStorage.stream)
+        filename: Original name; the extension picks the parser
+
+    Raises:
+        IngestError: Unsupported file type, missing openpyxl for XLSX, no URL column
+    """
+    ext = os.path.splitext(filename or '')[1].lower()
+    if ext in ('.xlsx', '.xlsm'):
+        if not OPENPYXL_AVAILABLE:
+            raise IngestError('XLSX upload requires openpyxl; upload a CSV instead')
+        workbook = openpyxl.load_workbook(stream, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                return
+            yield from _rows_from_table(list(header), rows)
+        finally:
+            workbook.close()
+    elif ext in ('.csv', '.txt', ''):
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig', errors='replace', newline='')
+        sample = text.read(8192)
+        text.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t|')
+        except csv.Error:
+            dialect = csv.excel
+        reader = csv.reader(text, dialect)
+        header = next(reader, None)
+        if not header:
+            return
+        yield from _rows_from_table(header, reader)
+    else:
+        raise IngestError(f'Unsupported spreadsheet type: {ext}')
+
+
+def normalize_urls(urls):
+    """
+    Dedup key and host for a whole URL column in one pass.
+
+    Returns:
+        List parallel to urls of (key, host); (None, None) for blank URLs.
+        key is host (lowercased, no www.) + path without trailing slash, so
+        'HTTPS://www.Acme.com/' and 'acme.com' collide.
+    """
+    seen = {}
+    out = []
+    match = _URL_RE.match
+    for url in urls:
+        # Spreadsheet cells and JSON values may be numbers
+        url = '' if url is None else str(url).strip()
+        if url not in seen:
+            if not url:
+                seen[url] = (None, None)
+            else:
+                m = match(url)
+                host = m.group(1).lower().rstrip('.') if m else ''
+                if host.startswith('www.'):
+                    host = host[4:]
+                path = m.group(2).rstrip('/') if m else ''
+                seen[url] = ((host + path) if host else url.lower(), host or None)
+        out.append(seen[url])
+    return out
+
+
+def fallback_name(host, url):
+    """Company name from the domain ('acme-kitchens.co.uk' -> 'Acme-kitchens'), the URL without a host"""
+    return host.split('.')[0].capitalize() if host else url
+
+
+def prepare_companies(rows, auto_detect_names=True):
+    """
+    Normalize, deduplicate and shape rows for insert_companies.
+
+    Args:
+        rows: Iterable of dicts with COMPANY_FIELDS keys (+ optional additional_data)
+        auto_detect_names: Fill a missing company_name from the domain
+
+    Returns:
+        (records, stats): insert-ready dicts in input order (first occurrence of
+        each site wins), and {'rows', 'duplicates', 'blank'}
+
+    Rows are consumed INGEST_CHUNK_SIZE at a time, so a streamed upload is
+    never held in memory as raw rows.
+    """
+    rows = iter(rows)
+    records = []
+    seen = set()
+    stats = {'rows': 0, 'duplicates': 0, 'blank': 0}
+    while True:
+        chunk = [row for row in islice(rows, INGEST_CHUNK_SIZE) if row]
+        if not chunk:
+            break
+        stats['rows'] += len(chunk)
+        keys = normalize_urls(row.get('website_url') for row in chunk)
+        for row, (key, host) in zip(chunk, keys):
+            if key is None:
+                stats['blank'] += 1
+                continue
+            if key in seen:
+                stats['duplicates'] += 1
+                continue
+            seen.add(key)
+            record = {field: (str(row[field]).strip()[:FIELD_LENGTHS[field]] if row.get(field) not in (None, '') else None)
+                      for field in COMPANY_FIELDS}
+            if not record['company_name']:
+                record['company_name'] = fallback_name(host, record['website_url'])[:300] if auto_detect_names else ''
+            record['additional_data'] = row.get('additional_data') or {}
+            records.append(record)
+    return records, stats
+
+
+def ingest_stream_name(upload_id, user_id=None, session_id=None):
+    """
+    Progress stream for an upload_id, scoped to its caller (the user, or the
+    guest session) so another client cannot follow it by guessing the id.
+    None without an upload_id or a caller.
+    """
+    if not upload_id:
+        return None
+    if user_id:
+        return f'user-{user_id}:{upload_id}'
+    if session_id:
+        return f'guest-{session_id}:{upload_id}'
+    return None
+
+
+def publish_progress(stream_name, **data):
+    """Ingest progress event on an ingest_stream_name() stream (no-op without one)"""
+    if stream_name:
+        publish_event('campaign_ingest', stream_name, data)
+
+
+def insert_companies(campaign_id, records, progress_stream=None, chunk_size=None):
+    """
+    Insert records for a campaign with chunked multi-row INSERTs (caller commits).
+
+    Returns:
+        Number of rows inserted
+    """
+    from database import db
+    from models import Company
+    chunk_size = chunk_size or INGEST_CHUNK_SIZE
+    insert = Company.__table__.insert()
+    total = len(records)
+    done = 0
+    for start in range(0, total, chunk_size):
+        chunk = [dict(record, campaign_id=campaign_id) for record in records[start:start + chunk_size]]
+        db.session.execute(insert, chunk)
+        done += len(chunk)
+        publish_progress(progress_stream, status='inserting', inserted=done, total=total)
+        if total >= 10 * chunk_size:
+            print(f"[Create Campaign] Inserted {done}/{total} companies for campaign {campaign_id}")
+    return done
@@ -0,0 +1,156 @@
+"""
+Reachability pre-flight for campaign company lists.
+
+Before a campaign's companies are dispatched to browser workers, every
+website is checked concurrently with asyncio (bounded): DNS resolution, then
+one GET (redirects followed, first PREFLIGHT_SNIFF_BYTES read to spot parked
+domains). Definitely dead sites - no DNS record, connection refused, parked
+or malformed URL - are reported so the caller can fail them immediately
+instead of letting each one hold a worker slot until navigation times out.
+Live sites are ordered fastest first; slow or 5xx sites go last.
+
+A single capped GET is used instead of HEAD + GET: many servers answer HEAD
+with 403/405 and the parked-domain check needs the body anyway.
+
+    from campaign_preflight import preflight
+    report = preflight([(company_id, url), ...])
+    report['dead']   # [{'company_id', 'url', 'reason', ...}]
+    report['order']  # company ids to dispatch, likely-fast first
+"""
+import os
+import time
+import socket
+import asyncio
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+PREFLIGHT_ENABLED = os.getenv('CAMPAIGN_PREFLIGHT', '1') != '0'
+PREFLIGHT_CONCURRENCY = int(os.getenv('CAMPAIGN_PREFLIGHT_CONCURRENCY', '100'))
+PREFLIGHT_TIMEOUT_SEC = float(os.getenv('CAMPAIGN_PREFLIGHT_TIMEOUT', '6'))
+PREFLIGHT_SNIFF_BYTES = 32 * 1024
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Reasons that fail the company without a browser run
+DEAD_REASONS = ('invalid_url', 'dns_failed', 'connect_failed', 'parked')
+
+PARKING_HOSTS = ('sedoparking.com', 'parkingcrew.net', 'bodis.com', 'dan.com', 'afternic.com', 'hugedomains.com',
+                 'above.com', 'parklogic.com', 'undeveloped.com', 'sav.com', 'domainmarket.com')
+PARKED_PHRASES = ('this domain is for sale', 'domain is parked', 'buy this domain', 'this domain may be for sale',
+                  'domain has expired', 'parked free, courtesy of', 'is available for purchase')
+
+# User-facing messages per reason (Company.error_message)
+REASON_MESSAGES = {
+    'invalid_url': 'Website URL is invalid.',
+    'dns_failed': 'Website domain does not exist (DNS lookup failed).',
+    'connect_failed': 'Website is not reachable (connection refused).',
+    'parked': 'Website is a parked or for-sale domain.',
+}
+
+
+def _host_port(url):
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname or '.' not in parsed.hostname:
+        return None, None
+    return parsed.hostname, parsed.port or (443 if parsed.scheme == 'https' else 80)
+
+
+def _is_parked(final_url, body):
+    host = (urlparse(final_url).hostname or '').lower()
+    if any(host == p or host.endswith('.' + p) for p in PARKING_HOSTS):
+        return True
+    text = body.lower()
+    return any(phrase in text for phrase in PARKED_PHRASES)
+
+
+async def check_site(session, resolver, company_id, url, timeout=PREFLIGHT_TIMEOUT_SEC):
+    """Check one website; returns {'company_id', 'url', 'reason', 'final_url', 'status', 'elapsed'}"""
+    started = time.monotonic()
+    check = {'company_id': company_id, 'url': url, 'reason': 'ok', 'final_url': url, 'status': None, 'elapsed': None}
+    host, port = _host_port(url)
+    if not host:
+        check['reason'] = 'invalid_url'
+        return check
+    try:
+        await asyncio.wait_for(resolver.resolve(host, port, family=socket.AF_INET), timeout)
+    except asyncio.TimeoutError:
+        check['reason'] = 'timeout'
+        return check
+    except OSError:
+        check['reason'] = 'dns_failed'
+        return check
+    try:
+        async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), allow_redirects=True) as response:
+            check['status'] = response.status
+            check['final_url'] = str(response.url)
+            body = await response.content.read(PREFLIGHT_SNIFF_BYTES)
+            if _is_parked(check['final_url'], body.decode('utf-8', errors='ignore')):
+                check['reason'] = 'parked'
+            elif response.status >= 500:
+                check['reason'] = f'http_{response.status}'
+    except asyncio.TimeoutError:
+        check['reason'] = 'timeout'
+    except aiohttp.ClientConnectorError as e:
+        # Redirect target without DNS record, or nothing listening
+        check['reason'] = 'dns_failed' if isinstance(e.os_error, socket.gaierror) else 'connect_failed'
+    except (aiohttp.ClientError, ValueError, UnicodeError):
+        check['reason'] = 'connect_failed'
+    check['elapsed'] = round(time.monotonic() - started, 3)
+    return check
+
+
+async def preflight_async(sites, concurrency=PREFLIGHT_CONCURRENCY, timeout=PREFLIGHT_TIMEOUT_SEC, resolver=None):
+    """Check (company_id, url) pairs with at most `concurrency` in flight; see preflight()"""
+    resolver = resolver or aiohttp.ThreadedResolver()
+    connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=2, ttl_dns_cache=300,
+                                     resolver=resolver, ssl=False)
+    limit = asyncio.Semaphore(concurrency)
+    async with aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT}) as session:
+        async def one(company_id, url):
+            async with limit:
+                return await check_site(session, resolver, company_id, url, timeout)
+        checks = await asyncio.gather(*(one(cid, url) for cid, url in sites))
+    return _report(checks)
+
+
+def _report(checks):
+    dead = [c for c in checks if c['reason'] in DEAD_REASONS]
+    live = [c for c in checks if c['reason'] == 'ok']
+    slow = [c for c in checks if c['reason'] not in DEAD_REASONS and c['reason'] != 'ok']
+    live.sort(key=lambda c: c['elapsed'] or 0)
+    return {
+        'checks': checks,
+        'dead': dead,
+        'order': [c['company_id'] for c in live + slow],
+        'canonical': {c['company_id']: c['final_url'] for c in live + slow if _canonical_changed(c['url'], c['final_url'])},
+    }
+
+
+def _canonical_changed(url, final_url):
+    """True when a redirect moved the site to another scheme or host (http->https, www)"""
+    before, after = urlparse(url), urlparse(final_url)
+    return (before.scheme, before.netloc.lower()) != (after.scheme, after.netloc.lower())
+
+
+def preflight(sites, concurrency=PREFLIGHT_CONCURRENCY, timeout=PREFLIGHT_TIMEOUT_SEC, resolver=None):
+    """
+    Blocking pre-flight for a company list.
+
+    Args:
+        sites: [(company_id, website_url), ...]
+        concurrency: Max sites checked at once
+        timeout: Per-site budget in seconds
+        resolver: aiohttp resolver (tests pass a stub)
+
+    Returns:
+        {'checks': [...], 'dead': [...], 'order': [company_id, ...], 'canonical': {company_id: url}}
+        Disabled or without aiohttp: nothing dead, original order.
+    """
+    sites = list(sites)
+    if not sites or not (AIOHTTP_AVAILABLE and PREFLIGHT_ENABLED):
+        return {'checks': [], 'dead': [], 'order': [cid for cid, _ in sites], 'canonical': {}}
+    return asyncio.run(preflight_async(sites, concurrency, timeout, resolver))
@@ -0,0 +1,272 @@
+"""
+Process-wide campaign scheduler.
+
+All running campaigns share one worker budget (derived from CPU cores and
+RAM, see worker_budget()) instead of each campaign run owning its own
+Semaphore of 5 workers. Companies are dispatched with weighted fair
+queuing between campaigns: each campaign advances a virtual clock by
+1/weight per dispatched company and the campaign with the lowest clock goes
+next, so an enterprise campaign gets ~4x the slots of a free one while both
+have work, and nobody starves.
+
+Admission control: at most MAX_ACTIVE_CAMPAIGNS campaigns dispatch at once
+and at most MAX_QUEUED_COMPANIES companies may be queued overall; campaigns
+beyond the active limit wait in FIFO order and can report their position.
+
+The scheduler is per process (one web worker runs campaigns). The worker
+pool (campaign_worker_pool) is sized to the same budget.
+
+    from campaign_scheduler import get_scheduler
+    get_scheduler().run_campaign(campaign_id, tasks, tier='premium')  # blocks
+"""
+import os
+import threading
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+WORKERS_PER_CORE = float(os.getenv('CAMPAIGN_WORKERS_PER_CORE', '1'))
+MB_PER_WORKER = int(os.getenv('CAMPAIGN_MB_PER_WORKER', '600'))
+RESERVED_MB = int(os.getenv('CAMPAIGN_RESERVED_MB', '1024'))
+MAX_ACTIVE_CAMPAIGNS = int(os.getenv('CAMPAIGN_MAX_ACTIVE', '10'))
+MAX_QUEUED_COMPANIES = int(os.getenv('CAMPAIGN_MAX_QUEUED_COMPANIES', '100000'))
+
+TIER_WEIGHTS = {
+    'enterprise': 4,
+    'client': 4,
+    'premium': 2,
+    'production': 2,
+    'free': 1,
+    'testing': 1,
+    'guest': 1,
+}
+
+
+class AdmissionRejected(Exception):
+    """The scheduler cannot take this campaign now (queue full)"""
+
+
+def _total_memory_mb():
+    if PSUTIL_AVAILABLE:
+        try:
+            return psutil.virtual_memory().total / (1024 * 1024)
+        except Exception:
+            pass
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 * 1024)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def worker_budget():
+    """
+    Concurrent company workers this machine can hold: the smaller of the
+    core-based and the RAM-based limit (CAMPAIGN_WORKER_BUDGET overrides).
+    """
+    override = os.getenv('CAMPAIGN_WORKER_BUDGET')
+    if override:
+        return max(1, int(override))
+    by_cpu = int((os.cpu_count() or 1) * WORKERS_PER_CORE)
+    memory = _total_memory_mb()
+    by_ram = int((memory - RESERVED_MB) // MB_PER_WORKER) if memory else by_cpu
+    return max(1, min(by_cpu, by_ram))
+
+
+def tier_weight(tier):
+    return TIER_WEIGHTS.get((tier or 'guest').strip().lower(), 1)
+
+
+class _Campaign:
+    __slots__ = ('campaign_id', 'weight', 'tasks', 'running', 'vtime', 'done', 'dispatched', 'cancelled')
+
+    def __init__(self, campaign_id, weight, tasks):
+        self.campaign_id = campaign_id
+        self.weight = weight
+        self.tasks = deque(tasks)
+        self.running = 0
+        self.vtime = 0.0
+        self.dispatched = 0
+        self.cancelled = False
+        self.done = threading.Event()
+
+
+class CampaignScheduler:
+    def __init__(self, budget=None, max_active=MAX_ACTIVE_CAMPAIGNS, max_queued=MAX_QUEUED_COMPANIES):
+        self.budget = budget or worker_budget()
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self._cond = threading.Condition()
+        self._active = OrderedDict()   # campaign_id -> _Campaign (dispatching)
+        self._waiting = OrderedDict()  # campaign_id -> _Campaign (admission queue, FIFO)
+        self._running = 0
+        self._vclock = 0.0  # virtual time of the last dispatch
+        self._executor = ThreadPoolExecutor(max_workers=self.budget, thread_name_prefix='campaign-slot')
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, daemon=True, name='campaign-scheduler')
+        self._dispatcher.start()
+
+    # -- admission ---------------------------------------------------------
+
+    def queued_companies(self):
+        with self._cond:
+            return self._queued_locked()
+
+    def _queued_locked(self):
+        return sum(len(c.tasks) for c in list(self._active.values()) + list(self._waiting.values()))
+
+    def check_admission(self, company_count):
+        """Raise AdmissionRejected if `company_count` more companies would overflow the queue"""
+        with self._cond:
+            queued = self._queued_locked()
+        if queued + company_count > self.max_queued:
+            raise AdmissionRejected(
+                f'{queued} companies are already queued (limit {self.max_queued}); try again shortly'
+            )
+
+    def submit(self, campaign_id, tasks, tier=None, weight=None):
+        """
+        Queue a campaign's company tasks (callables). Returns the campaign's
+        done Event. Raises AdmissionRejected when the queue is full.
+
+        A cancelled campaign whose killed tasks are still unwinding does not
+        block a restart: the new submission takes over its slot and the old
+        entry finishes (sets its own done Event) in the background.
+        """
+        tasks = list(tasks)
+        campaign = _Campaign(campaign_id, weight or tier_weight(tier), tasks)
+        with self._cond:
+            previous = self._active.get(campaign_id)
+            if previous is not None and previous.cancelled:
+                self._active.pop(campaign_id)
+            elif previous is not None or campaign_id in self._waiting:
+                raise AdmissionRejected(f'Campaign {campaign_id} is already scheduled')
+            if self._queued_locked() + len(tasks) > self.max_queued:
+                raise AdmissionRejected(f'Queue full (limit {self.max_queued} companies)')
+            if not tasks:
+                campaign.done.set()
+                return campaign.done
+            self._waiting[campaign_id] = campaign
+            self._admit_locked()
+            self._cond.notify_all()
+        return campaign.done
+
+    def run_campaign(self, campaign_id, tasks, tier=None, weight=None):
+        """submit() and block until every task of the campaign has finished"""
+        self.submit(campaign_id, tasks, tier=tier, weight=weight).wait()
+
+    def _admit_locked(self):
+        while self._waiting and len(self._active) < self.max_active:
+            campaign_id, campaign = self._waiting.popitem(last=False)
+            # Start at the current virtual time: no credit for time spent waiting
+            campaign.vtime = self._vclock
+            self._active[campaign_id] = campaign
+
+    def cancel(self, campaign_id):
+        """Drop a campaign's queued companies; running ones finish (or are killed by the caller)"""
+        with self._cond:
+            campaign = self._active.get(campaign_id) or self._waiting.pop(campaign_id, None)
+            if not campaign:
+                return 0
+            dropped = len(campaign.tasks)
+            campaign.tasks.clear()
+            campaign.cancelled = True
+            self._finish_if_done_locked(campaign)
+            self._cond.notify_all()
+            return dropped
+
+    # -- reporting ---------------------------------------------------------
+
+    def status(self, campaign_id):
+        """Queue position and share for a campaign, or None if it is not scheduled"""
+        with self._cond:
+            if campaign_id in self._waiting:
+                position = list(self._waiting).index(campaign_id) + 1
+                campaign = self._waiting[campaign_id]
+                return {
+                    'state': 'waiting', 'position': position, 'campaigns_ahead': position - 1 + len(self._active),
+                    'queued_companies': len(campaign.tasks), 'running_companies': 0,
+                    'weight': campaign.weight, 'budget': self.budget,
+                }
+            campaign = self._active.get(campaign_id)
+            if not campaign:
+                return None
+            total_weight = sum(c.weight for c in self._active.values() if c.tasks or c.running) or campaign.weight
+            return {
+                'state': 'running', 'position': 0, 'campaigns_ahead': 0,
+                'queued_companies': len(campaign.tasks), 'running_companies': campaign.running,
+                'weight': campaign.weight, 'budget': self.budget,
+                'share': round(campaign.weight / total_weight, 3),
+            }
+
+    def stats(self):
+        with self._cond:
+            return {
+                'budget': self.budget, 'running': self._running,
+                'active_campaigns': len(self._active), 'waiting_campaigns': len(self._waiting),
+                'queued_companies': self._queued_locked(),
+            }
+
+    # -- dispatch ----------------------------------------------------------
+
+    def _next_locked(self):
+        """Campaign with queued work and the lowest virtual time"""
+        best = None
+        for campaign in self._active.values():
+            if campaign.tasks and (best is None or campaign.vtime < best.vtime):
+                best = campaign
+        return best
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                campaign = None
+                while campaign is None:
+                    if self._running < self.budget:
+                        campaign = self._next_locked()
+                    if campaign is None:
+                        self._cond.wait()
+                task = campaign.tasks.popleft()
+                self._vclock = campaign.vtime
+                campaign.vtime += 1.0 / campaign.weight
+                campaign.running += 1
+                campaign.dispatched += 1
+                self._running += 1
+            self._executor.submit(self._run_task, campaign, task)
+
+    def _run_task(self, campaign, task):
+        try:
+            task()
+        except Exception as e:
+            print(f"[Scheduler] Company task for campaign {campaign.campaign_id} failed: {e}")
+        finally:
+            with self._cond:
+                campaign.running -= 1
+                self._running -= 1
+                self._finish_if_done_locked(campaign)
+                self._cond.notify_all()
+
+    def _finish_if_done_locked(self, campaign):
+        if not campaign.tasks and campaign.running == 0 and not campaign.done.is_set():
+            # A restart may already own this campaign_id; only remove our own entry
+            if self._active.get(campaign.campaign_id) is campaign:
+                self._active.pop(campaign.campaign_id)
+            campaign.done.set()
+            self._admit_locked()
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """Process-wide scheduler shared by all campaign runs"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = CampaignScheduler()
+    return _scheduler
@@ -1,20 +1,22 @@
 """
 Standalone campaign sequential processor.
 No Celery/Redis imports - safe to use when Redis is not running (e.g. Start button).
-Uses a subprocess-based architecture for robustness: each company is processed in its own 
-process that can be forcefully killed if it hangs, preventing the whole run from freezing.
+Uses a subprocess-based architecture for robustness: companies are processed by persistent
+worker processes (campaign_worker_pool) that each keep a warm browser and can be forcefully
+killed if a company hangs, preventing the whole run from freezing.
 """
-import os
 import json
 import re
 import threading
-import subprocess
-import tempfile
 import time
 import sys
 from datetime import datetime, timedelta
-from sqlalchemy import func
 from models import Campaign, Company, db
+from functools import partial
+from campaign_worker_pool import get_worker_pool, WorkerError, kill_process_tree
+from campaign_scheduler import get_scheduler
+from campaign_preflight import preflight, REASON_MESSAGES
+from campaign_counters import record_bulk_moves, Reconciler
 
 # Global registry to allow Sentinel to kill stalled threads
 # campaign_id -> state dict
@@ -25,27 +27,72 @@ REGISTRY_LOCK = threading.Lock()
 PER_COMPANY_TIMEOUT_SEC = 90
 # Max time to wait for worker output/cleanup
 WORKER_WAIT_TIMEOUT_SEC = 10
-# Maximum concurrent workers to avoid OOM or CPU saturation
-MAX_CONCURRENT_WORKERS = 5
+# Concurrency is the shared campaign_scheduler budget (cores/RAM), not per campaign
 # Sentinel: How long without heartbeat before we consider a campaign 'orphaned'# Threshold for detecting stalled campaigns (2m 30s)
 SENTINEL_ORPHAN_THRESHOLD_SEC = 150
 
+def _campaign_tier(campaign):
+    """Subscription tier of the campaign owner ('guest' for session campaigns)"""
+    if not campaign or not campaign.user_id:
+        return 'guest'
+    from models import User
+    user = User.query.get(campaign.user_id)
+    return (user.subscription_tier or 'free').strip().lower() if user else 'guest'
+
+
+def _preflight_companies(campaign_id, companies, state, ws_manager):
+    """
+    Check every company website concurrently (campaign_preflight), fail the dead
+    ones in bulk, store redirect targets and return the rest likely-fast first.
+    """
+    try:
+        report = preflight([(c.id, c.website_url) for c in companies])
+    except Exception as e:
+        print(f"[Parallel] [PREFLIGHT] Skipped: {e}")
+        return companies
+
+    by_id = {c.id: c for c in companies}
+    now = datetime.utcnow()
+    dead_updates = [{
+        'id': check['company_id'], 'status': 'failed', 'contact_method': check['reason'],
+        'error_message': REASON_MESSAGES[check['reason']], 'processed_at': now,
+    } for check in report['dead']]
+    url_updates = [{'id': cid, 'website_url': url[:500]} for cid, url in report['canonical'].items()]
+    try:
+        if dead_updates:
+            # bulk_update_mappings skips the flush listener: count the moves here, grouped by the
+            # companies' current status (explicit company_ids may include already-processed rows)
+            record_bulk_moves(campaign_id, [update['id'] for update in dead_updates], 'failed')
+            db.session.bulk_update_mappings(Company, dead_updates)
+        if url_updates:
+            db.session.bulk_update_mappings(Company, url_updates)
+        db.session.commit()
+    except Exception as e:
+        print(f"[Parallel] [PREFLIGHT] Could not store results: {e}")
+        db.session.rollback()
+        return companies
+
+    for update in dead_updates:
+        with state['lock']:
+            state['processed_count'] += 1
+            processed = state['processed_count']
+        ws_manager.broadcast_event(campaign_id, {
+            'type': 'company_completed',
+            'data': {
+                'company_id': update['id'], 'status': 'failed', 'screenshot_url': None,
+                'progress': round((processed / state['total_companies']) * 100, 1),
+                'processed_count': processed, 'total_companies': state['total_companies'],
+            }
+        })
+    if report['checks']:
+        print(f"[Parallel] [PREFLIGHT] Campaign {campaign_id}: {len(dead_updates)}/{len(companies)} unreachable, "
+              f"{len(url_updates)} redirected to a canonical URL")
+    return [by_id[cid] for cid in report['order'] if cid in by_id]
+
+
 def _kill_process_tree(proc):
     """Safely terminate a process and all its children across platforms."""
-    if not proc: return
-    try:
-        if sys.platform == 'win32':
-            # On Windows, taskkill /F /T kills the process and all its children
-            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)], 
-                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        else:
-            # On Linux/macOS, we use process groups
-            import signal
-            os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
-    except:
-        # Fallback to simple terminate if group kill fails
-        try: proc.kill()
-        except: pass
+    kill_process_tree(proc)
 
 # Map technical log (action / message) to user-friendly English for the right-hand panel
 def _user_friendly_message(level, action, message):
@@ -147,12 +194,13 @@ def _user_facing_error(err: str) -> str:
         return "Processing error (browser context). You can retry this company."
     return s
 
-def process_campaign_sequential(campaign_id, company_ids=None, processing_limit=None, skip_submit=False):
+def process_campaign_sequential(campaign_id, company_ids=None, processing_limit=None, skip_submit=False, tier=None):
     """
     Process a campaign with "Lightning Fast" parallelism.
-    Uses ThreadPoolExecutor and multiple subprocesses for maximum speed.
+    Companies run on the shared campaign scheduler (campaign_scheduler) and
+    persistent worker processes; `tier` sets the campaign's fair-share weight
+    (resolved from the campaign owner when None).
     """
-    from concurrent.futures import ThreadPoolExecutor
     import threading
     
     # Get flask app for DB updates early so it's available to everything
@@ -206,6 +254,8 @@ def process_campaign_sequential(campaign_id, company_ids=None, processing_limit=
                         if camp and camp.status in ['stopping', 'cancelled']:
                             print(f"[Parallel] [WATCHDOG] STOP REQUESTED (status={camp.status}). Killing active workers...")
                             state['interrupted'] = True
+                            # Drop this campaign's queued companies from the shared scheduler
+                            get_scheduler().cancel(campaign_id)
                             with state['lock']:
                                 for pid, proc in list(state['active_procs'].items()):
                                     print(f"[Parallel] [WATCHDOG] Killing PID {pid}")
@@ -251,23 +301,10 @@ def process_campaign_sequential(campaign_id, company_ids=None, processing_limit=
                             # CRITICAL: Update heartbeat
                             camp.last_heartbeat_at = datetime.utcnow()
                             
-                            # Optimized stats update: Single query instead of 4
-                            stats = db.session.query(
-                                Company.status, 
-                                func.count(Company.id)
-                            ).filter(Company.campaign_id == campaign_id).group_by(Company.status).all()
-                            
-                            counts = {s: c for s, c in stats}
-                            processed = sum(c for s, c in counts.items() if s not in ['pending', 'processing'])
-                            success = counts.get('completed', 0) + counts.get('contact_info_found', 0)
-                            failed = counts.get('failed', 0)
-                            captcha = counts.get('captcha', 0)
-                            
-                            camp.processed_count = processed
-                            camp.success_count = success
-                            camp.failed_count = failed
-                            camp.captcha_count = captcha
                             db.session.commit()
+                            # Counters are maintained per status transition (campaign_counters)
+                            processed, success = camp.processed_count, camp.success_count
+                            failed, captcha = camp.failed_count, camp.captcha_count
                             db.session.remove() # Release connection while waiting for next heartbeat
                             
                             total = camp.total_companies or 0
@@ -331,210 +368,195 @@ def process_campaign_sequential(campaign_id, company_ids=None, processing_limit=
             'data': {'campaign_id': campaign_id, 'total_companies': len(companies)}
         })
 
-        # 2. Worker Execution in ThreadPool
+        # 1b. Reachability pre-flight: dead sites fail now instead of holding a worker slot
+        companies = _preflight_companies(campaign_id, companies, state, ws_manager)
+
+        # 2. Worker Execution on the shared scheduler
         # ---------------------------------------------------------------------
-        semaphore = threading.Semaphore(MAX_CONCURRENT_WORKERS)
-        
+
         def process_one_company(comp_id, comp_name):
-            with semaphore:
-                try:
-                    # Check global interrupt flag before starting new work
-                    if state['interrupted']:
-                        return
+            try:
+                # Check global interrupt flag before starting new work
+                if state['interrupted']:
+                    return
 
-                    with flask_app.app_context():
-                        from models import Company, Campaign
-                        from database import db
-                        
-                        # A. Refresh state
-                        db.session.remove()
-                        db.session.rollback()
-                        company = Company.query.get(comp_id)
-                        if not company: return
-                        
-                        camp = Campaign.query.get(campaign_id)
-                        if not camp or camp.status in ['stopping', 'cancelled']:
-                            return
+                with flask_app.app_context():
+                    from models import Company, Campaign
+                    from database import db
+                    
+                    # A. Refresh state
+                    db.session.remove()
+                    db.session.rollback()
+                    company = Company.query.get(comp_id)
+                    if not company: return
+                    
+                    camp = Campaign.query.get(campaign_id)
+                    if not camp or camp.status in ['stopping', 'cancelled']:
+                        return
 
-                        # B. Mark processing
-                        company.status = 'processing'
-                        # Capture data into serializable dict BEFORE we commit and potentially lose the session
-                        company_data_dict = company.to_dict()
-                        db.session.commit()
-                        db.session.remove() # AGGRESSIVE: Release connection back to pool while worker is busy (~90s)
-                        
-                        with state['lock']: state['last_activity_at'] = time.time()
-                        
-                        ws_manager.broadcast_event(campaign_id, {
-                            'type': 'company_processing',
-                            'data': {'company_id': comp_id, 'company_name': comp_name}
-                        })
-
-                        # C. Run Worker Subprocess
-                        input_fd, input_path = tempfile.mkstemp(suffix='.json', prefix='worker_in_')
-                        output_fd, output_path = tempfile.mkstemp(suffix='.json', prefix='worker_out_')
-                        result = None
+                    # B. Mark processing
+                    company.status = 'processing'
+                    # Capture data into serializable dict BEFORE we commit and potentially lose the session
+                    company_data_dict = company.to_dict()
+                    db.session.commit()
+                    db.session.remove() # AGGRESSIVE: Release connection back to pool while worker is busy (~90s)
+                    
+                    with state['lock']: state['last_activity_at'] = time.time()
+                    
+                    ws_manager.broadcast_event(campaign_id, {
+                        'type': 'company_processing',
+                        'data': {'company_id': comp_id, 'company_name': comp_name}
+                    })
+
+                    # C. Run on a warm worker from the shared pool (fresh browser context per company)
+                    worker_input = {
+                        'campaign_id': campaign_id,
+                        'company_id': comp_id,
+                        'company_data': company_data_dict,
+                        'message_template': message_template_str,
+                        'subject': subject_str,
+                        'sender_data': sender_data,
+                        'timeout_sec': PER_COMPANY_TIMEOUT_SEC,
+                        'skip_submit': skip_submit
+                    }
+
+                    # Log streaming
+                    def stream_log(line_str, cid=comp_id, cname=comp_name):
                         try:
-                            os.close(input_fd)
-                            os.close(output_fd)
-                            worker_input = {
-                                'campaign_id': campaign_id,
-                                'company_id': comp_id,
-                                'company_data': company_data_dict,
-                                'message_template': message_template_str,
-                                'subject': subject_str,
-                                'sender_data': sender_data,
-                                'timeout_sec': PER_COMPANY_TIMEOUT_SEC,
-                                'skip_submit': skip_submit
-                            }
-                            with open(input_path, 'w', encoding='utf-8') as f:
-                                json.dump(worker_input, f)
-                            
-                            python_exe = sys.executable or 'py'
-                            worker_script = os.path.join(os.path.dirname(__file__), 'process_single_company.py')
-                            cmd = [python_exe, worker_script, '--input', input_path, '--output', output_path]
-                            
-                            kwargs = {
-                                'stdout': subprocess.PIPE, 'stderr': subprocess.STDOUT,
-                                'cwd': os.path.dirname(__file__), 'bufsize': -1
-                            }
-                            if sys.platform != 'win32': kwargs['preexec_fn'] = os.setsid
-                            
-                            proc = subprocess.Popen(cmd, **kwargs)
-                            with state['lock']: state['active_procs'][proc.pid] = proc
-
-                            # Log streaming
-                            def stream_logs(pipe, cid, cname):
-                                try:
-                                    for line in iter(pipe.readline, b''):
-                                        try:
-                                            line_str = line.decode('utf-8', errors='ignore').strip()
-                                            if not line_str: continue
-                                            match = re.match(r'\[(\w+)\] (.*?): (.*)', line_str)
-                                            if match:
-                                                level, action, message = match.groups()
-                                                with state['lock']: state['last_activity_at'] = time.time()
-                                                user_msg = _user_friendly_message(level, action, message)
-                                                ws_manager.broadcast_event(campaign_id, {
-                                                    'type': 'activity',
-                                                    'data': {
-                                                        'company_id': cid, 'company_name': cname,
-                                                        'level': level, 'action': action, 'message': message,
-                                                        'user_message': user_msg, 'timestamp': datetime.utcnow().isoformat()
-                                                    }
-                                                })
-                                        except Exception as e:
-                                            print(f"[Parallel] Error processing log line: {e}")
-                                            # Don't break the loop, keep reading to avoid pipe block (Errno 11)
-                                except Exception as e:
-                                    print(f"[Parallel] Critical log streamer error for company {cid}: {e}")
-                            
-                            log_thread = threading.Thread(target=stream_logs, args=(proc.stdout, comp_id, comp_name), daemon=True)
-                            log_thread.start()
-
-                            try:
-                                proc.wait(timeout=PER_COMPANY_TIMEOUT_SEC + WORKER_WAIT_TIMEOUT_SEC)
+                            match = re.match(r'\[(\w+)\] (.*?): (.*)', line_str.strip())
+                            if match:
+                                level, action, message = match.groups()
                                 with state['lock']: state['last_activity_at'] = time.time()
-                                if os.path.exists(output_path):
-                                    with open(output_path, 'r', encoding='utf-8') as f:
-                                        result = json.load(f)
-                            except subprocess.TimeoutExpired:
-                                _kill_process_tree(proc)
-                                result = {'success': False, 'error': 'Processing timed out', 'method': 'timeout'}
-                            finally:
-                                with state['lock']: state['active_procs'].pop(proc.pid, None)
-
+                                user_msg = _user_friendly_message(level, action, message)
+                                ws_manager.broadcast_event(campaign_id, {
+                                    'type': 'activity',
+                                    'data': {
+                                        'company_id': cid, 'company_name': cname,
+                                        'level': level, 'action': action, 'message': message,
+                                        'user_message': user_msg, 'timestamp': datetime.utcnow().isoformat()
+                                    }
+                                })
                         except Exception as e:
+                            print(f"[Parallel] Error processing log line: {e}")
+
+                    active = {}
+                    def on_start(proc):
+                        # Registered so Stop / stall handling can kill this company's worker
+                        active['pid'] = proc.pid
+                        with state['lock']: state['active_procs'][proc.pid] = proc
+
+                    result = None
+                    try:
+                        result = get_worker_pool().run(
+                            worker_input,
+                            timeout=PER_COMPANY_TIMEOUT_SEC + WORKER_WAIT_TIMEOUT_SEC,
+                            on_log=stream_log,
+                            on_start=on_start,
+                        )
+                        with state['lock']: state['last_activity_at'] = time.time()
+                    except WorkerError as e:
+                        if str(e) == 'timeout':
+                            result = {'success': False, 'error': 'Processing timed out', 'method': 'timeout'}
+                        else:
                             result = {'success': False, 'error': str(e), 'method': 'error'}
-                        finally:
-                            for p in [input_path, output_path]:
-                                if os.path.exists(p):
-                                    try: os.remove(p)
-                                    except: pass
-
-                        # D. Update Result - RE-FETCH first to avoid DetachedInstanceError
-                        # The commit earlier (line 273) expired these objects, and the long-running 
-                        # subprocess might have timed out the session or seen other thread-local issues.
-                        db.session.rollback() # Clear any stale cache/objects for this thread
-                        company = Company.query.get(comp_id)
-                        camp = Campaign.query.get(campaign_id)
-                        
-                        if not company or not camp:
-                            print(f"[Parallel] CRITICAL: Company {comp_id} or Campaign {campaign_id} not found in DB after worker.")
-                            return
-
-                        if result:
-                            if result.get('success'):
-                                method = result.get('method', '')
-                                company.status = 'contact_info_found' if (method == 'contact_info_found' or method.startswith('email')) else 'completed'
-                                company.contact_method = (method or '')[:20]
-                                company.fields_filled = result.get('fields_filled', 0)
-                                company.error_message = None
+                    except Exception as e:
+                        result = {'success': False, 'error': str(e), 'method': 'error'}
+                    finally:
+                        with state['lock']: state['active_procs'].pop(active.get('pid'), None)
+
+                    # D. Update Result - RE-FETCH first to avoid DetachedInstanceError
+                    # The commit earlier (line 273) expired these objects, and the long-running 
+                    # subprocess might have timed out the session or seen other thread-local issues.
+                    db.session.rollback() # Clear any stale cache/objects for this thread
+                    company = Company.query.get(comp_id)
+                    camp = Campaign.query.get(campaign_id)
+                    
+                    if not company or not camp:
+                        print(f"[Parallel] CRITICAL: Company {comp_id} or Campaign {campaign_id} not found in DB after worker.")
+                        return
+
+                    if result:
+                        if result.get('success'):
+                            method = result.get('method', '')
+                            company.status = 'contact_info_found' if (method == 'contact_info_found' or method.startswith('email')) else 'completed'
+                            company.contact_method = (method or '')[:20]
+                            company.fields_filled = result.get('fields_filled', 0)
+                            company.error_message = None
+                        else:
+                            error_msg = (result.get('error') or '').lower()
+                            method = result.get('method') or ''
+                            if method == 'timeout':
+                                company.status = 'failed'
+                                company.error_message = _user_facing_error('Processing timed out.')
+                            elif 'captcha' in error_msg or method == 'form_with_captcha':
+                                company.status = 'captcha'
+                            elif method == 'no_contact_found':
+                                company.status = 'no_contact_found'
+                                company.error_message = 'No contact form found.'
                             else:
-                                error_msg = (result.get('error') or '').lower()
-                                method = result.get('method') or ''
-                                if method == 'timeout':
-                                    company.status = 'failed'
-                                    company.error_message = _user_facing_error('Processing timed out.')
-                                elif 'captcha' in error_msg or method == 'form_with_captcha':
-                                    company.status = 'captcha'
-                                elif method == 'no_contact_found':
-                                    company.status = 'no_contact_found'
-                                    company.error_message = 'No contact form found.'
-                                else:
-                                    company.status = 'failed'
-                                    company.error_message = _user_facing_error(result.get('error'))
-                                company.contact_method = (method or '')[:20]
-                            
-                            if result.get('screenshot_bytes'):
-                                try:
-                                    import base64
-                                    s_bytes = base64.b64decode(result.get('screenshot_bytes'))
-                                    sb_url = upload_screenshot(s_bytes, campaign_id, comp_id)
-                                    if sb_url: company.screenshot_url = sb_url
-                                except: pass
-
-                        company.processed_at = datetime.utcnow()
-                        db.session.commit()
-                        
-                        with state['lock']:
-                            state['processed_count'] += 1
-                            processed = state['processed_count']
-                        
-                        progress_pct = round((processed / state['total_companies']) * 100, 1)
+                                company.status = 'failed'
+                                company.error_message = _user_facing_error(result.get('error'))
+                            company.contact_method = (method or '')[:20]
                         
-                        # Signal completion via WebSocket for real-time UI updates
-                        ws_manager.broadcast_event(campaign_id, {
-                            'type': 'company_completed',
-                            'data': {
-                                'company_id': comp_id, 'status': company.status,
-                                'screenshot_url': getattr(company, 'screenshot_url', None),
-                                'progress': progress_pct, 'processed_count': processed,
-                                'total_companies': state['total_companies']
-                            }
-                        })
-                        
-                        db.session.remove() # Aggressive cleanup
+                        if result.get('screenshot_bytes'):
+                            try:
+                                import base64
+                                s_bytes = base64.b64decode(result.get('screenshot_bytes'))
+                                sb_url = upload_screenshot(s_bytes, campaign_id, comp_id)
+                                if sb_url: company.screenshot_url = sb_url
+                            except: pass
+
+                    company.processed_at = datetime.utcnow()
+                    db.session.commit()
+                    
+                    with state['lock']:
+                        state['processed_count'] += 1
+                        processed = state['processed_count']
+                    
+                    progress_pct = round((processed / state['total_companies']) * 100, 1)
+                    
+                    # Signal completion via WebSocket for real-time UI updates
+                    ws_manager.broadcast_event(campaign_id, {
+                        'type': 'company_completed',
+                        'data': {
+                            'company_id': comp_id, 'status': company.status,
+                            'screenshot_url': getattr(company, 'screenshot_url', None),
+                            'progress': progress_pct, 'processed_count': processed,
+                            'total_companies': state['total_companies']
+                        }
+                    })
+                    
+                    db.session.remove() # Aggressive cleanup
 
-                except Exception as e:
-                    print(f"[Parallel] Error in company task {comp_id}: {e}")
-                    # Ensure cleanup even on error
-                    from database import db
-                    try: 
-                        db.session.rollback()
-                        db.session.remove()
-                    except: pass
+            except Exception as e:
+                print(f"[Parallel] Error in company task {comp_id}: {e}")
+                # Ensure cleanup even on error
+                from database import db
+                try: 
+                    db.session.rollback()
+                    db.session.remove()
+                except: pass
 
-        # Execute in ThreadPool
-        with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_WORKERS) as executor:
-            for c in companies:
-                executor.submit(process_one_company, c.id, getattr(c, 'company_name', ''))
+        # Dispatch through the process-wide scheduler: one worker budget shared
+        # fairly (tier-weighted) by every running campaign. Blocks until done.
+        if tier is None:
+            tier = _campaign_tier(campaign)
+        get_scheduler().run_campaign(
+            campaign_id,
+            [partial(process_one_company, c.id, getattr(c, 'company_name', '')) for c in companies],
+            tier=tier,
+        )
 
         # 3. Finalization
         # ---------------------------------------------------------------------
         db.session.remove()
         db.session.rollback()
         campaign = Campaign.query.get(campaign_id)
+        if state['interrupted']:
+            # Stopped, or cancelled by the sentinel which has restarted the campaign:
+            # companies may still be pending, so this run must not mark it completed
+            db.session.remove()
+            return {'status': 'interrupted', 'processed': state['processed_count']}
         if campaign and campaign.status not in ['stopping', 'cancelled']:
             campaign.status = 'completed'
             campaign.completed_at = datetime.utcnow()
@@ -579,6 +601,7 @@ class SelfHealingSentinel:
     _lock = threading.Lock()
     _running = False
     _prog_cache = {} # campaign_id -> {'count': int, 'last_move_at': float}
+    _reconciler = Reconciler()  # Fixes campaign counter drift every CAMPAIGN_COUNTER_RECONCILE_INTERVAL
 
     @classmethod
     def start(cls):
@@ -600,6 +623,7 @@ class SelfHealingSentinel:
                     from database import db
                     
                     now_ts = time.time()
+                    cls._reconciler.maybe_run()
                     cutoff_heartbeat = datetime.utcnow() - timedelta(seconds=SENTINEL_ORPHAN_THRESHOLD_SEC)
                     
                     # Look for campaigns that SHOULD be processing
@@ -613,6 +637,13 @@ class SelfHealingSentinel:
                         is_stalled = False
                         reason = ""
 
+                        # 0. Waiting for admission or for a worker slot is not a stall:
+                        # restart the progress window once companies are dispatched again
+                        scheduled = get_scheduler().status(cid)
+                        if scheduled and (scheduled['state'] == 'waiting' or scheduled['running_companies'] == 0):
+                            cls._prog_cache[cid] = {'count': curr_count, 'last_move_at': now_ts}
+                            continue
+
                         # 1. Check Heartbeat (Dead Process)
                         if last_hb is None or last_hb < cutoff_heartbeat:
                             is_stalled = True
@@ -645,6 +676,7 @@ class SelfHealingSentinel:
                                     print(f"[SENTINEL]   - Found active state registry. Killing {len(old_state['active_procs'])} workers...")
                                     old_state['interrupted'] = True
                                     old_state['stop_watchdog'] = True
+                                    get_scheduler().cancel(cid)
                                     with old_state['lock']:
                                         for pid, proc in list(old_state['active_procs'].items()):
                                             print(f"[SENTINEL]   - Killing PID {pid}")
@@ -0,0 +1,274 @@
+"""
+Pool of persistent campaign worker processes.
+
+Each worker is `process_single_company.py --serve`: one Python process with
+FastCampaignProcessor imported and one Chromium kept warm. A company job is
+sent over the worker's stdin as a JSON line and runs in a fresh browser
+context; the result comes back as a JSON line on stdout and log lines on
+stderr. No temp files and no process/browser start per company.
+
+Kill-on-timeout is unchanged: a job that overruns its deadline gets its
+worker's whole process tree killed and the worker replaced. Workers are also
+recycled after MAX_JOBS_PER_WORKER jobs or when their process tree grows past
+MAX_WORKER_RSS_MB.
+
+    from campaign_worker_pool import get_worker_pool
+    result = get_worker_pool().run(worker_input, timeout=100, on_log=print)
+"""
+import os
+import sys
+import json
+import time
+import queue
+import atexit
+import itertools
+import threading
+import subprocess
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+POOL_SIZE = int(os.getenv('CAMPAIGN_WORKER_POOL_SIZE', '0'))  # 0: campaign scheduler budget
+MAX_JOBS_PER_WORKER = int(os.getenv('CAMPAIGN_WORKER_MAX_JOBS', '25'))
+MAX_WORKER_RSS_MB = int(os.getenv('CAMPAIGN_WORKER_MAX_RSS_MB', '1500'))
+STARTUP_TIMEOUT_SEC = float(os.getenv('CAMPAIGN_WORKER_STARTUP_TIMEOUT', '60'))
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'process_single_company.py')
+
+
+class WorkerError(RuntimeError):
+    """The worker died, timed out or could not start"""
+
+
+def kill_process_tree(proc):
+    """Kill a worker and its browser (the worker runs in its own process group)"""
+    if not proc:
+        return
+    try:
+        if sys.platform == 'win32':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(proc.pid)],
+                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        else:
+            import signal
+            os.killpg(os.getpgid(proc.pid), signal.SIGKILL)
+    except Exception:
+        try:
+            proc.kill()
+        except Exception:
+            pass
+
+
+class CampaignWorker:
+    """One persistent worker process and its pipe readers"""
+
+    def __init__(self, command):
+        kwargs = {
+            'stdin': subprocess.PIPE, 'stdout': subprocess.PIPE, 'stderr': subprocess.PIPE,
+            'cwd': os.path.dirname(WORKER_SCRIPT), 'bufsize': 1, 'text': True, 'encoding': 'utf-8',
+            'errors': 'ignore',
+        }
+        if sys.platform != 'win32':
+            kwargs['preexec_fn'] = os.setsid
+        self.proc = subprocess.Popen(command, **kwargs)
+        self.pid = self.proc.pid
+        self.jobs_done = 0
+        self.on_log = None
+        self.retired = False
+        self._messages = queue.Queue()
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        try:
+            for line in self.proc.stdout:
+                try:
+                    self._messages.put(json.loads(line))
+                except ValueError:
+                    continue
+        finally:
+            self._messages.put(None)  # EOF: the worker exited
+
+    def _read_stderr(self):
+        for line in self.proc.stderr:
+            line = line.rstrip('\n')
+            callback = self.on_log
+            if line and callback:
+                try:
+                    callback(line)
+                except Exception as e:
+                    print(f"[WorkerPool] Log callback error: {e}")
+
+    def wait_for(self, message_type, timeout, job_id=None):
+        """Next protocol message of a type (results are matched by job id)"""
+        end = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if end is None else end - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise WorkerError('timeout')
+            try:
+                message = self._messages.get(timeout=remaining)
+            except queue.Empty:
+                raise WorkerError('timeout')
+            if message is None:
+                raise WorkerError(f'worker {self.pid} exited (code {self.proc.poll()})')
+            if message.get('type') == message_type and (job_id is None or message.get('job_id') == job_id):
+                return message
+
+    def send(self, message):
+        self.proc.stdin.write(json.dumps(message) + '\n')
+        self.proc.stdin.flush()
+
+    def alive(self):
+        return self.proc.poll() is None
+
+    def rss_mb(self):
+        """Resident memory of the worker and its browser processes (0 without psutil)"""
+        if not PSUTIL_AVAILABLE:
+            return 0
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + root.children(recursive=True)
+        except Exception:
+            return 0
+        total = 0
+        for process in processes:
+            try:
+                total += process.memory_info().rss
+            except Exception:
+                continue
+        return total / (1024 * 1024)
+
+    def stop(self, timeout=5):
+        """Ask the worker to exit; kill it if it does not"""
+        try:
+            self.send({'type': 'shutdown'})
+            self.proc.wait(timeout=timeout)
+        except Exception:
+            kill_process_tree(self.proc)
+
+
+class CampaignWorkerPool:
+    """
+    Fixed number of persistent workers, leased one job at a time. Workers are
+    started lazily and replaced when they die, time out or are recycled.
+    """
+
+    def __init__(self, size=POOL_SIZE, max_jobs=MAX_JOBS_PER_WORKER, max_rss_mb=MAX_WORKER_RSS_MB,
+                 command=None, startup_timeout=STARTUP_TIMEOUT_SEC):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.command = command or [sys.executable or 'python', WORKER_SCRIPT, '--serve']
+        self.startup_timeout = startup_timeout
+        self._idle = queue.LifoQueue()  # most recently used first: warmest worker
+        self._slots = threading.BoundedSemaphore(size)
+        self._job_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._busy = {}  # pid -> CampaignWorker
+        self._closed = False
+        self.stats = {'started': 0, 'recycled': 0, 'killed': 0, 'jobs': 0}
+
+    def _start_worker(self):
+        worker = CampaignWorker(self.command)
+        try:
+            worker.wait_for('ready', self.startup_timeout)
+        except WorkerError as e:
+            kill_process_tree(worker.proc)
+            raise WorkerError(f'worker failed to start: {e}')
+        with self._lock:
+            self.stats['started'] += 1
+        return worker
+
+    def _lease(self):
+        while True:
+            try:
+                worker = self._idle.get_nowait()
+            except queue.Empty:
+                return self._start_worker()
+            if worker.alive() and not worker.retired:
+                return worker
+
+    def _release(self, worker):
+        recycle = worker.retired or not worker.alive()
+        if not recycle and worker.jobs_done >= self.max_jobs:
+            recycle = True
+        elif not recycle and self.max_rss_mb and worker.rss_mb() > self.max_rss_mb:
+            recycle = True
+        if recycle or self._closed:
+            with self._lock:
+                self.stats['recycled'] += 1
+            worker.stop()
+        else:
+            self._idle.put(worker)
+
+    def run(self, worker_input, timeout, on_log=None, on_start=None):
+        """
+        Run one company job on a warm worker; blocks until the result.
+
+        Args:
+            worker_input: The process_single_company input dict
+            timeout: Seconds before the worker is killed and the job fails
+            on_log: on_log(line) for each stderr line the job produces
+            on_start: on_start(proc) once the job is assigned (for stop requests)
+
+        Raises:
+            WorkerError: timed out, worker died or could not start
+        """
+        if self._closed:
+            raise WorkerError('pool is shut down')
+        with self._slots:
+            worker = self._lease()
+            job_id = next(self._job_ids)
+            worker.on_log = on_log
+            with self._lock:
+                self._busy[worker.pid] = worker
+            try:
+                if on_start:
+                    on_start(worker.proc)
+                worker.send({'type': 'job', 'job_id': job_id, 'input': worker_input})
+                message = worker.wait_for('result', timeout, job_id=job_id)
+                worker.jobs_done += 1
+                with self._lock:
+                    self.stats['jobs'] += 1
+                return message['result']
+            except (WorkerError, OSError, ValueError) as e:
+                worker.retired = True
+                kill_process_tree(worker.proc)
+                with self._lock:
+                    self.stats['killed'] += 1
+                raise WorkerError(str(e))
+            finally:
+                worker.on_log = None
+                with self._lock:
+                    self._busy.pop(worker.pid, None)
+                self._release(worker)
+
+    def shutdown(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().stop()
+            except queue.Empty:
+                break
+        with self._lock:
+            busy = list(self._busy.values())
+        for worker in busy:
+            kill_process_tree(worker.proc)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_worker_pool():
+    """Process-wide worker pool shared by all campaign runs"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                from campaign_scheduler import worker_budget
+                _pool = CampaignWorkerPool(size=POOL_SIZE or worker_budget())
+                atexit.register(_pool.shutdown)
+    return _pool
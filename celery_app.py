@@ -1,8 +1,68 @@
 from celery import Celery
 import os
+import sys
 
 # Create Celery instance
-celery_app = Celery('trevnoctilla_api')
+celery_app = Celery('trevnoctilla_api', include=['tasks', 'webhooks'])
+
+# Per-queue worker settings. Every value can be overridden with
+# CELERY_<QUEUE>_<SETTING>, e.g. CELERY_VIDEO_MAX_CONCURRENCY=3.
+#   concurrency / max_concurrency: autoscaler floor and ceiling (processes)
+#   prefetch: worker_prefetch_multiplier for that queue's workers
+#   max_tasks_per_child: recycle a pool process after this many tasks
+#   backlog_per_process: waiting tasks one extra process is expected to absorb
+#   time_limit / soft_time_limit: seconds, applied to the queue's tasks
+QUEUE_SETTINGS = {
+    'video': {
+        'concurrency': 1, 'max_concurrency': 2, 'prefetch': 1, 'max_tasks_per_child': 20,
+        'backlog_per_process': 1, 'time_limit': 60 * 60, 'soft_time_limit': 55 * 60,
+    },
+    'audio': {
+        'concurrency': 1, 'max_concurrency': 4, 'prefetch': 1, 'max_tasks_per_child': 100,
+        'backlog_per_process': 2, 'time_limit': 20 * 60, 'soft_time_limit': 18 * 60,
+    },
+    'image': {
+        'concurrency': 2, 'max_concurrency': 8, 'prefetch': 4, 'max_tasks_per_child': 500,
+        'backlog_per_process': 8, 'time_limit': 5 * 60, 'soft_time_limit': 4 * 60,
+    },
+    'pdf': {
+        'concurrency': 2, 'max_concurrency': 8, 'prefetch': 4, 'max_tasks_per_child': 500,
+        'backlog_per_process': 8, 'time_limit': 10 * 60, 'soft_time_limit': 9 * 60,
+    },
+    'default': {
+        'concurrency': 1, 'max_concurrency': 4, 'prefetch': 4, 'max_tasks_per_child': 1000,
+        'backlog_per_process': 10, 'time_limit': 30 * 60, 'soft_time_limit': 25 * 60,
+    },
+}
+
+# Registered task name -> queue. Task names are module.function (tasks.py is
+# imported as the top-level module `tasks`).
+TASK_QUEUES = {
+    'tasks.convert_video_async': 'video',
+    'tasks.convert_audio_async': 'audio',
+    'tasks.convert_image_async': 'image',
+    'tasks.process_pdf_async': 'pdf',
+    'webhooks.send_webhook': 'default',
+    'webhooks.send_webhook_batch': 'default',
+}
+
+
+def queue_setting(queue, name):
+    """QUEUE_SETTINGS value for a queue, overridable via CELERY_<QUEUE>_<NAME>"""
+    default = QUEUE_SETTINGS[queue][name]
+    value = os.getenv(f'CELERY_{queue.upper()}_{name.upper()}')
+    return type(default)(value) if value else default
+
+
+def worker_argv(queue):
+    """Arguments for a worker consuming one queue with that queue's settings"""
+    return [
+        'worker', '-Q', queue, '-n', f'{queue}@%h', '--loglevel=info',
+        f"--autoscale={queue_setting(queue, 'max_concurrency')},{queue_setting(queue, 'concurrency')}",
+        f"--prefetch-multiplier={queue_setting(queue, 'prefetch')}",
+        f"--max-tasks-per-child={queue_setting(queue, 'max_tasks_per_child')}",
+    ]
+
 
 # Configuration
 celery_app.conf.update(
@@ -18,40 +78,32 @@ celery_app.conf.update(
     task_soft_time_limit=25 * 60,  # 25 minutes
     worker_prefetch_multiplier=1,
     worker_max_tasks_per_child=1000,
+    # Scale pool processes on broker queue depth, not only on reserved tasks
+    worker_autoscaler='queue_autoscale:QueueDepthAutoscaler',
 )
 
-# Optional configuration for better performance
 celery_app.conf.update(
-    task_routes={
-        'trevnoctilla_backend.tasks.convert_video_async': {'queue': 'video'},
-        'trevnoctilla_backend.tasks.convert_audio_async': {'queue': 'audio'},
-        'trevnoctilla_backend.tasks.convert_image_async': {'queue': 'image'},
-        'trevnoctilla_backend.tasks.process_pdf_async': {'queue': 'pdf'},
+    task_routes={name: {'queue': queue} for name, queue in TASK_QUEUES.items()},
+    task_annotations={
+        name: {
+            'time_limit': queue_setting(queue, 'time_limit'),
+            'soft_time_limit': queue_setting(queue, 'soft_time_limit'),
+        }
+        for name, queue in TASK_QUEUES.items()
     },
     task_default_queue='default',
     task_queues={
-        'default': {
-            'exchange': 'default',
-            'routing_key': 'default',
-        },
-        'video': {
-            'exchange': 'video',
-            'routing_key': 'video',
-        },
-        'audio': {
-            'exchange': 'audio',
-            'routing_key': 'audio',
-        },
-        'image': {
-            'exchange': 'image',
-            'routing_key': 'image',
-        },
-        'pdf': {
-            'exchange': 'pdf',
-            'routing_key': 'pdf',
-        },
+        queue: {
+            'exchange': queue,
+            'routing_key': queue,
+        }
+        for queue in QUEUE_SETTINGS
     }
 )
 
 if __name__ == '__main__':
-    celery_app.start()
+    # python celery_app.py queue-worker <queue>
+    if len(sys.argv) == 3 and sys.argv[1] == 'queue-worker':
+        celery_app.worker_main(worker_argv(sys.argv[2]))
+    else:
+        celery_app.start()
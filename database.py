@@ -180,7 +180,7 @@ def init_db(app):
                 
                 # Create missing tables (notifications, analytics tables, campaigns tables, scraping rules, etc.)
                 missing_tables = []
-                required_tables = ['notifications', 'analytics_events', 'page_views', 'user_sessions', 'campaigns', 'companies', 'submission_logs', 'scraping_rules', 'scraping_sessions', 'system_settings']
+                required_tables = ['notifications', 'billing_ledger', 'analytics_events', 'page_views', 'user_sessions', 'campaigns', 'companies', 'submission_logs', 'scraping_rules', 'scraping_sessions', 'system_settings']
                 
                 for table_name in required_tables:
                     if table_name not in tables:
@@ -190,7 +190,7 @@ def init_db(app):
                     print(f"[LOAD] Creating missing tables: {', '.join(missing_tables)}...")
                     # Ensure all models are imported before creating tables
                     try:
-                        from models import Notification, AnalyticsEvent, PageView, UserSession, Campaign, Company, SubmissionLog, ScrapingRule, ScrapingSession, SystemSetting
+                        from models import Notification, BillingLedgerEntry, AnalyticsEvent, PageView, UserSession, Campaign, Company, SubmissionLog, ScrapingRule, ScrapingSession, SystemSetting
                         db.create_all()  # This will create all missing tables
                         print(f"[OK] Created missing tables: {', '.join(missing_tables)}")
                     except Exception as e:
@@ -203,6 +203,15 @@ def init_db(app):
                 if hasattr(signal, 'SIGALRM'):
                     signal.alarm(0)
             
+            # Copy notifications missing from the billing ledger (resumes an interrupted backfill)
+            try:
+                from billing_ledger import backfill_pending, backfill_ledger
+                if backfill_pending():
+                    backfill_ledger()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[WARN] Billing ledger backfill incomplete, will resume on next start: {e}")
+            
             if 'users' in tables:
                 # Table exists - check and add missing columns
                 print("[RELOAD] Checking for missing columns...")
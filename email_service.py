@@ -5,11 +5,11 @@ Uses Resend API to send emails (works on all Railway plans)
 import os
 import requests
 import base64
-import uuid
 from datetime import datetime
 from typing import Optional, Dict, Any
 from jinja2 import Environment, FileSystemLoader
 from pathlib import Path
+from invoice_renderer import render_pdf, invoice_number, logo_data_uri, LOGO_URL
 
 # Set up Jinja2 environment for email templates
 template_dir = Path(__file__).parent / 'templates' / 'emails'
@@ -29,7 +29,7 @@ FROM_NAME = os.getenv('FROM_NAME', 'Trevnoctilla Team')
 
 def generate_subscription_pdf(tier: str, amount: float = 0.0, user_email: str = "", subscription_id: str = "", payment_id: str = "", payment_date: Optional[datetime] = None, billing_cycle: str = "Monthly", payment_method: str = "PayFast", old_tier: Optional[str] = None) -> Optional[bytes]:
     """
-    Generate PDF subscription document from HTML template using html-to-pdf endpoint
+    Generate PDF subscription document from HTML template (rendered in-process, memoized per payment)
     
     Args:
         tier: Subscription tier (free, premium, enterprise)
@@ -72,117 +72,26 @@ def generate_subscription_pdf(tier: str, amount: float = 0.0, user_email: str =
                 next_billing_date_obj = subscription_date_obj + timedelta(days=30)
         next_billing_date_str = next_billing_date_obj.strftime('%B %d, %Y')
         
-        # Generate subscription ID if not provided
+        # Subscription ID is stable per payment so the rendered PDF can be memoized
+        stable_id = bool(subscription_id or payment_id)
         if not subscription_id:
-            subscription_id = f"SUB-{subscription_date_obj.strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+            subscription_id = invoice_number('SUB', subscription_date_obj, payment_id)
         
-        # Download and embed logo as base64 for PDF compatibility
-        logo_base64 = None
-        try:
-            logo_url = "https://www.trevnoctilla.com/logo.png"
-            logo_response = requests.get(logo_url, timeout=10)
-            if logo_response.status_code == 200:
-                import base64
-                logo_base64 = base64.b64encode(logo_response.content).decode('utf-8')
-                logo_data_uri = f"data:image/png;base64,{logo_base64}"
-                print(f"[OK] [SUBSCRIPTION] Logo downloaded and embedded as base64 ({len(logo_base64)} chars)")
-            else:
-                print(f"[WARN] [SUBSCRIPTION] Failed to download logo: HTTP {logo_response.status_code}")
-        except Exception as e:
-            print(f"[WARN] [SUBSCRIPTION] Error downloading logo: {e}")
-            # Continue without logo if download fails
-        
-        # Generate subscription HTML with embedded logo
-        subscription_template = env.get_template('upgrade.html')
+        # Render in-process (compiled template, bundled logo, local HTML->PDF engine)
         old_tier_name = tier_names.get(old_tier.lower(), old_tier) if old_tier else "Free Tier"
         new_tier_name = tier_names.get(tier.lower(), tier)
-        subscription_html = subscription_template.render(
-            old_tier_name=old_tier_name,
-            new_tier_name=new_tier_name
+        pdf = render_pdf(
+            'upgrade.html',
+            {'old_tier_name': old_tier_name, 'new_tier_name': new_tier_name},
+            invoice_id=subscription_id if stable_id else None
         )
-        
-        # Save HTML to temp file
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
-            f.write(subscription_html)
-            html_path = f.name
-        
-        # Debug: Log HTML size and preview
-        html_size = len(subscription_html)
-        print(f" [SUBSCRIPTION] Generated HTML ({html_size} chars)")
-        print(f" [SUBSCRIPTION] HTML preview (first 500 chars): {subscription_html[:500]}")
-        print(f" [SUBSCRIPTION] HTML saved to: {html_path}")
-        
-        # Get API URL for PDF conversion
-        # Use frontend domain if available (Next.js rewrites proxy to backend)
-        # Otherwise fall back to direct backend URL
-        # Backend only uses existing Railway vars; use fixed production URLs for PDF conversion.
-        api_url = 'https://www.trevnoctilla.com'
-        print(f" [SUBSCRIPTION] Using frontend domain for PDF conversion: {api_url}")
-        
-        # Convert HTML to PDF using backend endpoint
-        print(f" [SUBSCRIPTION] Converting HTML to PDF via {api_url}/convert_html_to_pdf...")
-        response = None
-        with open(html_path, 'rb') as html_file:
-            files = {'html': ('subscription.html', html_file, 'text/html')}
-            try:
-                response = requests.post(
-                    f"{api_url}/convert_html_to_pdf",
-                    files=files,
-                    timeout=60  # Increased timeout for PDF generation
-                )
-            except requests.exceptions.Timeout:
-                print(f"[ERROR] [SUBSCRIPTION] PDF conversion timed out after 60 seconds")
-                # Clean up temp HTML file
-                try:
-                    os.unlink(html_path)
-                except:
-                    pass
-                return None
-            except requests.exceptions.RequestException as e:
-                print(f"[ERROR] [SUBSCRIPTION] PDF conversion request failed: {e}")
-                # Clean up temp HTML file
-                try:
-                    os.unlink(html_path)
-                except:
-                    pass
-                return None
-        
-        # Clean up temp HTML file
-        try:
-            os.unlink(html_path)
-        except:
-            pass
-        
-        if response and response.status_code == 200:
-            data = response.json()
-            print(f" [SUBSCRIPTION] Conversion response: {data}")
-            if data.get('status') == 'success' and data.get('download_url'):
-                # Download the PDF
-                pdf_url = data['download_url']
-                if not pdf_url.startswith('http'):
-                    pdf_url = f"{api_url}{pdf_url}"
-                
-                print(f" [SUBSCRIPTION] Downloading PDF from: {pdf_url}")
-                pdf_response = requests.get(pdf_url, timeout=30)
-                if pdf_response.status_code == 200:
-                    pdf_size = len(pdf_response.content)
-                    print(f"[OK] [SUBSCRIPTION] PDF generated successfully ({pdf_size} bytes)")
-                    if pdf_size < 1000:
-                        print(f"[WARN] [SUBSCRIPTION] WARNING: PDF size is very small ({pdf_size} bytes), might be blank!")
-                    return pdf_response.content
-                else:
-                    print(f"[ERROR] [SUBSCRIPTION] Failed to download PDF: {pdf_response.status_code} - {pdf_response.text[:200]}")
-            else:
-                error_msg = data.get('error', data.get('message', 'Unknown error'))
-                print(f"[ERROR] [SUBSCRIPTION] Conversion failed: {error_msg}")
-                print(f"   Full response: {data}")
+        if pdf:
+            print(f"[OK] [SUBSCRIPTION] PDF generated successfully ({len(pdf)} bytes)")
+            if len(pdf) < 1000:
+                print(f"[WARN] [SUBSCRIPTION] WARNING: PDF size is very small ({len(pdf)} bytes), might be blank!")
         else:
-            error_text = response.text[:500] if response.text else "No error message"
-            print(f"[ERROR] [SUBSCRIPTION] HTML to PDF conversion failed: {response.status_code}")
-            print(f"   Error response: {error_text}")
-        
-        return None
+            print(f"[ERROR] [SUBSCRIPTION] HTML to PDF conversion failed")
+        return pdf
         
     except Exception as e:
         print(f"[ERROR] [SUBSCRIPTION] Error generating subscription PDF: {e}")
@@ -192,7 +101,7 @@ def generate_subscription_pdf(tier: str, amount: float = 0.0, user_email: str =
 
 def generate_invoice_pdf(tier: str, amount: float = 0.0, user_email: str = "", payment_id: str = "", payment_date: Optional[datetime] = None, item_description: Optional[str] = None, template_name: str = 'emails/invoice.html') -> Optional[bytes]:
     """
-    Generate PDF invoice from HTML template using html-to-pdf endpoint
+    Generate PDF invoice from HTML template (rendered in-process, memoized per payment)
     
     Args:
         tier: Subscription tier (free, premium, enterprise)
@@ -229,149 +138,45 @@ def generate_invoice_pdf(tier: str, amount: float = 0.0, user_email: str = "", p
         invoice_date_obj = payment_date if payment_date else datetime.now()
         invoice_date_str = invoice_date_obj.strftime('%B %d, %Y')
         
-        # Generate invoice number based on payment date
-        invoice_number = f"INV-{invoice_date_obj.strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
-        
-        # Download and embed logo as base64 for PDF compatibility
-        logo_base64 = None
-        try:
-            logo_url = "https://www.trevnoctilla.com/logo.png"
-            logo_response = requests.get(logo_url, timeout=10)
-            if logo_response.status_code == 200:
-                import base64
-                logo_base64 = base64.b64encode(logo_response.content).decode('utf-8')
-                logo_data_uri = f"data:image/png;base64,{logo_base64}"
-                print(f"[OK] [INVOICE] Logo downloaded and embedded as base64 ({len(logo_base64)} chars)")
-            else:
-                print(f"[WARN] [INVOICE] Failed to download logo: HTTP {logo_response.status_code}")
-        except Exception as e:
-            print(f"[WARN] [INVOICE] Error downloading logo: {e}")
-            # Continue without logo if download fails
+        # Invoice number is stable per payment so the rendered PDF can be memoized
+        invoice_id = invoice_number('INV', invoice_date_obj, payment_id)
         
-        # Generate invoice HTML with embedded logo
         # Handle both 'emails/invoice.html' and 'invoice.html' template names
         template_to_load = template_name.replace('emails/', '') if 'emails/' in template_name else template_name
-        invoice_template = env.get_template(template_to_load)
         # Use provided item_description or default to tier subscription
         final_item_description = item_description or f"{tier_names.get(tier.lower(), tier)} Subscription"
         
-        # Render template with appropriate variables based on template type
+        # Template variables based on template type
+        context = {
+            'invoice_number': invoice_id,
+            'invoice_date': invoice_date_str,
+            'user_email': user_email,
+            'tier_name': tier_names.get(tier.lower(), tier),
+            'item_description': final_item_description,
+            'unit_price': f"{invoice_amount:.2f}",
+            'total_amount': f"{invoice_amount:.2f}",
+            'currency_symbol': "$",
+            'tax_amount': 0.0,
+            'tax_rate': 0,
+            'status': "Paid" if invoice_amount > 0 else "Free"
+        }
         if template_to_load == 'subscription-invoice.html':
             # subscription-invoice.html uses different variable structure
-            invoice_html = invoice_template.render(
-                invoice_number=invoice_number,
-                invoice_date=invoice_date_str,
-                user_email=user_email,
-                tier_name=tier_names.get(tier.lower(), tier),
-                item_description=final_item_description,
-                unit_price=f"{invoice_amount:.2f}",
-                total_amount=f"{invoice_amount:.2f}",
-                amount=f"{invoice_amount:.2f}",
-                currency_symbol="$",
-                tax_amount=0.0,
-                tax_rate=0,
-                status="Paid" if invoice_amount > 0 else "Free"
-            )
+            context['amount'] = f"{invoice_amount:.2f}"
         else:
             # emails/invoice.html (default for welcome emails)
-            invoice_html = invoice_template.render(
-                invoice_number=invoice_number,
-                invoice_date=invoice_date_str,
-                user_email=user_email,
-                tier_name=tier_names.get(tier.lower(), tier),
-                item_description=final_item_description,
-                unit_price=f"{invoice_amount:.2f}",
-                total_amount=f"{invoice_amount:.2f}",
-                currency_symbol="$",
-                tax_amount=0.0,
-                tax_rate=0,
-                status="Paid" if invoice_amount > 0 else "Free",
-                status_class="status-paid" if invoice_amount > 0 else "status-free",
-                logo_url=logo_data_uri if logo_base64 else "https://www.trevnoctilla.com/logo.png"  # Fallback to URL if base64 failed
-            )
-        
-        # Save HTML to temp file
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.html', delete=False, encoding='utf-8') as f:
-            f.write(invoice_html)
-            html_path = f.name
-        
-        # Debug: Log HTML size and preview
-        html_size = len(invoice_html)
-        print(f" [INVOICE] Generated HTML ({html_size} chars)")
-        print(f" [INVOICE] HTML preview (first 500 chars): {invoice_html[:500]}")
-        print(f" [INVOICE] HTML saved to: {html_path}")
-        
-        # Get API URL for PDF conversion
-        # Use frontend domain if available (Next.js rewrites proxy to backend)
-        # Otherwise fall back to direct backend URL
-        # Backend only uses existing Railway vars; use fixed production URL for PDF conversion.
-        api_url = 'https://www.trevnoctilla.com'
-        print(f" [INVOICE] Using frontend domain for PDF conversion: {api_url}")
-        
-        # Convert HTML to PDF using backend endpoint
-        print(f" [INVOICE] Converting HTML to PDF via {api_url}/convert_html_to_pdf...")
-        response = None
-        with open(html_path, 'rb') as html_file:
-            files = {'html': ('invoice.html', html_file, 'text/html')}
-            try:
-                response = requests.post(
-                    f"{api_url}/convert_html_to_pdf",
-                    files=files,
-                    timeout=60  # Increased timeout for PDF generation
-                )
-            except requests.exceptions.Timeout:
-                print(f"[ERROR] [INVOICE] PDF conversion timed out after 60 seconds")
-                # Clean up temp HTML file
-                try:
-                    os.unlink(html_path)
-                except:
-                    pass
-                return None
-            except requests.exceptions.RequestException as e:
-                print(f"[ERROR] [INVOICE] PDF conversion request failed: {e}")
-                # Clean up temp HTML file
-                try:
-                    os.unlink(html_path)
-                except:
-                    pass
-                return None
-        
-        # Clean up temp HTML file
-        try:
-            os.unlink(html_path)
-        except:
-            pass
-        
-        if response and response.status_code == 200:
-            data = response.json()
-            print(f" [INVOICE] Conversion response: {data}")
-            if data.get('status') == 'success' and data.get('download_url'):
-                # Download the PDF
-                pdf_url = data['download_url']
-                if not pdf_url.startswith('http'):
-                    pdf_url = f"{api_url}{pdf_url}"
-                
-                print(f" [INVOICE] Downloading PDF from: {pdf_url}")
-                pdf_response = requests.get(pdf_url, timeout=30)
-                if pdf_response.status_code == 200:
-                    pdf_size = len(pdf_response.content)
-                    print(f"[OK] [INVOICE] PDF generated successfully ({pdf_size} bytes)")
-                    if pdf_size < 1000:
-                        print(f"[WARN] [INVOICE] WARNING: PDF size is very small ({pdf_size} bytes), might be blank!")
-                    return pdf_response.content
-                else:
-                    print(f"[ERROR] [INVOICE] Failed to download PDF: {pdf_response.status_code} - {pdf_response.text[:200]}")
-            else:
-                error_msg = data.get('error', data.get('message', 'Unknown error'))
-                print(f"[ERROR] [INVOICE] Conversion failed: {error_msg}")
-                print(f"   Full response: {data}")
+            context['status_class'] = "status-paid" if invoice_amount > 0 else "status-free"
+            context['logo_url'] = logo_data_uri() or LOGO_URL
+        
+        # Render in-process (compiled template, bundled logo, local HTML->PDF engine)
+        pdf = render_pdf(template_to_load, context, invoice_id=invoice_id if payment_id else None)
+        if pdf:
+            print(f"[OK] [INVOICE] PDF generated successfully ({len(pdf)} bytes)")
+            if len(pdf) < 1000:
+                print(f"[WARN] [INVOICE] WARNING: PDF size is very small ({len(pdf)} bytes), might be blank!")
         else:
-            error_text = response.text[:500] if response.text else "No error message"
-            print(f"[ERROR] [INVOICE] HTML to PDF conversion failed: {response.status_code}")
-            print(f"   Error response: {error_text}")
-        
-        return None
+            print(f"[ERROR] [INVOICE] HTML to PDF conversion failed")
+        return pdf
         
     except Exception as e:
         print(f"[ERROR] [INVOICE] Error generating invoice PDF: {e}")
@@ -0,0 +1,224 @@
+"""
+Streaming export service for usage logs and analytics tables.
+Rows are read with server-side cursors (yield_per) as plain column tuples and
+encoded to NDJSON, CSV or Parquet chunk by chunk, so memory stays constant
+regardless of the requested range.
+"""
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, date
+from database import db
+from models import UsageLog, AnalyticsEvent, PageView
+
+# Parquet is optional (pyarrow is not in requirements.txt)
+PARQUET_AVAILABLE = False
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    pa = None
+    pq = None
+
+# Rows fetched per server-side cursor round trip / encoded per output chunk
+EXPORT_BATCH_SIZE = 5000
+
+EXPORT_SOURCES = {
+    'usage_logs': (UsageLog, [
+        'id', 'api_key_id', 'user_id', 'endpoint', 'method', 'status_code',
+        'file_size', 'processing_time', 'ip_address', 'user_agent', 'timestamp',
+        'error_message', 'is_free_tier'
+    ]),
+    'analytics_events': (AnalyticsEvent, [
+        'id', 'user_id', 'event_type', 'event_name', 'properties', 'session_id',
+        'page_url', 'page_title', 'timestamp', 'user_agent', 'device_type',
+        'browser', 'os', 'referrer'
+    ]),
+    'page_views': (PageView, [
+        'id', 'user_id', 'session_id', 'page_url', 'page_title', 'timestamp',
+        'duration', 'referrer', 'user_agent', 'device_type', 'browser', 'os'
+    ]),
+}
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=_json_default)
+    return value
+
+
+def iter_batches(source, start=None, end=None, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Yield lists of row tuples for an export source in id order.
+
+    Uses Query.yield_per so PostgreSQL streams through a named (server-side)
+    cursor and only `batch_size` rows are held at a time.
+    """
+    model, columns = EXPORT_SOURCES[source]
+    query = db.session.query(*[getattr(model, name) for name in columns])
+    if start:
+        query = query.filter(model.timestamp >= start)
+    if end:
+        query = query.filter(model.timestamp < end)
+    query = query.order_by(model.id).yield_per(batch_size)
+
+    batch = []
+    for row in query:
+        batch.append(tuple(row))
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _encode_ndjson(columns, batches):
+    for batch in batches:
+        lines = [json.dumps(dict(zip(columns, row)), default=_json_default) for row in batch]
+        yield ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def _encode_csv(columns, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue().encode('utf-8')
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value) for value in row] for row in batch)
+        yield buffer.getvalue().encode('utf-8')
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes back to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _arrow_schema(model, columns):
+    """Fixed Arrow schema from the SQLAlchemy column types (JSON/text -> string)"""
+    fields = []
+    for name in columns:
+        python_type = None
+        try:
+            python_type = model.__table__.c[name].type.python_type
+        except NotImplementedError:
+            pass
+        if python_type is bool:
+            arrow_type = pa.bool_()
+        elif python_type is int:
+            arrow_type = pa.int64()
+        elif python_type is float:
+            arrow_type = pa.float64()
+        elif python_type is datetime:
+            arrow_type = pa.timestamp('us')
+        else:
+            arrow_type = pa.string()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _encode_parquet(model, columns, batches):
+    """One Parquet row group per batch; the file footer is written on close"""
+    schema = _arrow_schema(model, columns)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema, compression='gzip')
+    try:
+        for batch in batches:
+            data = {
+                name: [
+                    json.dumps(value, default=_json_default) if isinstance(value, (dict, list)) else value
+                    for value in values
+                ]
+                for name, values in zip(columns, zip(*batch))
+            }
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        writer.close()
+    chunk = sink.drain()
+    if chunk:
+        yield chunk
+
+
+def _gzip_stream(chunks):
+    """Incrementally gzip a byte-chunk generator"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(source, fmt='ndjson', start=None, end=None, compress=True, batch_size=EXPORT_BATCH_SIZE):
+    """
+    Generator of encoded export bytes for `source` in `fmt`.
+
+    Parquet output is compressed internally (gzip codec), so `compress` only
+    applies to NDJSON and CSV.
+
+    Raises:
+        ValueError: unknown source/format or Parquet without pyarrow
+    """
+    if source not in EXPORT_SOURCES:
+        raise ValueError(f"Unknown export source '{source}'. Valid: {', '.join(EXPORT_SOURCES)}")
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}'. Valid: {', '.join(EXPORT_FORMATS)}")
+    if fmt == 'parquet' and not PARQUET_AVAILABLE:
+        raise ValueError("Parquet export requires pyarrow to be installed")
+
+    model, columns = EXPORT_SOURCES[source]
+    batches = iter_batches(source, start=start, end=end, batch_size=batch_size)
+
+    if fmt == 'parquet':
+        return _encode_parquet(model, columns, batches)
+
+    encoder = _encode_ndjson if fmt == 'ndjson' else _encode_csv
+    chunks = encoder(columns, batches)
+    return _gzip_stream(chunks) if compress else chunks
+
+
+def export_filename(source, fmt, compress=True, start=None, end=None):
+    """Download filename for an export, e.g. usage_logs_20260101-20260201.ndjson.gz"""
+    _, extension = EXPORT_FORMATS[fmt]
+    start_part = start.strftime('%Y%m%d') if start else 'all'
+    end_part = end.strftime('%Y%m%d') if end else datetime.utcnow().strftime('%Y%m%d')
+    name = f"{source}_{start_part}-{end_part}.{extension}"
+    if compress and fmt != 'parquet':
+        name += '.gz'
+    return name
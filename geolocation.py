@@ -0,0 +1,286 @@
+"""
+IP geolocation for session tracking
+Lookups are served from an LRU+TTL cache keyed by network prefix. Misses are
+never resolved on the request path against a remote API; they are queued for a
+background enrichment worker that backfills UserSession.country/city.
+Backends are pluggable: a local MMDB file (maxminddb), ip-api.com, or a static
+stub for tests.
+"""
+
+import ipaddress
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+
+# A location is (country, city, region, timezone); all may be None
+EMPTY_LOCATION = (None, None, None, None)
+
+
+def cache_key(ip_address):
+    """
+    Cache key for an IP: the /24 for IPv4 and the /48 for IPv6, since city-level
+    geolocation is effectively constant within those prefixes.
+    Returns None for private, loopback or unparsable addresses.
+    """
+    try:
+        ip = ipaddress.ip_address(ip_address.strip())
+    except (ValueError, AttributeError):
+        return None
+    if ip.is_private or ip.is_loopback or ip.is_link_local or ip.is_multicast or ip.is_reserved:
+        return None
+    prefix = 24 if ip.version == 4 else 48
+    return str(ipaddress.ip_network(f"{ip}/{prefix}", strict=False))
+
+
+def format_city(city, region):
+    """Store region alongside city for better precision, e.g. 'Cape Town, Western Cape'"""
+    if city and region and region not in city:
+        return f"{city}, {region}"
+    return city
+
+
+class LocationCache:
+    """Thread-safe LRU cache with per-entry TTL"""
+
+    def __init__(self, max_size=10000, ttl=24 * 3600, negative_ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached location, or None if missing/expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            location, expires_at = entry
+            if expires_at < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return location
+
+    def set(self, key, location):
+        """Cache a location; failed lookups (all None) use the shorter negative TTL"""
+        ttl = self.ttl if any(location) else self.negative_ttl
+        with self._lock:
+            self._data[key] = (location, time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class StaticGeoBackend:
+    """In-memory backend for tests and local development"""
+    is_local = True
+
+    def __init__(self, locations=None, default=EMPTY_LOCATION):
+        self.locations = dict(locations or {})
+        self.default = default
+        self.calls = 0
+
+    def lookup(self, ip_address):
+        self.calls += 1
+        return self.locations.get(ip_address, self.default)
+
+
+class MMDBGeoBackend:
+    """Offline lookups from a MaxMind/DB-IP .mmdb city database"""
+    is_local = True
+
+    def __init__(self, path):
+        import maxminddb  # optional dependency
+        self.reader = maxminddb.open_database(path)
+
+    def lookup(self, ip_address):
+        record = self.reader.get(ip_address) or {}
+        country = (record.get('country') or {}).get('names', {}).get('en')
+        city = (record.get('city') or {}).get('names', {}).get('en')
+        subdivisions = record.get('subdivisions') or []
+        region = subdivisions[0].get('names', {}).get('en') if subdivisions else None
+        timezone = (record.get('location') or {}).get('time_zone')
+        return country, city, region, timezone
+
+
+class IpApiGeoBackend:
+    """ip-api.com over HTTP (free tier: 45 requests/minute), rate limited client-side"""
+    is_local = False
+
+    def __init__(self, requests_per_minute=45, timeout=3):
+        import requests
+        self.session = requests.Session()
+        self.timeout = timeout
+        self.min_interval = 60.0 / requests_per_minute
+        self._last_request = 0.0
+        self._lock = threading.Lock()
+
+    def lookup(self, ip_address):
+        with self._lock:
+            wait = self._last_request + self.min_interval - time.time()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_request = time.time()
+        response = self.session.get(
+            f'http://ip-api.com/json/{ip_address}?fields=status,country,countryCode,city,regionName,timezone,lat,lon',
+            timeout=self.timeout
+        )
+        if response.status_code == 200:
+            data = response.json()
+            if data.get('status') == 'success':
+                return data.get('country'), data.get('city'), data.get('regionName'), data.get('timezone')
+        return EMPTY_LOCATION
+
+
+def create_backend():
+    """
+    Backend from the environment:
+        GEOIP_BACKEND=mmdb|ip-api|none (default: mmdb when GEOIP_MMDB_PATH exists, else ip-api)
+        GEOIP_MMDB_PATH=/path/to/GeoLite2-City.mmdb
+    """
+    backend_name = os.getenv('GEOIP_BACKEND', '').lower()
+    mmdb_path = os.getenv('GEOIP_MMDB_PATH', '')
+
+    if backend_name == 'none':
+        return None
+    if backend_name in ('', 'mmdb') and mmdb_path and os.path.exists(mmdb_path):
+        try:
+            return MMDBGeoBackend(mmdb_path)
+        except Exception as e:
+            print(f"[WARN] [GEO] Could not open MMDB database {mmdb_path}: {e}")
+    if backend_name in ('', 'ip-api', 'mmdb'):
+        try:
+            return IpApiGeoBackend()
+        except ImportError:
+            print("[WARN] [GEO] requests not installed, geolocation disabled")
+    return None
+
+
+class GeoResolver:
+    """
+    Cached, non-blocking IP geolocation.
+
+    lookup() answers from the cache or a local backend only; anything needing a
+    remote call is deferred with enqueue_enrichment() and written back to the
+    session row by the worker thread.
+    """
+
+    def __init__(self, backend=None, cache=None, max_queue=5000):
+        self.backend = backend
+        self.cache = cache or LocationCache()
+        self.app = None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._pending = set()
+        self._pending_lock = threading.Lock()
+        self._worker_thread = None
+
+    def init_app(self, app, backend=None):
+        """Bind to the Flask app, pick a backend and start the enrichment worker"""
+        self.app = app
+        if backend is not None:
+            self.backend = backend
+        elif self.backend is None:
+            self.backend = create_backend()
+        if self.backend and (not self._worker_thread or not self._worker_thread.is_alive()):
+            self._worker_thread = threading.Thread(target=self._enrichment_worker, daemon=True)
+            self._worker_thread.start()
+            print(f"[GEO] Enrichment worker started ({type(self.backend).__name__})")
+
+    def _resolve(self, ip_address, key):
+        try:
+            location = self.backend.lookup(ip_address)
+        except Exception as e:
+            print(f"[GEO] Error getting location from IP {ip_address}: {e}")
+            location = EMPTY_LOCATION
+        self.cache.set(key, location)
+        return location
+
+    def lookup(self, ip_address):
+        """
+        Location without blocking on the network.
+
+        Returns:
+            (location, resolved) - resolved is False when the answer needs a
+            remote lookup and should be deferred with enqueue_enrichment()
+        """
+        key = cache_key(ip_address or '')
+        if key is None or self.backend is None:
+            return EMPTY_LOCATION, True
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached, True
+        if self.backend.is_local:
+            return self._resolve(ip_address, key), True
+        return EMPTY_LOCATION, False
+
+    def enqueue_enrichment(self, session_id, ip_address):
+        """Queue a session for background backfill (a session already queued is not queued twice)"""
+        if not session_id or self.backend is None:
+            return False
+        with self._pending_lock:
+            if session_id in self._pending:
+                return True
+            self._pending.add(session_id)
+        try:
+            self._queue.put_nowait((session_id, ip_address))
+            return True
+        except queue.Full:
+            with self._pending_lock:
+                self._pending.discard(session_id)
+            return False
+
+    def _backfill(self, session_id, location):
+        """Fill country/city on a session only where they are still empty"""
+        from database import db
+        from models import UserSession
+
+        country, city, region, _ = location
+        city = format_city(city, region)
+        if not country and not city:
+            return
+        with self.app.app_context():
+            try:
+                if country:
+                    UserSession.query.filter(
+                        UserSession.id == session_id,
+                        UserSession.country.is_(None)
+                    ).update({'country': country[:50]}, synchronize_session=False)
+                if city:
+                    UserSession.query.filter(
+                        UserSession.id == session_id,
+                        UserSession.city.is_(None)
+                    ).update({'city': city[:50]}, synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                print(f"[GEO] Error backfilling session {session_id}: {e}")
+
+    def _enrichment_worker(self):
+        """Resolve queued IPs (cache first, so one remote call per prefix) and backfill sessions"""
+        while True:
+            try:
+                session_id, ip_address = self._queue.get()
+                try:
+                    key = cache_key(ip_address or '')
+                    if key is not None:
+                        location = self.cache.get(key)
+                        if location is None:
+                            location = self._resolve(ip_address, key)
+                        if self.app is not None:
+                            self._backfill(session_id, location)
+                finally:
+                    with self._pending_lock:
+                        self._pending.discard(session_id)
+                    self._queue.task_done()
+            except Exception as worker_err:
+                print(f"[GEO] Enrichment worker error: {worker_err}")
+                time.sleep(1)
+
+# Global instance
+geo_resolver = GeoResolver()
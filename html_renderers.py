@@ -0,0 +1,847 @@
+"""
+HTML to PDF renderers and the renderer registry used by /convert_html_to_pdf.
+
+Inputs are classified as our own PDF-derived HTML ('pdf_pages': absolutely
+positioned .pdf-page / .page markup produced by the PDF->HTML converters) or
+arbitrary HTML ('generic'). Each renderer declares the fidelity it achieves per
+class; the registry tries renderers best-fidelity-first and, within a fidelity
+tier, fastest-first using measured latency (EWMA) and failure rates. HTML we
+generated ourselves never goes through a full browser.
+"""
+import os
+import re
+import time
+import base64
+import threading
+from html.parser import HTMLParser
+import fitz
+
+# Try to import HTML to PDF conversion libraries
+WEASYPRINT_AVAILABLE = False
+XHTML2PDF_AVAILABLE = False
+PLAYWRIGHT_AVAILABLE = False
+
+# Try WeasyPrint (requires GTK+ on Windows - often problematic)
+try:
+    from weasyprint import HTML, CSS
+    WEASYPRINT_AVAILABLE = True
+    print("[OK] WeasyPrint available")
+except (ImportError, OSError) as e:
+    print(f"[WARN] WeasyPrint not available: {e}")
+
+# Try xhtml2pdf (pure Python, works on Windows)
+try:
+    from xhtml2pdf import pisa
+    XHTML2PDF_AVAILABLE = True
+    print("[OK] xhtml2pdf available")
+except ImportError:
+    print("[WARN] xhtml2pdf not available")
+
+# Try Playwright (browser-based, most accurate but requires browser installation)
+try:
+    from playwright.sync_api import sync_playwright
+    PLAYWRIGHT_AVAILABLE = True
+    print("[OK] Playwright available")
+except ImportError:
+    print("[WARN] Playwright not available")
+
+
+def convert_html_to_pdf_playwright(html_path, output_path):
+    """Convert HTML to PDF using Playwright - most accurate, browser-based rendering (pooled warm browser)"""
+    try:
+        from browser_pool import browser_pool
+
+        # Convert to file:// URL so relative paths (images, CSS, etc.) resolve (Windows compatible)
+        html_file = os.path.abspath(html_path)
+        if os.sep == '\\':
+            file_url = f"file:///{html_file.replace(os.sep, '/')}"
+        else:
+            file_url = f"file://{html_file}"
+        
+        # CSS that removes any transforms/scaling that might affect layout
+        # and ensures pages are visible and properly positioned
+        override_css = """
+            /* Remove all transforms that might affect layout */
+            .pdf-page, .page {
+                transform: none !important;
+                transform-origin: unset !important;
+                margin: 0 !important;
+                padding: 0 !important;
+                display: block !important;
+                visibility: visible !important;
+                opacity: 1 !important;
+                position: relative !important;
+                width: auto !important;
+                height: auto !important;
+            }
+            /* Ensure container doesn't add padding/margins */
+            .pdf-container {
+                padding: 0 !important;
+                margin: 0 !important;
+                width: auto !important;
+                height: auto !important;
+            }
+            /* Ensure body doesn't add spacing */
+            body {
+                margin: 0 !important;
+                padding: 0 !important;
+                width: auto !important;
+                height: auto !important;
+            }
+            /* Ensure absolute positioned elements maintain their positions */
+            .text-span, .editable-text, .editable-image {
+                position: absolute !important;
+            }
+        """
+        
+        def render(browser_page):
+            # Load the HTML file - this preserves all CSS and absolute positioning
+            browser_page.goto(file_url, wait_until="networkidle")
+            browser_page.add_style_tag(content=override_css)
+            # Wait for web fonts instead of a fixed delay
+            browser_page.evaluate("document.fonts.ready.then(() => true)")
+            
+            # Get page information - use data attributes if available, otherwise detect
+            page_info = browser_page.evaluate("""
+                () => {
+                    // Find all page containers
+                    const pageElements = document.querySelectorAll('.pdf-page, .page');
+                    
+                    if (pageElements.length === 0) {
+                        // Single page - use body dimensions
+                        const body = document.body;
+                        const rect = body.getBoundingClientRect();
+                        return {
+                            singlePage: true,
+                            width: Math.max(rect.width, body.scrollWidth, 595),
+                            height: Math.max(rect.height, body.scrollHeight, 842)
+                        };
+                    }
+                    
+                    // Try to get dimensions from data attributes first (most accurate)
+                    const firstPage = pageElements[0];
+                    let width = parseFloat(firstPage.getAttribute('data-width'));
+                    let height = parseFloat(firstPage.getAttribute('data-height'));
+                    
+                    // If data attributes not available, use rendered dimensions
+                    if (!width || !height || isNaN(width) || isNaN(height)) {
+                        const rect = firstPage.getBoundingClientRect();
+                        width = rect.width;
+                        height = rect.height;
+                        
+                        // Get the actual content bounds within the page
+                        const content = firstPage.querySelector('.page-content');
+                        if (content) {
+                            const contentRect = content.getBoundingClientRect();
+                            width = Math.max(contentRect.width, rect.width);
+                            height = Math.max(contentRect.height, rect.height);
+                        }
+                    }
+                    
+                    // Ensure minimum A4 size
+                    width = Math.max(width, 595);
+                    height = Math.max(height, 842);
+                    
+                    return {
+                        singlePage: false,
+                        pageCount: pageElements.length,
+                        width: width,
+                        height: height
+                    };
+                }
+            """)
+            
+            page_width = int(page_info.get('width', 595))
+            page_height = int(page_info.get('height', 842))
+            is_single_page = page_info.get('singlePage', True)
+            page_count = page_info.get('pageCount', 1)
+            
+            print(f"Detected: {page_count} page(s), dimensions: {page_width}x{page_height}px")
+            
+            # Multi-page: one tall page covering every .pdf-page (full document height)
+            total_height = page_height * page_count if (not is_single_page and page_count > 1) else page_height
+            browser_page.pdf(
+                path=output_path,
+                print_background=True,
+                margin={"top": "0", "right": "0", "bottom": "0", "left": "0"},
+                width=f"{page_width}px",
+                height=f"{total_height}px",
+                scale=1.0,
+                prefer_css_page_size=False
+            )
+            return True
+        
+        browser_pool.run(render)
+        
+        # Verify the PDF was created
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            print(f"Successfully converted HTML to PDF using Playwright: {output_path}")
+            print(f"PDF size: {os.path.getsize(output_path)} bytes")
+            return True
+        else:
+            print("Playwright conversion failed: PDF file not created or empty")
+            return False
+            
+    except Exception as e:
+        print(f"Error in Playwright conversion: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def convert_html_to_pdf_xhtml2pdf(html_path, output_path):
+    """Convert HTML to PDF using xhtml2pdf - pure Python, works on Windows"""
+    try:
+        from xhtml2pdf import pisa
+        
+        # Read HTML content
+        with open(html_path, "r", encoding="utf-8") as f:
+            html_content = f.read()
+        
+        # Ensure output directory exists
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+        
+        # Convert HTML to PDF
+        with open(output_path, "wb") as pdf_file:
+            pisa_status = pisa.CreatePDF(
+                html_content,
+                dest=pdf_file,
+                encoding='utf-8'
+            )
+        
+        # Check for errors
+        if pisa_status.err:
+            print(f"xhtml2pdf conversion errors: {pisa_status.err}")
+            return False
+        
+        # Verify the PDF was created
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            print(f"Successfully converted HTML to PDF using xhtml2pdf: {output_path}")
+            return True
+        else:
+            print("xhtml2pdf conversion failed: PDF file not created or empty")
+            return False
+            
+    except Exception as e:
+        print(f"Error in xhtml2pdf conversion: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def convert_html_to_pdf_weasyprint(html_path, output_path):
+    """Convert HTML to PDF using WeasyPrint - best for preserving CSS and layout"""
+    try:
+        # Read HTML content
+        with open(html_path, "r", encoding="utf-8") as f:
+            html_content = f.read()
+        
+        # Get the directory of the HTML file for resolving relative paths (images, CSS, etc.)
+        html_dir = os.path.dirname(os.path.abspath(html_path))
+        # Convert Windows path to file:// URL format
+        if os.sep == '\\':
+            # Fix: Cannot use backslash in f-string expression, so do replace first
+            html_dir_normalized = html_dir.replace('\\', '/')
+            base_url = f"file:///{html_dir_normalized}/"
+        else:
+            base_url = f"file://{html_dir}/"
+        
+        # Ensure output directory exists
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir, exist_ok=True)
+        
+        # Convert HTML to PDF using WeasyPrint
+        # WeasyPrint supports modern CSS features and preserves layout accurately
+        # It handles:
+        # - CSS positioning (absolute, relative, fixed)
+        # - Flexbox and Grid layouts
+        # - Fonts and typography
+        # - Colors and backgrounds
+        # - Images (including base64 encoded)
+        # - Page breaks and pagination
+        
+        html_doc = HTML(
+            string=html_content,
+            base_url=base_url  # Helps resolve relative URLs in HTML (images, CSS files, etc.)
+        )
+        
+        # Write PDF with default settings (good quality)
+        html_doc.write_pdf(
+            output_path,
+            # Optional: You can add stylesheets here if needed
+            # stylesheets=[CSS(string='@page { size: A4; margin: 0; }')]
+        )
+        
+        # Verify the PDF was created
+        if os.path.exists(output_path) and os.path.getsize(output_path) > 0:
+            print(f"Successfully converted HTML to PDF using WeasyPrint: {output_path}")
+            print(f"PDF size: {os.path.getsize(output_path)} bytes")
+            return True
+        else:
+            print("WeasyPrint conversion failed: PDF file not created or empty")
+            return False
+            
+    except Exception as e:
+        print(f"Error in WeasyPrint conversion: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+# Fonts PyMuPDF can draw without embedding, keyed by the font-family our converters emit
+_BASE14_FONTS = {
+    'Arial': 'helv',
+    'Helvetica': 'helv',
+    'Times': 'times',
+    'Times New Roman': 'times',
+    'Courier': 'cour',
+    'Courier New': 'cour',
+    'ArialMT': 'helv',
+}
+_DEFAULT_PAGE_SIZE = (595.0, 842.0)  # A4 in points
+_READ_CHUNK_SIZE = 64 * 1024
+_LENGTH_RE = re.compile(r'^\s*([\d.]+)\s*(pt|px)\s*$', re.IGNORECASE)
+
+
+def _parse_style(style_attr):
+    """Inline style attribute -> {property: value} (lower-cased property names)"""
+    style = {}
+    for declaration in style_attr.split(';'):
+        name, sep, value = declaration.partition(':')
+        if sep:
+            style[name.strip().lower()] = value.strip()
+    return style
+
+
+def _style_length(style, name):
+    """Numeric pt/px length from a parsed style; our converters write coordinates in PDF points"""
+    match = _LENGTH_RE.match(style.get(name, ''))
+    return float(match.group(1)) if match else None
+
+
+class LayoutPage:
+    """Size plus absolutely positioned text spans and images of one page"""
+    __slots__ = ('number', 'width', 'height', 'texts', 'images')
+
+    def __init__(self, number, width, height):
+        self.number = number
+        self.width = width
+        self.height = height
+        self.texts = []   # (left, top, size, font_family, bold, italic, text)
+        self.images = []  # (left, top, width, height, image_bytes)
+
+
+class PageLayoutParser(HTMLParser):
+    """
+    Single-pass layout extractor for HTML produced by our PDF->HTML converters.
+
+    Pages are either <div class="pdf-page" data-width data-height> or
+    <div class="page" style="width: Wpt; min-height: Hpt"> (optionally with a
+    .page-content child carrying the exact height). Absolutely positioned
+    <span>s and data-URI <img>s inside a page are collected, and each page is
+    handed to on_page as soon as its closing </div> is seen, so memory is bounded
+    by the largest page and the work is linear in the document size.
+    Elements outside any page are kept as a single fallback page.
+    """
+
+    def __init__(self, on_page):
+        super().__init__(convert_charrefs=True)
+        self.on_page = on_page
+        self.pages_emitted = 0
+        self.loose = LayoutPage(1, *_DEFAULT_PAGE_SIZE)
+        self._sized_loose = False
+        self._page = None
+        self._div_depth = 0
+        self._page_depth = None
+        self._span = None       # [left, top, size, font, bold, italic, [text parts]]
+        self._span_depth = 0
+
+    # --- page boundaries -------------------------------------------------
+
+    def _open_page(self, width, height):
+        if self._page is not None:
+            self._emit_page()  # unclosed page: the next one starts here
+        self._page = LayoutPage(self.pages_emitted + 1, width, height)
+        self._page_depth = self._div_depth
+
+    def _emit_page(self):
+        page, self._page, self._page_depth = self._page, None, None
+        self._span = None
+        self.pages_emitted += 1
+        self.on_page(page)
+
+    def _target(self):
+        return self._page if self._page is not None else self.loose
+
+    def _page_for_div(self, attrs):
+        """(width, height) if this div starts a page, else None"""
+        classes = (attrs.get('class') or '').split()
+        if 'pdf-page' in classes and attrs.get('data-width') and attrs.get('data-height'):
+            try:
+                return float(attrs['data-width']), float(attrs['data-height'])
+            except ValueError:
+                return None
+        if 'page' in classes:
+            style = _parse_style(attrs.get('style') or '')
+            if style.get('width', '').endswith('pt'):
+                width = _style_length(style, 'width')
+                height = _style_length(style, 'min-height') or _DEFAULT_PAGE_SIZE[1]
+                if width:
+                    return width, height
+        return None
+
+    # --- tokenizer callbacks ---------------------------------------------
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'div':
+            attrs = dict(attrs)
+            self._div_depth += 1
+            size = self._page_for_div(attrs)
+            if size:
+                self._open_page(*size)
+            elif self._page is not None and 'page-content' in (attrs.get('class') or '').split():
+                height = _style_length(_parse_style(attrs.get('style') or ''), 'height')
+                if height:
+                    self._page.height = height
+            elif self._page is None and not self._sized_loose and attrs.get('data-width'):
+                try:
+                    self.loose.width = float(attrs['data-width'])
+                    self.loose.height = float(attrs.get('data-height') or self.loose.height)
+                    self._sized_loose = True
+                except ValueError:
+                    pass
+        elif tag == 'span':
+            if self._span is not None:
+                self._span_depth += 1
+                return
+            style_attr = dict(attrs).get('style') or ''
+            style = _parse_style(style_attr)
+            if style.get('position', '').lower() != 'absolute':
+                return
+            left = _style_length(style, 'left')
+            top = _style_length(style, 'top')
+            size = _style_length(style, 'font-size')
+            if left is None or top is None or size is None:
+                return
+            weight = style.get('font-weight', '').lower()
+            self._span = [
+                left, top, size,
+                style.get('font-family', 'Arial').strip("'\"") or 'Arial',
+                weight in ('bold', 'bolder', '700', '800', '900'),
+                style.get('font-style', '').lower() == 'italic',
+                []
+            ]
+            self._span_depth = 0
+        elif tag == 'img':
+            self._handle_img(dict(attrs))
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == 'img':
+            self._handle_img(dict(attrs))
+        elif tag != 'div':
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag == 'span' and self._span is not None:
+            if self._span_depth:
+                self._span_depth -= 1
+                return
+            left, top, size, font, bold, italic, parts = self._span
+            self._span = None
+            text = ''.join(parts).replace('\xa0', ' ').strip()
+            if text:
+                self._target().texts.append((left, top, size, font, bold, italic, text))
+        elif tag == 'div' and self._div_depth:
+            if self._page is not None and self._div_depth == self._page_depth:
+                self._emit_page()
+            self._div_depth -= 1
+
+    def handle_data(self, data):
+        if self._span is not None:
+            self._span[6].append(data)
+
+    def _handle_img(self, attrs):
+        src = attrs.get('src') or ''
+        if not src.startswith('data:image/') or ';base64,' not in src:
+            return
+        style = _parse_style(attrs.get('style') or '')
+        if style.get('position', '').lower() != 'absolute':
+            return
+        box = [_style_length(style, name) for name in ('left', 'top', 'width', 'height')]
+        if None in box:
+            print(f"Warning: Image missing required style attributes. Style: {(attrs.get('style') or '')[:100]}")
+            return
+        try:
+            image_bytes = base64.b64decode(src.split(';base64,', 1)[1])
+        except (ValueError, TypeError) as e:
+            print(f"Error decoding image at ({box[0]}, {box[1]}): {e}")
+            return
+        self._target().images.append((*box, image_bytes))
+
+    def close(self):
+        super().close()
+        if self._page is not None:
+            self._emit_page()
+
+
+def _draw_layout_page(doc, layout):
+    """Create a PDF page for a LayoutPage and draw its text and images; returns elements drawn"""
+    page = doc.new_page(width=layout.width, height=layout.height)
+    elements_added = 0
+
+    for left, top, size, font_family, bold, italic, text in layout.texts:
+        font_name = font_family.split(',')[0].strip().strip("'\"")
+        # Base-14 fonts only: bold/italic variants are not embedded, so the regular face is used
+        pdf_font = _BASE14_FONTS.get(font_name, 'helv')
+        try:
+            page.insert_text(fitz.Point(left, top), text, fontsize=size, fontname=pdf_font, render_mode=0)
+            elements_added += 1
+        except Exception as e:
+            print(f"Warning: Could not insert text with font {pdf_font}, trying default: {e}")
+            try:
+                page.insert_text(fitz.Point(left, top), text, fontsize=size, fontname='helv', render_mode=0)
+                elements_added += 1
+            except Exception as e2:
+                print(f"Error inserting text even with default font: {e2}")
+
+    for left, top, width, height, image_bytes in layout.images:
+        try:
+            page.insert_image(fitz.Rect(left, top, left + width, top + height), stream=image_bytes, keep_proportion=False)
+            elements_added += 1
+        except Exception as e:
+            print(f"Error adding image at ({left}, {top}): {e}")
+
+    if elements_added == 0 and (layout.texts or layout.images):
+        print(f"[WARN] No elements could be drawn on page {layout.number} "
+              f"(text spans: {len(layout.texts)}, images: {len(layout.images)})")
+    return elements_added
+
+
+def extract_page_layouts(html_source, on_page):
+    """
+    Stream HTML (a path or an iterable of str chunks) through PageLayoutParser.
+
+    Returns:
+        The parser (pages_emitted, and loose elements when no page markup was found)
+    """
+    parser = PageLayoutParser(on_page)
+    if isinstance(html_source, str):
+        with open(html_source, "r", encoding="utf-8") as f:
+            for chunk in iter(lambda: f.read(_READ_CHUNK_SIZE), ''):
+                parser.feed(chunk)
+    else:
+        for chunk in html_source:
+            parser.feed(chunk)
+    parser.close()
+    return parser
+
+
+def convert_html_to_pdf_pymupdf_step_by_step(html_path, output_path):
+    """
+    Convert HTML to PDF by parsing the HTML structure and recreating the PDF page by page.
+    This method extracts absolute positioned elements and places them exactly where they were.
+    This is the most accurate method for HTML generated from PDF using PyMuPDF.
+
+    The HTML is tokenized in a single streaming pass (PageLayoutParser) and each page
+    is drawn into the output document as soon as it has been read.
+    """
+    try:
+        doc = fitz.open()
+        totals = {'text': 0, 'images': 0, 'drawn': 0}
+
+        def on_page(layout):
+            totals['text'] += len(layout.texts)
+            totals['images'] += len(layout.images)
+            totals['drawn'] += _draw_layout_page(doc, layout)
+
+        parser = extract_page_layouts(html_path, on_page)
+        print(f"Found {parser.pages_emitted} pages in HTML")
+
+        if not parser.pages_emitted:
+            print("No pages found in HTML, trying single page approach")
+            on_page(parser.loose)
+
+        if totals['drawn'] == 0:
+            doc.close()
+            print(f"Step-by-step conversion failed: no text or images found "
+                  f"(text spans: {totals['text']}, images: {totals['images']})")
+            return False
+
+        page_count = len(doc)
+        doc.save(output_path)
+        doc.close()
+
+        if not os.path.exists(output_path):
+            print("Step-by-step conversion failed: PDF file not created")
+            return False
+
+        pdf_size = os.path.getsize(output_path)
+        if pdf_size < 1000:  # PDF should be at least 1KB
+            print(f"Step-by-step conversion failed: PDF file is too small ({pdf_size} bytes)")
+            return False
+
+        print(f"[OK] Successfully converted HTML to PDF using step-by-step method: {output_path}")
+        print(f"PDF size: {pdf_size} bytes, {page_count} pages, {totals['text']} text spans, {totals['images']} images")
+        return True
+
+    except Exception as e:
+        print(f"Error in step-by-step conversion: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+def convert_html_to_pdf_pymupdf(html_path, output_path):
+    """Convert HTML to PDF using PyMuPDF"""
+    try:
+        # Read HTML content
+        with open(html_path, "r", encoding="utf-8") as f:
+            html_content = f.read()
+        
+        # Create a new PDF document
+        doc = fitz.open()
+        
+        # Create a page (A4 size: 595 x 842 points)
+        page = doc.new_page(width=595, height=842)
+        rect = page.rect
+        
+        # Use PyMuPDF's insert_htmlbox to render HTML
+        # This method renders HTML content into the PDF
+        try:
+            # Insert HTML content into the page
+            # insert_htmlbox renders HTML with CSS support
+            # Parameters: rect, text (HTML content), css (optional)
+            page.insert_htmlbox(
+                rect,  # Rectangle to fill
+                html_content,  # HTML content (parameter name is 'text' but accepts HTML)
+                css=""  # Additional CSS if needed
+            )
+            
+        except Exception as e:
+            print(f"Warning: insert_htmlbox failed, trying alternative: {e}")
+            # Fallback: Try with file path instead
+            try:
+                # Convert to absolute path for file:// URL
+                abs_html_path = os.path.abspath(html_path)
+                file_url = f"file:///{abs_html_path.replace(os.sep, '/')}"
+                
+                # Try rendering from file URL
+                page.insert_htmlbox(rect, file_url)
+                
+            except Exception as e2:
+                print(f"Warning: File URL method failed, using text extraction: {e2}")
+                # Last resort: Extract text and add as plain text
+                import re
+                from html import unescape
+                # Remove HTML tags and decode entities
+                text_content = re.sub(r'<[^>]+>', ' ', html_content)
+                text_content = unescape(text_content)
+                # Clean up whitespace
+                text_content = ' '.join(text_content.split())
+                
+                # Insert text with basic formatting
+                if text_content:
+                    page.insert_text((50, 50), text_content[:10000], fontsize=11)
+                else:
+                    print("ERROR: No text content extracted from HTML")
+                    return False
+        
+        # Save PDF
+        doc.save(output_path)
+        doc.close()
+        
+        return True
+        
+    except Exception as e:
+        print(f"ERROR in HTML to PDF conversion: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Renderer registry
+# ---------------------------------------------------------------------------
+
+HTML_CLASS_PDF_PAGES = 'pdf_pages'
+HTML_CLASS_GENERIC = 'generic'
+
+# Fidelity tiers (lower is better)
+FIDELITY_EXACT = 0       # reproduces the source layout exactly
+FIDELITY_HIGH = 1        # full CSS layout engine
+FIDELITY_BASIC = 2       # limited CSS (no flex/grid/absolute layout)
+FIDELITY_LAST_RESORT = 3
+
+_PDF_PAGE_RE = re.compile(r'<div[^>]*class="[^"]*\bpdf-page\b[^"]*"[^>]*data-width=', re.IGNORECASE)
+_PAGE_CONTENT_RE = re.compile(r'<div[^>]*class="[^"]*\bpage-content\b[^"]*"[^>]*style="[^"]*height:\s*[\d.]+pt', re.IGNORECASE)
+_ABSOLUTE_RE = re.compile(r'style="[^"]*position:\s*absolute', re.IGNORECASE)
+
+
+def classify_html(html_content):
+    """'pdf_pages' for HTML produced by our PDF->HTML converters, otherwise 'generic'"""
+    if _PDF_PAGE_RE.search(html_content):
+        return HTML_CLASS_PDF_PAGES
+    if _PAGE_CONTENT_RE.search(html_content) and _ABSOLUTE_RE.search(html_content):
+        return HTML_CLASS_PDF_PAGES
+    return HTML_CLASS_GENERIC
+
+
+class Renderer:
+    """A converter(html_path, output_path) -> bool with per-class fidelity"""
+
+    def __init__(self, name, convert, fidelity, expected_ms=500, available=True, uses_browser=False):
+        self.name = name
+        self.convert = convert
+        self.fidelity = dict(fidelity)  # html class -> fidelity tier; classes not listed are not eligible
+        self.expected_ms = expected_ms  # latency prior until measurements exist
+        self.available = available
+        self.uses_browser = uses_browser
+
+
+class RendererStats:
+    """Latency/failure counters for one (renderer, html class)"""
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, expected_ms):
+        self.calls = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self.ewma_ms = float(expected_ms)
+        self.last_error = None
+
+    def record(self, elapsed_ms, ok, error=None):
+        self.calls += 1
+        self.total_ms += elapsed_ms
+        self.ewma_ms += self.EWMA_ALPHA * (elapsed_ms - self.ewma_ms)
+        if not ok:
+            self.failures += 1
+            self.last_error = error
+
+    @property
+    def failure_rate(self):
+        return self.failures / self.calls if self.calls else 0.0
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'failures': self.failures,
+            'failure_rate': round(self.failure_rate, 3),
+            'avg_ms': round(self.total_ms / self.calls, 1) if self.calls else None,
+            'ewma_ms': round(self.ewma_ms, 1),
+            'last_error': self.last_error
+        }
+
+
+class RendererRegistry:
+    """Pluggable HTML->PDF renderers with classification, selection and stats"""
+    MIN_CALLS_FOR_DEMOTION = 5
+    DEMOTION_FAILURE_RATE = 0.5
+
+    def __init__(self):
+        self._renderers = []
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, convert, fidelity, expected_ms=500, available=True, uses_browser=False):
+        """Add (or replace) a renderer"""
+        renderer = Renderer(name, convert, fidelity, expected_ms, available, uses_browser)
+        with self._lock:
+            self._renderers = [r for r in self._renderers if r.name != name] + [renderer]
+        return renderer
+
+    def get(self, name):
+        return next((r for r in self._renderers if r.name == name), None)
+
+    def _stats_for(self, renderer, html_class):
+        key = (renderer.name, html_class)
+        if key not in self._stats:
+            self._stats[key] = RendererStats(renderer.expected_ms)
+        return self._stats[key]
+
+    def candidates(self, html_class):
+        """
+        Eligible renderers for a class in the order they should be tried:
+        fidelity tier, then renderers that keep failing last, then fastest first.
+        """
+        with self._lock:
+            eligible = [
+                r for r in self._renderers
+                if r.available and html_class in r.fidelity
+                and not (html_class == HTML_CLASS_PDF_PAGES and r.uses_browser)
+            ]
+
+            def sort_key(renderer):
+                stats = self._stats_for(renderer, html_class)
+                unreliable = (stats.calls >= self.MIN_CALLS_FOR_DEMOTION
+                              and stats.failure_rate > self.DEMOTION_FAILURE_RATE)
+                return (renderer.fidelity[html_class], unreliable, stats.ewma_ms)
+
+            return sorted(eligible, key=sort_key)
+
+    def record(self, renderer, html_class, elapsed_ms, ok, error=None):
+        with self._lock:
+            self._stats_for(renderer, html_class).record(elapsed_ms, ok, error)
+
+    def render(self, html_path, output_path, html_content=None):
+        """
+        Convert html_path to output_path with the best available renderer.
+
+        Returns:
+            (success, renderer_name, html_class)
+        """
+        if html_content is None:
+            with open(html_path, "r", encoding="utf-8") as f:
+                html_content = f.read()
+        html_class = classify_html(html_content)
+
+        for renderer in self.candidates(html_class):
+            start = time.perf_counter()
+            error = None
+            try:
+                ok = bool(renderer.convert(html_path, output_path))
+            except Exception as e:
+                ok = False
+                error = str(e)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.record(renderer, html_class, elapsed_ms, ok, error)
+            print(f"{'[OK]' if ok else '[WARN]'} [RENDERER] {renderer.name} ({html_class}): "
+                  f"{'ok' if ok else 'failed'} in {elapsed_ms:.0f}ms")
+            if ok:
+                return True, renderer.name, html_class
+        return False, None, html_class
+
+    def stats(self):
+        """Per-renderer, per-class counters"""
+        with self._lock:
+            return {
+                f"{name}/{html_class}": stats.to_dict()
+                for (name, html_class), stats in sorted(self._stats.items())
+                if stats.calls
+            }
+
+
+renderer_registry = RendererRegistry()
+renderer_registry.register(
+    'pymupdf_step_by_step', convert_html_to_pdf_pymupdf_step_by_step,
+    {HTML_CLASS_PDF_PAGES: FIDELITY_EXACT}, expected_ms=50
+)
+renderer_registry.register(
+    'weasyprint', convert_html_to_pdf_weasyprint,
+    {HTML_CLASS_PDF_PAGES: FIDELITY_HIGH, HTML_CLASS_GENERIC: FIDELITY_HIGH},
+    expected_ms=400, available=WEASYPRINT_AVAILABLE
+)
+renderer_registry.register(
+    'playwright', convert_html_to_pdf_playwright,
+    {HTML_CLASS_GENERIC: FIDELITY_HIGH},
+    expected_ms=800, available=PLAYWRIGHT_AVAILABLE, uses_browser=True
+)
+renderer_registry.register(
+    'xhtml2pdf', convert_html_to_pdf_xhtml2pdf,
+    {HTML_CLASS_GENERIC: FIDELITY_BASIC},
+    expected_ms=150, available=XHTML2PDF_AVAILABLE
+)
+renderer_registry.register(
+    'pymupdf_htmlbox', convert_html_to_pdf_pymupdf,
+    {HTML_CLASS_PDF_PAGES: FIDELITY_LAST_RESORT, HTML_CLASS_GENERIC: FIDELITY_LAST_RESORT},
+    expected_ms=100
+)
@@ -0,0 +1,237 @@
+"""
+In-process invoice/subscription PDF renderer.
+Templates are compiled once, the logo is read once from the bundled asset (or
+fetched once and cached there) and inlined as a data URI, and HTML is
+converted to PDF in memory with xhtml2pdf (PyMuPDF Story as a fallback, or the
+shared browser pool first when INVOICE_PDF_ENGINE=browser) - no HTTP round
+trip through the public site per render.
+Rendered PDFs are memoized by invoice id.
+"""
+import os
+import io
+import re
+import base64
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from jinja2 import Environment, FileSystemLoader
+
+try:
+    from xhtml2pdf import pisa
+    XHTML2PDF_AVAILABLE = True
+except ImportError:
+    XHTML2PDF_AVAILABLE = False
+
+TEMPLATES_ROOT = Path(__file__).parent / 'templates'
+LOGO_URL = 'https://www.trevnoctilla.com/logo.png'
+# Bundled asset (override with INVOICE_LOGO_PATH). Until the PNG is committed it is fetched once from
+# LOGO_URL and saved here, so later processes and renders read it from disk
+LOGO_PATH = os.getenv('INVOICE_LOGO_PATH', str(TEMPLATES_ROOT / 'emails' / 'assets' / 'logo.png'))
+LOGO_FETCH_TIMEOUT = float(os.getenv('INVOICE_LOGO_FETCH_TIMEOUT', '5'))
+LOGO_RETRY_SECONDS = int(os.getenv('INVOICE_LOGO_RETRY_SECONDS', '300'))
+PDF_CACHE_SIZE = int(os.getenv('INVOICE_PDF_CACHE_SIZE', '256'))
+# 'browser' renders on the shared warm Chromium pool first (browser_pool.py)
+PDF_ENGINE = os.getenv('INVOICE_PDF_ENGINE', '').lower()
+
+# Templates ship with the image, so compiled templates are kept for the process lifetime
+# (no per-render mtime checks). templates/emails first, then templates/ (subscription-invoice.html).
+_env = Environment(
+    loader=FileSystemLoader([str(TEMPLATES_ROOT / 'emails'), str(TEMPLATES_ROOT)]),
+    auto_reload=False,
+    cache_size=-1
+)
+
+_LOGO_IMG_RE = re.compile(r'<img\b[^>]*' + re.escape(LOGO_URL) + r'[^>]*>', re.IGNORECASE)
+_logo_lock = threading.Lock()
+_logo = {}
+
+
+def get_template(name):
+    """Compiled template ('emails/' prefix optional)"""
+    if name.startswith('emails/'):
+        name = name[len('emails/'):]
+    return _env.get_template(name)
+
+
+def _fetch_logo():
+    """Download the site logo (PNG bytes); raises on any failure"""
+    import requests
+    response = requests.get(LOGO_URL, timeout=LOGO_FETCH_TIMEOUT)
+    response.raise_for_status()
+    if not response.content.startswith(b'\x89PNG'):
+        raise ValueError(f'{LOGO_URL} did not return a PNG')
+    return response.content
+
+
+def _save_logo(data):
+    """Cache a fetched logo at LOGO_PATH (atomic rename); a read-only image just keeps it in memory"""
+    tmp = f'{LOGO_PATH}.{os.getpid()}.tmp'
+    try:
+        os.makedirs(os.path.dirname(LOGO_PATH), exist_ok=True)
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, LOGO_PATH)
+    except OSError as e:
+        print(f"[WARN] [INVOICE] Could not cache logo at {LOGO_PATH}: {e}")
+
+
+def _load_logo():
+    try:
+        with open(LOGO_PATH, 'rb') as f:
+            return f.read()
+    except OSError:
+        pass
+    try:
+        data = _fetch_logo()
+    except Exception as e:
+        print(f"[WARN] [INVOICE] Logo asset not found at {LOGO_PATH} and fetch failed ({e}), rendering without logo")
+        return None
+    _save_logo(data)
+    return data
+
+
+def logo_data_uri():
+    """
+    Logo as a data URI: read once from the bundled asset, else fetched once
+    and cached (see LOGO_PATH). None while unavailable; a failed fetch is
+    retried after LOGO_RETRY_SECONDS, never on every render.
+    """
+    if _logo.get('uri') or time.monotonic() < _logo.get('retry_at', 0):
+        return _logo.get('uri')
+    with _logo_lock:
+        if not _logo.get('uri') and time.monotonic() >= _logo.get('retry_at', 0):
+            data = _load_logo()
+            _logo['uri'] = f"data:image/png;base64,{base64.b64encode(data).decode('ascii')}" if data else None
+            _logo['retry_at'] = time.monotonic() + LOGO_RETRY_SECONDS
+    return _logo['uri']
+
+
+def inline_logo(html):
+    """Point logo <img> tags at the cached logo; drop them while it is unavailable (the PDF engine never fetches it)"""
+    uri = logo_data_uri()
+    if uri:
+        return html.replace(LOGO_URL, uri)
+    return _LOGO_IMG_RE.sub('', html)
+
+
+def invoice_number(prefix, date_obj, reference=''):
+    """
+    Invoice/subscription number. Stable for a given (date, payment reference) so the
+    same invoice always gets the same id; random when there is no reference.
+    """
+    if reference:
+        suffix = hashlib.sha1(reference.encode('utf-8')).hexdigest()[:8].upper()
+    else:
+        import uuid
+        suffix = str(uuid.uuid4())[:8].upper()
+    return f"{prefix}-{date_obj.strftime('%Y%m%d')}-{suffix}"
+
+
+def _pdf_xhtml2pdf(html):
+    buffer = io.BytesIO()
+    result = pisa.CreatePDF(html, dest=buffer, encoding='utf-8')
+    if result.err:
+        print(f"[WARN] [INVOICE] xhtml2pdf reported {result.err} error(s)")
+        return None
+    return buffer.getvalue()
+
+
+def _pdf_pymupdf(html):
+    import fitz
+    buffer = io.BytesIO()
+    story = fitz.Story(html=html)
+    writer = fitz.DocumentWriter(buffer)
+    mediabox = fitz.paper_rect('a4')
+    where = mediabox + (36, 36, -36, -36)
+    more = 1
+    while more:
+        device = writer.begin_page(mediabox)
+        more, _ = story.place(where)
+        story.draw(device)
+        writer.end_page()
+    writer.close()
+    return buffer.getvalue()
+
+
+def _pdf_browser(html):
+    from browser_pool import browser_pool
+    return browser_pool.html_to_pdf(html, pdf_options={'format': 'A4'}, timeout=30)
+
+
+def html_to_pdf(html):
+    """Convert HTML to PDF bytes in memory; None if every engine fails"""
+    engines = [('browser', _pdf_browser)] if PDF_ENGINE == 'browser' else []
+    if XHTML2PDF_AVAILABLE:
+        engines.append(('xhtml2pdf', _pdf_xhtml2pdf))
+    engines.append(('pymupdf', _pdf_pymupdf))
+    for name, engine in engines:
+        try:
+            pdf = engine(html)
+            if pdf:
+                return pdf
+        except Exception as e:
+            print(f"[WARN] [INVOICE] {name} conversion error: {e}")
+    return None
+
+
+class PDFCache:
+    """Thread-safe LRU of rendered PDFs"""
+
+    def __init__(self, max_size=PDF_CACHE_SIZE):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            pdf = self._data.get(key)
+            if pdf is not None:
+                self._data.move_to_end(key)
+            return pdf
+
+    def set(self, key, pdf):
+        with self._lock:
+            self._data[key] = pdf
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+pdf_cache = PDFCache()
+
+
+def render_pdf(template_name, context, invoice_id=None):
+    """
+    Render a template to PDF bytes.
+
+    Args:
+        template_name: Template file name ('emails/' prefix optional)
+        context: Template variables
+        invoice_id: Stable invoice/subscription id; when given the PDF is memoized
+                    (keyed by id and rendered HTML, so changed details re-render)
+
+    Returns:
+        PDF bytes, or None if conversion failed
+    """
+    html = inline_logo(get_template(template_name).render(**context))
+    key = None
+    if invoice_id:
+        key = (invoice_id, hashlib.sha1(html.encode('utf-8')).hexdigest())
+        cached = pdf_cache.get(key)
+        if cached is not None:
+            print(f"[OK] [INVOICE] {invoice_id} served from cache ({len(cached)} bytes)")
+            return cached
+
+    pdf = html_to_pdf(html)
+    if pdf and key:
+        pdf_cache.set(key, pdf)
+    return pdf
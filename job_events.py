@@ -0,0 +1,263 @@
+"""
+Server-push job progress events.
+
+Task workers publish job/conversion progress with publish_event(); any web
+worker relays them to clients as Server-Sent Events (sse_stream()), so
+clients no longer poll /api/v1/jobs/<id>/status or /conversion_progress.
+
+Transport is Redis:
+- every stream has a sequence counter; each event gets the next id
+- the last EVENT_LOG_SIZE events are kept in a capped list (for resume)
+- the event is PUBLISHed on the stream's channel for live subscribers
+
+A client reconnecting with Last-Event-ID (header or ?last_event_id=) first
+gets the logged events after that id, then live events. Without Redis an
+in-process broker is used, which only relays events published in the same
+process.
+"""
+import os
+import json
+import time
+import threading
+from collections import defaultdict, deque
+
+EVENT_LOG_SIZE = int(os.getenv('JOB_EVENT_LOG_SIZE', '100'))
+EVENT_TTL_SECONDS = int(os.getenv('JOB_EVENT_TTL_SECONDS', str(6 * 3600)))
+KEEPALIVE_SECONDS = 15
+STREAM_TIMEOUT_SECONDS = 30 * 60
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled', 'error')
+
+
+def stream_key(kind, name):
+    """Stream name for a job ('job', job_id) or a conversion ('conversion', filename)"""
+    return f'{kind}:{name}'
+
+
+class RedisEventBroker:
+    """Sequence counter + capped log + pub/sub channel per stream"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def publish(self, stream, event_type, data):
+        event_id = self.client.incr(f'job_events:{stream}:seq')
+        event = json.dumps({'id': event_id, 'event': event_type, 'data': data}, default=str)
+        log_key = f'job_events:{stream}:log'
+        pipe = self.client.pipeline()
+        pipe.rpush(log_key, event)
+        pipe.ltrim(log_key, -EVENT_LOG_SIZE, -1)
+        pipe.expire(log_key, EVENT_TTL_SECONDS)
+        pipe.expire(f'job_events:{stream}:seq', EVENT_TTL_SECONDS)
+        pipe.publish(f'job_events:{stream}', event)
+        pipe.execute()
+        return event_id
+
+    def history(self, stream, after_id=0):
+        events = [json.loads(raw) for raw in self.client.lrange(f'job_events:{stream}:log', 0, -1)]
+        return [event for event in events if event['id'] > after_id]
+
+    def subscribe(self, stream):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(f'job_events:{stream}')
+        return RedisSubscription(pubsub)
+
+
+class RedisSubscription:
+    def __init__(self, pubsub):
+        self.pubsub = pubsub
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        if message and message.get('type') == 'message':
+            return json.loads(message['data'])
+        return None
+
+    def close(self):
+        try:
+            self.pubsub.close()
+        except Exception:
+            pass
+
+
+class MemoryEventBroker:
+    """Single-process fallback with the same interface as RedisEventBroker"""
+
+    def __init__(self):
+        self._lock = threading.Condition()
+        self._seq = defaultdict(int)
+        self._log = defaultdict(lambda: deque(maxlen=EVENT_LOG_SIZE))
+
+    def publish(self, stream, event_type, data):
+        with self._lock:
+            self._seq[stream] += 1
+            event = {'id': self._seq[stream], 'event': event_type, 'data': data}
+            self._log[stream].append(event)
+            self._lock.notify_all()
+        return event['id']
+
+    def history(self, stream, after_id=0):
+        with self._lock:
+            return [event for event in self._log[stream] if event['id'] > after_id]
+
+    def subscribe(self, stream):
+        return MemorySubscription(self, stream)
+
+
+class MemorySubscription:
+    def __init__(self, broker, stream):
+        self.broker = broker
+        self.stream = stream
+        with broker._lock:
+            self.last_id = broker._seq[stream]
+
+    def get(self, timeout):
+        broker = self.broker
+        with broker._lock:
+            if broker._seq[self.stream] <= self.last_id:
+                broker._lock.wait(timeout)
+            for event in broker._log[self.stream]:
+                if event['id'] > self.last_id:
+                    self.last_id = event['id']
+                    return event
+        return None
+
+    def close(self):
+        pass
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """Redis broker when REDIS_URL is reachable, otherwise the in-process one"""
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                try:
+                    import redis
+                    client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), decode_responses=True)
+                    client.ping()
+                    _broker = RedisEventBroker(client)
+                except Exception as e:
+                    print(f"[WARN] [JOB EVENTS] Redis unavailable ({e}), using in-process events")
+                    _broker = MemoryEventBroker()
+    return _broker
+
+
+def publish_event(kind, name, data, event_type='progress'):
+    """Publish an event; never raises (progress must not break the job)"""
+    try:
+        return get_broker().publish(stream_key(kind, name), event_type, data)
+    except Exception as e:
+        print(f"[WARN] [JOB EVENTS] Could not publish {kind} {name}: {e}")
+        return None
+
+
+def _format_sse(event):
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], default=str)}\n\n"
+
+
+def _is_terminal(event):
+    data = event.get('data')
+    return isinstance(data, dict) and data.get('status') in TERMINAL_STATUSES
+
+
+def sse_stream(kind, name, last_event_id=0, snapshot=None, timeout=STREAM_TIMEOUT_SECONDS, broker=None):
+    """
+    Generator of SSE frames for one stream.
+
+    Args:
+        kind, name: Stream (see stream_key)
+        last_event_id: Resume point; logged events after it are replayed first
+        snapshot: Current state sent as an initial 'snapshot' event (id 0) when
+            there is nothing to replay, e.g. Job.to_dict()
+        timeout: Close the stream after this many seconds
+
+    The stream ends after an event whose status is terminal.
+    """
+    broker = broker or get_broker()
+    stream = stream_key(kind, name)
+    # Subscribe before reading the log so nothing published in between is lost
+    subscription = broker.subscribe(stream)
+    try:
+        yield "retry: 3000\n\n"
+        sent = last_event_id
+        backlog = broker.history(stream, last_event_id)
+        if not backlog and snapshot is not None:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot, default=str)}\n\n"
+            if isinstance(snapshot, dict) and snapshot.get('status') in TERMINAL_STATUSES:
+                return
+        for event in backlog:
+            sent = event['id']
+            yield _format_sse(event)
+            if _is_terminal(event):
+                return
+
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            event = subscription.get(KEEPALIVE_SECONDS)
+            if event is None:
+                yield ": keepalive\n\n"
+                continue
+            if event['id'] <= sent:
+                continue
+            sent = event['id']
+            yield _format_sse(event)
+            if _is_terminal(event):
+                return
+    finally:
+        subscription.close()
+
+
+def last_event_id_from(request):
+    """Last-Event-ID header (set by EventSource on reconnect) or ?last_event_id="""
+    raw = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+    try:
+        return max(int(raw), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def sse_response(generator):
+    """Flask streaming response for an sse_stream() generator"""
+    from flask import Response, stream_with_context
+    return Response(
+        stream_with_context(generator),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+class ProgressRegistry(dict):
+    """
+    conversion_progress store that publishes each assignment as a 'conversion'
+    event. Nested updates must go through update_fields() to be published.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._aliases = {}
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        publish_event('conversion', key, value)
+
+    def update_fields(self, key, **fields):
+        entry = dict(self.get(key) or {})
+        entry.update(fields)
+        self[key] = entry
+
+    def resolve(self, name):
+        """Stored key for a filename: exact, remembered alias, then one partial-match scan"""
+        if name in self:
+            return name
+        key = self._aliases.get(name)
+        if key in self:
+            return key
+        for key in list(self.keys()):
+            if name in key or key in name:
+                self._aliases[name] = key
+                return key
+        return None
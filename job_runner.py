@@ -0,0 +1,255 @@
+"""
+Shared lifecycle for conversion jobs run on Celery.
+
+Every conversion task (tasks.py) is a JobTask routed to one of the conversion
+queues (celery_app.TASK_QUEUES) and runs its work through run_job():
+
+- results are stored by content hash (input bytes + parameters), written to a
+  temporary file and moved into place, so a retried or redelivered task reuses
+  the finished result instead of converting again
+- the input file is only deleted once the job reaches a terminal state, so
+  retries still have it
+- Job status transitions are buffered and written in batches; terminal
+  transitions are flushed before the task returns
+- every transition is pushed to /api/v1/jobs/<id>/events (job_events);
+  completed/failed also trigger the API key's webhooks
+
+    from job_runner import enqueue_job
+    from tasks import convert_video_async
+    enqueue_job(convert_video_async, job.job_id, input_path, 'mp4', 80, 'medium')
+"""
+import os
+import json
+import shutil
+import hashlib
+import threading
+from datetime import datetime
+from celery import Task
+from flask import current_app, has_app_context
+from sqlalchemy import update, bindparam
+
+STATUS_FLUSH_INTERVAL = float(os.getenv('JOB_STATUS_FLUSH_INTERVAL', '2'))
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class JobFailed(Exception):
+    """Permanent job failure (bad input, unsupported operation) - not retried"""
+
+
+def _flask_app():
+    from app import app
+    return app
+
+
+class JobTask(Task):
+    """
+    Base class for conversion tasks: runs inside a Flask app context, is only
+    acknowledged once it finishes (a worker killed mid-job - e.g. by a deploy -
+    has the job redelivered) and retries transient failures.
+    """
+    abstract = True
+    acks_late = True
+    reject_on_worker_lost = True
+    max_retries = 3
+    default_retry_delay = 60
+
+    def __call__(self, *args, **kwargs):
+        if has_app_context():
+            return super().__call__(*args, **kwargs)
+        with _flask_app().app_context():
+            return super().__call__(*args, **kwargs)
+
+
+def enqueue_job(task, *args, **kwargs):
+    """Queue a job task on its conversion queue (see celery_app.TASK_QUEUES); returns the AsyncResult"""
+    return task.apply_async(args=args, kwargs=kwargs)
+
+
+class JobStatusBatcher:
+    """
+    Buffers Job column updates per job_id and writes them with one executemany
+    UPDATE per flush. Non-terminal updates (e.g. 'processing') are flushed by a
+    timer after STATUS_FLUSH_INTERVAL, so short jobs write a single row update.
+    """
+
+    def __init__(self, flush_interval=STATUS_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        self._app = None
+
+    def update(self, job_id, flush=False, **fields):
+        """Record column updates for a job; flush=True writes everything pending now"""
+        with self._lock:
+            self._pending.setdefault(job_id, {}).update(fields)
+            if has_app_context():
+                self._app = current_app._get_current_object()
+        if flush:
+            return self.flush()
+        self._schedule()
+        return 0
+
+    def _schedule(self):
+        with self._lock:
+            if self._timer is not None or self.flush_interval <= 0:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._flush_from_timer)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_from_timer(self):
+        app = self._app
+        try:
+            if app is None:
+                return
+            with app.app_context():
+                self.flush()
+        except Exception as e:
+            print(f"[WARN] [JOBS] Status flush failed: {e}")
+
+    def flush(self):
+        """Write all pending updates; returns the number of jobs updated"""
+        from database import db
+        from models import Job
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        # One executemany per distinct set of columns
+        groups = {}
+        for job_id, fields in pending.items():
+            groups.setdefault(tuple(sorted(fields)), []).append(dict(fields, _job_id=job_id))
+        table = Job.__table__
+        try:
+            for columns, rows in groups.items():
+                statement = update(table).where(table.c.job_id == bindparam('_job_id')).values(
+                    {column: bindparam(column) for column in columns}
+                )
+                db.session.execute(statement, rows)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            with self._lock:
+                for job_id, fields in pending.items():
+                    self._pending[job_id] = dict(fields, **self._pending.get(job_id, {}))
+            raise
+        return len(pending)
+
+
+status_batcher = JobStatusBatcher()
+
+
+def content_hash(input_path, params):
+    """sha256 over the input bytes and the conversion parameters"""
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def result_path(folder, digest, extension=None):
+    """Content-addressed result location (a directory when extension is None)"""
+    name = f"{digest}.{extension}" if extension else digest
+    return os.path.join(folder, name)
+
+
+def _remove(path):
+    try:
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        elif os.path.exists(path):
+            os.remove(path)
+    except OSError as e:
+        print(f"[WARN] [JOBS] Could not remove {path}: {e}")
+
+
+def _set_status(job_id, flush=False, **fields):
+    """Buffer the Job update and push the transition to event stream subscribers"""
+    from job_events import publish_event
+    status_batcher.update(job_id, flush=flush, **fields)
+    event = {'job_id': job_id}
+    event.update((key, value) for key, value in fields.items() if key != 'output_file_path')
+    if fields.get('status') == 'completed':
+        event['download_url'] = f'/api/v1/jobs/{job_id}/download'
+    publish_event('job', job_id, event, event_type='status')
+    if fields.get('status') in ('completed', 'failed'):
+        from webhooks import trigger_webhooks
+        # Runs in a prefork child: coalesce on Redis rather than in an in-memory buffer it may not outlive
+        trigger_webhooks(job_id, f"job.{fields['status']}", durable=True)
+
+
+def run_job(task, job_id, input_path, folder, extension, params, convert):
+    """
+    Run one conversion job through the shared lifecycle.
+
+    Args:
+        task: The bound JobTask (for retries)
+        job_id: Job.job_id
+        input_path: Uploaded input file (removed once the job is completed or failed)
+        folder: Result folder; results are named by content hash
+        extension: Result file extension, or None for a result directory
+        params: Conversion parameters (part of the content hash)
+        convert: convert(input_path, output_path) - writes the result, raises on failure
+
+    Returns:
+        dict with status, output_path, processing_time and error
+    """
+    from models import Job
+
+    job = Job.query.filter_by(job_id=job_id).first()
+    if job is None:
+        print(f"[WARN] [JOBS] {job_id}: job record not found, skipping")
+        return {'status': 'missing', 'output_path': None, 'processing_time': None, 'error': 'Job not found'}
+    if job.status == 'completed' and job.output_file_path and os.path.exists(job.output_file_path):
+        # Redelivered after it finished (worker lost before the ack)
+        return {'status': 'completed', 'output_path': job.output_file_path,
+                'processing_time': job.processing_time, 'error': None}
+
+    started = datetime.utcnow()
+    _set_status(job_id, status='processing', started_at=started)
+
+    output_path = None
+    tmp_path = None
+    try:
+        if not os.path.exists(input_path):
+            raise JobFailed(f'Input file not found: {input_path}')
+        os.makedirs(folder, exist_ok=True)
+        output_path = result_path(folder, content_hash(input_path, params), extension)
+        if os.path.exists(output_path):
+            print(f"[OK] [JOBS] {job_id}: reusing stored result {output_path}")
+        else:
+            token = task.request.id or job_id
+            tmp_path = result_path(folder, f"{os.path.basename(output_path)}.{token}.tmp", extension)
+            convert(input_path, tmp_path)
+            if not os.path.exists(tmp_path):
+                raise JobFailed('Conversion produced no output')
+            os.replace(tmp_path, output_path)
+            tmp_path = None
+    except Exception as e:
+        if tmp_path:
+            _remove(tmp_path)
+        attempt = task.request.retries + 1
+        if not isinstance(e, JobFailed) and task.request.retries < task.max_retries:
+            print(f"[WARN] [JOBS] {job_id}: attempt {attempt} failed, retrying: {e}")
+            _set_status(job_id, flush=True, error_message=f'Attempt {attempt} failed: {e}')
+            raise task.retry(exc=e)
+        print(f"[ERROR] [JOBS] {job_id}: failed after {attempt} attempt(s): {e}")
+        _set_status(job_id, flush=True, status='failed', error_message=str(e),
+                    completed_at=datetime.utcnow())
+        _remove(input_path)
+        return {'status': 'failed', 'output_path': None, 'processing_time': None, 'error': str(e)}
+
+    completed = datetime.utcnow()
+    processing_time = (completed - started).total_seconds()
+    _set_status(job_id, flush=True, status='completed', output_file_path=output_path,
+                processing_time=processing_time, error_message=None, completed_at=completed)
+    _remove(input_path)
+    return {'status': 'completed', 'output_path': output_path, 'processing_time': processing_time, 'error': None}
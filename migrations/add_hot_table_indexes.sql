@@ -0,0 +1,41 @@
+-- Migration: Composite / partial indexes for the hot query paths
+-- Run with: python run_index_migration.py
+-- Statements use CONCURRENTLY so they must run outside a transaction (the runner uses autocommit)
+
+-- usage_logs: per-user and per-key monthly usage, admin error-rate queries
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_usage_logs_user_id_timestamp
+  ON usage_logs (user_id, "timestamp");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_usage_logs_api_key_id_timestamp
+  ON usage_logs (api_key_id, "timestamp");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_usage_logs_timestamp_status_code
+  ON usage_logs ("timestamp", status_code);
+
+-- analytics_events: event-type breakdowns and per-session detail (top-N per session)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analytics_events_event_name_timestamp
+  ON analytics_events (event_name, "timestamp");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_analytics_events_session_id_timestamp
+  ON analytics_events (session_id, "timestamp");
+
+-- page_views: per-session detail and page filters
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_page_views_session_id_timestamp
+  ON page_views (session_id, "timestamp");
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_page_views_page_url_timestamp
+  ON page_views (page_url, "timestamp");
+
+-- user_sessions: keyset pagination on (start_time, id)
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_user_sessions_start_time_id
+  ON user_sessions (start_time, id);
+
+-- companies: status counts per campaign and the pending dispatch queue
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_companies_campaign_id_status
+  ON companies (campaign_id, status);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_companies_pending
+  ON companies (campaign_id, id)
+  WHERE status = 'pending';
+
+-- Refresh planner statistics for the new indexes
+ANALYZE usage_logs;
+ANALYZE analytics_events;
+ANALYZE page_views;
+ANALYZE user_sessions;
+ANALYZE companies;
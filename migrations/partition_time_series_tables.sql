@@ -0,0 +1,117 @@
+-- Migration: Monthly range partitioning for usage_logs, analytics_events and page_views
+-- Run with: python run_index_migration.py --partition
+--
+-- Each table is converted in its own transaction:
+--   1. the table is renamed to <table>_unpartitioned
+--   2. a new <table> PARTITION BY RANGE ("timestamp") is created with the same columns/defaults
+--      (primary key becomes (id, "timestamp") - PostgreSQL requires the partition key in it)
+--   3. monthly partitions are created from the oldest row up to 3 months ahead, plus a DEFAULT partition
+--   4. rows are copied, the id sequence is re-owned, the old table is dropped
+--   5. the old table's secondary indexes are recreated on the partitioned parent
+--   6. its foreign keys (usage_logs -> api_keys / users) are re-added to the parent; LIKE does not
+--      copy them. Adding them validates every copied row, so orphaned rows abort the conversion.
+--      Tables referenced BY another table's foreign key are refused (the partitioned primary key
+--      (id, "timestamp") could not back them).
+-- Already-partitioned tables are skipped, so the script is safe to re-run.
+-- Run create_monthly_partitions() monthly (run_index_migration.py --maintain-partitions) to keep
+-- partitions ahead of time; rows outside them land in <table>_default.
+
+CREATE OR REPLACE FUNCTION create_monthly_partitions(parent text, from_month date, months_ahead integer DEFAULT 3)
+RETURNS integer AS $$
+DECLARE
+  month_start date := date_trunc('month', from_month)::date;
+  last_month date := (date_trunc('month', now()) + make_interval(months => months_ahead))::date;
+  partition_name text;
+  created integer := 0;
+BEGIN
+  WHILE month_start <= last_month LOOP
+    partition_name := format('%s_y%sm%s', parent, to_char(month_start, 'YYYY'), to_char(month_start, 'MM'));
+    IF to_regclass(partition_name) IS NULL THEN
+      EXECUTE format(
+        'CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+        partition_name, parent, month_start, (month_start + interval '1 month')::date
+      );
+      created := created + 1;
+    END IF;
+    month_start := (month_start + interval '1 month')::date;
+  END LOOP;
+
+  IF to_regclass(parent || '_default') IS NULL THEN
+    EXECUTE format('CREATE TABLE %I PARTITION OF %I DEFAULT', parent || '_default', parent);
+  END IF;
+  RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION partition_table_by_month(tbl text)
+RETURNS void AS $$
+DECLARE
+  old_tbl text := tbl || '_unpartitioned';
+  seq_name text;
+  oldest date;
+  idx record;
+  fk record;
+BEGIN
+  IF (SELECT c.relkind FROM pg_class c WHERE c.oid = to_regclass(tbl)) = 'p' THEN
+    RAISE NOTICE '% is already partitioned, skipping', tbl;
+    RETURN;
+  END IF;
+
+  IF EXISTS (SELECT 1 FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(tbl)) THEN
+    RAISE EXCEPTION '% is referenced by a foreign key; partitioning it would drop that constraint', tbl;
+  END IF;
+
+  EXECUTE format('LOCK TABLE %I IN ACCESS EXCLUSIVE MODE', tbl);
+  EXECUTE format('ALTER TABLE %I RENAME TO %I', tbl, old_tbl);
+
+  EXECUTE format(
+    'CREATE TABLE %I (LIKE %I INCLUDING DEFAULTS INCLUDING CONSTRAINTS) PARTITION BY RANGE ("timestamp")',
+    tbl, old_tbl
+  );
+  EXECUTE format('ALTER TABLE %I ADD PRIMARY KEY (id, "timestamp")', tbl);
+
+  EXECUTE format('SELECT min("timestamp")::date FROM %I', old_tbl) INTO oldest;
+  PERFORM create_monthly_partitions(tbl, COALESCE(oldest, now()::date), 3);
+
+  EXECUTE format('INSERT INTO %I SELECT * FROM %I', tbl, old_tbl);
+
+  seq_name := pg_get_serial_sequence(old_tbl, 'id');
+  IF seq_name IS NOT NULL THEN
+    EXECUTE format('ALTER SEQUENCE %s OWNED BY %I.id', seq_name, tbl);
+  END IF;
+
+  -- Keep the secondary index definitions, drop the old table, recreate them on the parent
+  CREATE TEMP TABLE IF NOT EXISTS _partition_index_defs (indexdef text) ON COMMIT DROP;
+  DELETE FROM _partition_index_defs;
+  INSERT INTO _partition_index_defs
+    SELECT i.indexdef
+    FROM pg_indexes i
+    JOIN pg_class c ON c.relname = i.indexname
+    JOIN pg_index x ON x.indexrelid = c.oid
+    WHERE i.schemaname = current_schema() AND i.tablename = old_tbl AND NOT x.indisprimary;
+
+  CREATE TEMP TABLE IF NOT EXISTS _partition_fk_defs (conname text, condef text) ON COMMIT DROP;
+  DELETE FROM _partition_fk_defs;
+  INSERT INTO _partition_fk_defs
+    SELECT conname, pg_get_constraintdef(oid)
+    FROM pg_constraint
+    WHERE contype = 'f' AND conrelid = to_regclass(old_tbl);
+
+  EXECUTE format('DROP TABLE %I', old_tbl);
+
+  -- Validates all copied rows: the transaction fails (and the old table comes back) on an orphan
+  FOR fk IN SELECT conname, condef FROM _partition_fk_defs LOOP
+    EXECUTE format('ALTER TABLE %I ADD CONSTRAINT %I %s', tbl, fk.conname, fk.condef);
+  END LOOP;
+
+  FOR idx IN SELECT indexdef FROM _partition_index_defs LOOP
+    EXECUTE replace(
+      replace(idx.indexdef, 'CREATE INDEX ', 'CREATE INDEX IF NOT EXISTS '),
+      format(' ON %s.%s ', current_schema(), old_tbl),
+      format(' ON %s.%s ', current_schema(), tbl)
+    );
+  END LOOP;
+
+  EXECUTE format('ANALYZE %I', tbl);
+END;
+$$ LANGUAGE plpgsql;
@@ -109,6 +109,11 @@ class APIKey(db.Model):
 class UsageLog(db.Model):
     """Usage log for tracking API calls"""
     __tablename__ = 'usage_logs'
+    __table_args__ = (
+        db.Index('ix_usage_logs_user_id_timestamp', 'user_id', 'timestamp'),
+        db.Index('ix_usage_logs_api_key_id_timestamp', 'api_key_id', 'timestamp'),
+        db.Index('ix_usage_logs_timestamp_status_code', 'timestamp', 'status_code'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     api_key_id = db.Column(db.Integer, db.ForeignKey('api_keys.id'), nullable=False)
@@ -292,9 +297,51 @@ class Notification(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+class BillingLedgerEntry(db.Model):
+    """Per-user billing ledger (one row per payment/subscription notification)"""
+    __tablename__ = 'billing_ledger'
+    __table_args__ = (
+        db.Index('ix_billing_ledger_user_id_created_at_id', 'user_id', 'created_at', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    notification_id = db.Column(db.Integer, db.ForeignKey('notifications.id', ondelete='SET NULL'), unique=True)
+    entry_type = db.Column(db.String(20), nullable=False)  # 'payment', 'subscription'
+    invoice = db.Column(db.String(200), nullable=False)  # Plan name / invoice label
+    amount = db.Column(db.Float, default=0.0, nullable=False)
+    payment_id = db.Column(db.String(100))
+    tier = db.Column(db.String(20), default='free', nullable=False)
+    entry_metadata = db.Column(db.JSON)  # Copy of the notification metadata
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    # Rendered invoice PDF, cached on first download (deferred - never loaded by listings)
+    invoice_pdf = db.deferred(db.Column(db.LargeBinary))
+    invoice_pdf_generated_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        """Convert to the billing-history item format"""
+        return {
+            'id': str(self.id),
+            'invoice': self.invoice or f"Invoice #{self.payment_id[:8] if self.payment_id else self.id}",
+            'amount': float(self.amount or 0.0),
+            'date': self.created_at.isoformat() if self.created_at else None,
+            'status': 'Paid' if (self.amount or 0) > 0 else 'Free',
+            'payment_id': self.payment_id or '',
+            'tier': self.tier,
+            'notification_id': self.notification_id,
+            'ledger_id': self.id,
+            'has_cached_invoice': self.invoice_pdf_generated_at is not None,
+            'metadata': self.entry_metadata or {}
+        }
+
 class AnalyticsEvent(db.Model):
     """Analytics events tracking"""
     __tablename__ = 'analytics_events'
+    __table_args__ = (
+        db.Index('ix_analytics_events_event_name_timestamp', 'event_name', 'timestamp'),
+        db.Index('ix_analytics_events_session_id_timestamp', 'session_id', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
@@ -338,6 +385,10 @@ class AnalyticsEvent(db.Model):
 class PageView(db.Model):
     """Page views tracking"""
     __tablename__ = 'page_views'
+    __table_args__ = (
+        db.Index('ix_page_views_session_id_timestamp', 'session_id', 'timestamp'),
+        db.Index('ix_page_views_page_url_timestamp', 'page_url', 'timestamp'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
@@ -377,6 +428,9 @@ class PageView(db.Model):
 class UserSession(db.Model):
     """User sessions tracking"""
     __tablename__ = 'user_sessions'
+    __table_args__ = (
+        db.Index('ix_user_sessions_start_time_id', 'start_time', 'id'),
+    )
     
     id = db.Column(db.String(100), primary_key=True)  # session_id
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True, index=True)
@@ -478,6 +532,11 @@ class Campaign(db.Model):
 class Company(db.Model):
     """Company in a campaign"""
     __tablename__ = 'companies'
+    __table_args__ = (
+        db.Index('ix_companies_campaign_id_status', 'campaign_id', 'status'),
+        # Dispatch queue: pending companies of a campaign in id order
+        db.Index('ix_companies_pending', 'campaign_id', 'id', postgresql_where=db.text("status = 'pending'")),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False, index=True)
@@ -147,6 +147,13 @@ def get_performance_metrics(hours=24):
         ).order_by(
             func.count(UsageLog.id).desc()
         ).all()
+
+        # HTML->PDF renderer latency/failure counters (process-local, since start)
+        try:
+            from html_renderers import renderer_registry
+            pdf_renderers = renderer_registry.stats()
+        except Exception:
+            pdf_renderers = {}
         
         return {
             'period_hours': hours,
@@ -164,7 +171,8 @@ def get_performance_metrics(hours=24):
             'error_breakdown': [
                 {'status_code': status_code, 'count': count} 
                 for status_code, count in error_breakdown
-            ]
+            ],
+            'pdf_renderers': pdf_renderers
         }
 
     except Exception as e:
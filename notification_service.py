@@ -35,6 +35,15 @@ def create_notification(
         )
         
         db.session.add(notification)
+
+        # Mirror billable notifications into the per-user billing ledger (same transaction)
+        if category in ('payment', 'subscription'):
+            from billing_ledger import ledger_entry_for
+            db.session.flush()
+            entry = ledger_entry_for(notification)
+            if entry is not None:
+                db.session.add(entry)
+
         db.session.commit()
         
         print(f"[OK] Notification created: {title}")
@@ -52,7 +61,8 @@ def create_payment_notification(
     user_id: int = None,
     user_email: str = None,
     amount: float = None,
-    notification_type: str = 'payment'
+    notification_type: str = 'payment',
+    tier: str = None
 ) -> Notification:
     """Create a payment-related notification"""
     metadata = {}
@@ -64,6 +74,8 @@ def create_payment_notification(
         metadata['user_email'] = user_email
     if amount:
         metadata['amount'] = amount
+    if tier:
+        metadata['tier'] = tier
     
     return create_notification(
         title=title,
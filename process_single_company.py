@@ -4,6 +4,12 @@ Runs in a subprocess and can be forcefully killed if it exceeds timeout.
 
 Usage:
     python process_single_company.py --input input.json --output output.json
+    python process_single_company.py --serve
+
+--serve keeps one Chromium warm and processes jobs read from stdin, one JSON
+object per line, each in a fresh browser context; results are written to
+stdout as one JSON line each ({"type": "result", "job_id": ..., "result": {...}}).
+Log lines and anything else printed go to stderr. Used by campaign_worker_pool.
 
 Input JSON format:
 {
@@ -34,6 +40,7 @@ import sys
 import json
 import argparse
 import os
+import threading
 from playwright.sync_api import sync_playwright
 
 # Add parent directory to path so we can import services
@@ -47,10 +54,70 @@ def _timeout_handler(cid):
     os._exit(1) # Force exit immediately
 
 
-def process_single_company(input_data: dict) -> dict:
+def _launch_browser(p):
+    return p.chromium.launch(
+        headless=True,
+        args=[
+            '--disable-blink-features=AutomationControlled',
+            '--disable-dev-shm-usage',
+            '--no-sandbox',
+            '--disable-setuid-sandbox',
+            '--disable-web-security',
+            '--disable-features=IsolateOrigins,site-per-process'
+        ]
+    )
+
+
+def _run_in_context(browser, input_data, logger):
+    """Run one company in a fresh, isolated context of `browser`; the context is always closed"""
+    context = browser.new_context(
+        viewport={'width': 1280, 'height': 720},
+        user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        java_script_enabled=True,
+        bypass_csp=True,
+        ignore_https_errors=True
+    )
+    page = context.new_page()
+    
+    # LIGHTNING FAST: Block non-essential resources to slash load times
+    def block_aggressively(route):
+        if route.request.resource_type in ["image", "media", "font"]:
+            route.abort()
+        else:
+            route.continue_()
+    
+    page.route("**/*", block_aggressively)
+    
+    try:
+        processor = FastCampaignProcessor(
+            page=page,
+            company_data=input_data.get('company_data', {}),
+            message_template=input_data.get('message_template', ''),
+            campaign_id=input_data.get('campaign_id'),
+            company_id=input_data.get('company_id'),
+            logger=logger,
+            subject=input_data.get('subject', 'Partnership Inquiry'),
+            sender_data=input_data.get('sender_data', {}),
+            deadline_sec=input_data.get('timeout_sec', 60),
+            skip_submit=input_data.get('skip_submit', False)
+        )
+        return processor.process_company()
+    finally:
+        # Absolute cleanup
+        try:
+            page.close()
+        except: pass
+        try:
+            context.close()
+        except: pass
+
+
+def process_single_company(input_data: dict, browser=None) -> dict:
     """
     Process a single company and return the result.
     This function runs in a subprocess and can be killed.
+    With `browser` (serve mode) the company runs in a new context of that
+    browser instead of a freshly launched one.
     """
     result = {
         'success': False,
@@ -61,18 +128,12 @@ def process_single_company(input_data: dict) -> dict:
         'screenshot_url': None
     }
     
+    timer = None
     try:
-        campaign_id = input_data.get('campaign_id')
         company_id = input_data.get('company_id')
-        company_data = input_data.get('company_data', {})
-        message_template = input_data.get('message_template', '')
-        subject = input_data.get('subject', 'Partnership Inquiry')
-        sender_data = input_data.get('sender_data', {})
         timeout_sec = input_data.get('timeout_sec', 60)
-        skip_submit = input_data.get('skip_submit', False)
         
         # Absolute safeguard: kill self if we exceed timeout + 10s grace
-        import threading
         timer = threading.Timer(timeout_sec + 20, _timeout_handler, args=[company_id])
         timer.daemon = True
         timer.start()
@@ -81,68 +142,18 @@ def process_single_company(input_data: dict) -> dict:
         def simple_logger(level, action, message):
             print(f"[{level}] {action}: {message}", file=sys.stderr)
         
-        # Launch Playwright
-        with sync_playwright() as p:
-            browser = p.chromium.launch(
-                headless=True,
-                args=[
-                    '--disable-blink-features=AutomationControlled',
-                    '--disable-dev-shm-usage',
-                    '--no-sandbox',
-                    '--disable-setuid-sandbox',
-                    '--disable-web-security',
-                    '--disable-features=IsolateOrigins,site-per-process'
-                ]
-            )
-            
-            context = browser.new_context(
-                viewport={'width': 1280, 'height': 720},
-                user_agent='Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                java_script_enabled=True,
-                bypass_csp=True,
-                ignore_https_errors=True
-            )
-            
-            page = context.new_page()
-            
-            # LIGHTNING FAST: Block non-essential resources to slash load times
-            def block_aggressively(route):
-                if route.request.resource_type in ["image", "media", "font"]:
-                    route.abort()
-                else:
-                    route.continue_()
-            
-            page.route("**/*", block_aggressively)
-            
-            try:
-                # Create processor
-                processor = FastCampaignProcessor(
-                    page=page,
-                    company_data=company_data,
-                    message_template=message_template,
-                    campaign_id=campaign_id,
-                    company_id=company_id,
-                    logger=simple_logger,
-                    subject=subject,
-                    sender_data=sender_data,
-                    deadline_sec=timeout_sec,
-                    skip_submit=skip_submit
-                )
-                
-                # Process company
-                result = processor.process_company()
-                
-            finally:
-                # Absolute cleanup
-                try:
-                    page.close()
-                except: pass
+        if browser is not None:
+            result = _run_in_context(browser, input_data, simple_logger)
+        else:
+            # Launch Playwright
+            with sync_playwright() as p:
+                browser = _launch_browser(p)
                 try:
-                    context.close()
-                except: pass
-                try:
-                    browser.close()
-                except: pass
+                    result = _run_in_context(browser, input_data, simple_logger)
+                finally:
+                    try:
+                        browser.close()
+                    except: pass
     
     except Exception as e:
         result = {
@@ -153,6 +164,9 @@ def process_single_company(input_data: dict) -> dict:
             'fields_filled': 0,
             'screenshot_url': None
         }
+    finally:
+        if timer:
+            timer.cancel()
     
     # Ensure result is JSON serializable (bytes -> base64 string)
     if result and result.get('screenshot_bytes'):
@@ -166,12 +180,52 @@ def process_single_company(input_data: dict) -> dict:
     return result
 
 
+def serve():
+    """
+    Persistent worker: keep one Chromium warm and process jobs from stdin
+    until EOF or {"type": "shutdown"}. Every job gets a new browser context.
+    """
+    # Protocol messages own the real stdout; everything printed goes to stderr
+    protocol = os.fdopen(os.dup(sys.stdout.fileno()), 'w', encoding='utf-8', buffering=1)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    def send(message):
+        protocol.write(json.dumps(message) + '\n')
+        protocol.flush()
+
+    with sync_playwright() as p:
+        browser = _launch_browser(p)
+        send({'type': 'ready', 'pid': os.getpid()})
+        for line in sys.stdin:
+            line = line.strip()
+            if not line:
+                continue
+            message = json.loads(line)
+            if message.get('type') == 'shutdown':
+                break
+            if not browser.is_connected():
+                print("[warning] Worker: browser disconnected, relaunching", file=sys.stderr)
+                browser = _launch_browser(p)
+            result = process_single_company(message['input'], browser=browser)
+            send({'type': 'result', 'job_id': message['job_id'], 'result': result})
+        try:
+            browser.close()
+        except: pass
+
+
 def main():
     parser = argparse.ArgumentParser(description='Process a single company')
-    parser.add_argument('--input', required=True, help='Input JSON file path')
-    parser.add_argument('--output', required=True, help='Output JSON file path')
+    parser.add_argument('--input', help='Input JSON file path')
+    parser.add_argument('--output', help='Output JSON file path')
+    parser.add_argument('--serve', action='store_true', help='Process jobs from stdin with a warm browser')
     args = parser.parse_args()
     
+    if args.serve:
+        serve()
+        return
+    if not args.input or not args.output:
+        parser.error('--input and --output are required unless --serve is given')
+    
     # Read input
     try:
         with open(args.input, 'r', encoding='utf-8') as f:
@@ -0,0 +1,87 @@
+"""
+Queue-depth driven autoscaling for Celery workers.
+
+Celery's stock autoscaler only counts tasks the worker has already reserved,
+which with a low prefetch multiplier (video/audio workers prefetch one task)
+never exceeds the current pool size - so it never scales up. This autoscaler
+also looks at how many messages are waiting in the worker's broker queues and
+asks for one extra process per `backlog_per_process` waiting tasks, within the
+queue's concurrency floor and ceiling (celery_app.QUEUE_SETTINGS).
+
+Enabled via worker_autoscaler in celery_app.py; floor/ceiling come from
+--autoscale (celery_app.worker_argv).
+"""
+import math
+import os
+import time
+from celery.worker import state
+from celery.worker.autoscale import Autoscaler
+
+DEPTH_POLL_INTERVAL = float(os.getenv('CELERY_DEPTH_POLL_INTERVAL', '5'))
+
+
+def desired_concurrency(reserved, depth, min_concurrency, max_concurrency, backlog_per_process=1):
+    """
+    Pool size the worker should run.
+
+    Args:
+        reserved: Tasks the worker holds (running or prefetched)
+        depth: Messages waiting in the broker for the worker's queues
+        min_concurrency / max_concurrency: Autoscale floor and ceiling
+        backlog_per_process: Waiting tasks one extra process is expected to absorb
+    """
+    wanted = reserved + math.ceil(depth / max(backlog_per_process, 1))
+    return max(min_concurrency, min(wanted, max_concurrency))
+
+
+def queue_depth(client, queues):
+    """Waiting messages across queues; the Redis transport stores each queue as a list"""
+    return sum(client.llen(queue) for queue in queues)
+
+
+class QueueDepthAutoscaler(Autoscaler):
+    """Autoscaler whose target includes the broker backlog of the consumed queues"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._client = None
+        self._depth = 0
+        self._depth_checked = 0.0
+
+    def _queues(self):
+        if self.worker is None:
+            return []
+        return sorted(self.worker.app.amqp.queues.consume_from or {})
+
+    def _redis(self):
+        if self._client is None:
+            import redis
+            self._client = redis.from_url(self.worker.app.conf.broker_url)
+        return self._client
+
+    def _backlog_per_process(self, queues):
+        from celery_app import QUEUE_SETTINGS, queue_setting
+        known = [queue_setting(q, 'backlog_per_process') for q in queues if q in QUEUE_SETTINGS]
+        return min(known) if known else 1
+
+    def broker_depth(self):
+        """Waiting messages for this worker's queues (cached for DEPTH_POLL_INTERVAL)"""
+        now = time.monotonic()
+        if now - self._depth_checked >= DEPTH_POLL_INTERVAL:
+            self._depth_checked = now
+            try:
+                self._depth = queue_depth(self._redis(), self._queues())
+            except Exception as e:
+                # Broker hiccup: fall back to reserved-only scaling
+                print(f"[WARN] [AUTOSCALE] Could not read queue depth: {e}")
+                self._client = None
+                self._depth = 0
+        return self._depth
+
+    @property
+    def qty(self):
+        return desired_concurrency(
+            len(state.reserved_requests), self.broker_depth(),
+            self.min_concurrency, self.max_concurrency,
+            self._backlog_per_process(self._queues()),
+        )
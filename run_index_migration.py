@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Migration script for hot-table indexes and (optionally) monthly partitioning
+
+    python run_index_migration.py                       # composite/partial indexes
+    python run_index_migration.py --partition           # + partition usage_logs/analytics_events/page_views
+    python run_index_migration.py --maintain-partitions # create next months' partitions (run monthly)
+"""
+import os
+import sys
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+PARTITIONED_TABLES = ['usage_logs', 'analytics_events', 'page_views']
+
+
+def _split_statements(sql):
+    """Split a plain SQL file (no function bodies) into statements"""
+    lines = [line for line in sql.splitlines() if not line.strip().startswith('--')]
+    return [stmt.strip() for stmt in '\n'.join(lines).split(';') if stmt.strip()]
+
+
+def apply_indexes(conn):
+    """Create indexes one statement at a time (CONCURRENTLY needs autocommit)"""
+    with open(os.path.join(MIGRATIONS_DIR, 'add_hot_table_indexes.sql')) as f:
+        statements = _split_statements(f.read())
+    conn.autocommit = True
+    cursor = conn.cursor()
+    for statement in statements:
+        print(f"  {statement.splitlines()[0]}")
+        cursor.execute(statement)
+    cursor.close()
+
+
+def apply_partitioning(conn):
+    """Install the partition functions, then convert each table in its own transaction"""
+    with open(os.path.join(MIGRATIONS_DIR, 'partition_time_series_tables.sql')) as f:
+        functions_sql = f.read()
+    conn.autocommit = False
+    cursor = conn.cursor()
+    cursor.execute(functions_sql)
+    conn.commit()
+    for table in PARTITIONED_TABLES:
+        print(f"  Partitioning {table}...")
+        cursor.execute("SET LOCAL statement_timeout = 0")
+        cursor.execute("SELECT partition_table_by_month(%s)", (table,))
+        conn.commit()
+    cursor.close()
+
+
+def maintain_partitions(conn):
+    """Create partitions up to 3 months ahead for every partitioned table"""
+    conn.autocommit = True
+    cursor = conn.cursor()
+    for table in PARTITIONED_TABLES:
+        cursor.execute("SELECT create_monthly_partitions(%s, date_trunc('month', now())::date, 3)", (table,))
+        print(f"  {table}: {cursor.fetchone()[0]} new partition(s)")
+    cursor.close()
+
+
+def run_migration(argv):
+    """Run the index migration and optional partitioning steps"""
+    try:
+        import psycopg2
+
+        database_url = os.getenv('DATABASE_URL')
+        if not database_url or database_url.startswith('sqlite'):
+            print("ERROR: DATABASE_URL must point at PostgreSQL")
+            sys.exit(1)
+        if database_url.startswith('postgres://'):
+            database_url = database_url.replace('postgres://', 'postgresql://', 1)
+
+        print("Connecting to database...")
+        conn = psycopg2.connect(database_url)
+
+        if '--maintain-partitions' in argv:
+            print("Maintaining partitions...")
+            maintain_partitions(conn)
+        else:
+            print("Running migration: composite/partial indexes for hot tables...")
+            apply_indexes(conn)
+            if '--partition' in argv:
+                print("Running migration: monthly range partitioning...")
+                apply_partitioning(conn)
+
+        conn.close()
+        print("SUCCESS: Migration completed successfully!")
+
+    except ImportError:
+        print("ERROR: psycopg2 not installed")
+        print("Install it with: pip install psycopg2-binary")
+        sys.exit(1)
+    except Exception as e:
+        print(f"ERROR: Migration failed: {e}")
+        import traceback
+        traceback.print_exc()
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    run_migration(sys.argv[1:])
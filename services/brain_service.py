@@ -2,32 +2,233 @@
 Self-learning brain: store and retrieve patterns in Supabase. No domains stored.
 - brain_patterns: aggregated pattern_type + pattern_value with success_count / use_count
 - brain_events: recent events for admin visibility (event_type, outcome, metadata, no domain)
+
+Campaign workers record a pattern use per field/link/cookie click, so writes
+are aggregated in-process: record_pattern_use adds a (pattern_type, value) ->
+(uses, successes) delta and record_event queues the row; a background thread
+flushes every BRAIN_FLUSH_INTERVAL seconds (or once BRAIN_FLUSH_SIZE items
+are waiting) with one brain_record_patterns RPC (upsert-with-increment, see
+supabase_brain_schema.sql) and one multi-row events insert. get_top_patterns
+is served from a TTL cache: in-process first, then Redis (shared by every
+worker process), then Supabase.
 """
 import os
+import json
+import time
+import atexit
+import threading
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
+
+FLUSH_INTERVAL_SEC = float(os.getenv('BRAIN_FLUSH_INTERVAL', '10'))
+FLUSH_SIZE = int(os.getenv('BRAIN_FLUSH_SIZE', '200'))
+TOP_PATTERNS_TTL_SEC = int(os.getenv('BRAIN_TOP_PATTERNS_TTL', '300'))
+LOCAL_TOP_PATTERNS_TTL_SEC = min(60, TOP_PATTERNS_TTL_SEC)
+
+_supabase = None
+_client_lock = threading.Lock()
 
-# Reuse Supabase client from storage (same project)
+
+# Reuse Supabase client from storage (same project); resolved once per process
 def _client():
-    from utils.supabase_storage import _client as storage_client
-    return storage_client()
+    global _supabase
+    if _supabase is None:
+        with _client_lock:
+            if _supabase is None:
+                from utils.supabase_storage import _client as storage_client
+                _supabase = storage_client()
+    return _supabase
 
 
 def _table(name: str):
     return _client().table(name)
 
 
+# --- Write buffer ---
+
+class BrainWriteBuffer:
+    """Pattern deltas and event rows accumulated in-process, flushed by a background thread"""
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL_SEC, flush_size: int = FLUSH_SIZE):
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._deltas: Dict[Tuple[str, str], List] = {}  # (type, value) -> [uses, successes, last_used_at]
+        self._events: List[Dict] = []
+        self._pid = None
+        self._worker_thread = None
+        self._wake = threading.Event()
+        self.stats = {'patterns_flushed': 0, 'events_flushed': 0, 'flushes': 0, 'errors': 0}
+
+    def _ensure_worker(self):
+        # Worker processes are forked/spawned from the app: each process runs its own flush thread
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._worker_thread = None
+            atexit.register(self.flush)
+        if not (self._worker_thread and self._worker_thread.is_alive()):
+            self._worker_thread = threading.Thread(target=self._flush_worker, daemon=True)
+            self._worker_thread.start()
+
+    def add_pattern(self, pattern_type: str, pattern_value: str, success: bool):
+        now = datetime.utcnow().isoformat()
+        with self._lock:
+            self._ensure_worker()
+            delta = self._deltas.setdefault((pattern_type, pattern_value), [0, 0, now])
+            delta[0] += 1
+            delta[1] += 1 if success else 0
+            delta[2] = now
+            pending = len(self._deltas) + len(self._events)
+        if pending >= self.flush_size:
+            self._wake.set()
+
+    def add_event(self, row: Dict):
+        with self._lock:
+            self._ensure_worker()
+            self._events.append(row)
+            pending = len(self._deltas) + len(self._events)
+        if pending >= self.flush_size:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._deltas) + len(self._events)
+
+    def _drain(self):
+        with self._lock:
+            deltas, self._deltas = self._deltas, {}
+            events, self._events = self._events, []
+        return deltas, events
+
+    def _requeue(self, deltas, events):
+        """Put back a batch whose write failed, merged with anything recorded since"""
+        with self._lock:
+            for key, (uses, successes, last_used_at) in deltas.items():
+                delta = self._deltas.setdefault(key, [0, 0, last_used_at])
+                delta[0] += uses
+                delta[1] += successes
+            self._events[:0] = events
+
+    def flush(self) -> int:
+        """
+        Write all buffered deltas and events; returns items written.
+        Patterns and events are written separately and only the part that
+        failed is requeued, so applied deltas are never counted twice.
+        """
+        with self._flush_lock:
+            deltas, events = self._drain()
+            if not deltas and not events:
+                return 0
+            failed = False
+            unwritten = _write_pattern_deltas(deltas) if deltas else {}
+            if unwritten:
+                failed = True
+                self.stats['errors'] += 1
+                self._requeue(unwritten, [])
+            patterns_written = len(deltas) - len(unwritten)
+            events_written = 0
+            if events:
+                try:
+                    _table("brain_events").insert(events).execute()
+                    events_written = len(events)
+                except Exception as e:
+                    failed = True
+                    self.stats['errors'] += 1
+                    print(f"[BRAIN] flush failed ({len(events)} events requeued): {e}")
+                    self._requeue({}, events)
+            if not failed:
+                self.stats['flushes'] += 1
+            self.stats['patterns_flushed'] += patterns_written
+            self.stats['events_flushed'] += events_written
+            return patterns_written + events_written
+
+    def _flush_worker(self):
+        """Flush every flush_interval seconds, or sooner once flush_size items are waiting"""
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[BRAIN] flush worker error: {e}")
+                time.sleep(1)
+
+
+def _is_missing_function(error) -> bool:
+    """True when the RPC failed because brain_record_patterns is not deployed (not a transient error)"""
+    if getattr(error, 'code', None) in ('PGRST202', '42883'):
+        return True
+    message = str(error)
+    return 'Could not find the function' in message or ('function' in message and 'does not exist' in message)
+
+
+def _write_pattern_deltas(deltas: Dict[Tuple[str, str], List]) -> Dict[Tuple[str, str], List]:
+    """
+    One RPC applying every delta (insert or increment); per-pattern fallback
+    only if the function is missing. Returns the deltas that were not written
+    (all of them on a transient RPC error, the remainder if the fallback stops).
+    """
+    rows = [{"pattern_type": t, "pattern_value": v, "uses": uses, "successes": successes, "last_used_at": last}
+            for (t, v), (uses, successes, last) in deltas.items()]
+    try:
+        _client().rpc("brain_record_patterns", {"deltas": rows}).execute()
+        return {}
+    except Exception as e:
+        if not _is_missing_function(e):
+            print(f"[BRAIN] brain_record_patterns failed ({len(rows)} patterns requeued): {e}")
+            return deltas
+        print(f"[BRAIN] brain_record_patterns RPC unavailable ({e}), writing patterns one by one")
+    table = _table("brain_patterns")
+    for i, row in enumerate(rows):
+        now = datetime.utcnow().isoformat()
+        try:
+            r = table.select("id, use_count, success_count").eq("pattern_type", row["pattern_type"]).eq("pattern_value", row["pattern_value"]).execute()
+            if r.data and len(r.data) > 0:
+                existing = r.data[0]
+                table.update({
+                    "use_count": (existing.get("use_count") or 0) + row["uses"],
+                    "success_count": (existing.get("success_count") or 0) + row["successes"],
+                    "last_used_at": row["last_used_at"],
+                    "updated_at": now,
+                }).eq("id", existing["id"]).execute()
+            else:
+                table.insert({
+                    "pattern_type": row["pattern_type"],
+                    "pattern_value": row["pattern_value"],
+                    "use_count": row["uses"],
+                    "success_count": row["successes"],
+                    "last_used_at": row["last_used_at"],
+                    "updated_at": now,
+                }).execute()
+        except Exception as e:
+            # Patterns before this one are applied; only this one and the rest go back
+            print(f"[BRAIN] pattern write failed after {i} of {len(rows)} patterns: {e}")
+            return {(rest["pattern_type"], rest["pattern_value"]): deltas[(rest["pattern_type"], rest["pattern_value"])]
+                    for rest in rows[i:]}
+    return {}
+
+
+_buffer = BrainWriteBuffer()
+
+
+def flush() -> int:
+    """Write buffered pattern uses and events now (tests, shutdown hooks)"""
+    return _buffer.flush()
+
+
 # --- Recording (called from processor) ---
 
 def record_event(event_type: str, outcome: str, pattern_value: Optional[str] = None, metadata: Optional[Dict] = None) -> bool:
-    """Append one learning event for admin visibility. No domain stored."""
+    """Queue one learning event for admin visibility. No domain stored."""
     try:
-        _table("brain_events").insert({
+        _buffer.add_event({
             "event_type": event_type,
             "pattern_value": pattern_value or "",
             "outcome": outcome,
             "metadata": metadata or {},
-        }).execute()
+            "created_at": datetime.utcnow().isoformat(),
+        })
         return True
     except Exception as e:
         print(f"[BRAIN] record_event failed: {e}")
@@ -35,30 +236,9 @@ def record_event(event_type: str, outcome: str, pattern_value: Optional[str] = N
 
 
 def record_pattern_use(pattern_type: str, pattern_value: str, success: bool) -> bool:
-    """Increment use_count and optionally success_count for a pattern (upsert)."""
+    """Add one use (and a success) to the pattern's pending delta; flushed as an upsert-with-increment."""
     try:
-        now = datetime.utcnow().isoformat()
-        # Try upsert: match (pattern_type, pattern_value), then set use_count = use_count + 1, success_count = success_count + (success ? 1 : 0)
-        # Supabase/PostgREST doesn't support increment in upsert easily; we do RPC or select+upsert. Use raw increment via update after insert on conflict.
-        table = _table("brain_patterns")
-        r = table.select("id, use_count, success_count").eq("pattern_type", pattern_type).eq("pattern_value", pattern_value).execute()
-        if r.data and len(r.data) > 0:
-            row = r.data[0]
-            table.update({
-                "use_count": (row.get("use_count") or 0) + 1,
-                "success_count": (row.get("success_count") or 0) + (1 if success else 0),
-                "last_used_at": now,
-                "updated_at": now,
-            }).eq("id", row["id"]).execute()
-        else:
-            table.insert({
-                "pattern_type": pattern_type,
-                "pattern_value": pattern_value,
-                "use_count": 1,
-                "success_count": 1 if success else 0,
-                "last_used_at": now,
-                "updated_at": now,
-            }).execute()
+        _buffer.add_pattern(pattern_type, pattern_value, success)
         return True
     except Exception as e:
         print(f"[BRAIN] record_pattern_use failed: {e}")
@@ -67,16 +247,64 @@ def record_pattern_use(pattern_type: str, pattern_value: str, success: bool) ->
 
 # --- Reading for processor (optional: use learned patterns) ---
 
+_local_top: Dict[Tuple[str, int], Tuple[float, List[str]]] = {}
+_local_top_lock = threading.Lock()
+_redis_client = None
+_redis_checked = False
+
+
+def _redis():
+    """Shared cache for top patterns when REDIS_URL is reachable; None otherwise (checked once)"""
+    global _redis_client, _redis_checked
+    if not _redis_checked:
+        _redis_checked = True
+        try:
+            import redis
+            client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), decode_responses=True,
+                                    socket_connect_timeout=1, socket_timeout=1)
+            client.ping()
+            _redis_client = client
+        except Exception as e:
+            print(f"[BRAIN] Redis unavailable ({e}), top patterns cached per process only")
+    return _redis_client
+
+
+def _top_patterns_key(pattern_type: str, limit: int) -> str:
+    return f'brain:top:{pattern_type}:{limit}'
+
+
 def get_top_patterns(pattern_type: str, limit: int = 50) -> List[str]:
-    """Return list of pattern_value ordered by success_count desc (for use in processor)."""
-    try:
-        r = _table("brain_patterns").select("pattern_value").eq("pattern_type", pattern_type).order("success_count", desc=True).limit(limit).execute()
-        if not r.data:
-            return []
-        return [row["pattern_value"] for row in r.data if row.get("pattern_value")]
-    except Exception as e:
-        print(f"[BRAIN] get_top_patterns failed: {e}")
-        return []
+    """Return list of pattern_value ordered by success_count desc (for use in processor). Cached, see module doc."""
+    key = (pattern_type, limit)
+    now = time.time()
+    with _local_top_lock:
+        cached = _local_top.get(key)
+    if cached and cached[0] > now:
+        return list(cached[1])
+
+    values = None
+    shared = _redis()
+    if shared is not None:
+        try:
+            raw = shared.get(_top_patterns_key(pattern_type, limit))
+            values = json.loads(raw) if raw is not None else None
+        except Exception:
+            values = None
+    if values is None:
+        try:
+            r = _table("brain_patterns").select("pattern_value").eq("pattern_type", pattern_type).order("success_count", desc=True).limit(limit).execute()
+            values = [row["pattern_value"] for row in (r.data or []) if row.get("pattern_value")]
+        except Exception as e:
+            print(f"[BRAIN] get_top_patterns failed: {e}")
+            return list(cached[1]) if cached else []
+        if shared is not None:
+            try:
+                shared.setex(_top_patterns_key(pattern_type, limit), TOP_PATTERNS_TTL_SEC, json.dumps(values))
+            except Exception:
+                pass
+    with _local_top_lock:
+        _local_top[key] = (now + LOCAL_TOP_PATTERNS_TTL_SEC, values)
+    return list(values)
 
 
 # --- Admin API ---
@@ -0,0 +1,233 @@
+"""
+Compiled contact-link matcher.
+
+contact_patterns holds thousands of case/symbol variants (LINK_TEXT_PATTERNS,
+get_all_url_variations()) as flat lists; checking them one by one against
+every anchor is N x patterns, so the in-page code only ever looked for a
+couple of hard-coded substrings. Here the patterns are normalized once
+(lowercased, accents and symbols stripped: 'Contáctanos →' -> 'contactanos',
+'contact-us' -> 'contact us') - which collapses the variants - and compiled
+into two Aho-Corasick automatons, one for URL paths and one for link texts.
+Every anchor is then matched in one linear pass over its text and path.
+
+Scores: a pattern weighs 3 (contact family: contact/kontakt/contato/enquiry/
+get in touch/お問い合わせ...), 2 (intent: quote, message, write, request...)
+or 1 (generic: support, help, chat...). A link scores the strongest weight
+of its text and path * 100 plus the lengths of both matched patterns, so
+STRONG_SCORE means "matched the contact family" and longer / double matches
+rank higher within a weight.
+
+    score_link('/de/kontakt/', 'Kontaktieren Sie uns')   # Python side
+    find_contact_links(page, keywords)                    # one evaluate, same automatons in JS
+"""
+
+import json
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.contact_patterns import BASE_LINK_TEXT_PATTERNS, CONTACT_URL_PATTERNS
+
+STRONG_STEMS = ('contac', 'contat', 'contakt', 'kontakt', 'kontact', 'cantact', 'contect', 'conntact', 'conact',
+                'cotact', 'conatct', 'contct', 'cntact', 'in touch', 'intouch', 'enqu', 'inqu', 'enqiry', 'conosco',
+                'お問い合わせ', '联系', '聯繫', '연락')
+INTENT_STEMS = ('quote', 'quotation', 'devis', 'presupuesto', 'orcamento', 'cotiza', 'cotac', 'message', 'mensaje',
+                'mensagem', 'bericht', 'write', 'escri', 'ecri', 'email', 'talk', 'speak', 'reach', 'anfrage',
+                'richiesta', 'scrivici', 'ask', 'consult', 'request', 'solicit', 'demande', 'say hello', 'connect')
+STRONG_SCORE = 300  # a link scoring at least this matched a contact-family pattern
+
+# Link texts seen in the wild that the base list does not carry yet
+EXTRA_LINK_TEXTS = ['お問い合わせ', '联系我们', '聯繫我們', '연락처', 'Kontaktieren', 'Contatti', 'Kontakt os', 'Kontakta oss']
+
+FOOTER_SELECTOR = ('footer, [role="contentinfo"], .footer, #footer, .site-footer, .page-footer, '
+                   '[class*="footer"], [class*="Footer"]')
+
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def normalize(value: str) -> str:
+    """Lowercase, NFKD with combining marks dropped, every run of non-alphanumerics -> one space"""
+    value = unicodedata.normalize('NFKD', (value or '').lower())
+    value = ''.join(ch for ch in value if not unicodedata.category(ch).startswith('M'))
+    return _SEPARATORS.sub(' ', value).strip()
+
+
+def pattern_weight(pattern: str) -> int:
+    """3 contact family, 2 contact intent, 1 generic (pattern already normalized)"""
+    if any(normalize(stem) in pattern for stem in STRONG_STEMS):
+        return 3
+    if any(stem in pattern for stem in INTENT_STEMS):
+        return 2
+    return 1
+
+
+class Automaton:
+    """
+    Aho-Corasick automaton over normalized patterns. Matches must start at a
+    word boundary; patterns shorter than 5 characters must also end at one
+    ('hi' does not match 'this', 'form' does not match 'format').
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = sorted({p for p in (normalize(p) for p in patterns) if p})
+        self.weights = [pattern_weight(p) for p in self.patterns]
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[int]] = [[]]
+        for index, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                if ch not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.out.append([])
+                    self.goto[state][ch] = len(self.goto) - 1
+                state = self.goto[state][ch]
+            self.out[state].append(index)
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for ch, child in self.goto[state].items():
+                queue.append(child)
+                fallback = self.fail[state]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[child] = self.goto[fallback].get(ch, 0)
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def matches(self, normalized: str) -> List[Tuple[int, int]]:
+        """(start, pattern index) of every boundary-respecting match in one pass"""
+        text = ' ' + normalized + ' '
+        found = []
+        state = 0
+        for end, ch in enumerate(text):
+            while state and ch not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(ch, 0)
+            for index in self.out[state]:
+                length = len(self.patterns[index])
+                start = end - length + 1
+                if text[start - 1] != ' ':
+                    continue
+                if length < 5 and text[end + 1:end + 2] not in (' ', ''):
+                    continue
+                found.append((start - 1, index))
+        return found
+
+    def best(self, value: str) -> Tuple[int, Optional[str]]:
+        """(score, pattern) of the strongest match in value; (0, None) without a match"""
+        best = (0, None)
+        for _, index in self.matches(normalize(value)):
+            pattern = self.patterns[index]
+            score = self.weights[index] * 100 + min(len(pattern), 99)
+            if score > best[0]:
+                best = (score, pattern)
+        return best
+
+    def compact(self) -> Dict:
+        """JSON-ready form for the in-page matcher: per-state edge chars + targets, fail links, outputs"""
+        return {
+            'c': [''.join(edges) for edges in self.goto],
+            't': [list(edges.values()) for edges in self.goto],
+            'f': self.fail,
+            'o': self.out,
+            'p': self.patterns,
+            'w': self.weights,
+        }
+
+
+@lru_cache(maxsize=1)
+def automatons() -> Tuple[Automaton, Automaton]:
+    """(path automaton, text automaton), built once per process"""
+    return Automaton(CONTACT_URL_PATTERNS), Automaton(list(BASE_LINK_TEXT_PATTERNS) + EXTRA_LINK_TEXTS)
+
+
+def link_score(path_score: int, text_score: int) -> int:
+    """Strongest weight of either field * 100, plus the matched pattern lengths of both (capped at 99)"""
+    weight = max(path_score // 100, text_score // 100)
+    return weight * 100 + min(path_score % 100 + text_score % 100, 99)
+
+
+def _path_of(href: str) -> str:
+    href = (href or '').split('?')[0]
+    if '://' in href:
+        href = '/' + href.split('://', 1)[1].partition('/')[2]
+    return href
+
+
+def score_link(href: str, text: str) -> Dict:
+    """{'score', 'pattern'} for one anchor: best text match + best path match"""
+    path_auto, text_auto = automatons()
+    path_score, path_pattern = path_auto.best(_path_of(href))
+    text_score, text_pattern = text_auto.best(text)
+    pattern = text_pattern if text_score >= path_score else path_pattern
+    return {'score': link_score(path_score, text_score), 'pattern': pattern}
+
+
+# Anchors are walked once; each one runs its path and text through the
+# automatons (same normalization and boundary rules as Automaton.matches).
+_LINKS_JS = r'''
+(args) => {
+    const hydrate = (m) => ({ next: m.c.map((chars, s) => { const e = new Map(); Array.from(chars).forEach((ch, i) => e.set(ch, m.t[s][i])); return e; }),
+                              fail: m.f, out: m.o, patterns: m.p, weights: m.w });
+    const PATH = hydrate(MATCHER.path), TEXT = hydrate(MATCHER.text);
+    const normalize = (v) => (v || '').toLowerCase().normalize('NFKD').replace(/\p{M}/gu, '').replace(/[^\p{L}\p{N}]+/gu, ' ').trim();
+    const best = (a, value) => {
+        const text = Array.from(' ' + normalize(value) + ' ');
+        let state = 0, score = 0, pattern = null;
+        for (let end = 0; end < text.length; end++) {
+            const ch = text[end];
+            while (state && !a.next[state].has(ch)) state = a.fail[state];
+            state = a.next[state].get(ch) || 0;
+            for (const index of a.out[state]) {
+                const p = a.patterns[index], length = Array.from(p).length, start = end - length + 1;
+                if (text[start - 1] !== ' ') continue;
+                if (length < 5 && end + 1 < text.length && text[end + 1] !== ' ') continue;
+                const s = a.weights[index] * 100 + Math.min(length, 99);
+                if (s > score) { score = s; pattern = p; }
+            }
+        }
+        return [score, pattern];
+    };
+    const keywords = (args.keywords || []).map(k => k.toLowerCase());
+    const found = [];
+    for (const a of document.querySelectorAll('a[href]')) {
+        const href = a.getAttribute('href') || '';
+        const text = (a.innerText || a.textContent || '').trim().toLowerCase();
+        let path = href.split('?')[0];
+        try { const u = new URL(href, document.baseURI); path = decodeURIComponent(u.pathname) + u.hash; } catch (e) {}
+        const [ps, pp] = best(PATH, path), [ts, tp] = best(TEXT, text);
+        const hrefLower = href.toLowerCase();
+        const keyword = keywords.find(k => hrefLower.includes(k) || text.includes(k)) || null;
+        if (!ps && !ts && !keyword) continue;
+        let url = null;
+        try { url = new URL(href, document.baseURI).href; } catch (e) {}
+        const score = Math.max(Math.floor(ps / 100), Math.floor(ts / 100)) * 100 + Math.min(ps % 100 + ts % 100, 99);
+        found.push({ href: href, url: url, text: text.slice(0, 100), score: score, pattern: ts >= ps ? tp : pp,
+                     keyword: keyword, in_footer: !!a.closest(FOOTER), visible: a.offsetParent !== null });
+    }
+    return found;
+}
+'''
+
+
+@lru_cache(maxsize=1)
+def contact_links_js() -> str:
+    """The in-page matcher with both automatons inlined, serialized once per process"""
+    path_auto, text_auto = automatons()
+    data = json.dumps({'path': path_auto.compact(), 'text': text_auto.compact()}, ensure_ascii=False, separators=(',', ':'))
+    return ('(args) => { const MATCHER = ' + data + '; const FOOTER = ' + json.dumps(FOOTER_SELECTOR) + '; return ('
+            + _LINKS_JS + ')(args); }')
+
+
+def find_contact_links(page, keywords: List[str] = ()) -> List[Dict]:
+    """
+    Every anchor on the page matching the automatons or one of `keywords`, in DOM order, one evaluate.
+
+    Returns:
+        [{'href', 'url', 'text', 'score', 'pattern', 'keyword', 'in_footer', 'visible'}, ...]; [] on error
+    """
+    try:
+        return page.evaluate(contact_links_js(), {'keywords': list(keywords)}) or []
+    except Exception:
+        return []
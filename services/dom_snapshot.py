@@ -0,0 +1,177 @@
+"""
+DOM snapshot for form discovery and filling.
+
+Reading a form through Playwright handles costs one IPC round trip per
+get_attribute / is_visible / evaluate call - a 30-field form took hundreds.
+SNAPSHOT_JS collects everything the classifiers and the field extractor need
+(attributes, labels, required flags, visibility, bounding boxes, select
+options, newsletter context) in a single evaluate; the functions below work
+on that in-memory dict.
+
+    snap = snapshot(form_handle)            # one round trip (form, frame or page)
+    count_contact_like_fields(snap)
+    is_newsletter_or_signup(snap)
+    extract_fields(snap)                    # same shape as the old _extract_form_fields
+    frames = snapshot_page(page)            # every form in the main frame and iframes
+"""
+
+from typing import Dict, List, Optional
+
+NEWSLETTER_KEYWORDS = ['newsletter', 'sign up', 'signup', 'stay in the loop', 'subscribe', 'subscribe to our',
+                       'join our list', 'get the latest', 'email signup', 'mailing list']
+SKIP_INPUT_TYPES = ('hidden', 'submit', 'button', 'image')
+
+# Snapshot of one root (form element, or the document for div-based forms / frames).
+# Labels follow the two rules the processor used per element: `label` for the
+# extract-then-fill path, `label_nearby` (lowercased, sibling text) for the fallback loop.
+_ROOT_SNAPSHOT = r'''
+(root) => {
+    const doc = root.ownerDocument || root;
+    const box = (el) => { const r = el.getBoundingClientRect(); return [Math.round(r.x), Math.round(r.y), Math.round(r.width), Math.round(r.height)]; };
+    const visible = (el) => {
+        const r = el.getBoundingClientRect();
+        if (!(r.width > 0 && r.height > 0)) return false;
+        const st = (doc.defaultView || window).getComputedStyle(el);
+        return st.visibility !== 'hidden';
+    };
+    const forLabel = (el) => {
+        if (!el.id) return null;
+        const l = doc.querySelector('label[for="' + CSS.escape(el.id) + '"]');
+        return l ? (l.textContent || '').trim() : null;
+    };
+    const inputLabel = (el) => {
+        const l = forLabel(el); if (l !== null) return l;
+        const p = el.closest('label') || el.previousElementSibling;
+        if (p && (p.tagName === 'LABEL' || p.textContent)) return (p.textContent || '').trim();
+        return el.getAttribute('aria-label') || '';
+    };
+    const selectLabel = (el) => {
+        const l = forLabel(el); if (l !== null) return l;
+        const p = el.previousElementSibling; return p ? (p.textContent || '').trim() : (el.getAttribute('aria-label') || '');
+    };
+    const nearbyLabel = (el) => {
+        const l = forLabel(el); if (l !== null) return l.toLowerCase();
+        let p = el.closest('label') || el.parentElement;
+        if (p && p.tagName === 'LABEL') return (p.textContent || '').trim().toLowerCase();
+        for (let n = el.previousElementSibling; n; n = n.previousElementSibling) {
+            if (n.tagName === 'LABEL') return (n.textContent || '').trim().toLowerCase();
+            const t = (n.textContent || '').trim().toLowerCase();
+            if (t.length >= 2 && t.length <= 60 && !/^(choose|select|please select|general enquiry|--|select one)/.test(t) && !/branch\s*$/.test(t))
+                return t;
+        }
+        const aria = el.getAttribute('aria-label');
+        return aria ? aria.trim().toLowerCase() : '';
+    };
+    const required = (el) => el.hasAttribute('required') || el.getAttribute('aria-required') === 'true';
+
+    const inputs = Array.from(root.querySelectorAll('input, textarea')).map(el => ({
+        tag: el.tagName.toLowerCase(),
+        type: (el.getAttribute('type') || 'text').toLowerCase(),
+        name: el.getAttribute('name'), id: el.getAttribute('id'),
+        placeholder: el.getAttribute('placeholder'), aria: el.getAttribute('aria-label'),
+        label: inputLabel(el), label_nearby: nearbyLabel(el),
+        required: required(el), visible: visible(el), box: box(el),
+    }));
+    const selects = Array.from(root.querySelectorAll('select')).map(el => ({
+        tag: 'select', type: 'select', name: el.getAttribute('name'), id: el.getAttribute('id'),
+        label: selectLabel(el), required: required(el), visible: visible(el), box: box(el),
+        options: Array.from(el.querySelectorAll('option')).map(o => ({ value: o.getAttribute('value'), text: (o.innerText || o.textContent || '').trim() })),
+    }));
+
+    let context = '', inFooter = false;
+    if (root.nodeType === 1) {
+        inFooter = !!root.closest('footer, [role="contentinfo"], .footer, #footer, .site-footer, .page-footer, [class*="footer"], [class*="Footer"]');
+        let prev = '';
+        let p = root.previousElementSibling;
+        for (let i = 0; i < 3 && p; i++) { prev += (p.textContent || '').toLowerCase(); p = p.previousElementSibling; }
+        const cls = typeof root.className === 'string' ? root.className : '';
+        context = [(root.id || ''), (root.getAttribute('name') || ''), cls, (root.getAttribute('action') || ''),
+                   (root.getAttribute('aria-label') || '')].join(' ').toLowerCase() + ' ' + prev + ' ' + (root.textContent || '').toLowerCase().slice(0, 500);
+    }
+    return { in_footer: inFooter, context: context, inputs: inputs, selects: selects };
+}
+'''
+
+SNAPSHOT_JS = '(root) => (' + _ROOT_SNAPSHOT + ')(root || document)'
+
+PAGE_SNAPSHOT_JS = '() => { const snap = (' + _ROOT_SNAPSHOT + '); ' \
+    'const forms = Array.from(document.querySelectorAll("form")).map(f => snap(f)); ' \
+    'return { forms: forms, document: snap(document) }; }'
+
+MESSAGE_KEYWORDS = ['message', 'enquiry', 'inquiry', 'comment', 'comments', 'details', 'your message',
+                    'how can we help', 'describe', 'body']
+
+
+def snapshot(target) -> Optional[Dict]:
+    """Snapshot a form ElementHandle, a Frame or a Page (whole document) in one evaluate"""
+    try:
+        return target.evaluate(SNAPSHOT_JS)
+    except Exception:
+        return None
+
+
+def snapshot_page(page) -> List[Dict]:
+    """Every form (and the whole document) of the main frame and each iframe: one evaluate per frame"""
+    frames = []
+    for index, frame in enumerate(page.frames):
+        try:
+            snap = frame.evaluate(PAGE_SNAPSHOT_JS)
+        except Exception:
+            continue
+        snap.update(frame_index=index, url=frame.url, is_main=frame == page.main_frame)
+        frames.append(snap)
+    return frames
+
+
+def count_contact_like_fields(snap: Dict) -> int:
+    """Inputs/textareas that are not hidden/submit/button/image, plus selects"""
+    fields = [f for f in snap['inputs'] if f['type'] not in SKIP_INPUT_TYPES]
+    return len(fields) + len(snap['selects'])
+
+
+def has_message_field(snap: Dict) -> bool:
+    """A textarea, or a text input whose name/id/placeholder/aria says message"""
+    for f in snap['inputs']:
+        if f['tag'] == 'textarea':
+            return True
+    for f in snap['inputs']:
+        if f['tag'] == 'input' and f['type'] == 'text':
+            combined = ' '.join((f.get(k) or '').lower() for k in ('name', 'id', 'placeholder', 'aria'))
+            if any(k in combined for k in MESSAGE_KEYWORDS):
+                return True
+    return False
+
+
+def is_newsletter_or_signup(snap: Dict) -> bool:
+    """Footer forms, newsletter wording, or no message field: not a contact form"""
+    if snap['in_footer']:
+        return True
+    if any(kw in snap['context'] for kw in NEWSLETTER_KEYWORDS):
+        return True
+    return not has_message_field(snap)
+
+
+def extract_fields(snap: Dict) -> List[Dict]:
+    """Field list for extract-then-fill: fillable inputs/textareas in DOM order, then selects"""
+    out = []
+    for f in snap['inputs']:
+        if f['type'] in SKIP_INPUT_TYPES:
+            continue
+        out.append({'tag': f['tag'], 'type': f['type'], 'name': f['name'], 'id': f['id'], 'placeholder': f['placeholder'],
+                    'label': f['label'], 'required': f['required'], 'visible': f['visible'], 'box': f['box']})
+    for f in snap['selects']:
+        out.append({'tag': 'select', 'type': 'select', 'name': f['name'], 'id': f['id'], 'label': f['label'],
+                    'options': f['options'], 'required': f['required'], 'visible': f['visible'], 'box': f['box']})
+    return out
+
+
+def first_match_visibility(snap: Dict) -> Dict:
+    """
+    (tag, ('name'|'id', value)) -> visibility of the first element with that
+    key, i.e. what form.locator('tag[name=..]').first.is_visible() answers.
+    """
+    seen = {}
+    for f in snap['inputs'] + snap['selects']:
+        key = (f['tag'], ('name', f['name']) if f.get('name') else ('id', f.get('id')))
+        seen.setdefault(key, f['visible'])
+    return seen
@@ -11,6 +11,13 @@ import re
 import time
 from typing import Dict, List, Optional, Tuple
 
+from services.dom_snapshot import (
+    snapshot as dom_snapshot, snapshot_page, count_contact_like_fields, is_newsletter_or_signup, extract_fields,
+    first_match_visibility,
+)
+from services.overlay_detect import find_candidates as find_overlay_candidates, top_hit_selector
+from services.contact_matcher import find_contact_links, STRONG_SCORE as STRONG_CONTACT_SCORE
+
 def _brain_record_event(event_type: str, outcome: str, pattern_value: Optional[str] = None, metadata: Optional[Dict] = None):
     try:
         from services.brain_service import record_event
@@ -58,6 +65,8 @@ class FastCampaignProcessor:
         self.skip_submit = bool(skip_submit)
         self.found_form = False
         self.found_contact_page = False
+        self._snapshots = {}  # id(form/frame handle) -> (handle, DOM snapshot), see _snapshot
+        self._cookie_learned = None  # brain 'cookie_selector' winners, fetched on first handle_cookie_modal
         self.website_url = self.company.get('website_url', '')
 
         # Parse message template (could be plain text or JSON)
@@ -203,7 +212,37 @@ class FastCampaignProcessor:
 
             # Track contact keyword when we follow a link (for mandatory brain recording)
             self._contact_keyword_used = None
-            
+
+            # STRATEGY -1: HTTP pre-pass over the server-rendered HTML. Static contact page with an
+            # email and no form -> done without the browser; static contact form -> open it directly.
+            plan = self._http_prepass(website_url)
+            skip_footer_scan = bool(plan and plan['reason'] == 'homepage_form')
+            if plan and not plan['needs_browser']:
+                self._contact_keyword_used = plan.get('contact_keyword')
+                email_result = self._prepass_email_result(plan, result)
+                if email_result:
+                    return email_result
+            elif plan and plan.get('form_page') and plan['form_page'] != website_url:
+                self._contact_keyword_used = plan.get('contact_keyword')
+                self.log('info', 'Pre-pass', f"Contact form found in page HTML; opening {plan['form_page']} directly")
+                try:
+                    self.page.goto(plan['form_page'], wait_until='domcontentloaded', timeout=self._remaining_ms(10000))
+                    self.handle_cookie_modal()
+                    form_result = self._try_forms_on_page('contact_page')
+                    if form_result:
+                        result.update(form_result)
+                        result['method'] = 'form_submitted_contact_page'
+                        self.found_form = True
+                        return result
+                    self.log('info', 'Pre-pass', 'Contact page form did not succeed; falling back to full discovery')
+                except Exception as e:
+                    self.log('warning', 'Pre-pass', f'Opening contact page failed: {e}; falling back to full discovery')
+                if self._is_timed_out():
+                    result['success'] = False
+                    result['error'] = 'Processing timed out'
+                    result['method'] = 'timeout'
+                    return result
+
             # Initial navigation (short timeouts so no-form bails fast; cap to deadline)
             self.log('info', 'Navigation', f'Opening {website_url}...')
             try:
@@ -234,24 +273,17 @@ class FastCampaignProcessor:
                     self._wait_ms(400)
                 except Exception:
                     pass
-                footer_containers = self.page.query_selector_all(
-                    'footer, [role="contentinfo"], .footer, #footer, .site-footer, .page-footer, [class*="footer"], [class*="Footer"]'
-                )
-                for footer_el in (footer_containers or []):
-                    try:
-                        footer_links = footer_el.query_selector_all('a[href]')
-                        for link in (footer_links or []):
-                            try:
-                                href = link.get_attribute('href')
-                                text = (link.inner_text() or '').strip().lower()
-                                if not href or href.startswith('mailto:') or href.startswith('tel:'):
-                                    continue
-                                if any(kw in (href or '').lower() or kw in text for kw in contact_keywords):
-                                    footer_candidates.append((href, text))
-                            except Exception:
-                                pass
-                    except Exception:
-                        pass
+                # Pre-pass already fetched the footer contact pages: no form there, the form is on the homepage.
+                # Footer anchors come from the same one-evaluate matcher as Strategy 2 (multilingual + brain keywords)
+                footer_links = [] if skip_footer_scan else [
+                    l for l in find_contact_links(self.page, contact_keywords)
+                    if l['in_footer'] and l['href'] and not l['href'].startswith(('mailto:', 'tel:'))
+                    and (l['keyword'] or l['score'] >= STRONG_CONTACT_SCORE)
+                ]
+                footer_by_href = {}
+                for l in footer_links:
+                    footer_by_href.setdefault(l['href'], l)
+                footer_candidates = [(l['href'], l['text']) for l in footer_links]
                 seen = set()
                 unique = []
                 for href, text in footer_candidates:
@@ -270,12 +302,14 @@ class FastCampaignProcessor:
                         return 2
                     if 'about-us' in h or 'about-us' in t or 'about us' in t:
                         return 3
-                    return 2
-                unique.sort(key=_contact_priority)
+                    # Non-English contact pages ("kontakt", "contactez-nous", "お問い合わせ") rank with "contact"
+                    return 0 if footer_by_href[href]['score'] >= STRONG_CONTACT_SCORE else 2
+                unique.sort(key=lambda item: (_contact_priority(item), -footer_by_href[item[0]]['score']))
                 if unique:
                     self.log('info', 'Strategy 0', f'Found {len(unique)} contact link(s) in footer; trying contact page first')
                     href, text = unique[0]
-                    matched_kw = next((kw for kw in contact_keywords if kw in (href or '').lower() or kw in (text or '')), None)
+                    matched_kw = next((kw for kw in contact_keywords if kw in (href or '').lower() or kw in (text or '')), None) \
+                        or footer_by_href[href]['pattern']
                     self._contact_keyword_used = matched_kw
                     full_href = self.make_absolute_url(href)
                     if not (href or '').strip().startswith('#'):
@@ -465,41 +499,19 @@ class FastCampaignProcessor:
             self.log('info', 'Strategy 2', 'No form on homepage, searching for contact link (footer first)...')
             contact_keywords = _brain_get_keywords('contact_keyword', ['contact', 'get-in-touch', 'enquiry', 'support', 'about-us'])
             self.log('info', 'Discovery', 'Strategy 2: Searching for contact links')
-            selector = ', '.join([f'a[href*="{kw}"]' for kw in contact_keywords]) + ', ' + \
-                       ', '.join([f'a:has-text("{kw}")' for kw in contact_keywords])
-            
             contact_link = None
             try:
-                # Collect (href, text) from footer/selector while still on homepage so we don't hold stale handles after navigation
-                candidates = []
-                footer_containers = self.page.query_selector_all(
-                    'footer, [role="contentinfo"], .footer, #footer, .site-footer, .page-footer, [class*="footer"], [class*="Footer"]'
-                )
-                for footer_el in (footer_containers or []):
-                    try:
-                        footer_links = footer_el.query_selector_all('a[href]')
-                        for link in (footer_links or []):
-                            try:
-                                href = link.get_attribute('href')
-                                text = (link.inner_text() or '').strip().lower()
-                                if not href or href.startswith('mailto:') or href.startswith('tel:'):
-                                    continue
-                                if any(kw in (href or '').lower() or kw in text for kw in contact_keywords):
-                                    candidates.append((href, text))
-                            except Exception:
-                                pass
-                    except Exception:
-                        pass
+                # Every anchor of the homepage scored in one evaluate (compiled multilingual matcher plus the
+                # brain's keywords); collected as plain data so no handles go stale after navigation
+                links = [l for l in find_contact_links(self.page, contact_keywords)
+                         if l['href'] and not l['href'].startswith(('mailto:', 'tel:'))]
+                by_href = {}
+                for l in links:
+                    by_href.setdefault(l['href'], l)
+                matched = [l for l in links if l['keyword'] or l['score'] >= STRONG_CONTACT_SCORE]
+                candidates = [(l['href'], l['text']) for l in matched if l['in_footer']]
                 if not candidates:
-                    fallback_links = self.page.query_selector_all(selector)
-                    for link in (fallback_links or []):
-                        try:
-                            href = link.get_attribute('href')
-                            text = (link.inner_text() or '').strip().lower()
-                            if href and not href.startswith('mailto:') and not href.startswith('tel:'):
-                                candidates.append((href, text))
-                        except Exception:
-                            pass
+                    candidates = [(l['href'], l['text']) for l in matched]
                 # Dedupe by normalized href (keep first)
                 seen = set()
                 unique = []
@@ -520,8 +532,10 @@ class FastCampaignProcessor:
                         return 2
                     if 'about-us' in h or 'about-us' in t or 'about us' in t:
                         return 3
-                    return 2
-                unique.sort(key=contact_priority)
+                    # Non-English contact pages ("kontakt", "contactez-nous", "お問い合わせ") rank with "contact"
+                    return 0 if by_href[href]['score'] >= STRONG_CONTACT_SCORE else 2
+                # Matcher score breaks ties within a priority (e.g. "kontakt" vs a generic "support" page)
+                unique.sort(key=lambda item: (contact_priority(item), -by_href[item[0]]['score']))
                 self.log('info', 'Discovery', f'Found {len(unique)} potential contact links (contact/enquiry first, support last)')
 
                 for i, (href, text) in enumerate(unique[:5]):
@@ -529,7 +543,8 @@ class FastCampaignProcessor:
                         break
                     if not href:
                         continue
-                    matched_kw = next((kw for kw in contact_keywords if kw in (href or '').lower() or kw in (text or '')), None)
+                    matched_kw = next((kw for kw in contact_keywords if kw in (href or '').lower() or kw in (text or '')), None) \
+                        or by_href[href]['pattern']
                     self._contact_keyword_used = matched_kw
                     full_href = self.make_absolute_url(href)
                     self.log('info', 'Testing Link', f'Link {i+1}: {text or "(no text)"} ({href})')
@@ -700,11 +715,17 @@ class FastCampaignProcessor:
                 return result
             self.log('info', 'Strategy 3', 'Checking all frames for embedded forms...')
             self._wait_ms(300)
+            # One snapshot per frame tells which iframes (ads, video, maps) have nothing to fill
+            frame_snaps = {f['frame_index']: f for f in snapshot_page(self.page)}
             
             for idx, frame in enumerate(self.page.frames):
                 if self._is_timed_out():
                     break
                 if frame == self.page.main_frame: continue
+                frame_snap = frame_snaps.get(idx)
+                if frame_snap and frame_snap['url'] == frame.url and not frame_snap['forms'] and not any(
+                        f['tag'] == 'textarea' or f['type'] == 'email' for f in frame_snap['document']['inputs']):
+                    continue
                 try:
                     # Wait slightly for each frame to be ready
                     self.log('info', 'Checking Frame', f'Checking frame {idx}: {frame.url[:50]}...')
@@ -813,53 +834,73 @@ class FastCampaignProcessor:
                 pass
         return result
 
-    def _is_newsletter_or_signup_form(self, form) -> bool:
-        """Return True if form is clearly newsletter/signup or lacks a real contact message field. Contact forms must have message/textarea."""
+    def _http_prepass(self, website_url: str) -> Optional[Dict]:
+        """Run the HTTP pre-pass (services.http_prepass); None when disabled, unavailable or out of time."""
+        if self._remaining_ms(30000) < 20000:
+            return None
         try:
-            # Form inside footer is almost always newsletter/signup — never treat as contact form
-            in_footer = form.evaluate('''el => {
-                const footer = el.closest('footer, [role="contentinfo"], .footer, #footer, .site-footer, .page-footer, [class*="footer"], [class*="Footer"]');
-                return !!footer;
-            }''')
-            if in_footer:
-                return True
-            # Form context: id, name, class, action, aria-label, or nearby text
-            ctx = form.evaluate('''el => {
-                const id = (el.id || '').toLowerCase();
-                const name = (el.getAttribute('name') || '').toLowerCase();
-                const cls = (el.className || '').toLowerCase();
-                const action = (el.getAttribute('action') || '').toLowerCase();
-                const aria = (el.getAttribute('aria-label') || '').toLowerCase();
-                let prev = '';
-                let p = el.previousElementSibling;
-                for (let i = 0; i < 3 && p; i++) { prev += (p.textContent || '').toLowerCase(); p = p.previousElementSibling; }
-                const inner = (el.textContent || '').toLowerCase().slice(0, 500);
-                return id + ' ' + name + ' ' + cls + ' ' + action + ' ' + aria + ' ' + prev + ' ' + inner;
-            }''') or ''
-            newsletter_keywords = ['newsletter', 'sign up', 'signup', 'stay in the loop', 'subscribe', 'subscribe to our', 'join our list', 'get the latest', 'email signup', 'mailing list']
-            if any(kw in ctx for kw in newsletter_keywords):
-                return True
-            # Contact forms must have a message/enquiry field (textarea or message-like input). No message field = newsletter/signup.
-            has_message_field = form.evaluate('''el => {
-                const textareas = el.querySelectorAll('textarea');
-                if (textareas.length > 0) return true;
-                const msgKeywords = ['message', 'enquiry', 'inquiry', 'comment', 'comments', 'details', 'your message', 'how can we help', 'describe', 'body'];
-                const inputs = el.querySelectorAll('input[type="text"], input:not([type])');
-                for (const i of inputs) {
-                    const name = (i.getAttribute('name') || '').toLowerCase();
-                    const id = (i.getAttribute('id') || '').toLowerCase();
-                    const placeholder = (i.getAttribute('placeholder') || '').toLowerCase();
-                    const aria = (i.getAttribute('aria-label') || '').toLowerCase();
-                    const combined = name + ' ' + id + ' ' + placeholder + ' ' + aria;
-                    if (msgKeywords.some(k => combined.includes(k))) return true;
-                }
-                return false;
-            }''')
-            if not has_message_field:
-                return True  # No message/textarea = newsletter or signup, not contact
-            return False
+            from services.http_prepass import scan_site
+            keywords = _brain_get_keywords('contact_keyword', [
+                'contact', 'contact us', 'get in touch', 'get-in-touch', 'enquiry', 'enquiries', 'support', 'about-us'
+            ])
+            plan = scan_site(website_url, timeout=min(8, self._remaining_ms(8000) / 1000), keywords=keywords)
+        except Exception as e:
+            self.log('warning', 'Pre-pass', f'HTTP pre-pass failed: {e}')
+            return None
+        if plan:
+            self.log('info', 'Pre-pass', f"{plan['reason']} (browser {'needed' if plan['needs_browser'] else 'not needed'})")
+        return plan
+
+    def _prepass_email_result(self, plan: Dict, result: Dict) -> Optional[Dict]:
+        """Email outcome straight from the pre-pass (static contact page, no form). None -> use the browser."""
+        contact_info = {'emails': plan['emails']}
+        self.log('success', 'Email Found', f"Found {len(plan['emails'])} email(s) on {plan['start_url']} (no browser needed)")
+        if not self.sender_data.get('email_found_when_no_form', False):
+            self.log('info', 'Email option off', 'Skipping email send (user disabled "email found when no form")')
+            result.update({'success': True, 'contact_info': contact_info, 'method': 'contact_info_found'})
+            self._record_brain_mandatory(self._contact_keyword_used, [], True, 'contact_info_found')
+            return result
+        if self.send_email_to_contact(plan['emails'][0]):
+            result.update({'success': True, 'method': 'email_sent', 'contact_info': contact_info})
+            self._record_brain_mandatory(self._contact_keyword_used, [], True, 'email_sent')
+            return result
+        return None
+
+    def _try_forms_on_page(self, location: str) -> Optional[Dict]:
+        """Fill the first contact-like form on the current page; the form result on success, else None."""
+        try:
+            self.page.wait_for_selector('form, input[type="email"], textarea', timeout=self._remaining_ms(8000))
         except Exception:
-            return False
+            pass
+        # Classify every form of the page from one snapshot instead of per-form round trips
+        main = next((f for f in snapshot_page(self.page) if f['is_main']), None)
+        if not main:
+            return None
+        candidates = [i for i, snap in enumerate(main['forms'])
+                      if count_contact_like_fields(snap) >= 2 and not is_newsletter_or_signup(snap)]
+        for form_idx in candidates:
+            if self._is_timed_out():
+                break
+            try:
+                self.page.locator('form').nth(form_idx).scroll_into_view_if_needed(timeout=self._action_timeout_ms())
+                self._wait_ms(300)
+            except Exception:
+                pass
+            forms_refresh = self.page.query_selector_all('form')
+            if form_idx >= len(forms_refresh):
+                continue
+            form_result = self.fill_and_submit_form(forms_refresh[form_idx], location)
+            self._record_brain_mandatory(self._contact_keyword_used, form_result.get('filled_field_patterns', []),
+                                         form_result['success'], 'form_submitted_contact_page' if form_result['success'] else form_result.get('method', 'form_fill_failed'))
+            if form_result['success']:
+                self.log('success', 'Form Detection', 'Filled contact form found by the pre-pass')
+                return form_result
+        return None
+
+    def _is_newsletter_or_signup_form(self, form) -> bool:
+        """Return True if form is clearly newsletter/signup or lacks a real contact message field. Contact forms must have message/textarea."""
+        snap = self._snapshot(form)
+        return is_newsletter_or_signup(snap) if snap else False
 
     def _is_contact_form_fill(self, filled_field_patterns: List[Dict]) -> bool:
         """True if filled fields look like a real contact form (not newsletter-only). Reject email-only/newsletter as success."""
@@ -894,20 +935,18 @@ class FastCampaignProcessor:
 
     def _count_contact_like_fields(self, form) -> int:
         """Count inputs/selects that look like contact form fields (not hidden/submit/button). Used to skip newsletter/search forms."""
-        try:
-            count = 0
-            inputs = form.query_selector_all('input, textarea')
-            selects = form.query_selector_all('select')
-            for el in inputs or []:
-                t = (el.get_attribute('type') or 'text').lower()
-                if t in ('hidden', 'submit', 'button', 'image'):
-                    continue
-                count += 1
-            for _ in selects or []:
-                count += 1
-            return count
-        except Exception:
-            return 0
+        snap = self._snapshot(form)
+        return count_contact_like_fields(snap) if snap else 0
+
+    def _snapshot(self, form) -> Optional[Dict]:
+        """DOM snapshot of a form/frame/page (services.dom_snapshot), one evaluate per handle and cached for it."""
+        cached = self._snapshots.get(id(form))
+        if cached and cached[0] is form:
+            return cached[1]
+        snap = dom_snapshot(form)
+        if snap is not None:
+            self._snapshots[id(form)] = (form, snap)  # keep the handle so its id is not reused
+        return snap
 
     def make_absolute_url(self, href: str) -> str:
         """Converts a relative URL to an absolute URL."""
@@ -957,56 +996,17 @@ class FastCampaignProcessor:
             base_url = self.company['website_url']
             self.log('info', '🔍 Contact Link Search', f'Searching for contact links on {base_url}')
             
-            contact_links = self.page.evaluate("""
-                (baseUrl) => {
-                    const links = Array.from(document.querySelectorAll('a'));
-                    const found = [];
-                    const debug = [];
-                    
-                    for (const link of links) {
-                        const href = (link.getAttribute('href') || '').toLowerCase();
-                        const text = (link.textContent || '').toLowerCase().trim();
-                        
-                        if ((href.includes('contact') || text.includes('contact') || 
-                             text.includes('get in touch') || text.includes('reach out')) &&
-                            link.offsetParent !== null) {
-                            
-                            const rawHref = link.getAttribute('href');
-                            debug.push({
-                                rawHref: rawHref,
-                                text: text.substring(0, 50),
-                                href: href.substring(0, 100)
-                            });
-                            
-                            let fullUrl = rawHref;
-                            if (fullUrl && !fullUrl.startsWith('http')) {
-                                try {
-                                    fullUrl = new URL(fullUrl, baseUrl).href;
-                                } catch (e) {
-                                    debug.push({ error: 'URL construction failed', rawHref: rawHref, message: e.message });
-                                    continue;
-                                }
-                            }
-                            if (fullUrl && fullUrl.startsWith('http')) {
-                                found.push(fullUrl);
-                            }
-                        }
-                    }
-                    
-                    return { found: [...new Set(found)].slice(0, 1), debug: debug.slice(0, 5) };
-                }
-            """, base_url)
-            
-            # Log debug info
-            if contact_links.get('debug'):
-                self.log('info', '📝 Debug Info', f'Found {len(contact_links["debug"])} potential contact links')
-                for i, debug_item in enumerate(contact_links['debug'], 1):
-                    self.log('info', f'  Link {i}', str(debug_item))
-            
-            result_links = contact_links.get('found', [])
-            if result_links:
-                self.log('success', '✅ Contact Link Found', f'URL: {result_links[0]}')
-                return result_links[0]
+            # One pass over every anchor with the compiled multilingual matcher (services.contact_matcher)
+            links = [l for l in find_contact_links(self.page)
+                     if l['visible'] and l['score'] >= STRONG_CONTACT_SCORE and (l['url'] or '').startswith('http')]
+            links.sort(key=lambda l: -l['score'])
+            self.log('info', '📝 Debug Info', f'Found {len(links)} potential contact links')
+            for i, link in enumerate(links[:5], 1):
+                self.log('info', f'  Link {i}', str({'rawHref': link['href'], 'text': link['text'][:50], 'match': link['pattern']}))
+
+            if links:
+                self.log('success', '✅ Contact Link Found', f"URL: {links[0]['url']}")
+                return links[0]['url']
             else:
                 self.log('warning', '❌ No Contact Links', 'No valid contact links found after filtering')
                 return None
@@ -1016,78 +1016,27 @@ class FastCampaignProcessor:
             return None
 
     def handle_cookie_modal(self, max_time_ms: int = 15000):
-        """Comprehensive cookie modal handling - Accept, Reject, or Close. Capped at max_time_ms."""
-        start_time = time.time()
-        # Try accept buttons first, then reject/close buttons
-        selectors = [
-            # Accept buttons
-            'button:has-text("Accept")',
-            'button:has-text("Accept All")',
-            'button:has-text("I Accept")',
-            'button:has-text("Agree")',
-            '#accept-cookies',
-            '#acceptCookies',
-            '.cookie-accept',
-            '.accept-cookies',
-            '[aria-label*="Accept"]',
-            '[aria-label*="Agree"]',
-            # Termly and similar consent prompts (aria-label "Cookie Consent Prompt")
-            '[aria-label*="Cookie Consent"] button:has-text("Accept")',
-            '[aria-label*="Cookie Consent"] button:has-text("Accept All")',
-            'div[role="alertdialog"][aria-label*="Cookie"] button:has-text("Accept")',
-            'div[role="alertdialog"][aria-label*="Cookie"] button:has-text("Close")',
-            'div[role="alertdialog"] button:has-text("Accept")',
-            'div[role="alertdialog"] button:has-text("Close")',
-            # Reject/Close buttons
-            'button:has-text("Reject")',
-            'button:has-text("Reject All")',
-            'button:has-text("Decline")',
-            'button:has-text("Close")',
-            '[aria-label*="Close"]',
-            '[aria-label*="Reject"]',
-            '.cookie-close',
-            '.cookie-dismiss',
-            # Generic close buttons on modals
-            '[class*="cookie"] button[class*="close"]',
-            '[class*="consent"] button[class*="close"]',
-            '[id*="cookie"] button[class*="close"]',
-            # More variants so no screenshot shows a cookie modal
-            'button:has-text("Allow all")',
-            'button:has-text("Allow All")',
-            'button:has-text("Accept all cookies")',
-            'button:has-text("Allow all cookies")',
-            'button:has-text("OK")',
-            'button:has-text("I agree")',
-            'button:has-text("I Agree")',
-            'button:has-text("Consent")',
-            'button:has-text("Allow")',
-            'a:has-text("Accept all")',
-            'a:has-text("Accept All")',
-            'a:has-text("Reject all")',
-            '[data-testid*="accept"]',
-            '[class*="cookie"] button',
-            '[id*="cookie"] button',
-            '[class*="consent"] button',
-        ]
-
-        for selector in selectors:
-            try:
-                # PERMANENT FIX: Don't spend too long on cookie modals; check deadline and local cap
-                if self._is_timed_out() or (time.time() - start_time) * 1000 > max_time_ms:
-                    break
-                
-                element = self.page.locator(selector).first
-                # Faster visibility check (50ms) to fly through the list
-                if element.is_visible(timeout=50):
-                    element.click(timeout=self._action_timeout_ms())
-                    self._wait_ms(200)
-                    self.log('info', 'Cookie Modal', f'Dismissed using: {selector}')
-                    _brain_record_pattern('cookie_selector', selector[:200], success=True)
-                    _brain_record_event('cookie_modal', 'dismissed', pattern_value=selector[:200])
-                    return True
-            except Exception:
-                continue
-        return False
+        """Cookie modal handling - Accept, Reject, or Close. One ranked in-page scan, click the top hit only."""
+        if self._is_timed_out():
+            return False
+        if self._cookie_learned is None:
+            # Brain winners are fetched once per company, not on every call
+            self._cookie_learned = _brain_get_keywords('cookie_selector', [])
+        candidates = find_overlay_candidates(self.page, learned=self._cookie_learned)
+        if not candidates:
+            return False
+        top = candidates[0]
+        try:
+            self.page.locator(top_hit_selector(0)).first.click(timeout=min(self._action_timeout_ms(), max_time_ms))
+        except Exception:
+            if top['learned']:
+                _brain_record_pattern('cookie_selector', top['rule'][:200], success=False)
+            return False
+        self._wait_ms(200)
+        self.log('info', 'Cookie Modal', f"Dismissed using: {top['rule']}")
+        _brain_record_pattern('cookie_selector', top['rule'][:200], success=True)
+        _brain_record_event('cookie_modal', 'dismissed', pattern_value=top['rule'][:200])
+        return True
 
     def extract_contact_info(self) -> Optional[Dict]:
         """Extract emails and phones from page"""
@@ -1118,66 +1067,23 @@ class FastCampaignProcessor:
             self.log('error', 'Contact Info Extraction', str(e))
             return None
 
+    def _field_visible(self, form, el, tag: str, name: Optional[str], id_: Optional[str]) -> bool:
+        """
+        Is form.locator(tag[name|id]).first visible? Visible in the form snapshot -> yes without a
+        round trip; hidden or missing there -> ask the page (fields revealed by earlier fills).
+        """
+        snap = self._snapshot(form)
+        if snap:
+            if '_visibility' not in snap:
+                snap['_visibility'] = first_match_visibility(snap)
+            if snap['_visibility'].get((tag, ('name', name) if name else ('id', id_))):
+                return True
+        return bool(el.count()) and el.is_visible()
+
     def _extract_form_fields(self, form) -> List[Dict]:
         """Extract field list from the current form (same shape as extract-contact-form-fields.js). One website at a time: extract then fill."""
-        out = []
-        try:
-            inputs = form.query_selector_all('input, textarea')
-            for el in (inputs or []):
-                if self._is_timed_out():
-                    break
-                try:
-                    itype = (el.get_attribute('type') or 'text').lower()
-                    if itype in ('hidden', 'submit', 'button', 'image'):
-                        continue
-                    name = el.get_attribute('name')
-                    id_ = el.get_attribute('id')
-                    placeholder = el.get_attribute('placeholder')
-                    tag = el.evaluate('el => el.tagName.toLowerCase()') or 'input'
-                    label = ''
-                    try:
-                        label = (el.evaluate('''el => {
-                            const id = el.id;
-                            if (id) { const l = document.querySelector('label[for="' + id + '"]'); if (l) return (l.textContent || '').trim(); }
-                            const p = el.closest('label') || el.previousElementSibling;
-                            if (p && (p.tagName === 'LABEL' || p.textContent)) return (p.textContent || '').trim();
-                            return el.getAttribute('aria-label') || '';
-                        }''') or '')
-                    except Exception:
-                        pass
-                    required = el.evaluate('el => el.hasAttribute("required") || (el.getAttribute("aria-required") === "true")') or False
-                    out.append({'tag': tag, 'type': itype, 'name': name, 'id': id_, 'placeholder': placeholder, 'label': label, 'required': required})
-                except Exception:
-                    continue
-            selects = form.query_selector_all('select')
-            for el in (selects or []):
-                if self._is_timed_out():
-                    break
-                try:
-                    name = el.get_attribute('name')
-                    id_ = el.get_attribute('id')
-                    label = ''
-                    try:
-                        label = (el.evaluate('''el => {
-                            const id = el.id;
-                            if (id) { const l = document.querySelector('label[for="' + id + '"]'); if (l) return (l.textContent || '').trim(); }
-                            const p = el.previousElementSibling; return p ? (p.textContent || '').trim() : (el.getAttribute('aria-label') || '');
-                        }''') or '')
-                    except Exception:
-                        pass
-                    required = el.evaluate('el => el.hasAttribute("required") || (el.getAttribute("aria-required") === "true")') or False
-                    options = []
-                    for opt in (el.query_selector_all('option') or []):
-                        try:
-                            options.append({'value': opt.get_attribute('value'), 'text': (opt.inner_text() or '').strip()})
-                        except Exception:
-                            pass
-                    out.append({'tag': 'select', 'type': 'select', 'name': name, 'id': id_, 'label': label, 'options': options, 'required': required})
-                except Exception:
-                    continue
-        except Exception:
-            pass
-        return out
+        snap = self._snapshot(form)
+        return extract_fields(snap) if snap else []
 
     def _log_form_fields_report(self, extracted: List[Dict], filled_field_patterns: List[Dict], context: str = 'form'):
         """Log for every company where we find a form: extracted fields (name/properties), filled fields (with values), and fields left unsatisfied."""
@@ -1410,7 +1316,7 @@ class FastCampaignProcessor:
                 id_safe = (id_ or '').replace('\\', '\\\\').replace('"', '\\"')
                 sel = f'select[name="{name_safe}"]' if name else f'select[id="{id_safe}"]'
                 el = form.locator(sel).first
-                if not el.count() or not el.is_visible():
+                if not self._field_visible(form, el, 'select', name, id_):
                     continue
                 chosen = None
                 for o in opts:
@@ -1470,9 +1376,7 @@ class FastCampaignProcessor:
                 else:
                     sel = f'{tag}[name="{name_safe}"]' if name else f'{tag}[id="{id_safe}"]'
                 el = form.locator(sel).first
-                if not el.count():
-                    continue
-                if not el.is_visible():
+                if not self._field_visible(form, el, tag, name, id_):
                     continue
             except Exception:
                 continue
@@ -1735,6 +1639,40 @@ class FastCampaignProcessor:
             pass
         return False
 
+    def _read_input_attributes(self, input_element) -> Tuple:
+        """Per-element attribute reads for the fallback fill loop (used only when the form snapshot is unavailable)."""
+        input_id = (input_element.get_attribute('id') or '').lower()
+        name = (input_element.get_attribute('name') or '').lower()
+        name_raw = (input_element.get_attribute('name') or '').strip()
+        id_raw = (input_element.get_attribute('id') or '').strip()
+        placeholder = (input_element.get_attribute('placeholder') or '').lower()
+        input_type = (input_element.get_attribute('type') or 'text').lower()
+        # Include visible label so "First name", "Last Name", "Branch" etc. are matched.
+        # Many sites use <span>First name</span><input> or <div>First name</div><input> — use previous sibling text when it looks like a label (short, not dropdown phrasing).
+        label_text = ''
+        try:
+            label_text = (input_element.evaluate('''el => {
+                const id = el.id;
+                if (id) {
+                    const label = document.querySelector('label[for="' + id + '"]');
+                    if (label) return (label.textContent || '').trim().toLowerCase();
+                }
+                let p = el.closest('label') || el.parentElement;
+                if (p && p.tagName === 'LABEL') return (p.textContent || '').trim().toLowerCase();
+                for (let n = el.previousElementSibling; n; n = n.previousElementSibling) {
+                    if (n.tagName === 'LABEL') return (n.textContent || '').trim().toLowerCase();
+                    var t = (n.textContent || '').trim().toLowerCase();
+                    if (t.length >= 2 && t.length <= 60 && !/^(choose|select|please select|general enquiry|--|select one)/.test(t) && !/branch\\s*$/.test(t))
+                        return t;
+                }
+                const aria = el.getAttribute('aria-label');
+                if (aria) return aria.trim().toLowerCase();
+                return '';
+            }''') or '')
+        except Exception:
+            pass
+        return input_id, name, name_raw, id_raw, (name_raw or id_raw), placeholder, input_type, label_text
+
     def fill_and_submit_form(self, form, location: str, is_iframe: bool = False, is_heuristic: bool = False, frame=None) -> Dict:
         """Fill and submit form with smart field detection. Uses pre-extracted field_mappings when present (intelligent fill)."""
         try:
@@ -1772,7 +1710,7 @@ class FastCampaignProcessor:
                             id_safe = (field.get('id') or '').replace('\\', '\\\\').replace('"', '\\"')
                             sel = f'select[name="{name_safe}"]' if field.get('name') else f'select[id="{id_safe}"]'
                             el = form.locator(sel).first
-                            if el.count() and el.is_visible():
+                            if self._field_visible(form, el, 'select', field.get('name'), field.get('id')):
                                 opts = field.get('options') or []
                                 if len(opts) >= 1:
                                     first_text = (opts[0].get('text') or '').strip().lower()
@@ -1842,40 +1780,24 @@ class FastCampaignProcessor:
             # Prepare message
             message = self.replace_variables(self.message_body)
             
-            for input_element in inputs:
+            # Attributes and labels come from one DOM snapshot of the form instead of ~7 round trips per input
+            snap = self._snapshot(form)
+            snap_inputs = snap['inputs'] if snap and len(snap['inputs']) >= len(inputs) else None
+            for input_idx, input_element in enumerate(inputs):
                 if self._is_timed_out():
                     break
-                input_id = (input_element.get_attribute('id') or '').lower()
-                name = (input_element.get_attribute('name') or '').lower()
-                name_raw = (input_element.get_attribute('name') or '').strip()
-                id_raw = (input_element.get_attribute('id') or '').strip()
-                field_id = (name_raw or id_raw)
-                placeholder = (input_element.get_attribute('placeholder') or '').lower()
-                input_type = (input_element.get_attribute('type') or 'text').lower()
-                # Include visible label so "First name", "Last Name", "Branch" etc. are matched.
-                # Many sites use <span>First name</span><input> or <div>First name</div><input> — use previous sibling text when it looks like a label (short, not dropdown phrasing).
-                label_text = ''
-                try:
-                    label_text = (input_element.evaluate('''el => {
-                        const id = el.id;
-                        if (id) {
-                            const label = document.querySelector('label[for="' + id + '"]');
-                            if (label) return (label.textContent || '').trim().toLowerCase();
-                        }
-                        let p = el.closest('label') || el.parentElement;
-                        if (p && p.tagName === 'LABEL') return (p.textContent || '').trim().toLowerCase();
-                        for (let n = el.previousElementSibling; n; n = n.previousElementSibling) {
-                            if (n.tagName === 'LABEL') return (n.textContent || '').trim().toLowerCase();
-                            var t = (n.textContent || '').trim().toLowerCase();
-                            if (t.length >= 2 && t.length <= 60 && !/^(choose|select|please select|general enquiry|--|select one)/.test(t) && !/branch\\s*$/.test(t))
-                                return t;
-                        }
-                        const aria = el.getAttribute('aria-label');
-                        if (aria) return aria.trim().toLowerCase();
-                        return '';
-                    }''') or '')
-                except Exception:
-                    pass
+                if snap_inputs:
+                    info = snap_inputs[input_idx]
+                    name_raw = (info['name'] or '').strip()
+                    id_raw = (info['id'] or '').strip()
+                    input_id = (info['id'] or '').lower()
+                    name = (info['name'] or '').lower()
+                    field_id = (name_raw or id_raw)
+                    placeholder = (info['placeholder'] or '').lower()
+                    input_type = info['type']
+                    label_text = info['label_nearby'] or ''
+                else:
+                    input_id, name, name_raw, id_raw, field_id, placeholder, input_type, label_text = self._read_input_attributes(input_element)
                 # If label looks like dropdown phrasing (e.g. "General enquiry" from wrong element), don't use it so we don't mis-identify name fields
                 if label_text and any(kw in label_text for kw in ['general enquiry', 'choose a branch', 'choose branch', 'select a branch', 'please select']):
                     label_text = ''
@@ -1890,7 +1812,7 @@ class FastCampaignProcessor:
                     if input_type == 'search' or any(k in field_text for k in ['search by', 'by city', 'city or', 'or university', 'find student', 'find accommodation', 'search ...']):
                         if any(k in field_text for k in ['city', 'university', 'accommodation', 'location']) and 'message' not in field_text and 'comment' not in field_text:
                             continue
-                    tag = (input_element.evaluate('el => el.tagName.toLowerCase()') or 'input')
+                    tag = snap_inputs[input_idx]['tag'] if snap_inputs else (input_element.evaluate('el => el.tagName.toLowerCase()') or 'input')
                     extracted_heuristic.append({'name': name_raw, 'id': id_raw, 'label': label_text, 'type': input_type, 'tag': tag})
                     
                     # 1. Fill email field (Highest priority)
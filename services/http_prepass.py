@@ -0,0 +1,340 @@
+"""
+HTTP-first contact discovery (pre-pass before the browser).
+
+Most campaign targets are static (WordPress etc.) sites whose contact page,
+<form> and mailto: links are in the server-rendered HTML. This pre-pass
+fetches the homepage and the best contact-page candidates with a pooled
+asyncio HTTP client (aiohttp: keep-alive connections, DNS cache, global and
+per-host concurrency limits), parses them with a single-pass HTML parser and
+returns a plan for FastCampaignProcessor:
+
+- start_url: page the browser should open first (contact page with a form)
+- needs_browser: False when the contact page is static, has no form/embed and
+  already shows an email address -> no browser needed for this company
+- contact_urls / emails / reason for logging
+
+Anything the pre-pass cannot judge (fetch errors, JS app shells, no contact
+link) yields needs_browser=True with start_url = homepage, i.e. the old flow.
+Without aiohttp the pre-pass is disabled and scan_site() returns None.
+
+    from services.http_prepass import scan_site
+    plan = scan_site('https://example.com', timeout=8)
+"""
+
+import asyncio
+import os
+import re
+import threading
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+from urllib.parse import urljoin, urlparse
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+PREPASS_ENABLED = os.getenv('CAMPAIGN_HTTP_PREPASS', '1') != '0'
+MAX_CONNECTIONS = int(os.getenv('CAMPAIGN_PREPASS_MAX_CONNECTIONS', '50'))
+MAX_PER_HOST = int(os.getenv('CAMPAIGN_PREPASS_MAX_PER_HOST', '4'))
+MAX_CONTACT_PAGES = 3
+MAX_BODY_BYTES = 2 * 1024 * 1024
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+CONTACT_KEYWORDS = ['contact', 'contact us', 'get in touch', 'get-in-touch', 'enquiry', 'enquiries', 'inquiry', 'support', 'about-us']
+NEWSLETTER_KEYWORDS = ['newsletter', 'sign up', 'signup', 'stay in the loop', 'subscribe', 'join our list', 'get the latest', 'mailing list']
+MESSAGE_KEYWORDS = ['message', 'enquiry', 'inquiry', 'comment', 'details', 'how can we help', 'describe', 'body']
+# Third-party form embeds that only exist after JS runs (or inside an iframe)
+FORM_EMBED_MARKERS = ['hsforms', 'hubspot', 'typeform', 'jotform', 'formstack', 'docs.google.com/forms',
+                      'cognitoforms', 'wufoo', 'calendly', 'paperform', 'tally.so', 'wixstatic', 'static.parastorage']
+# Client-rendered app shells: the static HTML says nothing about the real page
+APP_SHELL_MARKERS = ['id="root"', "id='root'", 'id="app"', "id='app'", '__next_data__', 'ng-version', 'data-reactroot',
+                     'window.__nuxt__', 'id="___gatsby"']
+EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+EMAIL_SKIP = ['example.com', 'test.', 'noreply', 'no-reply', 'wixpress', 'sentry.io', '.png', '.jpg', '.webp']
+FOOTER_HINTS = ('footer', 'contentinfo')
+FIELD_SKIP_TYPES = ('hidden', 'submit', 'button', 'image', 'reset')
+
+
+class PageScan(HTMLParser):
+    """Single pass over a page: links, forms with their fields, iframes, emails, text size"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.links = []     # {'href', 'text', 'in_footer'}
+        self.forms = []     # {'action', 'context', 'fields': [...], 'has_textarea', 'in_footer'}
+        self.iframes = []
+        self.mailtos = []
+        self.text_chars = 0
+        self._text = []
+        self._stack = []    # open container tags: (tag, is_footer)
+        self._footer_depth = 0
+        self._link = None
+        self._form = None
+        self._skip_text = 0
+
+    def handle_starttag(self, tag, attrs):
+        attrs = {k: (v or '') for k, v in attrs}
+        if tag in ('script', 'style', 'noscript', 'template'):
+            self._skip_text += 1
+            return
+        if tag in ('footer', 'div', 'section', 'aside', 'nav'):
+            marker = ' '.join((attrs.get('class', ''), attrs.get('id', ''), attrs.get('role', ''))).lower()
+            is_footer = tag == 'footer' or any(h in marker for h in FOOTER_HINTS)
+            self._stack.append((tag, is_footer))
+            if is_footer:
+                self._footer_depth += 1
+        elif tag == 'a':
+            href = attrs.get('href', '').strip()
+            if href.lower().startswith('mailto:'):
+                self.mailtos.append(href[7:].split('?')[0].strip())
+            self._link = {'href': href, 'text': [], 'in_footer': self._footer_depth > 0}
+        elif tag == 'form':
+            context = ' '.join(attrs.get(k, '') for k in ('id', 'name', 'class', 'action', 'aria-label'))
+            self._form = {'action': attrs.get('action', ''), 'context': [context.lower()], 'fields': [],
+                          'has_textarea': False, 'in_footer': self._footer_depth > 0}
+        elif tag in ('input', 'textarea', 'select') and self._form is not None:
+            field_type = 'textarea' if tag == 'textarea' else ('select' if tag == 'select' else attrs.get('type', 'text').lower())
+            if field_type in FIELD_SKIP_TYPES:
+                return
+            self._form['fields'].append({
+                'type': field_type,
+                'hint': ' '.join(attrs.get(k, '') for k in ('name', 'id', 'placeholder', 'aria-label')).lower(),
+            })
+            if tag == 'textarea':
+                self._form['has_textarea'] = True
+        elif tag == 'iframe':
+            self.iframes.append(attrs.get('src', '') or attrs.get('data-src', ''))
+
+    def handle_endtag(self, tag):
+        if tag in ('script', 'style', 'noscript', 'template'):
+            self._skip_text = max(0, self._skip_text - 1)
+        elif tag in ('footer', 'div', 'section', 'aside', 'nav'):
+            # Pop to the matching open tag (tolerates unclosed children)
+            while self._stack:
+                open_tag, is_footer = self._stack.pop()
+                if is_footer:
+                    self._footer_depth -= 1
+                if open_tag == tag:
+                    break
+        elif tag == 'a' and self._link is not None:
+            self._link['text'] = ' '.join(''.join(self._link['text']).split()).lower()
+            self.links.append(self._link)
+            self._link = None
+        elif tag == 'form' and self._form is not None:
+            self._form['context'] = ' '.join(self._form['context'])[:800]
+            self.forms.append(self._form)
+            self._form = None
+
+    def handle_data(self, data):
+        if self._skip_text:
+            return
+        if self._link is not None:
+            self._link['text'].append(data)
+        if self._form is not None:
+            self._form['context'].append(data.lower())
+        stripped = data.strip()
+        if stripped:
+            self.text_chars += len(stripped)
+            self._text.append(stripped)
+
+    def text(self) -> str:
+        return ' '.join(self._text)
+
+    def close(self):
+        super().close()
+        if self._form is not None:
+            self.handle_endtag('form')
+
+
+def is_contact_form(form: Dict) -> bool:
+    """Same rules as FastCampaignProcessor: 2+ fillable fields, a message field, not newsletter/footer"""
+    if form['in_footer'] or len(form['fields']) < 2:
+        return False
+    if any(kw in form['context'] for kw in NEWSLETTER_KEYWORDS):
+        return False
+    if form['has_textarea']:
+        return True
+    return any(f['type'] in ('text', '') and any(kw in f['hint'] for kw in MESSAGE_KEYWORDS) for f in form['fields'])
+
+
+def contact_priority(href: str, text: str) -> int:
+    """contact / get in touch first, enquiry next, support and about-us last"""
+    h, t = href.lower(), text.lower()
+    if 'contact' in h or 'contact' in t or 'get in touch' in t or 'get-in-touch' in h:
+        return 0
+    if 'enquiry' in h or 'enquiry' in t or 'inquiry' in h or 'inquiry' in t:
+        return 1
+    if 'about-us' in h or 'about us' in t:
+        return 3
+    return 2
+
+
+def contact_links(scan: PageScan, base_url: str, keywords: List[str] = None) -> List[Dict]:
+    """Same-site contact page candidates, footer links first, best keyword first"""
+    keywords = keywords or CONTACT_KEYWORDS
+    host = urlparse(base_url).netloc.lower().removeprefix('www.')
+    seen = set()
+    found = []
+    for link in scan.links:
+        href = link['href']
+        if not href or href.startswith('#') or href.lower().startswith(('mailto:', 'tel:', 'javascript:')):
+            continue
+        keyword = next((kw for kw in keywords if kw in href.lower() or kw in link['text']), None)
+        if not keyword:
+            continue
+        url = urljoin(base_url, href).split('#')[0]
+        parsed = urlparse(url)
+        if parsed.scheme not in ('http', 'https') or parsed.netloc.lower().removeprefix('www.') != host:
+            continue
+        if url.rstrip('/') in seen or url.rstrip('/') == base_url.rstrip('/'):
+            continue
+        seen.add(url.rstrip('/'))
+        found.append({'url': url, 'text': link['text'], 'keyword': keyword,
+                      'rank': (contact_priority(href, link['text']), not link['in_footer'])})
+    found.sort(key=lambda c: c['rank'])
+    return found
+
+
+def page_emails(scan: PageScan) -> List[str]:
+    emails = [e for e in scan.mailtos if '@' in e] + EMAIL_RE.findall(scan.text())
+    emails = [e for e in emails if not any(skip in e.lower() for skip in EMAIL_SKIP)]
+    return list(dict.fromkeys(emails))[:5]
+
+
+def needs_rendering(html: str, scan: PageScan) -> bool:
+    """True if the static HTML cannot be trusted: JS app shell, form embeds or iframes"""
+    lowered = html[:200000].lower()
+    if any(marker in lowered for marker in FORM_EMBED_MARKERS):
+        return True
+    if scan.iframes:
+        return True
+    return scan.text_chars < 200 and any(marker in lowered for marker in APP_SHELL_MARKERS)
+
+
+class HttpPrepass:
+    """Pooled aiohttp client and the discovery pass; use from one event loop"""
+
+    def __init__(self, max_connections: int = MAX_CONNECTIONS, max_per_host: int = MAX_PER_HOST,
+                 max_contact_pages: int = MAX_CONTACT_PAGES):
+        self.max_connections = max_connections
+        self.max_per_host = max_per_host
+        self.max_contact_pages = max_contact_pages
+        self._session = None
+        self.stats = {'requests': 0, 'sites': 0, 'browser_skipped': 0}
+
+    async def session(self):
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.max_connections, limit_per_host=self.max_per_host,
+                                             ttl_dns_cache=300, ssl=False)
+            self._session = aiohttp.ClientSession(connector=connector, headers={'User-Agent': USER_AGENT})
+        return self._session
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch(self, url: str, timeout: float):
+        """(final_url, html) or (url, None) on error / non-HTML"""
+        session = await self.session()
+        self.stats['requests'] += 1
+        try:
+            async with session.get(url, timeout=aiohttp.ClientTimeout(total=timeout), allow_redirects=True) as response:
+                content_type = response.headers.get('Content-Type', '')
+                if response.status >= 400 or 'html' not in content_type.lower():
+                    return str(response.url), None
+                body = await response.content.read(MAX_BODY_BYTES)
+                return str(response.url), body.decode(response.charset or 'utf-8', errors='ignore')
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, ValueError):
+            return url, None
+
+    @staticmethod
+    def parse(html: str) -> PageScan:
+        scan = PageScan()
+        try:
+            scan.feed(html)
+            scan.close()
+        except Exception:
+            pass
+        return scan
+
+    async def scan(self, website_url: str, timeout: float = 8, keywords: List[str] = None) -> Dict:
+        """Fetch homepage and contact candidates; return the plan dict (see module docstring)"""
+        self.stats['sites'] += 1
+        plan = {'start_url': website_url, 'needs_browser': True, 'reason': '', 'contact_urls': [],
+                'contact_keyword': None, 'emails': [], 'form_page': None}
+        home_url, html = await self.fetch(website_url, timeout)
+        if html is None:
+            plan['reason'] = 'homepage_not_fetched'
+            return plan
+        home = self.parse(html)
+        if needs_rendering(html, home):
+            plan['reason'] = 'homepage_needs_rendering'
+            return plan
+
+        candidates = contact_links(home, home_url, keywords)[:self.max_contact_pages]
+        plan['contact_urls'] = [c['url'] for c in candidates]
+        pages = await asyncio.gather(*(self.fetch(c['url'], timeout) for c in candidates))
+        for candidate, (page_url, page_html) in zip(candidates, pages):
+            if page_html is None:
+                continue
+            page = self.parse(page_html)
+            rendered = needs_rendering(page_html, page)
+            if any(is_contact_form(f) for f in page.forms) or rendered:
+                # Browser needed to fill/submit (or render) - but it can start right here
+                plan.update(start_url=page_url, contact_keyword=candidate['keyword'], form_page=page_url,
+                            reason='contact_page_form' if not rendered else 'contact_page_needs_rendering')
+                return plan
+            emails = page_emails(page)
+            if emails and not page.forms:
+                plan.update(start_url=page_url, contact_keyword=candidate['keyword'], emails=emails,
+                            needs_browser=False, reason='static_contact_page_email')
+                self.stats['browser_skipped'] += 1
+                return plan
+
+        if any(is_contact_form(f) for f in home.forms):
+            plan.update(form_page=home_url, reason='homepage_form')
+            return plan
+        plan['reason'] = 'no_static_contact' if not candidates else 'contact_pages_inconclusive'
+        return plan
+
+    async def scan_many(self, urls: List[str], timeout: float = 8, concurrency: int = 20) -> List[Dict]:
+        """Scan many sites at once, at most `concurrency` sites in flight"""
+        limit = asyncio.Semaphore(concurrency)
+
+        async def one(url):
+            async with limit:
+                return await self.scan(url, timeout)
+        return await asyncio.gather(*(one(url) for url in urls))
+
+
+# -- sync entry point: one background loop + pooled session per process -------
+
+_loop = None
+_client = None
+_loop_lock = threading.Lock()
+
+
+def _background_client():
+    global _loop, _client
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, daemon=True, name='http-prepass').start()
+            _client = HttpPrepass()
+    return _loop, _client
+
+
+def scan_site(website_url: str, timeout: float = 8, keywords: List[str] = None) -> Optional[Dict]:
+    """Blocking pre-pass for one site (None when disabled or aiohttp is missing)"""
+    if not (AIOHTTP_AVAILABLE and PREPASS_ENABLED):
+        return None
+    loop, client = _background_client()
+    future = asyncio.run_coroutine_threadsafe(client.scan(website_url, timeout, keywords), loop)
+    try:
+        return future.result(timeout=timeout * 2 + 1)
+    except Exception:
+        future.cancel()
+        return None
@@ -0,0 +1,184 @@
+"""
+Batched cookie / consent overlay detection.
+
+handle_cookie_modal used to walk ~45 selectors with one
+locator(...).first.is_visible(timeout=50) round trip each, so a page without
+a banner cost the whole list - and _dismiss_cookie_for_screenshot runs it
+before every screenshot. OVERLAY_JS evaluates every rule (CSS selector plus
+optional has-text filter) in one evaluate and returns the visible hits ranked:
+
+    1. rules the brain learned as winners ('cookie_selector' patterns)
+    2. elements inside an overlay (consent/cookie container, dialog, fixed layer)
+    3. rule order of DEFAULT_RULES (accept before reject/close)
+
+The ranked elements are tagged with data-overlay-candidate="<rank>" so the
+caller clicks only the top hit by attribute:
+
+    candidates = find_candidates(page, learned=learned_selectors)
+    page.locator(top_hit_selector()).first.click()
+
+Rules keep the Playwright selector strings the brain already stores, e.g.
+'button:has-text("Accept")'; parse_rule splits them into CSS + text.
+"""
+
+import re
+from typing import Dict, List, Optional, Sequence
+
+CANDIDATE_ATTR = 'data-overlay-candidate'
+MAX_CANDIDATES = 5
+
+# Same rules and order as the old sequential loop: accept, then reject/close, then generic
+DEFAULT_RULES = [
+    # Accept buttons
+    'button:has-text("Accept")',
+    'button:has-text("Accept All")',
+    'button:has-text("I Accept")',
+    'button:has-text("Agree")',
+    '#accept-cookies',
+    '#acceptCookies',
+    '.cookie-accept',
+    '.accept-cookies',
+    '[aria-label*="Accept"]',
+    '[aria-label*="Agree"]',
+    # Termly and similar consent prompts (aria-label "Cookie Consent Prompt")
+    '[aria-label*="Cookie Consent"] button:has-text("Accept")',
+    '[aria-label*="Cookie Consent"] button:has-text("Accept All")',
+    'div[role="alertdialog"][aria-label*="Cookie"] button:has-text("Accept")',
+    'div[role="alertdialog"][aria-label*="Cookie"] button:has-text("Close")',
+    'div[role="alertdialog"] button:has-text("Accept")',
+    'div[role="alertdialog"] button:has-text("Close")',
+    # Reject/Close buttons
+    'button:has-text("Reject")',
+    'button:has-text("Reject All")',
+    'button:has-text("Decline")',
+    'button:has-text("Close")',
+    '[aria-label*="Close"]',
+    '[aria-label*="Reject"]',
+    '.cookie-close',
+    '.cookie-dismiss',
+    # Generic close buttons on modals
+    '[class*="cookie"] button[class*="close"]',
+    '[class*="consent"] button[class*="close"]',
+    '[id*="cookie"] button[class*="close"]',
+    # More variants so no screenshot shows a cookie modal
+    'button:has-text("Allow all")',
+    'button:has-text("Allow All")',
+    'button:has-text("Accept all cookies")',
+    'button:has-text("Allow all cookies")',
+    'button:has-text("OK")',
+    'button:has-text("I agree")',
+    'button:has-text("I Agree")',
+    'button:has-text("Consent")',
+    'button:has-text("Allow")',
+    'a:has-text("Accept all")',
+    'a:has-text("Accept All")',
+    'a:has-text("Reject all")',
+    '[data-testid*="accept"]',
+    '[class*="cookie"] button',
+    '[id*="cookie"] button',
+    '[class*="consent"] button',
+]
+
+_HAS_TEXT = re.compile(r'^(?P<css>.*?):has-text\((?P<quote>["\'])(?P<text>.*?)(?P=quote)\)(?P<rest>.*)$')
+
+# Rules are evaluated in order; score = learned bonus + overlay bonus + (rules left).
+# Deep query covers open shadow roots like Playwright's CSS engine (descendant
+# combinators do not cross a shadow boundary).
+OVERLAY_JS = r'''
+(args) => {
+    const rules = args.rules, limit = args.limit, attr = args.attr;
+    const roots = [document];
+    for (let i = 0; i < roots.length; i++)
+        roots[i].querySelectorAll('*').forEach(el => { if (el.shadowRoot) roots.push(el.shadowRoot); });
+    // Clear tags from a previous call in every root: Playwright's locator pierces shadow roots too
+    for (const root of roots)
+        root.querySelectorAll('[' + attr + ']').forEach(el => el.removeAttribute(attr));
+    const visible = (el) => {
+        const r = el.getBoundingClientRect();
+        if (!(r.width > 0 && r.height > 0)) return false;
+        return getComputedStyle(el).visibility !== 'hidden';
+    };
+    const OVERLAY_WORDS = /cookie|consent|gdpr|ccpa|cmp|privacy|onetrust|cookiebot|termly|didomi|usercentrics/i;
+    const inOverlay = (el) => {
+        for (let n = el, depth = 0; n && n.nodeType === 1 && depth < 12; depth++) {
+            const cls = typeof n.className === 'string' ? n.className : '';
+            if (OVERLAY_WORDS.test((n.id || '') + ' ' + cls + ' ' + (n.getAttribute('aria-label') || ''))) return true;
+            const role = n.getAttribute('role');
+            if (role === 'dialog' || role === 'alertdialog' || n.tagName === 'DIALOG') return true;
+            const pos = getComputedStyle(n).position;
+            if (pos === 'fixed' || pos === 'sticky') return true;
+            n = n.parentElement || (n.parentNode && n.parentNode.host) || null;
+        }
+        return false;
+    };
+    const textOf = (el) => (el.innerText || el.textContent || '').replace(/\s+/g, ' ').trim();
+
+    const best = new Map();
+    rules.forEach((rule, index) => {
+        const needle = rule.text ? rule.text.toLowerCase() : null;
+        for (const root of roots) {
+            let els;
+            try { els = root.querySelectorAll(rule.css); } catch (e) { return; }
+            for (const el of els) {
+                if (needle !== null && !textOf(el).toLowerCase().includes(needle)) continue;
+                if (!visible(el)) continue;
+                const overlay = inOverlay(el);
+                const score = (rule.learned ? 10000 : 0) + (overlay ? 1000 : 0) + (rules.length - index);
+                const seen = best.get(el);
+                if (!seen || seen.score < score) best.set(el, { score: score, rule: rule.key, in_overlay: overlay, learned: !!rule.learned });
+            }
+        }
+    });
+    const ranked = Array.from(best.entries()).sort((a, b) => b[1].score - a[1].score).slice(0, limit);
+    return ranked.map(([el, hit], rank) => {
+        el.setAttribute(attr, String(rank));
+        return Object.assign(hit, { rank: rank, tag: el.tagName.toLowerCase(), text: textOf(el).slice(0, 80) });
+    });
+}
+'''
+
+
+def parse_rule(selector: str, learned: bool = False) -> Optional[Dict]:
+    """'div[role=dialog] button:has-text("Close")' -> {'key', 'css', 'text', 'learned'}; None for non-CSS engines"""
+    selector = (selector or '').strip()
+    if not selector or selector.startswith(('text=', 'xpath=', '//')) or '>>' in selector:
+        return None
+    text = None
+    m = _HAS_TEXT.match(selector)
+    if m:
+        if m.group('rest').strip():
+            return None
+        css, text = m.group('css').strip() or '*', m.group('text')
+    else:
+        css = selector
+    return {'key': selector, 'css': css, 'text': text, 'learned': learned}
+
+
+def build_rules(learned: Sequence[str] = ()) -> List[Dict]:
+    """Learned winners first (flagged), then DEFAULT_RULES; duplicates keep their learned flag"""
+    rules, seen = [], set()
+    for selector, is_learned in [(s, True) for s in learned] + [(s, False) for s in DEFAULT_RULES]:
+        rule = parse_rule(selector, learned=is_learned)
+        if rule and rule['key'] not in seen:
+            seen.add(rule['key'])
+            rules.append(rule)
+    return rules
+
+
+def find_candidates(page, learned: Sequence[str] = (), limit: int = MAX_CANDIDATES) -> List[Dict]:
+    """
+    Ranked visible overlay buttons on the page, in one evaluate.
+
+    Returns:
+        [{'rank', 'rule', 'score', 'in_overlay', 'learned', 'tag', 'text'}, ...] best first;
+        the element of rank N carries data-overlay-candidate="N". [] on error.
+    """
+    try:
+        return page.evaluate(OVERLAY_JS, {'rules': build_rules(learned), 'limit': limit, 'attr': CANDIDATE_ATTR}) or []
+    except Exception:
+        return []
+
+
+def top_hit_selector(rank: int = 0) -> str:
+    """Selector of a ranked candidate tagged by OVERLAY_JS"""
+    return f'[{CANDIDATE_ATTR}="{rank}"]'
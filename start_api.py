@@ -83,9 +83,11 @@ def start_celery():
     """Start Celery worker"""
     try:
         print("Starting Celery worker...")
+        from celery_app import QUEUE_SETTINGS
         subprocess.Popen([
             sys.executable, '-m', 'celery', 
             '-A', 'celery_app', 'worker', 
+            '-Q', ','.join(QUEUE_SETTINGS),
             '--loglevel=info'
         ])
         print("✓ Celery worker started")
@@ -30,5 +30,21 @@ CREATE TABLE IF NOT EXISTS brain_events (
 CREATE INDEX IF NOT EXISTS idx_brain_events_created ON brain_events(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_brain_events_type ON brain_events(event_type);
 
+-- Batched increments from brain_service's write buffer: one call applies every
+-- (pattern_type, pattern_value) delta, inserting patterns seen for the first time.
+CREATE OR REPLACE FUNCTION brain_record_patterns(deltas JSONB)
+RETURNS VOID
+LANGUAGE SQL
+AS $$
+  INSERT INTO brain_patterns (pattern_type, pattern_value, use_count, success_count, last_used_at, updated_at)
+  SELECT d.pattern_type, d.pattern_value, d.uses, d.successes, d.last_used_at, NOW()
+  FROM jsonb_to_recordset(deltas) AS d(pattern_type TEXT, pattern_value TEXT, uses INT, successes INT, last_used_at TIMESTAMPTZ)
+  ON CONFLICT (pattern_type, pattern_value) DO UPDATE SET
+    use_count = brain_patterns.use_count + EXCLUDED.use_count,
+    success_count = brain_patterns.success_count + EXCLUDED.success_count,
+    last_used_at = GREATEST(brain_patterns.last_used_at, EXCLUDED.last_used_at),
+    updated_at = NOW();
+$$;
+
 COMMENT ON TABLE brain_patterns IS 'Aggregated learned patterns (no domains). pattern_type: contact_keyword, cookie_selector, submit_selector, etc.';
 COMMENT ON TABLE brain_events IS 'Recent learning events for admin dashboard; no domain stored.';
@@ -1,341 +1,118 @@
-from celery import current_task
-from celery_app import celery_app
-from celery.schedules import crontab
-import subprocess
 import os
-import time
-from datetime import datetime
-import json
-from models import Campaign, Company, Job, db
-database = db
-from playwright.sync_api import sync_playwright
+import subprocess
+from celery_app import celery_app
+from job_runner import JobTask, JobFailed, run_job
 
-@celery_app.task(bind=True)
-def convert_video_async(self, job_id, input_path, output_format, quality, compression):
-    """Convert video file asynchronously"""
-    try:
-        # Update job status to processing
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'processing'
-            job.started_at = datetime.utcnow()
-            database.session.commit()
+VIDEO_FOLDER = "converted_videos"
+AUDIO_FOLDER = "converted_audio"
+IMAGE_FOLDER = "converted_images"
+TEXT_FOLDER = "saved_html"
+PDF_FOLDER = "edited"
 
-        # Generate output path
-        output_filename = f"{os.path.splitext(os.path.basename(input_path))[0]}_converted.{output_format}"
-        output_path = os.path.join("converted_videos", output_filename)
-        
-        # Ensure output directory exists
-        os.makedirs("converted_videos", exist_ok=True)
+VIDEO_CRF = {95: 18, 85: 23, 75: 28, 60: 32, 40: 35}
+VIDEO_PRESETS = ('ultrafast', 'fast', 'medium', 'slow', 'veryslow')
 
-        # FFmpeg command
-        quality_map = {95: 18, 85: 23, 75: 28, 60: 32, 40: 35}
-        preset_map = {'ultrafast': 'ultrafast', 'fast': 'fast', 'medium': 'medium', 'slow': 'slow', 'veryslow': 'veryslow'}
-        
-        crf = quality_map.get(quality, 28)
-        preset = preset_map.get(compression, 'medium')
-        
-        cmd = [
-            'ffmpeg', '-i', input_path,
-            '-c:v', 'libx264', '-crf', str(crf), '-preset', preset,
-            '-c:a', 'aac', '-b:a', '128k',
-            '-y', output_path
-        ]
 
-        # Run FFmpeg
-        start_time = time.time()
+def _run_tool(cmd, name):
+    """Run an external converter; a non-zero exit is a permanent failure"""
+    try:
         result = subprocess.run(cmd, capture_output=True, text=True)
-        processing_time = time.time() - start_time
+    except FileNotFoundError:
+        raise RuntimeError(f"{name} is not installed")
+    if result.returncode != 0:
+        raise JobFailed(f"{name} error: {result.stderr[-2000:]}")
 
-        # Update job status
-        if result.returncode == 0:
-            job.status = 'completed'
-            job.output_file_path = output_path
-            job.processing_time = processing_time
-            job.completed_at = datetime.utcnow()
-        else:
-            job.status = 'failed'
-            job.error_message = result.stderr
-            job.completed_at = datetime.utcnow()
 
-        database.session.commit()
-
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
-
-        return {
-            'status': job.status,
-            'output_path': job.output_file_path,
-            'processing_time': processing_time,
-            'error': job.error_message
-        }
+@celery_app.task(bind=True, base=JobTask)
+def convert_video_async(self, job_id, input_path, output_format, quality, compression):
+    """Convert video file asynchronously"""
+    crf = VIDEO_CRF.get(quality, 28)
+    preset = compression if compression in VIDEO_PRESETS else 'medium'
 
-    except Exception as e:
-        # Update job status to failed
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.completed_at = datetime.utcnow()
-            database.session.commit()
+    def convert(source, output_path):
+        _run_tool([
+            'ffmpeg', '-i', source,
+            '-c:v', 'libx264', '-crf', str(crf), '-preset', preset,
+            '-c:a', 'aac', '-b:a', '128k',
+            '-y', output_path
+        ], 'FFmpeg')
 
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
+    return run_job(self, job_id, input_path, VIDEO_FOLDER, output_format,
+                   {'format': output_format, 'crf': crf, 'preset': preset}, convert)
 
-        raise self.retry(exc=e, countdown=60, max_retries=3)
 
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, base=JobTask)
 def convert_audio_async(self, job_id, input_path, output_format, bitrate):
     """Convert audio file asynchronously"""
-    try:
-        # Update job status to processing
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'processing'
-            job.started_at = datetime.utcnow()
-            database.session.commit()
+    def convert(source, output_path):
+        _run_tool(['ffmpeg', '-i', source, '-b:a', f'{bitrate}k', '-y', output_path], 'FFmpeg')
 
-        # Generate output path
-        output_filename = f"{os.path.splitext(os.path.basename(input_path))[0]}_converted.{output_format}"
-        output_path = os.path.join("converted_audio", output_filename)
-        
-        # Ensure output directory exists
-        os.makedirs("converted_audio", exist_ok=True)
+    return run_job(self, job_id, input_path, AUDIO_FOLDER, output_format,
+                   {'format': output_format, 'bitrate': str(bitrate)}, convert)
 
-        # FFmpeg command for audio conversion
-        cmd = [
-            'ffmpeg', '-i', input_path,
-            '-b:a', f'{bitrate}k',
-            '-y', output_path
-        ]
-
-        # Run FFmpeg
-        start_time = time.time()
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        processing_time = time.time() - start_time
 
-        # Update job status
-        if result.returncode == 0:
-            job.status = 'completed'
-            job.output_file_path = output_path
-            job.processing_time = processing_time
-            job.completed_at = datetime.utcnow()
-        else:
-            job.status = 'failed'
-            job.error_message = result.stderr
-            job.completed_at = datetime.utcnow()
-
-        database.session.commit()
-
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
-
-        return {
-            'status': job.status,
-            'output_path': job.output_file_path,
-            'processing_time': processing_time,
-            'error': job.error_message
-        }
-
-    except Exception as e:
-        # Update job status to failed
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.completed_at = datetime.utcnow()
-            database.session.commit()
-
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
-
-        raise self.retry(exc=e, countdown=60, max_retries=3)
-
-@celery_app.task(bind=True)
+@celery_app.task(bind=True, base=JobTask)
 def convert_image_async(self, job_id, input_path, output_format, quality, width, height):
     """Convert image file asynchronously"""
-    try:
-        # Update job status to processing
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'processing'
-            job.started_at = datetime.utcnow()
-            database.session.commit()
-
-        # Generate output path
-        output_filename = f"{os.path.splitext(os.path.basename(input_path))[0]}_converted.{output_format}"
-        output_path = os.path.join("converted_images", output_filename)
-        
-        # Ensure output directory exists
-        os.makedirs("converted_images", exist_ok=True)
-
+    def convert(source, output_path):
         # ImageMagick command for image conversion
-        cmd = ['convert', input_path]
-        
-        # Add resize if specified
+        cmd = ['convert', source]
         if width and height:
             cmd.extend(['-resize', f'{width}x{height}'])
-        
-        # Add quality for JPEG
         if output_format.lower() in ['jpg', 'jpeg']:
             cmd.extend(['-quality', str(quality)])
-        
         cmd.append(output_path)
+        _run_tool(cmd, 'ImageMagick')
 
-        # Run ImageMagick
-        start_time = time.time()
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        processing_time = time.time() - start_time
+    return run_job(self, job_id, input_path, IMAGE_FOLDER, output_format,
+                   {'format': output_format, 'quality': quality, 'width': width, 'height': height}, convert)
 
-        # Update job status
-        if result.returncode == 0:
-            job.status = 'completed'
-            job.output_file_path = output_path
-            job.processing_time = processing_time
-            job.completed_at = datetime.utcnow()
-        else:
-            job.status = 'failed'
-            job.error_message = result.stderr
-            job.completed_at = datetime.utcnow()
 
-        database.session.commit()
+def _extract_text(source, output_path):
+    import fitz
+    with fitz.open(source) as doc, open(output_path, 'w', encoding='utf-8') as f:
+        for page in doc:
+            f.write(page.get_text())
 
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
 
-        return {
-            'status': job.status,
-            'output_path': job.output_file_path,
-            'processing_time': processing_time,
-            'error': job.error_message
-        }
+def _extract_images(source, output_path):
+    import fitz
+    os.makedirs(output_path, exist_ok=True)
+    with fitz.open(source) as doc:
+        for page_num in range(len(doc)):
+            for img_index, img in enumerate(doc[page_num].get_images()):
+                pix = fitz.Pixmap(doc, img[0])
+                if pix.n - pix.alpha < 4:  # GRAY or RGB
+                    pix.save(os.path.join(output_path, f"page_{page_num}_img_{img_index}.png"))
 
-    except Exception as e:
-        # Update job status to failed
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.completed_at = datetime.utcnow()
-            database.session.commit()
 
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
+def _compress(source, output_path):
+    _run_tool([
+        'gs', '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4',
+        '-dPDFSETTINGS=/ebook', '-dNOPAUSE', '-dQUIET', '-dBATCH',
+        f'-sOutputFile={output_path}', source
+    ], 'Ghostscript')
 
-        raise self.retry(exc=e, countdown=60, max_retries=3)
 
-@celery_app.task(bind=True)
-def process_pdf_async(self, job_id, input_path, operation, **kwargs):
-    """Process PDF file asynchronously"""
-    try:
-        # Update job status to processing
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'processing'
-            job.started_at = datetime.utcnow()
-            database.session.commit()
-
-        # Generate output path based on operation
-        base_name = os.path.splitext(os.path.basename(input_path))[0]
-        
-        if operation == 'extract_text':
-            output_path = os.path.join("saved_html", f"{base_name}_extracted.txt")
-        elif operation == 'extract_images':
-            output_path = os.path.join("converted_images", f"{base_name}_images")
-        elif operation == 'compress':
-            output_path = os.path.join("edited", f"{base_name}_compressed.pdf")
-        else:
-            output_path = os.path.join("edited", f"{base_name}_processed.pdf")
-
-        # Ensure output directory exists
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+# operation -> (result folder, result extension or None for a directory, step)
+PDF_OPERATIONS = {
+    'extract_text': (TEXT_FOLDER, 'txt', _extract_text),
+    'extract_images': (IMAGE_FOLDER, None, _extract_images),
+    'compress': (PDF_FOLDER, 'pdf', _compress),
+}
 
-        # Process PDF based on operation
-        start_time = time.time()
-        
-        if operation == 'extract_text':
-            # Extract text using PyMuPDF
-            import fitz
-            doc = fitz.open(input_path)
-            text = ""
-            for page in doc:
-                text += page.get_text()
-            doc.close()
-            
-            with open(output_path, 'w', encoding='utf-8') as f:
-                f.write(text)
-                
-        elif operation == 'extract_images':
-            # Extract images using PyMuPDF
-            import fitz
-            doc = fitz.open(input_path)
-            os.makedirs(output_path, exist_ok=True)
-            
-            for page_num in range(len(doc)):
-                page = doc[page_num]
-                image_list = page.get_images()
-                
-                for img_index, img in enumerate(image_list):
-                    xref = img[0]
-                    pix = fitz.Pixmap(doc, xref)
-                    if pix.n - pix.alpha < 4:  # GRAY or RGB
-                        pix.save(f"{output_path}/page_{page_num}_img_{img_index}.png")
-                    pix = None
-            
-            doc.close()
-            
-        elif operation == 'compress':
-            # Compress PDF using Ghostscript
-            cmd = [
-                'gs', '-sDEVICE=pdfwrite', '-dCompatibilityLevel=1.4',
-                '-dPDFSETTINGS=/ebook', '-dNOPAUSE', '-dQUIET', '-dBATCH',
-                f'-sOutputFile={output_path}', input_path
-            ]
-            result = subprocess.run(cmd, capture_output=True, text=True)
-            
-            if result.returncode != 0:
-                raise Exception(f"Ghostscript error: {result.stderr}")
-        
-        processing_time = time.time() - start_time
 
-        # Update job status
-        job.status = 'completed'
-        job.output_file_path = output_path
-        job.processing_time = processing_time
-        job.completed_at = datetime.utcnow()
-        database.session.commit()
-
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
-
-        return {
-            'status': job.status,
-            'output_path': job.output_file_path,
-            'processing_time': processing_time,
-            'error': job.error_message
-        }
-
-    except Exception as e:
-        # Update job status to failed
-        job = Job.query.filter_by(job_id=job_id).first()
-        if job:
-            job.status = 'failed'
-            job.error_message = str(e)
-            job.completed_at = datetime.utcnow()
-            database.session.commit()
+@celery_app.task(bind=True, base=JobTask)
+def process_pdf_async(self, job_id, input_path, operation, **kwargs):
+    """Process PDF file asynchronously"""
+    if operation not in PDF_OPERATIONS:
+        def convert(source, output_path):
+            raise JobFailed(f"Unsupported PDF operation: {operation}")
+        return run_job(self, job_id, input_path, PDF_FOLDER, 'pdf', {'operation': operation}, convert)
 
-        # Clean up input file
-        if os.path.exists(input_path):
-            os.remove(input_path)
+    folder, extension, step = PDF_OPERATIONS[operation]
+    return run_job(self, job_id, input_path, folder, extension, dict(kwargs, operation=operation), step)
 
-        raise self.retry(exc=e, countdown=60, max_retries=3)
 
 # Re-export for code that still imports from tasks (e.g. scripts).
 # Campaign batch route imports from campaign_sequential to avoid loading Celery/Redis.
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for the set-based analytics query layer.
+Sessions with page views and events are seeded into an in-memory SQLite
+database; the row_number() window, GROUP BY breakdowns and keyset cursor
+pagination are checked against plain Python over the same data.
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from models import AnalyticsEvent, PageView, UserSession
+from analytics_queries import (
+    session_filter_condition, fetch_sessions_page, fetch_top_per_session, count_per_session,
+    session_aggregates, encode_cursor, decode_cursor,
+)
+
+NOW = datetime(2026, 3, 1, 12)
+SESSIONS = 12
+START = NOW - timedelta(days=1)
+
+
+def create_app():
+    """In-memory database: SESSIONS sessions, session i has 3*i page views and i events"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        db.session.execute(UserSession.__table__.insert(), [{
+            'id': f's{i:02d}', 'start_time': NOW - timedelta(minutes=i // 2),  # pairs share a start_time
+            'last_activity': NOW, 'device_type': 'mobile' if i % 2 else 'desktop',
+            'city': 'Paris' if i % 3 else 'Lyon', 'country': 'France', 'is_active': True, 'created_at': NOW,
+        } for i in range(SESSIONS)] + [{
+            'id': 'old', 'start_time': NOW - timedelta(days=5), 'last_activity': NOW - timedelta(days=5),
+            'device_type': 'mobile', 'city': 'Paris', 'country': 'France', 'is_active': True, 'created_at': NOW,
+        }])
+        db.session.execute(PageView.__table__.insert(), [{
+            'session_id': f's{i:02d}', 'page_url': f'https://site.test/p{n % 2}?ref={n}',
+            'timestamp': NOW - timedelta(seconds=n), 'created_at': NOW,
+        } for i in range(SESSIONS) for n in range(3 * i)])
+        db.session.execute(AnalyticsEvent.__table__.insert(), [{
+            'session_id': f's{i:02d}', 'event_type': 'click', 'event_name': 'signup' if n == 0 else 'scroll',
+            'page_url': 'https://site.test/', 'timestamp': NOW - timedelta(seconds=n), 'created_at': NOW,
+        } for i in range(SESSIONS) for n in range(i)])
+        db.session.commit()
+    return app
+
+
+def test_top_per_session_window():
+    """Each session gets its newest rows, capped per session, newest first"""
+    app = create_app()
+    with app.app_context():
+        ids = ['s01', 's05', 's11', 'missing']
+        top = fetch_top_per_session(PageView, ['page_url', 'timestamp'], ids, START, per_session=10)
+        assert set(top) == {'s01', 's05', 's11'}
+        assert len(top['s01']) == 3 and len(top['s05']) == 10 and len(top['s11']) == 10
+        times = [row[2] for row in top['s11']]
+        assert times == sorted(times, reverse=True) and times[0] == NOW
+        assert fetch_top_per_session(PageView, ['page_url'], [], START) == {}
+
+
+def test_counts_and_aggregates():
+    """GROUP BY counts match the seeded data; breakdowns group by path and location"""
+    app = create_app()
+    with app.app_context():
+        counts = count_per_session(PageView, ['s00', 's04', 's07'], START)
+        assert counts == {'s04': 12, 's07': 21}
+
+        condition = session_filter_condition('device', 'mobile', START)
+        mobile = [i for i in range(SESSIONS) if i % 2]
+        totals = session_aggregates(condition, START)
+        assert totals['total_sessions'] == len(mobile)
+        assert totals['total_page_views'] == sum(3 * i for i in mobile)
+        assert totals['total_events'] == sum(mobile)
+        assert totals['events_breakdown']['signup'] == len(mobile)
+        assert set(totals['pages_breakdown']) == {'/p0', '/p1'}
+        assert sum(totals['location_breakdown'].values()) == len(mobile)
+
+        event_condition = session_filter_condition('event', 'signup', START)
+        assert session_aggregates(event_condition, START)['total_sessions'] == SESSIONS - 1
+        assert session_filter_condition('planet', 'mars', START) is None
+
+
+def test_cursor_pagination_walks_every_session_once():
+    """Keyset pages cover all sessions in (start_time, id) DESC order, ties included"""
+    app = create_app()
+    with app.app_context():
+        condition = session_filter_condition('country', 'France', START)
+        expected = [s.id for s in UserSession.query.filter(condition).order_by(
+            UserSession.start_time.desc(), UserSession.id.desc())]
+        seen, cursor, pages = [], None, 0
+        while True:
+            page, cursor = fetch_sessions_page(condition, cursor=cursor, limit=5)
+            seen += [s.id for s in page]
+            pages += 1
+            if cursor is None:
+                break
+        assert seen == expected and len(seen) == SESSIONS and pages == 3
+
+        # Non-positive limits still return a page instead of failing on an empty slice
+        page, cursor = fetch_sessions_page(condition, limit=0)
+        assert len(page) == 1 and cursor is not None
+
+
+def test_cursor_round_trip_and_rejection():
+    """Cursors decode back to (start_time, id); garbage raises ValueError"""
+    session = UserSession(id='abc|def', start_time=NOW)
+    assert decode_cursor(encode_cursor(session)) == (NOW, 'abc|def')
+    for bad in ('', 'not-base64!', 'bm9waXBl'):
+        try:
+            decode_cursor(bad)
+            assert False, bad
+        except ValueError:
+            pass
+
+
+if __name__ == '__main__':
+    test_top_per_session_window()
+    test_counts_and_aggregates()
+    test_cursor_pagination_walks_every_session_once()
+    test_cursor_round_trip_and_rejection()
+    print('OK')
@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+"""
+Regression tests for the per-user billing ledger.
+Seeds an in-memory SQLite database with many customers' payment notifications,
+backfills the ledger and checks that one user's billing history costs a constant
+number of queries, pages correctly and that invoice PDFs are cached.
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+from flask_jwt_extended import JWTManager, create_access_token
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from models import User, Notification, BillingLedgerEntry
+import billing_ledger
+
+USER_COUNT = 2000
+PAYMENTS_PER_USER = 5
+
+
+def create_app():
+    """Minimal app bound to an in-memory database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'test'
+    db.init_app(app)
+    JWTManager(app)
+    from api.payment.routes import payment_api
+    app.register_blueprint(payment_api)
+    return app
+
+
+def seed(app):
+    """USER_COUNT users with PAYMENTS_PER_USER payment notifications each, then backfill"""
+    now = datetime.utcnow()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {
+                'id': i,
+                'email': f'user{i}@example.com',
+                'password_hash': 'x',
+                'role': 'user',
+                'is_active': True,
+                'created_at': now - timedelta(days=365),
+                'subscription_tier': 'premium',
+                'monthly_call_limit': 5000,
+                'monthly_used': 0,
+                'monthly_reset_date': now,
+            }
+            for i in range(1, USER_COUNT + 1)
+        ])
+        db.session.execute(Notification.__table__.insert(), [
+            {
+                'title': 'Payment Received: Production Plan',
+                'message': 'Payment received',
+                'type': 'payment',
+                'category': 'payment',
+                'is_read': False,
+                'notification_metadata': {'user_id': i, 'payment_id': f'pay-{i}-{n}', 'amount': 9.0, 'tier': 'premium'},
+                'created_at': now - timedelta(days=n),
+            }
+            for i in range(1, USER_COUNT + 1)
+            for n in range(PAYMENTS_PER_USER)
+        ])
+        # Orphaned notification (deleted user) and a non-billing one - both skipped
+        db.session.execute(Notification.__table__.insert(), [
+            {'title': 'Payment Received: Old', 'message': 'x', 'type': 'payment', 'category': 'payment',
+             'is_read': False, 'notification_metadata': {'user_id': USER_COUNT + 1, 'amount': 9.0}, 'created_at': now},
+            {'title': 'System', 'message': 'x', 'type': 'info', 'category': 'system',
+             'is_read': False, 'notification_metadata': {'user_id': 1}, 'created_at': now},
+        ])
+        db.session.commit()
+        billing_ledger.backfill_ledger()
+
+
+class QueryCounter:
+    """Count SQL statements executed against the engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+_app = None
+
+
+def get_app():
+    global _app
+    if _app is None:
+        _app = create_app()
+        seed(_app)
+    return _app
+
+
+def test_backfill_copies_only_billable_rows():
+    """Every user's payments are copied once; orphaned and system notifications are not"""
+    app = get_app()
+    with app.app_context():
+        assert BillingLedgerEntry.query.count() == USER_COUNT * PAYMENTS_PER_USER
+        assert billing_ledger.backfill_ledger() == 0  # re-run is a no-op
+
+        entry = BillingLedgerEntry.query.filter_by(user_id=7).order_by(BillingLedgerEntry.created_at.desc()).first()
+        assert entry.invoice == 'Production Plan'
+        assert entry.amount == 9.0
+        assert entry.payment_id == 'pay-7-0'
+        assert entry.to_dict()['status'] == 'Paid'
+
+
+def test_history_page_is_constant_queries():
+    """One user's page costs a single query regardless of total customers"""
+    app = get_app()
+    with app.app_context():
+        user = db.session.get(User, 42)
+        start = time.perf_counter()
+        with QueryCounter(db.engine) as counter:
+            entries, next_cursor = billing_ledger.fetch_ledger_page(user.id, user.created_at, limit=50)
+        print(f"   history page: {counter.count} queries in {(time.perf_counter() - start) * 1000:.1f}ms")
+
+        assert counter.count == 1
+        assert len(entries) == PAYMENTS_PER_USER
+        assert next_cursor is None
+        assert {entry.user_id for entry in entries} == {42}
+
+
+def test_keyset_pagination_walks_all_entries():
+    """Following next_cursor visits every entry once, newest first"""
+    app = get_app()
+    with app.app_context():
+        user = db.session.get(User, 42)
+        seen = []
+        cursor = None
+        while True:
+            entries, cursor = billing_ledger.fetch_ledger_page(user.id, user.created_at, cursor=cursor, limit=2)
+            seen.extend(entries)
+            if cursor is None:
+                break
+        assert [entry.payment_id for entry in seen] == [f'pay-42-{n}' for n in range(PAYMENTS_PER_USER)]
+
+        try:
+            billing_ledger.fetch_ledger_page(user.id, user.created_at, cursor='not-a-cursor')
+            assert False, 'malformed cursor accepted'
+        except ValueError:
+            pass
+
+
+def test_new_payment_notification_writes_ledger():
+    """create_payment_notification mirrors the notification into the ledger"""
+    from notification_service import create_payment_notification
+    app = get_app()
+    with app.app_context():
+        notification = create_payment_notification(
+            title='Payment Received: Enterprise Plan',
+            message='Payment of $19.00 received',
+            payment_id='pay-new',
+            user_id=3,
+            user_email='user3@example.com',
+            amount=19.0
+        )
+        entry = BillingLedgerEntry.query.filter_by(notification_id=notification.id).one()
+        assert entry.user_id == 3
+        assert entry.invoice == 'Enterprise Plan'
+        assert entry.amount == 19.0
+
+
+def test_invoice_pdf_is_cached():
+    """The invoice PDF is rendered on first download only"""
+    import email_service
+    app = get_app()
+    calls = []
+
+    def fake_render(**kwargs):
+        calls.append(kwargs)
+        return b'%PDF-1.4 invoice'
+
+    original = email_service.generate_invoice_pdf
+    email_service.generate_invoice_pdf = fake_render
+    try:
+        with app.app_context():
+            entry = BillingLedgerEntry.query.filter_by(user_id=5).first()
+            pdf, cached = billing_ledger.get_invoice_pdf(entry, 'user5@example.com')
+            assert (pdf, cached) == (b'%PDF-1.4 invoice', False)
+            db.session.expire_all()
+
+            entry = db.session.get(BillingLedgerEntry, entry.id)
+            pdf, cached = billing_ledger.get_invoice_pdf(entry, 'user5@example.com')
+            assert (pdf, cached) == (b'%PDF-1.4 invoice', True)
+            assert len(calls) == 1
+            assert calls[0]['template_name'] == 'subscription-invoice.html'
+    finally:
+        email_service.generate_invoice_pdf = original
+
+
+def test_interrupted_backfill_resumes():
+    """A backfill that dies mid-way leaves its committed batches; the next run copies only what is missing"""
+    app = get_app()
+    with app.app_context():
+        lost = BillingLedgerEntry.query.filter(BillingLedgerEntry.user_id.between(10, 29)).delete()
+        db.session.commit()
+        assert lost == 20 * PAYMENTS_PER_USER and billing_ledger.backfill_pending()
+
+        original = billing_ledger._entry_fields
+        calls = []
+
+        def failing_fields(notification, user_id):
+            calls.append(notification.id)
+            if len(calls) > 30:
+                raise TimeoutError('Database initialization timed out')
+            return original(notification, user_id)
+
+        billing_ledger._entry_fields = failing_fields
+        try:
+            billing_ledger.backfill_ledger(batch_size=10)
+            assert False, 'interruption not raised'
+        except TimeoutError:
+            db.session.rollback()
+        finally:
+            billing_ledger._entry_fields = original
+        assert BillingLedgerEntry.query.count() == USER_COUNT * PAYMENTS_PER_USER + 1 - lost + 30
+
+        assert billing_ledger.backfill_ledger(batch_size=10) == lost - 30
+        assert BillingLedgerEntry.query.count() == USER_COUNT * PAYMENTS_PER_USER + 1
+
+
+def test_download_invoice_requires_the_owner():
+    """A ledger invoice is only served to its owner: by JWT identity, or by case-insensitive email"""
+    import email_service
+    app = get_app()
+    with app.app_context():
+        entry_id = BillingLedgerEntry.query.filter_by(user_id=8).first().id
+        owner_token = create_access_token(identity='8')
+        other_token = create_access_token(identity='9')
+
+    original = email_service.generate_invoice_pdf
+    email_service.generate_invoice_pdf = lambda **kwargs: b'%PDF-1.4 invoice'
+    try:
+        client = app.test_client()
+
+        def download(token, **body):
+            return client.post('/api/payment/download-invoice', json=dict(body, ledger_id=entry_id),
+                               headers={'Authorization': f'Bearer {token}'}).status_code
+
+        assert download(other_token) == 404
+        assert download(other_token, user_email='user8@example.com') == 404
+        assert download(owner_token) == 200
+        # Bearer tokens not issued by this app: the stated email must match the owner
+        assert download('external-token') == 404
+        assert download('external-token', user_email='user9@example.com') == 404
+        assert download('external-token', user_email=' User8@Example.com ') == 200
+    finally:
+        email_service.generate_invoice_pdf = original
+
+
+def main():
+    """Run all tests"""
+    print(f"[START] Seeding {USER_COUNT * PAYMENTS_PER_USER} payment notifications...")
+    start = time.perf_counter()
+    get_app()
+    print(f"   Seeded and backfilled in {time.perf_counter() - start:.1f}s")
+
+    tests = [
+        test_backfill_copies_only_billable_rows,
+        test_history_page_is_constant_queries,
+        test_keyset_pagination_walks_all_entries,
+        test_new_payment_notification_writes_ledger,
+        test_invoice_pdf_is_cached,
+        test_interrupted_backfill_resumes,
+        test_download_invoice_requires_the_owner,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[OK] {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"[ERROR] {test.__name__}: {e}")
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
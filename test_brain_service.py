@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Tests for the brain write buffer and the top-patterns cache.
+A recording Supabase client counts remote calls: a company run's worth of
+pattern uses and events must flush as one RPC plus one insert, and repeated
+get_top_patterns calls (across "processes" sharing a cache) must not query.
+"""
+
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import brain_service
+
+
+class Query:
+    def __init__(self, client, table):
+        self.client = client
+        self.call = {'table': table, 'ops': []}
+
+    def __getattr__(self, op):
+        def chain(*args, **kwargs):
+            self.call['ops'].append((op, args))
+            return self
+        return chain
+
+    def execute(self):
+        self.client.calls.append(self.call)
+        return type('Response', (), {'data': self.client.answer(self.call)})()
+
+
+class Table:
+    """Each select/insert/update on a table handle starts a new request, like postgrest's builders"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+
+    def __getattr__(self, op):
+        return getattr(Query(self.client, self.name), op)
+
+
+class RecordingClient:
+    """Supabase client stand-in: every execute() is one remote round trip"""
+
+    def __init__(self, rpc_available=True, top=()):
+        self.calls = []
+        self.rpc_available = rpc_available
+        self.top = list(top)
+
+    def table(self, name):
+        return Table(self, name)
+
+    def rpc(self, name, params):
+        if not self.rpc_available:
+            raise RuntimeError('Could not find the function public.brain_record_patterns')
+        query = Query(self, 'rpc:' + name)
+        query.call['ops'].append(('params', (params,)))
+        return query
+
+    def answer(self, call):
+        if call['ops'][0][0] == 'select' and call['table'] == 'brain_patterns':
+            if 'pattern_value' == call['ops'][0][1][0]:
+                return [{'pattern_value': v} for v in self.top]
+            return []
+        return None
+
+
+class FlakyClient(RecordingClient):
+    """RecordingClient whose RPC, event inserts or n-th pattern write raise"""
+
+    def __init__(self, rpc_error=None, fail_events=False, fail_pattern_write=None, **kwargs):
+        super().__init__(**kwargs)
+        self.rpc_error = rpc_error
+        self.fail_events = fail_events
+        self.fail_pattern_write = fail_pattern_write
+        self.pattern_writes = 0
+
+    def rpc(self, name, params):
+        if self.rpc_error:
+            raise self.rpc_error
+        return super().rpc(name, params)
+
+    def answer(self, call):
+        if call['table'] == 'brain_events' and self.fail_events:
+            raise ConnectionError('server closed the connection unexpectedly')
+        if call['table'] == 'brain_patterns' and call['ops'][0][0] in ('insert', 'update'):
+            self.pattern_writes += 1
+            if self.pattern_writes == self.fail_pattern_write:
+                raise ConnectionError('server closed the connection unexpectedly')
+        return super().answer(call)
+
+
+class OfflineClient:
+    def table(self, name):
+        raise ConnectionError('offline')
+
+    def rpc(self, name, params):
+        raise ConnectionError('offline')
+
+
+class SharedCache:
+    """Redis stand-in shared by two simulated worker processes"""
+
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        value, expires = self.data.get(key, (None, 0))
+        return value if expires > time.time() else None
+
+    def setex(self, key, ttl, value):
+        self.data[key] = (value, time.time() + ttl)
+
+
+def _use(client, shared=None):
+    brain_service._supabase = client
+    brain_service._redis_client = shared
+    brain_service._redis_checked = True
+    brain_service._local_top.clear()
+    brain_service._buffer = brain_service.BrainWriteBuffer(flush_interval=3600)
+
+
+def test_company_run_flushes_as_one_rpc_and_one_insert():
+    """100 pattern uses over 3 patterns + 20 events -> 2 remote calls with summed deltas"""
+    client = RecordingClient()
+    _use(client)
+    for i in range(100):
+        brain_service.record_pattern_use('contact_keyword', ['contact', 'kontakt', 'enquiry'][i % 3], success=i % 2 == 0)
+    for i in range(20):
+        brain_service.record_event('cookie_modal', 'dismissed', pattern_value='#accept')
+    assert client.calls == []
+
+    assert brain_service.flush() == 23
+    assert len(client.calls) == 2
+    rpc, insert = client.calls
+    assert rpc['table'] == 'rpc:brain_record_patterns'
+    deltas = {d['pattern_value']: (d['uses'], d['successes']) for d in rpc['ops'][0][1][0]['deltas']}
+    assert deltas == {'contact': (34, 17), 'kontakt': (33, 16), 'enquiry': (33, 17)}
+    assert insert['table'] == 'brain_events' and len(insert['ops'][0][1][0]) == 20
+    assert brain_service.flush() == 0 and len(client.calls) == 2
+
+
+def test_failed_flush_keeps_the_deltas():
+    """A write error puts the batch back; without the RPC patterns are written one by one"""
+    client = RecordingClient(rpc_available=False)
+    _use(client)
+    brain_service.record_pattern_use('cookie_selector', '#accept', success=True)
+    brain_service._supabase = OfflineClient()
+    assert brain_service.flush() == 0
+    assert brain_service._buffer.pending() == 1
+
+    brain_service._supabase = client
+    brain_service.record_pattern_use('cookie_selector', '#accept', success=False)
+    assert brain_service.flush() == 1
+    insert = [c for c in client.calls if c['table'] == 'brain_patterns' and c['ops'][0][0] == 'insert'][0]
+    row = insert['ops'][0][1][0]
+    assert (row['use_count'], row['success_count']) == (2, 1)
+
+
+def test_top_patterns_are_cached_and_shared():
+    """Repeated lookups hit the process cache; a second process reads the shared cache, not Supabase"""
+    shared = SharedCache()
+    client = RecordingClient(top=['contact', 'kontakt'])
+    _use(client, shared)
+    for _ in range(12):
+        assert brain_service.get_top_patterns('contact_keyword', limit=30) == ['contact', 'kontakt']
+    assert len(client.calls) == 1
+    assert json.loads(shared.get('brain:top:contact_keyword:30')) == ['contact', 'kontakt']
+
+    other = RecordingClient(top=['something else'])
+    _use(other, shared)
+    assert brain_service.get_top_patterns('contact_keyword', limit=30) == ['contact', 'kontakt']
+    assert other.calls == []
+
+
+def test_background_thread_flushes_on_size():
+    """Reaching flush_size wakes the flush thread without waiting for the interval"""
+    client = RecordingClient()
+    _use(client)
+    brain_service._buffer = brain_service.BrainWriteBuffer(flush_interval=3600, flush_size=5)
+    for i in range(5):
+        brain_service.record_pattern_use('field_email', f'email{i}', success=True)
+    deadline = time.time() + 5
+    while not client.calls and time.time() < deadline:
+        time.sleep(0.01)
+    assert client.calls and client.calls[0]['table'] == 'rpc:brain_record_patterns'
+
+
+def test_partial_failures_are_not_double_counted():
+    """A failed events insert keeps applied deltas out of the retry; transient RPC errors do not fall back"""
+    client = FlakyClient(fail_events=True)
+    _use(client)
+    brain_service.record_pattern_use('contact_keyword', 'contact', success=True)
+    brain_service.record_event('cookie_modal', 'dismissed')
+    assert brain_service.flush() == 1
+    client.fail_events = False
+    assert brain_service.flush() == 1
+    assert [c['table'] for c in client.calls] == ['rpc:brain_record_patterns', 'brain_events', 'brain_events']
+
+    client = FlakyClient(rpc_error=ConnectionError('timeout'))
+    _use(client)
+    brain_service.record_pattern_use('contact_keyword', 'contact', success=True)
+    assert brain_service.flush() == 0
+    assert client.calls == [] and brain_service._buffer.pending() == 1
+
+    # Missing function: per-pattern writes; the 2nd of 3 fails, so only it and the 3rd go back
+    client = FlakyClient(rpc_error=RuntimeError('Could not find the function public.brain_record_patterns'),
+                         fail_pattern_write=2)
+    _use(client)
+    for value in ('a', 'b', 'c'):
+        brain_service.record_pattern_use('field_email', value, success=True)
+    assert brain_service.flush() == 1
+    assert brain_service.flush() == 2
+    inserted = [c['ops'][0][1][0]['pattern_value'] for c in client.calls
+                if c['table'] == 'brain_patterns' and c['ops'][0][0] == 'insert']
+    assert inserted == ['a', 'b', 'b', 'c']
+
+
+if __name__ == '__main__':
+    test_company_run_flushes_as_one_rpc_and_one_insert()
+    test_failed_flush_keeps_the_deltas()
+    test_top_patterns_are_cached_and_shared()
+    test_background_thread_flushes_on_size()
+    test_partial_failures_are_not_double_counted()
+    print('OK')
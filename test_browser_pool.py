@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent browser pool.
+Uses an in-process stand-in for Playwright so pool behaviour (warm reuse,
+recycling after K jobs, failure isolation, per-job timeouts and health-check
+restarts) can be checked without a Chromium install.
+"""
+
+import os
+import sys
+import time
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from browser_pool import BrowserPool, BrowserPoolError
+
+
+class FakePage:
+    def __init__(self):
+        self.closed = False
+        self.content = None
+
+    def set_default_timeout(self, ms):
+        self.timeout_ms = ms
+
+    def is_closed(self):
+        return self.closed
+
+    def close(self):
+        self.closed = True
+
+    def set_content(self, html, wait_until=None):
+        self.content = html
+
+    def evaluate(self, script):
+        return True
+
+    def pdf(self, **options):
+        return b'%PDF-1.4 ' + self.content.encode('utf-8')
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+
+    def new_page(self):
+        page = FakePage()
+        self.browser.pages.append(page)
+        return page
+
+    def close(self):
+        pass
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.pages = []
+
+    def new_context(self, **kwargs):
+        return FakeContext(self)
+
+    def is_connected(self):
+        return self.connected
+
+    def close(self):
+        self.connected = False
+
+
+class FakePlaywright:
+    def stop(self):
+        pass
+
+
+class FakeLauncher:
+    def __init__(self):
+        self.browsers = []
+        self.lock = threading.Lock()
+
+    def __call__(self):
+        with self.lock:
+            browser = FakeBrowser()
+            self.browsers.append(browser)
+            return FakePlaywright(), browser
+
+
+def make_pool(**kwargs):
+    launcher = FakeLauncher()
+    options = dict(size=1, max_jobs=1000, max_rss_mb=10 ** 6, job_timeout=5, health_check_interval=0.05)
+    options.update(kwargs)
+    return BrowserPool(launcher=launcher, **options), launcher
+
+
+def test_browser_is_reused_across_jobs():
+    """Many conversions share one warm browser and page"""
+    pool, launcher = make_pool()
+    try:
+        for i in range(10):
+            assert pool.html_to_pdf(f'<p>{i}</p>') == f'%PDF-1.4 <p>{i}</p>'.encode('utf-8')
+        assert len(launcher.browsers) == 1
+        assert len(launcher.browsers[0].pages) == 1
+        assert pool.stats()['completed'] == 10
+    finally:
+        pool.shutdown()
+
+
+def test_browser_restarts_after_max_jobs():
+    """A browser is recycled after max_jobs conversions"""
+    pool, launcher = make_pool(max_jobs=3)
+    try:
+        for i in range(7):
+            pool.html_to_pdf('<p>x</p>')
+        assert len(launcher.browsers) == 3
+        assert pool.stats()['restarts'] == 2
+    finally:
+        pool.shutdown()
+
+
+def test_failed_job_discards_page():
+    """Errors propagate to the caller and the next job gets a fresh page"""
+    pool, launcher = make_pool()
+    try:
+        def boom(page):
+            raise ValueError('render failed')
+        try:
+            pool.run(boom)
+            assert False, 'exception not propagated'
+        except ValueError:
+            pass
+        assert pool.html_to_pdf('<p>ok</p>').startswith(b'%PDF')
+        pages = launcher.browsers[0].pages
+        assert len(pages) == 2 and pages[0].closed
+        assert pool.stats()['failed'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_job_timeout():
+    """A slow job raises BrowserPoolError and the pool keeps serving"""
+    pool, launcher = make_pool()
+    try:
+        start = time.perf_counter()
+        try:
+            pool.run(lambda page: time.sleep(0.5), timeout=0.1)
+            assert False, 'timeout not raised'
+        except BrowserPoolError:
+            pass
+        assert time.perf_counter() - start < 0.4
+        assert pool.html_to_pdf('<p>after</p>').startswith(b'%PDF')
+        assert pool.stats()['timeouts'] >= 1
+    finally:
+        pool.shutdown()
+
+
+def test_health_check_restarts_disconnected_browser():
+    """A crashed browser is relaunched by the idle health check"""
+    pool, launcher = make_pool()
+    try:
+        pool.html_to_pdf('<p>1</p>')
+        launcher.browsers[0].connected = False
+        time.sleep(0.2)
+        pool.html_to_pdf('<p>2</p>')
+        assert len(launcher.browsers) == 2
+        assert pool.stats()['restarts'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_parallel_jobs_use_all_workers():
+    """Concurrent callers are spread across the pool's browsers"""
+    pool, launcher = make_pool(size=3)
+    try:
+        def slow(page):
+            time.sleep(0.1)
+            return True
+        threads = [threading.Thread(target=pool.run, args=(slow,)) for _ in range(6)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert time.perf_counter() - start < 0.5
+        assert len(launcher.browsers) == 3
+    finally:
+        pool.shutdown()
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_browser_is_reused_across_jobs,
+        test_browser_restarts_after_max_jobs,
+        test_failed_job_discards_page,
+        test_job_timeout,
+        test_health_check_restarts_disconnected_browser,
+        test_parallel_jobs_use_all_workers,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[OK] {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"[ERROR] {test.__name__}: {e}")
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Tests for incremental campaign counters.
+Company status changes on an in-memory SQLite database must move the campaign
+counters in the same commit without any COUNT query, bulk preflight failures
+must be counted explicitly, and reconciliation must repair deliberate drift.
+"""
+
+import os
+import sys
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from models import Campaign, Company
+import campaign_counters
+from campaign_counters import (
+    COUNTER_COLUMNS, counter_deltas, reconcile_counters, record_bulk_transitions, record_bulk_moves,
+)
+
+COMPANIES = 50
+
+
+def create_app():
+    """Minimal app bound to an in-memory database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    campaign_counters.install()
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def seed_campaign(name='Kitchens'):
+    """A processing campaign with COMPANIES pending companies; returns its id"""
+    campaign = Campaign(name=name, message_template='Hello', status='processing', total_companies=COMPANIES)
+    db.session.add(campaign)
+    db.session.flush()
+    db.session.add_all([Company(campaign_id=campaign.id, company_name=f'Company {i}',
+                                website_url=f'https://company{i}.test') for i in range(COMPANIES)])
+    db.session.commit()
+    return campaign.id
+
+
+def counters(campaign_id):
+    row = db.session.query(*[getattr(Campaign, c) for c in COUNTER_COLUMNS]).filter(Campaign.id == campaign_id).one()
+    return dict(zip(COUNTER_COLUMNS, row))
+
+
+class StatementLog:
+    """Record SQL statements executed against the engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def test_deltas_follow_status_meaning():
+    """pending/processing are unprocessed; completed, contact_info_found and success count as success"""
+    assert counter_deltas('pending', 'processing') == {}
+    assert counter_deltas('processing', 'contact_info_found') == {'processed_count': 1, 'success_count': 1}
+    assert counter_deltas('failed', 'pending') == {'processed_count': -1, 'failed_count': -1}
+    assert counter_deltas('captcha', 'completed') == {'captcha_count': -1, 'success_count': 1}
+    assert counter_deltas(None, 'no_contact_found') == {'processed_count': 1}
+
+
+def test_status_changes_update_counters_without_counting():
+    """Each commit moves the counters by atomic increments; no COUNT/GROUP BY is issued"""
+    app = create_app()
+    with app.app_context():
+        campaign_id = seed_campaign()
+        companies = Company.query.filter_by(campaign_id=campaign_id).order_by(Company.id).all()
+        campaign = Campaign.query.get(campaign_id)
+        assert campaign.processed_count == 0
+
+        with StatementLog(db.engine) as log:
+            for company in companies[:10]:
+                company.status = 'processing'
+                db.session.commit()
+                company.status = 'completed'
+                db.session.commit()
+            companies[10].status = 'failed'
+            companies[11].status = 'captcha'
+            companies[12].status = 'contact_info_found'
+            companies[13].status = 'processing'
+            db.session.commit()
+            # The in-session campaign sees the new values (expired after the flush)
+            assert campaign.processed_count == 13 and campaign.success_count == 11
+        assert not any('count(' in s.lower() for s in log.statements)
+        # At most one increment per counted transition (changes in one flush share an UPDATE)
+        assert sum('UPDATE campaigns' in s for s in log.statements) <= 13
+
+        companies[10].status = 'pending'  # retry a failure
+        db.session.delete(companies[0])
+        db.session.commit()
+        assert counters(campaign_id) == {'processed_count': 11, 'success_count': 10, 'failed_count': 0, 'captcha_count': 1}
+        assert reconcile_counters([campaign_id]) == {}
+
+
+def test_bulk_transitions_are_counted_explicitly():
+    """bulk_update_mappings bypasses the flush listener; record_bulk_transitions covers it"""
+    app = create_app()
+    with app.app_context():
+        campaign_id = seed_campaign()
+        ids = [cid for (cid,) in db.session.query(Company.id).filter_by(campaign_id=campaign_id).limit(7)]
+        db.session.bulk_update_mappings(Company, [{'id': cid, 'status': 'failed'} for cid in ids])
+        record_bulk_transitions(campaign_id, 'pending', 'failed', len(ids))
+        db.session.commit()
+        assert counters(campaign_id)['failed_count'] == 7 and counters(campaign_id)['processed_count'] == 7
+        assert reconcile_counters([campaign_id]) == {}
+
+
+def test_bulk_moves_use_each_rows_prior_status():
+    """Failing a mix of pending, succeeded and already failed companies counts each from its own status"""
+    app = create_app()
+    with app.app_context():
+        campaign_id = seed_campaign()
+        companies = Company.query.filter_by(campaign_id=campaign_id).order_by(Company.id).limit(9).all()
+        for company in companies[:3]:
+            company.status = 'completed'
+        for company in companies[3:5]:
+            company.status = 'failed'
+        db.session.commit()
+        assert counters(campaign_id) == {'processed_count': 5, 'success_count': 3, 'failed_count': 2, 'captcha_count': 0}
+
+        ids = [company.id for company in companies]
+        record_bulk_moves(campaign_id, ids, 'failed')
+        db.session.bulk_update_mappings(Company, [{'id': cid, 'status': 'failed'} for cid in ids])
+        db.session.commit()
+        assert counters(campaign_id) == {'processed_count': 9, 'success_count': 0, 'failed_count': 9, 'captcha_count': 0}
+        assert reconcile_counters([campaign_id]) == {}
+
+
+def test_reconciliation_repairs_drift():
+    """Counters corrupted behind the listener's back are recomputed; other campaigns are left alone"""
+    app = create_app()
+    with app.app_context():
+        first, second = seed_campaign('First'), seed_campaign('Second')
+        for company in Company.query.filter_by(campaign_id=first).limit(5):
+            company.status = 'completed'
+        db.session.commit()
+        # Raw SQL skips the listener, as a crashed worker or manual fix would
+        db.session.execute(Company.__table__.update().where(Company.campaign_id == first)
+                           .where(Company.status == 'pending').values(status='captcha'))
+        db.session.execute(Campaign.__table__.update().where(Campaign.id == second).values(success_count=99))
+        db.session.commit()
+
+        drift = reconcile_counters()
+        assert drift[first] == {'processed_count': (5, COMPANIES), 'captcha_count': (0, COMPANIES - 5)}
+        assert drift[second] == {'success_count': (99, 0)}
+        assert counters(first) == {'processed_count': COMPANIES, 'success_count': 5, 'failed_count': 0,
+                                   'captcha_count': COMPANIES - 5}
+        assert reconcile_counters() == {}
+
+
+def test_reconciler_runs_on_its_interval():
+    """The sentinel hook only reconciles once per interval"""
+    app = create_app()
+    with app.app_context():
+        campaign_id = seed_campaign()
+        db.session.execute(Campaign.__table__.update().values(failed_count=3))
+        db.session.commit()
+        reconciler = campaign_counters.Reconciler(interval=3600)
+        assert reconciler.maybe_run() == {campaign_id: {'failed_count': (3, 0)}}
+        db.session.execute(Campaign.__table__.update().values(failed_count=3))
+        db.session.commit()
+        assert reconciler.maybe_run() is None
+        assert counters(campaign_id)['failed_count'] == 3
+
+
+if __name__ == '__main__':
+    test_deltas_follow_status_meaning()
+    test_status_changes_update_counters_without_counting()
+    test_bulk_transitions_are_counted_explicitly()
+    test_bulk_moves_use_each_rows_prior_status()
+    test_reconciliation_repairs_drift()
+    test_reconciler_runs_on_its_interval()
+    print('OK')
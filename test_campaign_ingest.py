@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Tests for bulk company ingestion.
+Spreadsheet rows are streamed and mapped onto Company fields, URLs are
+normalized and deduplicated in one pass, and create_campaign inserts a large
+list in a handful of multi-row INSERTs on an in-memory SQLite database.
+"""
+
+import io
+import os
+import sys
+from flask import Flask
+from flask_jwt_extended import JWTManager
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from models import Campaign, Company
+import job_events
+import campaign_ingest
+from campaign_ingest import (
+    iter_spreadsheet_rows, normalize_urls, prepare_companies, insert_companies, ingest_stream_name, IngestError,
+)
+
+ROWS = 5000
+
+
+def create_app():
+    """Minimal app with the campaigns blueprint bound to an in-memory database"""
+    from api.campaigns.routes import campaigns_api
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['JWT_SECRET_KEY'] = 'test'
+    db.init_app(app)
+    JWTManager(app)
+    app.register_blueprint(campaigns_api)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+class StatementLog:
+    """Record SQL statements executed against the engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.statements = []
+
+    def _on_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+def _csv(rows, delimiter=','):
+    lines = [delimiter.join(['Company', 'Website', 'E-mail', 'Industry'])]
+    lines += [delimiter.join(row) for row in rows]
+    return io.BytesIO(('﻿' + '\n'.join(lines) + '\n').encode('utf-8'))
+
+
+def test_csv_rows_map_onto_company_fields():
+    """Header aliases pick the fields, BOM and ';' delimiters are handled, other columns go to additional_data"""
+    stream = _csv([['Acme', 'https://acme.test', 'hi@acme.test', 'Kitchens'], ['', 'beta.test', '', '']], delimiter=';')
+    rows = list(iter_spreadsheet_rows(stream, 'leads.csv'))
+    assert rows[0] == {'company_name': 'Acme', 'website_url': 'https://acme.test', 'contact_email': 'hi@acme.test',
+                       'additional_data': {'Industry': 'Kitchens'}}
+    assert rows[1] == {'website_url': 'beta.test', 'additional_data': {}}
+
+    for stream, filename in ((io.BytesIO(b'name,email\nAcme,a@b.test\n'), 'leads.csv'), (io.BytesIO(b''), 'leads.pdf')):
+        try:
+            list(iter_spreadsheet_rows(stream, filename))
+            assert False, filename
+        except IngestError:
+            pass
+
+
+def test_urls_normalize_and_dedupe():
+    """Scheme, case, www., port and trailing slash do not make a new site; paths do"""
+    keys = normalize_urls(['HTTPS://www.Acme.test/', 'acme.test', 'http://acme.test:8080', ' acme.test/uk/ ',
+                           '', None, 'not a url'])
+    assert [k for k, _ in keys[:4]] == ['acme.test', 'acme.test', 'acme.test', 'acme.test/uk']
+    assert keys[4] == (None, None) and keys[5] == (None, None)
+    assert keys[0][1] == 'acme.test'
+    # Numeric cells (XLSX, JSON) are coerced instead of failing on .strip()
+    assert normalize_urls([12345, 0]) == [('12345', '12345'), ('0', '0')]
+
+    records, stats = prepare_companies([
+        {'website_url': 'https://www.acme-kitchens.co.uk/'},
+        {'website_url': 'acme-kitchens.co.uk', 'company_name': 'Duplicate'},
+        {'website_url': '  '},
+        {'website_url': 'beta.test', 'company_name': 'B' * 400, 'phone': 12345},
+    ])
+    assert stats == {'rows': 4, 'duplicates': 1, 'blank': 1}
+    assert records[0]['company_name'] == 'Acme-kitchens' and records[0]['website_url'] == 'https://www.acme-kitchens.co.uk/'
+    assert len(records[1]['company_name']) == 300 and records[1]['phone'] == '12345'
+
+
+def test_rows_are_consumed_in_chunks():
+    """Rows are normalized a chunk at a time; counts and dedup still span chunk boundaries"""
+    saved = campaign_ingest.INGEST_CHUNK_SIZE
+    campaign_ingest.INGEST_CHUNK_SIZE = 4
+    try:
+        records, stats = prepare_companies({'website_url': f'site{i % 10}.test'} if i % 7 else {} for i in range(25))
+    finally:
+        campaign_ingest.INGEST_CHUNK_SIZE = saved
+    assert stats == {'rows': 21, 'duplicates': 11, 'blank': 0}
+    # Row 7 is empty, so site7 first appears at row 17, after site0 (row 10)
+    assert [r['website_url'] for r in records] == [f'site{i}.test' for i in (1, 2, 3, 4, 5, 6, 8, 9, 0, 7)]
+
+
+def test_insert_is_chunked():
+    """insert_companies issues one multi-row INSERT per chunk, not one per company"""
+    app = create_app()
+    with app.app_context():
+        campaign = Campaign(name='Bulk', message_template='Hello')
+        db.session.add(campaign)
+        db.session.flush()
+        records, _ = prepare_companies({'website_url': f'site{i}.test'} for i in range(2500))
+        with StatementLog(db.engine) as log:
+            assert insert_companies(campaign.id, records, chunk_size=1000) == 2500
+        db.session.commit()
+        assert Company.query.filter_by(campaign_id=campaign.id, status='pending').count() == 2500
+    assert sum('INSERT INTO companies' in s for s in log.statements) <= 3
+
+
+def test_create_campaign_from_upload():
+    """A large CSV upload becomes one campaign with deduplicated companies; progress reaches the ingest stream"""
+    app = create_app()
+    rows = [[f'Company {i}', f'https://company{i % (ROWS - 100)}.test/', '', 'Retail'] for i in range(ROWS)]
+    data = {'name': 'Spreadsheet', 'message_template': 'Hello', 'session_id': 'guest-1', 'upload_id': 'up-1',
+            'file': (_csv(rows), 'leads.csv')}
+    # Guests are capped at a few companies a day; lift the cap for this campaign size
+    from api.campaigns import routes
+    saved = dict(routes.DAILY_LIMITS)
+    routes.DAILY_LIMITS['guest'] = -1
+    try:
+        response = app.test_client().post('/api/campaigns', data=data, content_type='multipart/form-data')
+    finally:
+        routes.DAILY_LIMITS.clear()
+        routes.DAILY_LIMITS.update(saved)
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    assert body['ingest'] == {'rows': ROWS, 'duplicates': 100, 'blank': 0, 'inserted': ROWS - 100}
+    assert body['campaign']['total_companies'] == ROWS - 100 and body['campaign']['spreadsheet_filename'] == 'leads.csv'
+    with app.app_context():
+        company = Company.query.filter_by(company_name='Company 1').one()
+        assert company.additional_data == {'Industry': 'Retail'} and company.status == 'pending'
+
+    stream = ingest_stream_name('up-1', session_id='guest-1')
+    events = job_events.get_broker().history(job_events.stream_key('campaign_ingest', stream))
+    assert events[-1]['data']['status'] == 'completed'
+    assert any(e['data'].get('status') == 'inserting' for e in events)
+    assert job_events.get_broker().history(job_events.stream_key('campaign_ingest', 'up-1')) == []
+
+    # Progress is only streamed to the same guest session (or user)
+    client = app.test_client()
+    assert client.get('/api/campaigns/ingest/up-1/events').status_code == 400
+    body = client.get('/api/campaigns/ingest/up-1/events?session_id=guest-1').get_data(as_text=True)
+    assert '"completed"' in body
+    assert ingest_stream_name('up-1', session_id='guest-2') != stream
+    assert ingest_stream_name('up-1', user_id=7) == 'user-7:up-1' and ingest_stream_name(None, user_id=7) is None
+
+
+if __name__ == '__main__':
+    test_csv_rows_map_onto_company_fields()
+    test_urls_normalize_and_dedupe()
+    test_rows_are_consumed_in_chunks()
+    test_insert_is_chunked()
+    test_create_campaign_from_upload()
+    print('OK')
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Tests for the campaign reachability pre-flight.
+A stub resolver stands in for DNS (known names -> 127.0.0.1, anything else
+fails like NXDOMAIN) and one local http.server plays every site by Host
+header: fast, slow, redirecting, parked and erroring sites.
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from aiohttp.abc import AbstractResolver
+
+from campaign_preflight import preflight
+
+
+class StubResolver(AbstractResolver):
+    """DNS stub: names in `hosts` resolve to 127.0.0.1, the rest raise like a failed lookup"""
+
+    def __init__(self, hosts):
+        self.hosts = set(hosts)
+        self.lookups = 0
+
+    async def resolve(self, host, port=0, family=socket.AF_INET):
+        self.lookups += 1
+        if host not in self.hosts:
+            raise OSError(f'[Errno -2] Name or service not known: {host}')
+        return [{'hostname': host, 'host': '127.0.0.1', 'port': port, 'family': socket.AF_INET,
+                 'proto': 0, 'flags': socket.AI_NUMERICHOST}]
+
+    async def close(self):
+        pass
+
+
+class StubWeb:
+    """One server answering for every stub site based on the Host header"""
+
+    def __init__(self):
+        stub = self
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                host = self.headers.get('Host', '').split(':')[0]
+                with stub.lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    if host.startswith('slow'):
+                        time.sleep(0.4)
+                    if host == 'old.test':
+                        self.send_response(301)
+                        self.send_header('Location', stub.url('www.new.test'))
+                        self.send_header('Content-Length', '0')
+                        self.end_headers()
+                        return
+                    status, body = 200, '<html><body>Welcome to our shop</body></html>'
+                    if host == 'parked.test':
+                        body = '<html><body><h1>This domain is for sale!</h1></body></html>'
+                    elif host == 'broken.test':
+                        status, body = 503, 'Service Unavailable'
+                    data = body.encode()
+                    self.send_response(status)
+                    self.send_header('Content-Type', 'text/html')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        # A port with nothing listening: connection refused
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        self.closed_port = probe.getsockname()[1]
+        probe.close()
+
+    def url(self, host, closed=False):
+        port = self.closed_port if closed else self.server.server_address[1]
+        return f'http://{host}:{port}/'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+HOSTS = ['fast.test', 'slow.test', 'old.test', 'www.new.test', 'parked.test', 'broken.test', 'refused.test']
+
+
+def test_dead_sites_are_flagged_and_live_ones_ordered():
+    """DNS failures, refused connections, parked and bad URLs are dead; fast sites go first"""
+    with StubWeb() as web:
+        sites = [
+            (1, web.url('slow.test')),
+            (2, web.url('nxdomain.test')),
+            (3, web.url('old.test')),
+            (4, web.url('parked.test')),
+            (5, web.url('refused.test', closed=True)),
+            (6, web.url('broken.test')),
+            (7, 'not a url'),
+            (8, web.url('fast.test')),
+        ]
+        report = preflight(sites, resolver=StubResolver(HOSTS), timeout=3)
+
+    reasons = {c['company_id']: c['reason'] for c in report['checks']}
+    assert reasons == {1: 'ok', 2: 'dns_failed', 3: 'ok', 4: 'parked', 5: 'connect_failed',
+                       6: 'http_503', 7: 'invalid_url', 8: 'ok'}
+    assert sorted(c['company_id'] for c in report['dead']) == [2, 4, 5, 7]
+    # Live first by speed (slow site last among live), 5xx after all live sites
+    assert report['order'][-2:] == [1, 6] and set(report['order'][:2]) == {3, 8}
+    # Redirect to another host is the canonical URL
+    assert report['canonical'] == {3: web.url('www.new.test')}
+
+
+def test_checks_run_concurrently_within_the_bound():
+    """60 slow sites with concurrency 20 overlap (~3 waves), never more than 20 in flight"""
+    hosts = [f'slow{n}.test' for n in range(60)]
+    with StubWeb() as web:
+        sites = [(n, web.url(host)) for n, host in enumerate(hosts)]
+        started = time.monotonic()
+        report = preflight(sites, resolver=StubResolver(hosts), concurrency=20, timeout=5)
+        elapsed = time.monotonic() - started
+
+    assert len(report['order']) == 60 and not report['dead']
+    assert web.max_in_flight <= 20
+    assert elapsed < 60 * 0.4 / 4
+
+
+if __name__ == '__main__':
+    test_dead_sites_are_flagged_and_live_ones_ordered()
+    test_checks_run_concurrently_within_the_bound()
+    print('OK')
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Soak test for the process-wide campaign scheduler.
+Several campaigns fetch pages from local stub sites (http.server with a small
+per-request delay) through one scheduler and the test checks that the global
+worker budget is never exceeded, that backlogged campaigns share it in
+proportion to their tier weight, that every company runs exactly once and
+that admission control and queue positions behave.
+"""
+
+import os
+import sys
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from campaign_scheduler import CampaignScheduler, AdmissionRejected, tier_weight, worker_budget
+
+
+class StubSite:
+    """Local site that answers every path after `delay` seconds"""
+
+    def __init__(self, delay=0.02):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(site.delay)
+                body = b'<html><form action="/contact"></form></html>'
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.delay = delay
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.server_address[1]}{path}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Recorder:
+    """Tracks concurrency and start order across all campaigns"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.starts = []
+        self.done = []
+
+    def task(self, site, campaign, company):
+        def run():
+            with self.lock:
+                self.running += 1
+                self.max_running = max(self.max_running, self.running)
+                self.starts.append(campaign)
+            try:
+                with urllib.request.urlopen(site.url(f'/{campaign}/{company}'), timeout=10) as response:
+                    assert b'<form' in response.read()
+                with self.lock:
+                    self.done.append((campaign, company))
+            finally:
+                with self.lock:
+                    self.running -= 1
+        return run
+
+
+def test_budget_is_derived_and_tiers_are_weighted():
+    """Budget is at least one worker; paid tiers weigh more than free ones"""
+    assert worker_budget() >= 1
+    assert tier_weight('Enterprise') == 4 and tier_weight('premium') == 2
+    assert tier_weight('free') == tier_weight(None) == tier_weight('unknown') == 1
+
+
+def test_soak_budget_fairness_and_completion():
+    """Four campaigns x 60 companies: budget respected, weighted shares, all done once"""
+    scheduler = CampaignScheduler(budget=4, max_active=10)
+    recorder = Recorder()
+    tiers = {1: 'enterprise', 2: 'free', 3: 'premium', 4: 'free'}
+    with StubSite() as site:
+        events = [
+            scheduler.submit(cid, [recorder.task(site, cid, n) for n in range(60)], tier=tier)
+            for cid, tier in tiers.items()
+        ]
+        for event in events:
+            assert event.wait(timeout=60)
+
+    assert recorder.max_running <= 4
+    assert sorted(recorder.done) == sorted((cid, n) for cid in tiers for n in range(60))
+    # While all four are backlogged (first 80 starts), shares follow weights 4:1:2:1
+    window = recorder.starts[:80]
+    counts = {cid: window.count(cid) for cid in tiers}
+    assert counts[1] > counts[3] > counts[2]
+    assert 30 <= counts[1] <= 50 and 14 <= counts[3] <= 26
+    assert abs(counts[2] - counts[4]) <= 3
+    assert scheduler.stats()['running'] == 0 and scheduler.stats()['active_campaigns'] == 0
+
+
+def test_admission_control_and_queue_position():
+    """Campaigns beyond max_active wait in FIFO order; overflow is rejected"""
+    scheduler = CampaignScheduler(budget=1, max_active=1, max_queued=10)
+    gate = threading.Event()
+    first = scheduler.submit('a', [gate.wait] + [lambda: None] * 2)
+    second = scheduler.submit('b', [lambda: None] * 3)
+    third = scheduler.submit('c', [lambda: None] * 3)
+
+    assert scheduler.status('a')['state'] == 'running'
+    assert scheduler.status('b') == dict(scheduler.status('b'), state='waiting', position=1, campaigns_ahead=1)
+    assert scheduler.status('c')['position'] == 2
+
+    try:
+        scheduler.check_admission(5)
+        assert False, 'expected AdmissionRejected'
+    except AdmissionRejected:
+        pass
+
+    # Cancelling a waiting campaign moves the next one up
+    assert scheduler.cancel('b') == 3
+    assert second.is_set() and scheduler.status('c')['position'] == 1
+
+    gate.set()
+    assert first.wait(timeout=5) and third.wait(timeout=5)
+    assert scheduler.status('a') is None
+
+
+def test_restart_takes_over_a_cancelled_campaign():
+    """A cancelled campaign with a task still unwinding can be resubmitted at once; each run finishes on its own"""
+    scheduler = CampaignScheduler(budget=2, max_active=2)
+    gate, started = threading.Event(), threading.Event()
+    ran = []
+
+    def stuck():
+        started.set()
+        gate.wait()
+
+    old = scheduler.submit('a', [stuck] + [lambda: ran.append('old')] * 3)
+    try:
+        assert started.wait(timeout=5)
+        assert scheduler.cancel('a') >= 1 and not old.is_set()
+
+        new = scheduler.submit('a', [lambda: ran.append('new')] * 2)
+        assert new.wait(timeout=5) and ran.count('new') == 2
+        assert not old.is_set()
+        assert scheduler.status('a') is None
+    finally:
+        gate.set()
+    assert old.wait(timeout=5)
+    assert scheduler.stats()['running'] == 0 and scheduler.stats()['active_campaigns'] == 0
+
+
+if __name__ == '__main__':
+    test_budget_is_derived_and_tiers_are_weighted()
+    test_soak_budget_fairness_and_completion()
+    test_admission_control_and_queue_position()
+    test_restart_takes_over_a_cancelled_campaign()
+    print('OK')
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for the persistent campaign worker pool.
+Runs the pool against a stand-in worker that speaks the --serve protocol
+(no browser) and checks process reuse, log relay, kill-on-timeout and
+recycling after a number of jobs.
+"""
+
+import os
+import sys
+import textwrap
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from campaign_worker_pool import CampaignWorkerPool, WorkerError
+
+# Same protocol as process_single_company.py --serve; input 'sleep' simulates a hung site
+FAKE_WORKER = textwrap.dedent('''
+    import sys, os, json, time
+    out = sys.stdout
+    out.write(json.dumps({"type": "ready", "pid": os.getpid()}) + "\\n"); out.flush()
+    for line in sys.stdin:
+        message = json.loads(line)
+        if message.get("type") == "shutdown":
+            break
+        data = message["input"]
+        print("[info] Navigation: opening " + data["company_data"]["website_url"], file=sys.stderr, flush=True)
+        time.sleep(data.get("sleep", 0))
+        result = {"success": True, "method": "form_submitted", "pid": os.getpid(), "company_id": data["company_id"]}
+        out.write(json.dumps({"type": "result", "job_id": message["job_id"], "result": result}) + "\\n"); out.flush()
+''')
+
+
+def _pool(**kwargs):
+    return CampaignWorkerPool(command=[sys.executable, '-c', FAKE_WORKER], startup_timeout=10, **kwargs)
+
+
+def _input(company_id, sleep=0):
+    return {'company_id': company_id, 'company_data': {'website_url': f'https://site{company_id}.test'}, 'sleep': sleep}
+
+
+def test_jobs_reuse_a_warm_worker_and_relay_logs():
+    """Sequential jobs run in the same process; stderr lines reach on_log"""
+    pool = _pool(size=1, max_jobs=100)
+    logs = []
+    try:
+        results = [pool.run(_input(n), timeout=10, on_log=logs.append) for n in range(5)]
+    finally:
+        pool.shutdown()
+    assert [r['company_id'] for r in results] == list(range(5))
+    assert len({r['pid'] for r in results}) == 1
+    assert pool.stats['started'] == 1
+    assert len(logs) == 5 and logs[0].startswith('[info] Navigation:')
+
+
+def test_timeout_kills_the_worker_and_the_pool_recovers():
+    """A hung job fails with 'timeout', its worker is killed and the next job gets a new one"""
+    pool = _pool(size=1, max_jobs=100)
+    started = []
+    try:
+        try:
+            pool.run(_input(1, sleep=30), timeout=0.5, on_start=started.append)
+            assert False, 'expected a timeout'
+        except WorkerError as e:
+            assert str(e) == 'timeout'
+        started[0].wait(timeout=5)
+        assert started[0].poll() is not None
+
+        result = pool.run(_input(2), timeout=10)
+    finally:
+        pool.shutdown()
+    assert result['success'] and result['pid'] != started[0].pid
+    assert pool.stats['killed'] == 1 and pool.stats['started'] == 2
+
+
+def test_workers_are_recycled_after_max_jobs():
+    """After max_jobs a worker is retired and replaced"""
+    pool = _pool(size=1, max_jobs=2)
+    try:
+        pids = [pool.run(_input(n), timeout=10)['pid'] for n in range(5)]
+    finally:
+        pool.shutdown()
+    assert pids[0] == pids[1] != pids[2] == pids[3] != pids[4]
+    assert pool.stats['started'] == 3
+
+
+if __name__ == '__main__':
+    test_jobs_reuse_a_warm_worker_and_relay_logs()
+    test_timeout_kills_the_worker_and_the_pool_recovers()
+    test_workers_are_recycled_after_max_jobs()
+    print('OK')
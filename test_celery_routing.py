@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Integration tests for Celery queue routing and queue-depth autoscaling.
+Publishes every task type through the real router into kombu's in-memory broker
+(standing in for Redis) and checks that each one lands on its own queue, then
+checks the autoscaler policy against a stand-in Redis client.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from celery_app import celery_app, QUEUE_SETTINGS, TASK_QUEUES, queue_setting, worker_argv
+import queue_autoscale
+
+celery_app.conf.update(broker_url='memory://', result_backend='cache+memory://')
+
+import tasks
+import webhooks
+
+TASK_CALLS = {
+    'video': (tasks.convert_video_async, ('job-video', 'in.mov', 'mp4', 85, 'fast')),
+    'audio': (tasks.convert_audio_async, ('job-audio', 'in.wav', 'mp3', 192)),
+    'image': (tasks.convert_image_async, ('job-image', 'in.png', 'jpg', 80, 100, 100)),
+    'pdf': (tasks.process_pdf_async, ('job-pdf', 'in.pdf', 'compress')),
+    'default': (webhooks.send_webhook, (1, 'job-video', 'job.completed', {})),
+}
+
+
+class FakeRedis:
+    """Redis stand-in: queues are lists, llen is all the autoscaler needs"""
+
+    def __init__(self, lists):
+        self.lists = lists
+
+    def llen(self, name):
+        return len(self.lists.get(name, []))
+
+
+def _declare_queues():
+    with celery_app.connection_for_write() as conn:
+        for queue in celery_app.amqp.queues.values():
+            queue(conn.default_channel).declare()
+
+
+def _depths():
+    with celery_app.connection_for_write() as conn:
+        channel = conn.default_channel
+        return {
+            queue: channel.queue_declare(queue=queue, passive=True).message_count
+            for queue in QUEUE_SETTINGS
+        }
+
+
+def test_every_task_is_registered_under_its_routed_name():
+    """Routing table keys match the names the tasks are registered with"""
+    for name in TASK_QUEUES:
+        assert name in celery_app.tasks, name
+
+
+def test_each_task_type_lands_on_its_queue():
+    """apply_async without an explicit queue publishes to the task's own queue"""
+    _declare_queues()
+    before = _depths()
+    for queue, (task, args) in TASK_CALLS.items():
+        task.apply_async(args=args)
+        after = _depths()
+        changed = {q for q in QUEUE_SETTINGS if after[q] != before[q]}
+        assert changed == {queue}, (task.name, changed)
+        before = after
+
+
+def test_task_time_limits_follow_their_queue():
+    """Heavy video jobs get a longer hard limit than PDF jobs"""
+    annotations = celery_app.conf.task_annotations
+    assert annotations['tasks.convert_video_async']['time_limit'] == queue_setting('video', 'time_limit')
+    assert annotations['tasks.convert_video_async']['time_limit'] > annotations['tasks.process_pdf_async']['time_limit']
+
+
+def test_worker_argv_uses_queue_settings():
+    """Per-queue workers get their own autoscale range, prefetch and recycling"""
+    argv = worker_argv('video')
+    assert argv[:3] == ['worker', '-Q', 'video']
+    assert '--autoscale=2,1' in argv
+    assert '--prefetch-multiplier=1' in argv
+    assert '--max-tasks-per-child=20' in argv
+
+    os.environ['CELERY_VIDEO_MAX_CONCURRENCY'] = '6'
+    try:
+        assert '--autoscale=6,1' in worker_argv('video')
+    finally:
+        del os.environ['CELERY_VIDEO_MAX_CONCURRENCY']
+
+
+def test_autoscaler_policy_follows_queue_depth():
+    """Backlog adds processes within floor and ceiling"""
+    redis = FakeRedis({'pdf': ['m'] * 17, 'video': ['m'] * 3})
+    assert queue_autoscale.queue_depth(redis, ['pdf']) == 17
+    assert queue_autoscale.queue_depth(redis, ['pdf', 'video']) == 20
+    assert queue_autoscale.queue_depth(redis, ['image']) == 0
+
+    # Idle worker stays at the floor
+    assert queue_autoscale.desired_concurrency(0, 0, 2, 8, 8) == 2
+    # 17 waiting PDF jobs at 8 per process -> 3 extra processes
+    assert queue_autoscale.desired_concurrency(1, 17, 2, 8, 8) == 4
+    # Video: one process per waiting job, capped at the ceiling
+    assert queue_autoscale.desired_concurrency(1, 3, 1, 2, 1) == 2
+
+
+if __name__ == '__main__':
+    test_every_task_is_registered_under_its_routed_name()
+    test_each_task_type_lands_on_its_queue()
+    test_task_time_limits_follow_their_queue()
+    test_worker_argv_uses_queue_settings()
+    test_autoscaler_policy_follows_queue_depth()
+    print('OK')
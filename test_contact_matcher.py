@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests for the compiled contact-link matcher.
+The Aho-Corasick automaton is checked against a brute-force scan of the same
+patterns, and the in-page script is run under node with a minimal document
+stand-in to confirm it scores anchors exactly like the Python side.
+"""
+
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.contact_patterns import LINK_TEXT_PATTERNS, BASE_LINK_TEXT_PATTERNS, get_all_url_variations
+from services.contact_matcher import (
+    normalize, automatons, score_link, contact_links_js, STRONG_SCORE,
+)
+
+ANCHORS = [
+    ('/contact-us/', 'Contact Us'),
+    ('https://kitchens.test/de/kontakt/', 'Kontaktieren Sie uns'),
+    ('/es/contactanos', 'Contáctanos →'),
+    ('/ja/inquiry/', 'お問い合わせ'),
+    ('/get-a-quote', 'GET A QUOTE'),
+    ('/support', 'Help'),
+    ('/this-is-the-format', 'Brochure'),
+    ('/products/touchscreen', 'Touchscreens'),
+    ('#contact', 'Say hello'),
+    ('/about', 'About'),
+]
+
+# Minimal DOM for the in-page script: anchors with getAttribute / innerText / closest / offsetParent
+NODE_HARNESS = '''
+const [script, anchors] = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+global.document = {
+    baseURI: 'https://kitchens.test/',
+    querySelectorAll: () => anchors.map(([href, text, footer]) => ({
+        getAttribute: () => href, innerText: text, textContent: text,
+        closest: () => (footer ? {} : null), offsetParent: {},
+    })),
+};
+const run = eval(script);
+process.stdout.write(JSON.stringify(run({ keywords: ['about-us'] })));
+'''
+
+
+def _brute_force(automaton, normalized):
+    text = ' ' + normalized + ' '
+    found = set()
+    for index, pattern in enumerate(automaton.patterns):
+        start = text.find(pattern)
+        while start != -1:
+            end = start + len(pattern)
+            if text[start - 1] == ' ' and (len(pattern) >= 5 or text[end:end + 1] in (' ', '')):
+                found.add((start - 1, index))
+            start = text.find(pattern, start + 1)
+    return found
+
+
+def test_variants_collapse_on_normalization():
+    """Every case/symbol variant normalizes onto a base pattern; URL case variants collapse too"""
+    assert {normalize(p) for p in LINK_TEXT_PATTERNS} == {normalize(p) for p in BASE_LINK_TEXT_PATTERNS}
+    path_auto, text_auto = automatons()
+    assert len(path_auto.patterns) < len(get_all_url_variations()) / 2
+    assert normalize('✉ Contáctanos »') == 'contactanos' and normalize('contact_us/form') == 'contact us form'
+
+
+def test_automaton_matches_brute_force():
+    """One linear pass finds exactly the boundary-respecting matches a per-pattern scan finds"""
+    path_auto, text_auto = automatons()
+    rng = random.Random(7)
+    words = ['contact', 'us', 'kontakt', 'get', 'in', 'touch', 'format', 'this', 'hi', 'quote', 'support',
+             'reach', 'research', 'contactez', 'nous', 'faq', 'demo', 'x']
+    for automaton in (path_auto, text_auto):
+        for _ in range(300):
+            text = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 8)))
+            assert set(automaton.matches(text)) == _brute_force(automaton, text), text
+
+
+def test_scores_rank_contact_pages_first():
+    """Contact family in any language beats intent, which beats generic; partial words do not match"""
+    scores = {href: score_link(href, text)['score'] for href, text in ANCHORS}
+    assert scores['/contact-us/'] >= STRONG_SCORE and scores['https://kitchens.test/de/kontakt/'] >= STRONG_SCORE
+    assert scores['/es/contactanos'] >= STRONG_SCORE and scores['/ja/inquiry/'] >= STRONG_SCORE
+    assert STRONG_SCORE > scores['/get-a-quote'] > scores['/support'] > 0
+    assert scores['/this-is-the-format'] == 0 and scores['/about'] == 0
+    assert score_link('/de/kontakt/', 'Kontaktieren Sie uns')['pattern'] == 'kontaktieren sie uns'
+
+
+def test_in_page_matcher_agrees_with_python():
+    """The serialized automatons score each anchor in the page exactly as score_link does"""
+    node = shutil.which('node')
+    if not node:
+        return
+    anchors = [[href, text, i % 2 == 0] for i, (href, text) in enumerate(ANCHORS)] + [['/about-us', 'Who we are', False]]
+    out = subprocess.run([node, '-e', NODE_HARNESS], input=json.dumps([contact_links_js(), anchors]),
+                         capture_output=True, text=True, check=True)
+    found = {link['href']: link for link in json.loads(out.stdout)}
+
+    for i, (href, text) in enumerate(ANCHORS):
+        expected = score_link(href, text)
+        if not expected['score']:
+            assert href not in found
+            continue
+        assert found[href]['score'] == expected['score'], href
+        assert found[href]['pattern'] == expected['pattern'], href
+        assert found[href]['in_footer'] == (i % 2 == 0)
+    assert found['/about-us']['keyword'] == 'about-us' and found['/about-us']['score'] == 0
+    assert found['/contact-us/']['url'] == 'https://kitchens.test/contact-us/'
+
+
+if __name__ == '__main__':
+    test_variants_collapse_on_normalization()
+    test_automaton_matches_brute_force()
+    test_scores_rank_contact_pages_first()
+    test_in_page_matcher_agrees_with_python()
+    print('OK')
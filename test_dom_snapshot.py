@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Tests for the DOM snapshot layer used by FastCampaignProcessor.
+Classifiers run on hand-built snapshots (the shape SNAPSHOT_JS returns); a
+recording form handle checks that classification plus extraction cost one
+evaluate per form instead of per-field round trips.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.dom_snapshot import (
+    SNAPSHOT_JS, PAGE_SNAPSHOT_JS, count_contact_like_fields, is_newsletter_or_signup, extract_fields,
+    first_match_visibility,
+)
+from services.fast_campaign_processor import FastCampaignProcessor
+
+
+def _input(tag='input', type_='text', name=None, id_=None, placeholder=None, label='', visible=True, required=False):
+    return {'tag': tag, 'type': type_, 'name': name, 'id': id_, 'placeholder': placeholder, 'aria': None,
+            'label': label, 'label_nearby': label.lower(), 'required': required, 'visible': visible, 'box': [0, 0, 100, 20]}
+
+
+CONTACT = {
+    'in_footer': False,
+    'context': 'wpcf7-form /contact/#wpcf7 your name your email your message',
+    'inputs': [
+        _input(type_='hidden', name='_wpnonce', visible=False),
+        _input(name='your-name', label='Your name', required=True),
+        _input(type_='email', name='your-email', label='Your email', required=True),
+        _input(tag='textarea', type_='text', name='your-message', label='Message'),
+        _input(type_='submit', name=None),
+    ],
+    'selects': [{'tag': 'select', 'type': 'select', 'name': 'topic', 'id': None, 'label': 'Topic', 'required': True,
+                 'visible': True, 'box': [0, 0, 100, 20],
+                 'options': [{'value': '', 'text': 'Please select'}, {'value': 'sales', 'text': 'Sales'}]}],
+}
+
+NEWSLETTER = {
+    'in_footer': False,
+    'context': 'mc-embedded-subscribe-form  stay in the loop subscribe',
+    'inputs': [_input(type_='email', name='EMAIL'), _input(name='FNAME')],
+    'selects': [],
+}
+
+
+class RecordingForm:
+    """Form handle stand-in: answers evaluate() with a snapshot and counts calls"""
+
+    def __init__(self, snap):
+        self.snap = snap
+        self.evaluations = 0
+
+    def evaluate(self, script, *args):
+        self.evaluations += 1
+        assert script == SNAPSHOT_JS
+        return json.loads(json.dumps(self.snap))
+
+
+class NullPage:
+    def set_default_timeout(self, ms):
+        pass
+
+    def set_default_navigation_timeout(self, ms):
+        pass
+
+
+def test_snapshot_scripts_parse():
+    """Both in-page scripts are valid JavaScript functions"""
+    node = shutil.which('node')
+    if not node:
+        return
+    check = 'const a = JSON.parse(process.argv[1]); for (const s of a) new Function("return " + s);'
+    subprocess.run([node, '-e', check, json.dumps([SNAPSHOT_JS, PAGE_SNAPSHOT_JS])], check=True)
+
+
+def test_classifiers_on_snapshots():
+    """Contact form: 4 fillable fields, has a message field; newsletter form is rejected"""
+    assert count_contact_like_fields(CONTACT) == 4
+    assert not is_newsletter_or_signup(CONTACT)
+    assert is_newsletter_or_signup(NEWSLETTER)
+    assert is_newsletter_or_signup(dict(CONTACT, in_footer=True))
+
+    fields = extract_fields(CONTACT)
+    assert [f['name'] for f in fields] == ['your-name', 'your-email', 'your-message', 'topic']
+    assert fields[3]['options'][1] == {'value': 'sales', 'text': 'Sales'}
+    assert first_match_visibility(CONTACT)[('input', ('name', '_wpnonce'))] is False
+
+
+def test_processor_reads_a_form_in_one_round_trip():
+    """count + newsletter check + extract share one evaluate per form handle"""
+    processor = FastCampaignProcessor(NullPage(), {'website_url': 'https://kitchens.test'}, 'Hello')
+    form = RecordingForm(CONTACT)
+    assert processor._count_contact_like_fields(form) == 4
+    assert not processor._is_newsletter_or_signup_form(form)
+    assert len(processor._extract_form_fields(form)) == 4
+    assert processor._field_visible(form, None, 'input', 'your-email', None)
+    assert form.evaluations == 1
+
+
+if __name__ == '__main__':
+    test_snapshot_scripts_parse()
+    test_classifiers_on_snapshots()
+    test_processor_reads_a_form_in_one_round_trip()
+    print('OK')
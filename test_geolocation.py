@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Tests for the cached, non-blocking geolocation resolver.
+Uses StaticGeoBackend so no network access is needed.
+"""
+
+import os
+import sys
+import time
+from datetime import datetime
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from models import UserSession
+from geolocation import GeoResolver, StaticGeoBackend, LocationCache, cache_key
+
+
+class RemoteStubBackend(StaticGeoBackend):
+    """Static backend that behaves like a remote API (forces deferral)"""
+    is_local = False
+
+
+def create_app():
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+def test_cache_key_groups_prefixes():
+    """Addresses in the same /24 share a cache entry; private addresses are skipped"""
+    assert cache_key('8.8.8.8') == cache_key('8.8.8.200') == '8.8.8.0/24'
+    assert cache_key('2001:4860:4860::8888') == '2001:4860:4860::/48'
+    assert cache_key('127.0.0.1') is None
+    assert cache_key('10.1.2.3') is None
+    assert cache_key('unknown') is None
+
+
+def test_cache_ttl_and_lru():
+    """Entries expire after their TTL and the oldest entry is evicted first"""
+    cache = LocationCache(max_size=2, ttl=0.05, negative_ttl=0.05)
+    location = ('South Africa', 'Cape Town', 'Western Cape', 'Africa/Johannesburg')
+    cache.set('a', location)
+    cache.set('b', location)
+    cache.get('a')
+    cache.set('c', location)
+    assert cache.get('b') is None
+    assert cache.get('a') == location
+    time.sleep(0.06)
+    assert cache.get('a') is None
+
+
+def test_local_backend_resolves_inline_and_caches():
+    """Local backends answer on the request path, once per prefix"""
+    backend = StaticGeoBackend({'41.0.0.1': ('South Africa', 'Durban', 'KwaZulu-Natal', None)})
+    resolver = GeoResolver(backend=backend)
+    location, resolved = resolver.lookup('41.0.0.1')
+    assert resolved and location[0] == 'South Africa'
+    resolver.lookup('41.0.0.1')
+    assert backend.calls == 1
+
+
+def test_remote_backend_is_deferred_and_backfilled():
+    """Remote lookups never run on the request path; the worker backfills the session"""
+    app = create_app()
+    backend = RemoteStubBackend({'41.0.0.1': ('South Africa', 'Durban', 'KwaZulu-Natal', None)})
+    resolver = GeoResolver()
+    resolver.init_app(app, backend=backend)
+
+    location, resolved = resolver.lookup('41.0.0.1')
+    assert not resolved
+    assert backend.calls == 0
+
+    with app.app_context():
+        now = datetime.utcnow()
+        db.session.add(UserSession(id='s1', start_time=now, last_activity=now, ip_address='41.0.0.1'))
+        db.session.commit()
+
+    assert resolver.enqueue_enrichment('s1', '41.0.0.1')
+    resolver._queue.join()
+
+    with app.app_context():
+        session = db.session.get(UserSession, 's1')
+        assert session.country == 'South Africa'
+        assert session.city == 'Durban, KwaZulu-Natal'
+
+    # Now cached: answered without another backend call
+    location, resolved = resolver.lookup('41.0.0.77')
+    assert resolved and location[1] == 'Durban'
+    assert backend.calls == 1
+
+
+if __name__ == '__main__':
+    tests = [
+        test_cache_key_groups_prefixes,
+        test_cache_ttl_and_lru,
+        test_local_backend_resolves_inline_and_caches,
+        test_remote_backend_is_deferred_and_backfilled,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[OK] {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"[ERROR] {test.__name__}: {e}")
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    sys.exit(0 if passed == len(tests) else 1)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Tests for the HTML->PDF renderer registry.
+Checks classification of our own PDF-derived HTML vs arbitrary HTML, that our
+own HTML never goes to a browser renderer, renderer ordering by fidelity and
+measured latency, demotion of failing renderers and the per-renderer stats.
+"""
+
+import os
+import sys
+import time
+import base64
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import fitz
+from html_renderers import (
+    classify_html, RendererRegistry, HTML_CLASS_PDF_PAGES, HTML_CLASS_GENERIC,
+    FIDELITY_EXACT, FIDELITY_HIGH, FIDELITY_BASIC, convert_html_to_pdf_pymupdf_step_by_step,
+    extract_page_layouts
+)
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'html_to_pdf')
+
+
+def _corpus(name):
+    return os.path.join(CORPUS, name)
+
+
+def _read(name):
+    with open(_corpus(name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def build_convert_html(page_count, lines_per_page=30):
+    """HTML in the /convert (.pdf-page) format for a generated page_count-page PDF"""
+    pdf = fitz.open()
+    for p in range(page_count):
+        page = pdf.new_page(width=595, height=842)
+        page.insert_text((72, 60), f"Page {p + 1} heading", fontsize=16)
+        for i in range(lines_per_page):
+            page.insert_text((72, 90 + i * 24), f"Row {i + 1} of page {p + 1}: &amp; value", fontsize=10)
+    parts = ['<html><body><div class="pdf-container">']
+    for page_idx, page in enumerate(pdf):
+        parts.append(f'<div class="pdf-page" data-page="{page_idx + 1}" data-width="{page.rect.width}" data-height="{page.rect.height}">')
+        for block in page.get_text("dict")["blocks"]:
+            for line in block.get("lines", []):
+                parts.append('<div class="text-line">')
+                for span in line["spans"]:
+                    x0, y0 = span["bbox"][:2]
+                    style = f"position: absolute; left: {x0}px; top: {y0}px; font-size: {span['size']}px; font-family: {span['font']};"
+                    parts.append(f'<span class="text-span editable-text" data-text="{span["text"]}" style="{style}">{span["text"]}</span>')
+                parts.append('</div>')
+        parts.append('</div>')
+    parts.append('</div></body></html>')
+    pdf.close()
+    return ''.join(parts)
+
+
+class FakeRenderer:
+    """Converter that writes a placeholder PDF, or fails/raises on demand"""
+
+    def __init__(self, ok=True, raises=False):
+        self.ok = ok
+        self.raises = raises
+        self.calls = 0
+
+    def __call__(self, html_path, output_path):
+        self.calls += 1
+        if self.raises:
+            raise RuntimeError('renderer crashed')
+        if self.ok:
+            with open(output_path, 'wb') as f:
+                f.write(b'%PDF-1.4 fake')
+        return self.ok
+
+
+def test_classification_of_corpus():
+    """Corpus files are classified by how they were produced"""
+    assert classify_html(_read('own_pdf_pages.html')) == HTML_CLASS_PDF_PAGES
+    assert classify_html(_read('own_page_content.html')) == HTML_CLASS_PDF_PAGES
+    assert classify_html(_read('generic_invoice.html')) == HTML_CLASS_GENERIC
+    assert classify_html(_read('generic_article.html')) == HTML_CLASS_GENERIC
+    # A class name that merely contains "page" is not our format
+    assert classify_html('<div class="page-header">Hi</div>') == HTML_CLASS_GENERIC
+
+
+def test_own_html_never_uses_browser():
+    """Browser renderers are not candidates for our own HTML, even if they are the only match"""
+    registry = RendererRegistry()
+    browser = FakeRenderer()
+    registry.register('browser', browser, {HTML_CLASS_PDF_PAGES: FIDELITY_EXACT, HTML_CLASS_GENERIC: FIDELITY_HIGH},
+                      expected_ms=1, uses_browser=True)
+    registry.register('exact', FakeRenderer(), {HTML_CLASS_PDF_PAGES: FIDELITY_EXACT}, expected_ms=50)
+
+    assert [r.name for r in registry.candidates(HTML_CLASS_PDF_PAGES)] == ['exact']
+    assert [r.name for r in registry.candidates(HTML_CLASS_GENERIC)] == ['browser']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ok, name, html_class = registry.render(_corpus('own_pdf_pages.html'), os.path.join(tmp, 'out.pdf'))
+    assert (ok, name, html_class) == (True, 'exact', HTML_CLASS_PDF_PAGES)
+    assert browser.calls == 0
+
+
+def test_fidelity_then_latency_ordering():
+    """Best fidelity first; within a tier the measured-fastest renderer wins"""
+    registry = RendererRegistry()
+    registry.register('slow_high', FakeRenderer(), {HTML_CLASS_GENERIC: FIDELITY_HIGH}, expected_ms=900)
+    registry.register('fast_high', FakeRenderer(), {HTML_CLASS_GENERIC: FIDELITY_HIGH}, expected_ms=300)
+    registry.register('basic', FakeRenderer(), {HTML_CLASS_GENERIC: FIDELITY_BASIC}, expected_ms=1)
+    registry.register('unavailable', FakeRenderer(), {HTML_CLASS_GENERIC: FIDELITY_EXACT}, available=False)
+
+    assert [r.name for r in registry.candidates(HTML_CLASS_GENERIC)] == ['fast_high', 'slow_high', 'basic']
+
+    # Measurements override the prior: fast_high turns out slow
+    for _ in range(10):
+        registry.record(registry.get('fast_high'), HTML_CLASS_GENERIC, 2000, True)
+    assert [r.name for r in registry.candidates(HTML_CLASS_GENERIC)] == ['slow_high', 'fast_high', 'basic']
+
+
+def test_failing_renderer_falls_back_and_is_demoted():
+    """Failures fall through to the next renderer; a renderer that keeps failing is tried last in its tier"""
+    registry = RendererRegistry()
+    broken = FakeRenderer(raises=True)
+    backup = FakeRenderer()
+    registry.register('broken', broken, {HTML_CLASS_GENERIC: FIDELITY_HIGH}, expected_ms=10)
+    registry.register('backup', backup, {HTML_CLASS_GENERIC: FIDELITY_HIGH}, expected_ms=500)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, 'out.pdf')
+        for _ in range(RendererRegistry.MIN_CALLS_FOR_DEMOTION):
+            ok, name, _ = registry.render(_corpus('generic_invoice.html'), output_path)
+            assert (ok, name) == (True, 'backup')
+        assert broken.calls == RendererRegistry.MIN_CALLS_FOR_DEMOTION
+
+        assert [r.name for r in registry.candidates(HTML_CLASS_GENERIC)] == ['backup', 'broken']
+        registry.render(_corpus('generic_invoice.html'), output_path)
+        assert broken.calls == RendererRegistry.MIN_CALLS_FOR_DEMOTION
+
+    stats = registry.stats()
+    assert stats['broken/generic']['failures'] == RendererRegistry.MIN_CALLS_FOR_DEMOTION
+    assert stats['broken/generic']['last_error'] == 'renderer crashed'
+    assert stats['backup/generic']['calls'] == RendererRegistry.MIN_CALLS_FOR_DEMOTION + 1
+    assert stats['backup/generic']['failure_rate'] == 0
+
+
+def test_all_renderers_failing():
+    """render() reports failure when no renderer succeeds"""
+    registry = RendererRegistry()
+    registry.register('nope', FakeRenderer(ok=False), {HTML_CLASS_GENERIC: FIDELITY_HIGH})
+    with tempfile.TemporaryDirectory() as tmp:
+        assert registry.render(_corpus('generic_article.html'), os.path.join(tmp, 'out.pdf')) == \
+            (False, None, HTML_CLASS_GENERIC)
+
+
+def test_step_by_step_reproduces_own_html():
+    """The exact renderer recreates every page of our own HTML with each text span once"""
+    with tempfile.TemporaryDirectory() as tmp:
+        output_path = os.path.join(tmp, 'out.pdf')
+        assert convert_html_to_pdf_pymupdf_step_by_step(_corpus('own_pdf_pages.html'), output_path)
+        doc = fitz.open(output_path)
+        assert len(doc) == 3
+        text = doc[0].get_text()
+        assert text.count('Quarterly Report - Page 1') == 1
+        assert text.count('Line 30:') == 1
+        doc.close()
+
+
+def test_step_by_step_round_trips_200_pages():
+    """A 200-page /convert document round-trips page for page, in time linear in its size"""
+    with tempfile.TemporaryDirectory() as tmp:
+        timings = {}
+        for page_count in (50, 200):
+            html_path = os.path.join(tmp, f'{page_count}.html')
+            with open(html_path, 'w', encoding='utf-8') as f:
+                f.write(build_convert_html(page_count))
+            output_path = os.path.join(tmp, f'{page_count}.pdf')
+            start = time.perf_counter()
+            assert convert_html_to_pdf_pymupdf_step_by_step(html_path, output_path)
+            timings[page_count] = time.perf_counter() - start
+
+            doc = fitz.open(output_path)
+            assert len(doc) == page_count
+            last = doc[page_count - 1].get_text()
+            assert last.count(f'Row 30 of page {page_count}: & value') == 1
+            assert f'Page {page_count} heading' in last
+            doc.close()
+
+    print(f"   50 pages: {timings[50] * 1000:.0f}ms, 200 pages: {timings[200] * 1000:.0f}ms")
+    # Linear: 4x the pages should cost about 4x the time (quadratic would be ~16x)
+    assert timings[200] < timings[50] * 8
+
+
+def test_layout_extraction_streams_pages():
+    """Pages are emitted as soon as they close, images are decoded and .page-content sets the height"""
+    png = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 4, 4), False).tobytes('png')
+    src = base64.b64encode(png).decode('ascii')
+    html = (
+        '<div class="page" style="width: 300pt; min-height: 400pt;">'
+        '<div class="page-content" style="width: 300pt; height: 420pt; position: relative;">'
+        '<span style="position: absolute; left: 10pt; top: 20pt; font-size: 9pt; font-weight: bold">A <b>bold</b> word</span>'
+        f'<img style="position: absolute; left: 5pt; top: 5pt; width: 40pt; height: 40pt;" src="data:image/png;base64,{src}">'
+        '</div></div>'
+        '<div class="page" style="width: 200pt; min-height: 250pt;">'
+        '<span style="position: relative">ignored</span>'
+    )
+    emitted = []
+    # Fed in small chunks: tags split across chunk boundaries must still parse
+    parser = extract_page_layouts((html[i:i + 7] for i in range(0, len(html), 7)), emitted.append)
+
+    assert parser.pages_emitted == 2
+    first, second = emitted
+    assert (first.width, first.height) == (300.0, 420.0)
+    assert first.texts == [(10.0, 20.0, 9.0, 'Arial', True, False, 'A bold word')]
+    assert len(first.images) == 1 and first.images[0][:4] == (5.0, 5.0, 40.0, 40.0)
+    assert (second.width, second.height) == (200.0, 250.0)
+    assert second.texts == []
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_classification_of_corpus,
+        test_own_html_never_uses_browser,
+        test_fidelity_then_latency_ordering,
+        test_failing_renderer_falls_back_and_is_demoted,
+        test_all_renderers_failing,
+        test_step_by_step_reproduces_own_html,
+        test_step_by_step_round_trips_200_pages,
+        test_layout_extraction_streams_pages,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[OK] {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"[ERROR] {test.__name__}: {e}")
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
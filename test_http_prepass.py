@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests for the HTTP-first contact discovery pre-pass.
+Serves a few typical site shapes from a local keep-alive http.server and
+checks the plan for each (browser needed or not, where it should start),
+connection reuse and the per-host concurrency cap.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services.http_prepass import HttpPrepass, PageScan, is_contact_form, contact_links
+
+FOOTER = '<footer class="site-footer"><a href="{prefix}/contact-us/">Contact Us</a> <a href="/privacy">Privacy</a></footer>'
+CONTACT_FORM = '''<form class="wpcf7-form" action="/contact-us/#wpcf7">
+  <input type="text" name="your-name"><input type="email" name="your-email">
+  <textarea name="your-message"></textarea><input type="submit" value="Send"></form>'''
+NEWSLETTER = '<form class="newsletter"><p>Subscribe to our newsletter</p><input type="email" name="email"><button>Go</button></form>'
+TEXT = '<p>' + 'We build kitchens and bathrooms across the county. ' * 10 + '</p>'
+
+SITES = {
+    # WordPress: contact page has a server-rendered form
+    '/wp': '<html><body>' + TEXT + FOOTER.format(prefix='/wp') + '</body></html>',
+    '/wp/contact-us/': '<html><body>' + TEXT + CONTACT_FORM + '</body></html>',
+    # Static contact page with only an email address
+    '/mail': '<html><body>' + TEXT + FOOTER.format(prefix='/mail') + '</body></html>',
+    '/mail/contact-us/': '<html><body>' + TEXT + '<p>Write to <a href="mailto:hello@kitchens.test">hello@kitchens.test</a></p></body></html>',
+    # Client-rendered app: nothing useful in the HTML
+    '/spa': '<html><body><div id="root"></div><script src="/app.js"></script></body></html>',
+    # Contact page embeds a HubSpot form
+    '/hub': '<html><body>' + TEXT + FOOTER.format(prefix='/hub') + '</body></html>',
+    '/hub/contact-us/': '<html><body>' + TEXT + '<script src="//js.hsforms.net/forms/v2.js"></script></body></html>',
+    # Form on the homepage, contact page is just an address
+    '/home': '<html><body>' + TEXT + CONTACT_FORM + NEWSLETTER + FOOTER.format(prefix='/home') + '</body></html>',
+    '/home/contact-us/': '<html><body>' + TEXT + '</body></html>',
+}
+
+
+class StubSites:
+    """Keep-alive HTTP/1.1 server for SITES; records connections and peak concurrency"""
+
+    def __init__(self, delay=0.0):
+        stub = self
+        self.delay = delay
+        self.connections = set()
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with stub.lock:
+                    stub.connections.add(self.client_address)
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                try:
+                    time.sleep(stub.delay)
+                    page = SITES.get(self.path.split('?')[0])
+                    body = (page or 'not found').encode()
+                    self.send_response(200 if page else 404)
+                    self.send_header('Content-Type', 'text/html; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+
+    def url(self, path):
+        return f'http://127.0.0.1:{self.server.server_address[1]}{path}'
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _scan(paths):
+    async def run(stub):
+        client = HttpPrepass()
+        try:
+            return await client.scan_many([stub.url(p) for p in paths], timeout=5)
+        finally:
+            await client.close()
+    with StubSites() as stub:
+        return asyncio.run(run(stub)), stub
+
+
+def test_parser_finds_footer_links_and_contact_forms():
+    """Footer links are flagged; the newsletter form is not a contact form"""
+    scan = PageScan()
+    scan.feed(SITES['/home'])
+    scan.close()
+    assert [is_contact_form(f) for f in scan.forms] == [True, False]
+    links = contact_links(scan, 'https://kitchens.test/home')
+    assert links[0]['url'] == 'https://kitchens.test/home/contact-us/' and links[0]['keyword'] == 'contact'
+
+
+def test_plans_for_typical_sites():
+    """Static sites are decided over HTTP; JS shells and embeds keep the browser"""
+    plans, stub = _scan(['/wp', '/mail', '/spa', '/hub', '/home'])
+    wp, mail, spa, hub, home = plans
+
+    assert wp['needs_browser'] and wp['reason'] == 'contact_page_form'
+    assert wp['start_url'] == stub.url('/wp/contact-us/') == wp['form_page']
+
+    assert not mail['needs_browser'] and mail['emails'] == ['hello@kitchens.test']
+
+    assert spa['needs_browser'] and spa['reason'] == 'homepage_needs_rendering'
+    assert spa['start_url'] == stub.url('/spa')
+
+    assert hub['needs_browser'] and hub['start_url'] == stub.url('/hub/contact-us/')
+    assert hub['reason'] == 'contact_page_needs_rendering'
+
+    assert home['needs_browser'] and home['reason'] == 'homepage_form'
+    assert home['form_page'] == stub.url('/home')
+
+
+def test_connections_are_reused_and_capped_per_host():
+    """40 sites on one host share a handful of keep-alive connections, never more than max_per_host at once"""
+    async def run(stub):
+        client = HttpPrepass(max_per_host=3)
+        try:
+            return await client.scan_many([stub.url('/wp')] * 20 + [stub.url('/mail')] * 20, timeout=5)
+        finally:
+            await client.close()
+
+    with StubSites(delay=0.01) as stub:
+        plans = asyncio.run(run(stub))
+    assert len(plans) == 40 and stub.requests == 80
+    assert stub.max_in_flight <= 3
+    assert len(stub.connections) <= 3
+
+
+if __name__ == '__main__':
+    test_parser_finds_footer_links_and_contact_forms()
+    test_plans_for_typical_sites()
+    test_connections_are_reused_and_capped_per_host()
+    print('OK')
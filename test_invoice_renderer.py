@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process invoice renderer.
+Checks that invoices render locally without network access, that the same
+invoice id is served from the memo cache and that a changed invoice re-renders.
+"""
+
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import invoice_renderer
+import email_service
+
+
+def _no_network(*args, **kwargs):
+    raise AssertionError('invoice rendering must not make HTTP requests')
+
+
+class LogoSource:
+    """Stands in for the one-time logo download; counts calls"""
+
+    def __init__(self, data=None):
+        self.data = data
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.data is None:
+            raise ConnectionError('offline')
+        return self.data
+
+
+def _use_logo(tmp, source):
+    """Fresh logo state reading from (and caching to) a temporary LOGO_PATH"""
+    invoice_renderer.LOGO_PATH = os.path.join(tmp, 'assets', 'logo.png')
+    invoice_renderer._fetch_logo = source
+    invoice_renderer._logo.clear()
+
+
+def _render(**overrides):
+    kwargs = dict(tier='premium', amount=9.0, user_email='user@example.com', payment_id='pay-123',
+                  payment_date=datetime(2026, 1, 5), template_name='emails/invoice.html')
+    kwargs.update(overrides)
+    return email_service.generate_invoice_pdf(**kwargs)
+
+
+def test_invoice_renders_locally_and_is_memoized():
+    """Same payment renders once; no HTTP requests are made"""
+    import requests
+    original_get, original_post = requests.get, requests.post
+    requests.get = requests.post = _no_network
+    calls = []
+    original_engine = invoice_renderer.html_to_pdf
+
+    def counting_engine(html):
+        calls.append(html)
+        return original_engine(html)
+
+    invoice_renderer.html_to_pdf = counting_engine
+    invoice_renderer.pdf_cache.clear()
+    saved_logo = invoice_renderer.LOGO_PATH, invoice_renderer._fetch_logo
+    tmp = tempfile.TemporaryDirectory()
+    _use_logo(tmp.name, LogoSource())
+    try:
+        first = _render()
+        second = _render()
+        assert first and first.startswith(b'%PDF')
+        assert second is first
+        assert len(calls) == 1
+
+        # Different amount for the same payment id -> re-rendered
+        third = _render(amount=19.0)
+        assert third and len(calls) == 2
+    finally:
+        requests.get, requests.post = original_get, original_post
+        invoice_renderer.html_to_pdf = original_engine
+        invoice_renderer.LOGO_PATH, invoice_renderer._fetch_logo = saved_logo
+        invoice_renderer._logo.clear()
+        tmp.cleanup()
+
+
+def test_invoice_number_is_stable_per_payment():
+    """Invoice ids are deterministic for a payment and random without one"""
+    date = datetime(2026, 1, 5)
+    assert invoice_renderer.invoice_number('INV', date, 'pay-1') == invoice_renderer.invoice_number('INV', date, 'pay-1')
+    assert invoice_renderer.invoice_number('INV', date, 'pay-1') != invoice_renderer.invoice_number('INV', date, 'pay-2')
+    assert invoice_renderer.invoice_number('INV', date) != invoice_renderer.invoice_number('INV', date)
+
+
+def test_subscription_invoice_template_resolves():
+    """subscription-invoice.html (templates/) and emails/ templates share one loader"""
+    assert invoice_renderer.get_template('subscription-invoice.html') is invoice_renderer.get_template('subscription-invoice.html')
+    assert invoice_renderer.get_template('emails/invoice.html') is invoice_renderer.get_template('invoice.html')
+    pdf = _render(template_name='subscription-invoice.html', payment_id='pay-sub')
+    assert pdf and pdf.startswith(b'%PDF')
+
+
+def test_logo_is_fetched_once_and_cached():
+    """A missing asset is fetched once and saved to LOGO_PATH; while unavailable the <img> is dropped, not retried per render"""
+    html = f'<p>x</p><img alt="Trevnoctilla" src="{invoice_renderer.LOGO_URL}" width="40">'
+    png = b'\x89PNG\r\n\x1a\nlogo'
+    saved_logo = invoice_renderer.LOGO_PATH, invoice_renderer._fetch_logo
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            offline = LogoSource()
+            _use_logo(tmp, offline)
+            for _ in range(3):
+                inlined = invoice_renderer.inline_logo(html)
+                assert invoice_renderer.LOGO_URL not in inlined and '<p>x</p>' in inlined
+            assert offline.calls == 1
+
+            online = LogoSource(png)
+            _use_logo(tmp, online)
+            for _ in range(3):
+                assert 'src="data:image/png;base64,' in invoice_renderer.inline_logo(html)
+            assert online.calls == 1
+            with open(invoice_renderer.LOGO_PATH, 'rb') as f:
+                assert f.read() == png
+
+            # Another process finds the cached file and does not fetch
+            _use_logo(tmp, offline)
+            assert invoice_renderer.logo_data_uri() and offline.calls == 1
+    finally:
+        invoice_renderer.LOGO_PATH, invoice_renderer._fetch_logo = saved_logo
+        invoice_renderer._logo.clear()
+
+
+def main():
+    """Run all tests"""
+    tests = [
+        test_invoice_renders_locally_and_is_memoized,
+        test_invoice_number_is_stable_per_payment,
+        test_subscription_invoice_template_resolves,
+        test_logo_is_fetched_once_and_cached,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[OK] {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"[ERROR] {test.__name__}: {e}")
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests for the job progress event stream.
+Uses the in-process broker to check SSE framing, resume from Last-Event-ID,
+live relay of events published after the client connected and that
+conversion_progress assignments are published.
+"""
+
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import job_events
+
+
+def _fresh_broker():
+    job_events._broker = job_events.MemoryEventBroker()
+    return job_events._broker
+
+
+def _ids(frames):
+    return [int(line[4:]) for frame in frames for line in frame.splitlines() if line.startswith('id: ')]
+
+
+def test_resume_replays_only_events_after_last_id():
+    """Reconnecting with Last-Event-ID skips what the client already has"""
+    broker = _fresh_broker()
+    for progress in (10, 50, 90):
+        job_events.publish_event('job', 'job-1', {'status': 'processing', 'progress': progress})
+    job_events.publish_event('job', 'job-1', {'status': 'completed'})
+
+    frames = list(job_events.sse_stream('job', 'job-1', last_event_id=2, broker=broker))
+    assert frames[0].startswith('retry:')
+    assert _ids(frames) == [3, 4]
+    assert 'event: progress' in frames[-1] and '"completed"' in frames[-1]
+
+
+def test_snapshot_is_sent_when_nothing_to_replay():
+    """A finished job with no logged events gets its current state and the stream closes"""
+    broker = _fresh_broker()
+    frames = list(job_events.sse_stream('job', 'job-done', snapshot={'status': 'completed'}, broker=broker))
+    assert frames[1].startswith('event: snapshot')
+    assert len(frames) == 2
+
+
+def test_live_events_are_relayed_until_terminal():
+    """Events published after connecting are streamed; the terminal one ends the stream"""
+    broker = _fresh_broker()
+    stream = job_events.sse_stream('job', 'job-live', snapshot={'status': 'pending'}, broker=broker)
+    assert next(stream).startswith('retry:')
+    assert next(stream).startswith('event: snapshot')
+
+    def worker():
+        time.sleep(0.05)
+        job_events.publish_event('job', 'job-live', {'status': 'processing'}, event_type='status')
+        job_events.publish_event('job', 'job-live', {'status': 'failed', 'error_message': 'boom'}, event_type='status')
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    frames = list(stream)
+    thread.join()
+    assert _ids(frames) == [1, 2]
+    assert 'event: status' in frames[0]
+
+
+def test_progress_registry_publishes_and_resolves_partial_names():
+    """Assignments and update_fields() are published; partial lookups are remembered"""
+    broker = _fresh_broker()
+    progress = job_events.ProgressRegistry()
+    progress['ab12cd34_movie.mp4'] = {'status': 'processing', 'progress': 0, 'message': 'Starting'}
+    progress.update_fields('ab12cd34_movie.mp4', progress=40, message='Processing')
+
+    events = broker.history(job_events.stream_key('conversion', 'ab12cd34_movie.mp4'))
+    assert [event['data']['progress'] for event in events] == [0, 40]
+    assert events[-1]['data']['status'] == 'processing'
+
+    assert progress.resolve('ab12cd34_movie.mp4') == 'ab12cd34_movie.mp4'
+    assert progress.resolve('movie.mp4') == 'ab12cd34_movie.mp4'
+    assert progress._aliases == {'movie.mp4': 'ab12cd34_movie.mp4'}
+    assert progress.resolve('other.mp4') is None
+
+
+if __name__ == '__main__':
+    test_resume_replays_only_events_after_last_id()
+    test_snapshot_is_sent_when_nothing_to_replay()
+    test_live_events_are_relayed_until_terminal()
+    test_progress_registry_publishes_and_resolves_partial_names()
+    print('OK')
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Tests for the shared conversion job lifecycle.
+Runs run_job() against an in-memory SQLite database with a stand-in Celery task
+and checks that results are stored by content hash, that the input survives
+retries and that status updates are written in batches.
+"""
+
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from flask import Flask
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from models import Job, Webhook
+import job_runner
+
+
+class Retry(Exception):
+    pass
+
+
+class FakeTask:
+    """Just enough of a bound Celery task for run_job()"""
+    max_retries = 3
+
+    def __init__(self, retries=0):
+        self.request = SimpleNamespace(id=f'task-{retries}', retries=retries)
+
+    def retry(self, exc=None):
+        return Retry(exc)
+
+
+def create_app():
+    """Minimal app bound to an in-memory database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def _setup(app, tmp, *job_ids):
+    with app.app_context():
+        db.create_all()
+        for job_id in job_ids:
+            db.session.add(Job(job_id=job_id, api_key_id=1, user_id=1, endpoint='/test'))
+        db.session.commit()
+    paths = []
+    for job_id in job_ids:
+        path = os.path.join(tmp, f'{job_id}.in')
+        with open(path, 'w') as f:
+            f.write('same input')
+        paths.append(path)
+    return paths
+
+
+def _copy(source, output_path, calls):
+    calls.append(source)
+    with open(source) as src, open(output_path, 'w') as dst:
+        dst.write(src.read().upper())
+
+
+def test_result_is_stored_by_content_hash_and_reused():
+    """Two jobs with the same input and parameters convert once"""
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        first_input, second_input = _setup(app, tmp, 'job-1', 'job-2')
+        folder = os.path.join(tmp, 'out')
+        calls = []
+        with app.app_context():
+            first = job_runner.run_job(FakeTask(), 'job-1', first_input, folder, 'txt', {'format': 'txt'},
+                                       lambda s, o: _copy(s, o, calls))
+            second = job_runner.run_job(FakeTask(), 'job-2', second_input, folder, 'txt', {'format': 'txt'},
+                                        lambda s, o: _copy(s, o, calls))
+
+            assert first['status'] == second['status'] == 'completed'
+            assert first['output_path'] == second['output_path']
+            assert len(calls) == 1
+            assert os.listdir(folder) == [os.path.basename(first['output_path'])]
+            assert not os.path.exists(first_input) and not os.path.exists(second_input)
+            assert Job.query.filter_by(job_id='job-2').first().output_file_path == first['output_path']
+
+
+def test_input_is_kept_until_retries_are_exhausted():
+    """A transient failure retries with the input intact; the final failure removes it"""
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        (input_path,) = _setup(app, tmp, 'job-retry')
+        folder = os.path.join(tmp, 'out')
+
+        def flaky(source, output_path):
+            with open(output_path, 'w') as f:
+                f.write('partial')
+            raise IOError('disk hiccup')
+
+        with app.app_context():
+            try:
+                job_runner.run_job(FakeTask(retries=0), 'job-retry', input_path, folder, 'txt', {}, flaky)
+                assert False, 'expected a retry'
+            except Retry:
+                pass
+            assert os.path.exists(input_path)
+            assert os.listdir(folder) == []  # partial output discarded
+            assert Job.query.filter_by(job_id='job-retry').first().status == 'processing'
+
+            result = job_runner.run_job(FakeTask(retries=3), 'job-retry', input_path, folder, 'txt', {}, flaky)
+            assert result['status'] == 'failed'
+            assert not os.path.exists(input_path)
+            assert Job.query.filter_by(job_id='job-retry').first().status == 'failed'
+
+
+def test_permanent_failure_is_not_retried():
+    """JobFailed marks the job failed on the first attempt"""
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        (input_path,) = _setup(app, tmp, 'job-bad')
+
+        def bad(source, output_path):
+            raise job_runner.JobFailed('unsupported codec')
+
+        with app.app_context():
+            result = job_runner.run_job(FakeTask(), 'job-bad', input_path, os.path.join(tmp, 'out'), 'mp4', {}, bad)
+            assert result == {'status': 'failed', 'output_path': None, 'processing_time': None,
+                              'error': 'unsupported codec'}
+
+
+def test_status_updates_are_batched():
+    """Pending updates for many jobs are written by a single flush"""
+    app = create_app()
+    with tempfile.TemporaryDirectory() as tmp:
+        job_ids = [f'job-{i}' for i in range(20)]
+        _setup(app, tmp, *job_ids)
+        batcher = job_runner.JobStatusBatcher(flush_interval=0)
+        with app.app_context():
+            for job_id in job_ids:
+                batcher.update(job_id, status='processing')
+            assert Job.query.filter_by(status='processing').count() == 0
+            assert batcher.flush() == len(job_ids)
+            assert Job.query.filter_by(status='processing').count() == len(job_ids)
+            assert batcher.flush() == 0
+
+
+class RecordingTask:
+    """Stands in for send_webhook_batch; records what would go to the broker"""
+
+    def __init__(self):
+        self.calls = []
+
+    def apply_async(self, args=(), **kwargs):
+        self.calls.append((args, kwargs))
+
+
+class FakeRedis:
+    """The few Redis commands webhook coalescing uses, in memory"""
+
+    def __init__(self):
+        self.lists = {}
+        self.keys = {}
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+
+    def expire(self, key, seconds):
+        pass
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    def delete(self, key):
+        self.keys.pop(key, None)
+
+    def lrange(self, key, start, stop):
+        return self.lists.get(key, [])[start:stop + 1]
+
+    def ltrim(self, key, start, stop):
+        self.lists[key] = self.lists.get(key, [])[start:]
+
+    def llen(self, key):
+        return len(self.lists.get(key, []))
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, client):
+        self.client = client
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.queued.append((getattr(self.client, name), args, kwargs))
+        return queue
+
+    def execute(self):
+        return [command(*args, **kwargs) for command, args, kwargs in self.queued]
+
+
+def test_finished_job_webhooks_are_coalesced_on_the_broker():
+    """Jobs finishing in workers inside one window produce one batch task per subscribed endpoint"""
+    import webhooks
+    app = create_app()
+    job_ids = [f'job-hook-{i}' for i in range(5)]
+    redis_client, recorder = FakeRedis(), RecordingTask()
+    saved = webhooks.send_webhook_batch, webhooks._redis_client, webhooks._redis_checked
+    webhooks.send_webhook_batch, webhooks._redis_client, webhooks._redis_checked = recorder, redis_client, True
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            input_paths = _setup(app, tmp, *job_ids)
+            with app.app_context():
+                db.session.add_all([
+                    Webhook(api_key_id=1, url='https://a.test/hook', events=['job.completed']),
+                    Webhook(api_key_id=1, url='https://b.test/hook', events=['job.failed']),
+                    Webhook(api_key_id=1, url='https://c.test/hook'),
+                ])
+                db.session.commit()
+                webhooks._webhook_cache.clear()
+                for job_id, input_path in zip(job_ids, input_paths):
+                    job_runner.run_job(FakeTask(), job_id, input_path, os.path.join(tmp, 'out'), 'txt', {},
+                                       lambda s, o: _copy(s, o, []))
+
+        assert sorted(args for args, _ in recorder.calls) == [(1, None), (3, None)]
+        assert all(kwargs == {'countdown': webhooks.COALESCE_WINDOW} for _, kwargs in recorder.calls)
+        assert webhooks._service is None or not webhooks._service._buffers
+
+        # The batch task drains every event of the window; the next event starts a new window
+        payloads = webhooks._take_pending(1)
+        assert sorted(p['job_id'] for p in payloads) == job_ids and webhooks._take_pending(1) == []
+        webhooks._queue_durable(1, {'event': 'job.completed', 'job_id': 'late'})
+        assert len(recorder.calls) == 3
+
+        # A backlog larger than one batch schedules the next batch immediately
+        assert len(webhooks._take_pending(3, limit=2)) == 2
+        assert recorder.calls[-1] == ((3, None), {})
+    finally:
+        webhooks.send_webhook_batch, webhooks._redis_client, webhooks._redis_checked = saved
+        webhooks._webhook_cache.clear()
+
+if __name__ == '__main__':
+    test_result_is_stored_by_content_hash_and_reused()
+    test_input_is_kept_until_retries_are_exhausted()
+    test_permanent_failure_is_not_retried()
+    test_status_updates_are_batched()
+    test_finished_job_webhooks_are_coalesced_on_the_broker()
+    print('OK')
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Tests for batched cookie overlay detection.
+Rule parsing and ordering run in Python; a recording page answers the single
+OVERLAY_JS evaluate so handle_cookie_modal can be checked for round trips,
+clicking only the top hit and feeding the brain.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from services import fast_campaign_processor as fcp
+from services.overlay_detect import OVERLAY_JS, CANDIDATE_ATTR, DEFAULT_RULES, parse_rule, build_rules, top_hit_selector
+
+
+class RecordingLocator:
+    def __init__(self, page, selector):
+        self.page = page
+        self.selector = selector
+
+    @property
+    def first(self):
+        return self
+
+    def click(self, timeout=None):
+        self.page.clicks.append(self.selector)
+
+
+class RecordingPage:
+    """Page stand-in: OVERLAY_JS answers with canned candidates, everything else is recorded"""
+
+    def __init__(self, candidates):
+        self.candidates = candidates
+        self.evaluations = []
+        self.clicks = []
+
+    def set_default_timeout(self, ms):
+        pass
+
+    def set_default_navigation_timeout(self, ms):
+        pass
+
+    def evaluate(self, script, arg=None):
+        self.evaluations.append(arg)
+        assert script == OVERLAY_JS
+        return json.loads(json.dumps(self.candidates))
+
+    def locator(self, selector):
+        return RecordingLocator(self, selector)
+
+    def wait_for_timeout(self, ms):
+        pass
+
+
+def _candidate(rank, rule, learned=False):
+    return {'rank': rank, 'rule': rule, 'score': 1000 - rank, 'in_overlay': True, 'learned': learned,
+            'tag': 'button', 'text': 'Accept'}
+
+
+@contextmanager
+def brain_stub(learned=()):
+    """Swap the processor's brain helpers for in-memory ones; yields the recorded pattern uses"""
+    recorded = []
+    saved = fcp._brain_get_keywords, fcp._brain_record_pattern, fcp._brain_record_event
+    fcp._brain_get_keywords = lambda pattern_type, default: list(learned) + default
+    fcp._brain_record_pattern = lambda *a, **kw: recorded.append((a, kw))
+    fcp._brain_record_event = lambda *a, **kw: None
+    try:
+        yield recorded
+    finally:
+        fcp._brain_get_keywords, fcp._brain_record_pattern, fcp._brain_record_event = saved
+
+
+def _processor(page):
+    return fcp.FastCampaignProcessor(page, {'website_url': 'https://kitchens.test'}, 'Hello')
+
+
+def test_overlay_script_parses():
+    """OVERLAY_JS is a valid JavaScript function"""
+    node = shutil.which('node')
+    if not node:
+        return
+    subprocess.run([node, '-e', 'new Function("return " + JSON.parse(process.argv[1]));', json.dumps(OVERLAY_JS)],
+                   check=True)
+
+
+def test_rules_parse_and_learned_come_first():
+    """has-text rules split into CSS + text; learned winners lead and are not repeated"""
+    assert parse_rule('div[role="alertdialog"] button:has-text("Close")') == {
+        'key': 'div[role="alertdialog"] button:has-text("Close")', 'css': 'div[role="alertdialog"] button',
+        'text': 'Close', 'learned': False}
+    assert parse_rule('#accept-cookies')['text'] is None
+    assert parse_rule('text=Accept') is None and parse_rule('') is None
+
+    rules = build_rules(['#onetrust-accept-btn-handler', 'button:has-text("Agree")'])
+    assert [r['key'] for r in rules[:2]] == ['#onetrust-accept-btn-handler', 'button:has-text("Agree")']
+    assert rules[0]['learned'] and rules[1]['learned'] and not rules[2]['learned']
+    assert len(rules) == len(DEFAULT_RULES) + 1
+
+
+def test_one_evaluate_and_only_the_top_hit_is_clicked():
+    """A banner costs one evaluate and one click on rank 0; the winner is recorded for the brain"""
+    page = RecordingPage([_candidate(0, '#onetrust-accept-btn-handler', learned=True),
+                          _candidate(1, 'button:has-text("Reject")')])
+    with brain_stub(learned=['#onetrust-accept-btn-handler']) as recorded:
+        assert _processor(page).handle_cookie_modal()
+    assert len(page.evaluations) == 1
+    assert page.evaluations[0]['rules'][0] == {'key': '#onetrust-accept-btn-handler', 'css': '#onetrust-accept-btn-handler',
+                                               'text': None, 'learned': True}
+    assert page.evaluations[0]['attr'] == CANDIDATE_ATTR
+    assert page.clicks == [top_hit_selector(0)]
+    assert recorded == [(('cookie_selector', '#onetrust-accept-btn-handler'), {'success': True})]
+
+
+def test_no_banner_means_no_clicks():
+    """Without candidates: one evaluate, no click, nothing recorded; brain is asked once per company"""
+    page = RecordingPage([])
+    with brain_stub() as recorded:
+        processor = _processor(page)
+        assert not processor.handle_cookie_modal()
+        assert not processor.handle_cookie_modal()
+    assert page.clicks == [] and recorded == [] and len(page.evaluations) == 2
+    assert processor._cookie_learned == []
+
+
+if __name__ == '__main__':
+    test_overlay_script_parses()
+    test_rules_parse_and_learned_come_first()
+    test_one_evaluate_and_only_the_top_hit_is_clicked()
+    test_no_banner_means_no_clicks()
+    print('OK')
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Query-plan regression tests for the hot tables.
+Builds the schema in a scratch PostgreSQL database, applies
+migrations/add_hot_table_indexes.sql (and optionally the partitioning
+migration), seeds realistic volumes and fails if EXPLAIN shows a sequential
+scan on a hot table for any known hot query.
+
+    TEST_DATABASE_URL=postgresql://postgres@localhost/trevnoctilla_test python test_query_plans.py
+    TEST_DATABASE_URL=... python test_query_plans.py --partition
+
+WARNING: drops and recreates all tables in TEST_DATABASE_URL.
+"""
+
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+HOT_TABLES = ('usage_logs', 'analytics_events', 'page_views', 'user_sessions', 'companies')
+
+# (name, SQL) - parameters are inlined so EXPLAIN sees real selectivity
+HOT_QUERIES = [
+    ('usage_logs by user (monthly usage)',
+     "SELECT count(*) FROM usage_logs WHERE user_id = 42 AND \"timestamp\" >= now() - interval '30 days'"),
+    ('usage_logs by api key (free-tier key usage)',
+     "SELECT count(*) FROM usage_logs WHERE api_key_id = 42 AND \"timestamp\" >= now() - interval '30 days'"),
+    ('usage_logs errors in window',
+     "SELECT count(*) FROM usage_logs WHERE \"timestamp\" >= now() - interval '1 day' AND status_code >= 400"),
+    ('analytics_events by name in window',
+     "SELECT count(*) FROM analytics_events WHERE event_name = 'event_7' AND \"timestamp\" >= now() - interval '7 days'"),
+    ('analytics_events top-N per session',
+     "SELECT * FROM (SELECT session_id, event_name, row_number() OVER "
+     "(PARTITION BY session_id ORDER BY \"timestamp\" DESC) AS rn FROM analytics_events "
+     "WHERE session_id IN ('s1', 's2', 's3') AND \"timestamp\" >= now() - interval '30 days') t WHERE rn <= 20"),
+    ('page_views top-N per session',
+     "SELECT * FROM (SELECT session_id, page_url, row_number() OVER "
+     "(PARTITION BY session_id ORDER BY \"timestamp\" DESC) AS rn FROM page_views "
+     "WHERE session_id IN ('s1', 's2', 's3') AND \"timestamp\" >= now() - interval '30 days') t WHERE rn <= 20"),
+    ('page_views by url',
+     "SELECT session_id FROM page_views WHERE page_url = 'https://www.trevnoctilla.com/p7' "
+     "AND \"timestamp\" >= now() - interval '1 day'"),
+    ('user_sessions keyset page',
+     "SELECT id FROM user_sessions WHERE start_time >= now() - interval '1 day' "
+     "ORDER BY start_time DESC, id DESC LIMIT 50"),
+    ('companies status counts per campaign',
+     "SELECT status, count(*) FROM companies WHERE campaign_id = 7 GROUP BY status"),
+    ('companies pending dispatch queue',
+     "SELECT id FROM companies WHERE campaign_id = 7 AND status = 'pending' ORDER BY id LIMIT 10"),
+]
+
+SEED_SQL = [
+    """INSERT INTO users (id, email, password_hash, role, is_active, created_at, subscription_tier,
+                          monthly_call_limit, monthly_used, monthly_reset_date)
+       SELECT g, 'user' || g || '@example.com', 'x', 'user', true, now(), 'free', 5, 0, now()
+       FROM generate_series(1, 2000) g""",
+    """INSERT INTO api_keys (id, key, name, user_id, is_active, rate_limit, created_at, is_free_tier)
+       SELECT g, 'key-' || g, 'key ' || g, g, true, 1000, now(), g % 20 = 0
+       FROM generate_series(1, 2000) g""",
+    """INSERT INTO usage_logs (api_key_id, user_id, endpoint, method, status_code, "timestamp", is_free_tier)
+       SELECT 1 + g % 2000, 1 + g % 2000, '/api/v1/convert/pdf', 'POST',
+              CASE WHEN g % 17 = 0 THEN 500 ELSE 200 END,
+              now() - (g % 172800) * interval '1 minute', false
+       FROM generate_series(1, 300000) g""",
+    """INSERT INTO user_sessions (id, start_time, last_activity, page_views, events, is_active, created_at)
+       SELECT 's' || g, now() - (g % 129600) * interval '1 minute', now(), 0, 0, true, now()
+       FROM generate_series(1, 20000) g""",
+    """INSERT INTO analytics_events (event_type, event_name, session_id, page_url, "timestamp", created_at)
+       SELECT 'custom', 'event_' || (g % 50), 's' || (1 + g % 20000), '/p', now() - (g % 172800) * interval '1 minute', now()
+       FROM generate_series(1, 200000) g""",
+    """INSERT INTO page_views (session_id, page_url, "timestamp", created_at)
+       SELECT 's' || (1 + g % 20000), 'https://www.trevnoctilla.com/p' || (g % 500),
+              now() - (g % 172800) * interval '1 minute', now()
+       FROM generate_series(1, 200000) g""",
+    """INSERT INTO campaigns (id, public_id, name, message_template, status, total_companies, processed_count,
+                              success_count, failed_count, captcha_count, created_at)
+       SELECT g, 'c' || g, 'Campaign ' || g, 'Hello', 'processing', 1000, 0, 0, 0, 0, now()
+       FROM generate_series(1, 100) g""",
+    """INSERT INTO companies (campaign_id, company_name, website_url, status, created_at)
+       SELECT 1 + g % 100, 'Company ' || g, 'https://example' || g || '.com',
+              (ARRAY['pending', 'success', 'failed', 'captcha', 'processing'])[1 + g % 5], now()
+       FROM generate_series(1, 100000) g""",
+]
+
+
+def _database_url():
+    url = os.getenv('TEST_DATABASE_URL', '')
+    if url.startswith('postgres://'):
+        url = url.replace('postgres://', 'postgresql://', 1)
+    return url
+
+
+def _find_seq_scans(plan, hot_tables=HOT_TABLES):
+    """Relations (hot tables or their partitions) read with a Seq Scan anywhere in the plan tree"""
+    found = []
+    if plan.get('Node Type') == 'Seq Scan':
+        relation = plan.get('Relation Name', '')
+        if any(relation == table or relation.startswith(table + '_') for table in hot_tables):
+            found.append(relation)
+    for child in plan.get('Plans', []):
+        found.extend(_find_seq_scans(child, hot_tables))
+    return found
+
+
+def build_database(engine, partition=False):
+    """Recreate the schema, apply the migrations and seed data"""
+    from flask import Flask
+    from database import db
+    import models  # noqa: F401 - register models
+    import run_index_migration
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = str(engine.url.render_as_string(hide_password=False))
+    db.init_app(app)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+    raw = engine.raw_connection()
+    try:
+        run_index_migration.apply_indexes(raw.driver_connection)
+        raw.driver_connection.autocommit = True
+        cursor = raw.driver_connection.cursor()
+        for statement in SEED_SQL:
+            cursor.execute(statement)
+        if partition:
+            run_index_migration.apply_partitioning(raw.driver_connection)
+            raw.driver_connection.autocommit = True
+        for table in HOT_TABLES:
+            cursor.execute(f'ANALYZE {table}')
+        cursor.close()
+    finally:
+        raw.close()
+
+
+def explain(engine, sql):
+    """EXPLAIN (FORMAT JSON) root plan for a query"""
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        result = conn.execute(text(f'EXPLAIN (FORMAT JSON) {sql}')).scalar()
+    if isinstance(result, str):
+        result = json.loads(result)
+    return result[0]['Plan']
+
+
+def _non_empty(engine, relations):
+    """
+    Drop relations the planner knows are empty (e.g. future monthly partitions and
+    the DEFAULT partition): a Seq Scan over zero rows is the cheapest correct plan.
+    """
+    if not relations:
+        return []
+    from sqlalchemy import text
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT relname, reltuples FROM pg_class WHERE relname = ANY(:names)"),
+            {'names': list(relations)}
+        ).all()
+    empty = {name for name, tuples in rows if tuples < 1}
+    return [relation for relation in relations if relation not in empty]
+
+
+def check_plans(engine):
+    """Return [(query name, [seq-scanned relations])] for failing hot queries"""
+    failures = []
+    for name, sql in HOT_QUERIES:
+        seq_scans = _non_empty(engine, _find_seq_scans(explain(engine, sql)))
+        status = '[ERROR]' if seq_scans else '[OK]'
+        print(f"{status} {name}" + (f" - Seq Scan on {', '.join(seq_scans)}" if seq_scans else ''))
+        if seq_scans:
+            failures.append((name, seq_scans))
+    return failures
+
+
+def test_hot_queries_use_indexes():
+    """No hot query falls back to a sequential scan on a hot table"""
+    url = _database_url()
+    if not url.startswith('postgresql'):
+        import pytest
+        pytest.skip('TEST_DATABASE_URL (PostgreSQL) not set')
+    from sqlalchemy import create_engine
+    engine = create_engine(url)
+    build_database(engine, partition=os.getenv('TEST_PARTITIONED') == '1')
+    assert check_plans(engine) == []
+
+
+def main():
+    url = _database_url()
+    if not url.startswith('postgresql'):
+        print("ERROR: set TEST_DATABASE_URL to a scratch PostgreSQL database")
+        return False
+    from sqlalchemy import create_engine
+    engine = create_engine(url)
+    partition = '--partition' in sys.argv
+    print(f"[START] Building seeded database (partitioned={partition})...")
+    build_database(engine, partition=partition)
+    failures = check_plans(engine)
+    print(f"Results: {len(HOT_QUERIES) - len(failures)}/{len(HOT_QUERIES)} hot queries use indexes")
+    return not failures
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Regression benchmark for usage_service aggregation.
+Seeds an in-memory SQLite database with 10k users and checks that the
+admin usage stats helpers issue a constant number of queries.
+"""
+
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from flask import Flask
+from sqlalchemy import event
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from database import db
+from models import User, APIKey, UsageLog
+import usage_service
+
+USER_COUNT = 10000
+LOGS_PER_USER = 3
+FREE_TIER_KEYS = 200
+
+
+def create_app():
+    """Minimal app bound to an in-memory database"""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def seed(app):
+    """Insert USER_COUNT users, one key each and LOGS_PER_USER logs per user"""
+    now = datetime.utcnow()
+    with app.app_context():
+        db.create_all()
+        db.session.execute(User.__table__.insert(), [
+            {
+                'id': i,
+                'email': f'user{i}@example.com',
+                'password_hash': 'x',
+                'role': 'user',
+                'is_active': True,
+                'created_at': now,
+                'subscription_tier': 'premium' if i % 10 == 0 else 'free',
+                'monthly_call_limit': 5,
+                'monthly_used': i % 7,
+                'monthly_reset_date': now,
+            }
+            for i in range(1, USER_COUNT + 1)
+        ])
+        db.session.execute(APIKey.__table__.insert(), [
+            {
+                'id': i,
+                'key': f'key-{i}',
+                'name': f'key {i}',
+                'user_id': i,
+                'is_active': True,
+                'rate_limit': 1000,
+                'created_at': now,
+                'is_free_tier': i <= FREE_TIER_KEYS,
+                'granted_by': 1 if i <= FREE_TIER_KEYS else None,
+            }
+            for i in range(1, USER_COUNT + 1)
+        ])
+        db.session.execute(UsageLog.__table__.insert(), [
+            {
+                'api_key_id': i,
+                'user_id': i,
+                'endpoint': '/api/v1/convert/pdf',
+                'method': 'POST',
+                'status_code': 200 if n else 500,
+                'timestamp': now - timedelta(minutes=n),
+                'is_free_tier': False,
+            }
+            for i in range(1, USER_COUNT + 1)
+            for n in range(LOGS_PER_USER)
+        ])
+        db.session.commit()
+
+
+class QueryCounter:
+    """Count SQL statements executed against the engine"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args, **kwargs):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+_app = None
+
+
+def get_app():
+    global _app
+    if _app is None:
+        _app = create_app()
+        seed(_app)
+    return _app
+
+
+def test_users_usage_page_is_constant_queries():
+    """Users section costs two queries no matter how many users exist"""
+    app = get_app()
+    with app.app_context():
+        start = time.perf_counter()
+        with QueryCounter(db.engine) as counter:
+            rows, pagination = usage_service.get_users_usage_page(page=1, per_page=500)
+        elapsed = time.perf_counter() - start
+        print(f"   users page: {counter.count} queries in {elapsed * 1000:.1f}ms")
+
+        assert counter.count <= 2
+        assert pagination['total'] == USER_COUNT
+        assert len(rows) == 500
+        assert rows[0]['actual_monthly_calls'] == LOGS_PER_USER
+
+
+def test_tier_summary_matches_python_aggregation():
+    """Grouped tier summary equals the per-user loop it replaced"""
+    app = get_app()
+    with app.app_context():
+        with QueryCounter(db.engine) as counter:
+            users_by_tier, monthly_calls = usage_service.get_tier_summary()
+        assert counter.count == 1
+
+        expected_tiers = {}
+        expected_calls = 0
+        for user in User.query.all():
+            tier = user.subscription_tier or 'free'
+            expected_tiers[tier] = expected_tiers.get(tier, 0) + 1
+            expected_calls += user.monthly_used
+        assert users_by_tier == expected_tiers
+        assert monthly_calls == expected_calls
+
+
+def test_free_tier_keys_page_is_constant_queries():
+    """Free-tier key listing does not query per key"""
+    app = get_app()
+    with app.app_context():
+        query = APIKey.query.filter_by(is_free_tier=True).order_by(APIKey.id)
+        with QueryCounter(db.engine) as counter:
+            result, pagination = usage_service.get_free_tier_keys_page(query, page=1, per_page=100)
+        print(f"   free-tier keys page: {counter.count} queries")
+
+        # paginate (items + total), usage, granted_by emails
+        assert counter.count <= 4
+        assert pagination.total == FREE_TIER_KEYS
+        assert len(result) == 100
+        assert result[0]['usage'] == {'total': LOGS_PER_USER, 'last_30_days': LOGS_PER_USER}
+        assert result[0]['granted_by_email'] == 'user1@example.com'
+
+
+def test_call_summary():
+    """Total/success/error counts come from a single query"""
+    app = get_app()
+    with app.app_context():
+        with QueryCounter(db.engine) as counter:
+            total, success, error = usage_service.get_call_summary(datetime.utcnow() - timedelta(days=30))
+        assert counter.count == 1
+        assert total == USER_COUNT * LOGS_PER_USER
+        assert success == USER_COUNT * (LOGS_PER_USER - 1)
+        assert error == USER_COUNT
+
+
+def main():
+    """Run all tests"""
+    print(f"[START] Seeding {USER_COUNT} users...")
+    start = time.perf_counter()
+    get_app()
+    print(f"   Seeded in {time.perf_counter() - start:.1f}s")
+
+    tests = [
+        test_users_usage_page_is_constant_queries,
+        test_tier_summary_matches_python_aggregation,
+        test_free_tier_keys_page_is_constant_queries,
+        test_call_summary,
+    ]
+    passed = 0
+    for test in tests:
+        try:
+            test()
+            print(f"[OK] {test.__name__}")
+            passed += 1
+        except AssertionError as e:
+            print(f"[ERROR] {test.__name__}: {e}")
+    print(f"Results: {passed}/{len(tests)} tests passed")
+    return passed == len(tests)
+
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
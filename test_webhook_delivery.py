@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Tests for the webhook delivery engine against the local stub receiver.
+Checks that bursts of events to one endpoint are coalesced into one signed
+request over a reused connection, that per-endpoint concurrency is capped and
+that the circuit breaker stops hammering a failing receiver.
+"""
+
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from webhook_delivery import WebhookDeliveryService, CircuitBreaker, sign_payload
+from webhook_stub_receiver import StubReceiver
+
+
+def _event(n):
+    return {'event': 'job.completed', 'job_id': f'job-{n}', 'job': {'status': 'completed'}}
+
+
+def test_burst_is_coalesced_into_one_signed_request():
+    """100 events for one endpoint -> 2 requests (max_batch=50), signature matches the body"""
+    with StubReceiver() as stub:
+        service = WebhookDeliveryService(window=10, max_batch=50)
+        endpoint = {'id': 1, 'url': stub.url('/hooks/a'), 'secret': 's3cret'}
+        for n in range(100):
+            service.submit(endpoint, _event(n))
+        service.flush(wait=True)
+        service.close()
+
+        assert len(stub.received) == 2
+        first = stub.received[0]
+        assert first['body']['event'] == 'batch'
+        assert first['headers']['X-Webhook-Batch-Size'] == '50'
+        body = json.dumps(first['body'], sort_keys=True)
+        assert first['headers']['X-Webhook-Signature'] == f"sha256={sign_payload(body, 's3cret')}"
+        assert sorted(e['job_id'] for r in stub.received for e in r['body']['events']) == \
+            sorted(f'job-{n}' for n in range(100))
+        # Pooled keep-alive connections: at most one per concurrent request
+        assert len(stub.connections) <= service.max_concurrency_per_endpoint
+
+
+def test_single_event_keeps_the_original_payload():
+    """A lone event is posted as-is, not wrapped in a batch"""
+    results = []
+    with StubReceiver() as stub:
+        service = WebhookDeliveryService(window=10, on_result=lambda *args: results.append(args))
+        endpoint = {'id': 2, 'url': stub.url('/hooks/b'), 'secret': None}
+        service.submit(endpoint, _event(1))
+        service.flush(wait=True)
+        service.close()
+
+        assert stub.received[0]['body'] == _event(1)
+        assert 'X-Webhook-Signature' not in stub.received[0]['headers']
+        assert results == [(endpoint, True, 200, 1)]
+
+
+def test_concurrency_per_endpoint_is_capped():
+    """Parallel batches to one slow endpoint never exceed the per-endpoint limit"""
+    with StubReceiver(delay=0.1) as stub:
+        service = WebhookDeliveryService(window=10, max_batch=1, max_concurrency_per_endpoint=2, workers=8)
+        endpoint = {'id': 3, 'url': stub.url('/hooks/c'), 'secret': None}
+        for n in range(8):
+            service.submit(endpoint, _event(n))
+        service.close()
+
+        assert len(stub.received) == 8
+        assert stub.max_in_flight <= 2
+        assert len(stub.connections) <= 2
+
+
+def test_circuit_breaker_short_circuits_a_failing_endpoint():
+    """After the failure threshold, deliveries are rejected without a request and handed to retry"""
+    retried = []
+    clock = [0.0]
+    with StubReceiver(fail_first=100) as stub:
+        service = WebhookDeliveryService(
+            window=10, on_retry=lambda endpoint, payloads: retried.append(len(payloads)),
+            breaker_factory=lambda: CircuitBreaker(failure_threshold=3, reset_timeout=30, clock=lambda: clock[0]),
+        )
+        endpoint = {'id': 4, 'url': stub.url('/hooks/d'), 'secret': None}
+        results = [service.deliver(endpoint, [_event(n)]) for n in range(10)]
+
+        assert len(stub.received) == 3
+        assert [r['short_circuited'] for r in results] == [False] * 3 + [True] * 7
+        assert len(retried) == 10
+
+        # After the reset timeout one probe goes through; the receiver recovered
+        stub.fail_first = 0
+        clock[0] = 31
+        assert service.deliver(endpoint, [_event(99)])['success']
+        assert service.breaker_for(endpoint).state == 'closed'
+        service.close()
+
+
+if __name__ == '__main__':
+    test_burst_is_coalesced_into_one_signed_request()
+    test_single_event_keeps_the_original_payload()
+    test_concurrency_per_endpoint_is_capped()
+    test_circuit_breaker_short_circuits_a_failing_endpoint()
+    print('OK')
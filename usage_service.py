@@ -0,0 +1,183 @@
+"""
+Usage aggregation service for admin dashboards.
+All per-user and per-key usage figures are computed with grouped queries
+so the number of round trips does not grow with the number of users/keys.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import func, case
+from database import db
+from models import User, UsageLog
+
+
+def month_start_utc(now=None):
+    """Start of the current calendar month (UTC)"""
+    now = now or datetime.utcnow()
+    return now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def get_call_summary(since):
+    """
+    Total, 2xx and 4xx/5xx call counts since `since` in a single query.
+
+    Returns:
+        (total_calls, success_calls, error_calls)
+    """
+    total, success, error = db.session.query(
+        func.count(UsageLog.id),
+        func.coalesce(func.sum(case((UsageLog.status_code.between(200, 299), 1), else_=0)), 0),
+        func.coalesce(func.sum(case((UsageLog.status_code >= 400, 1), else_=0)), 0)
+    ).filter(
+        UsageLog.timestamp >= since
+    ).one()
+    return total or 0, int(success or 0), int(error or 0)
+
+
+def _monthly_calls_subquery(since):
+    """Grouped (user_id, calls) subquery for UsageLog rows since `since`"""
+    return db.session.query(
+        UsageLog.user_id.label('user_id'),
+        func.count(UsageLog.id).label('calls')
+    ).filter(
+        UsageLog.timestamp >= since
+    ).group_by(
+        UsageLog.user_id
+    ).subquery()
+
+
+def get_users_usage_page(page=1, per_page=100, since=None):
+    """
+    Paginated per-user usage rows with actual monthly calls.
+
+    One query for the page (users LEFT JOIN grouped usage counts) and one
+    for the total, regardless of how many users exist.
+
+    Returns:
+        (rows, pagination) where rows is a list of dicts in the shape used by
+        /api/admin/usage/stats and pagination is a dict
+    """
+    since = since or month_start_utc()
+    page = max(page, 1)
+    per_page = max(per_page, 1)
+
+    monthly = _monthly_calls_subquery(since)
+    calls = func.coalesce(monthly.c.calls, 0)
+
+    total = db.session.query(func.count(User.id)).scalar() or 0
+    results = db.session.query(
+        User.id,
+        User.email,
+        User.subscription_tier,
+        User.monthly_used,
+        User.monthly_call_limit,
+        calls.label('actual_monthly_calls')
+    ).outerjoin(
+        monthly, monthly.c.user_id == User.id
+    ).order_by(
+        User.id
+    ).offset((page - 1) * per_page).limit(per_page).all()
+
+    rows = []
+    for user_id, email, tier, monthly_used, monthly_limit, actual_calls in results:
+        monthly_used = monthly_used or 0
+        rows.append({
+            'id': user_id,
+            'email': email,
+            'subscription_tier': tier or 'free',
+            'monthly_used': monthly_used,
+            'monthly_limit': monthly_limit,
+            'monthly_remaining': monthly_limit - monthly_used if monthly_limit != -1 else -1,
+            'has_exceeded': monthly_used >= monthly_limit if monthly_limit != -1 else False,
+            'actual_monthly_calls': actual_calls
+        })
+
+    pages = (total + per_page - 1) // per_page if total else 0
+    return rows, {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': pages,
+        'has_next': page < pages,
+        'has_prev': page > 1
+    }
+
+
+def get_tier_summary():
+    """
+    Users per tier and the sum of monthly_used in a single grouped query.
+
+    Returns:
+        (users_by_tier dict, total monthly_used)
+    """
+    tier = func.coalesce(User.subscription_tier, 'free')
+    results = db.session.query(
+        tier.label('tier'),
+        func.count(User.id),
+        func.coalesce(func.sum(User.monthly_used), 0)
+    ).group_by(tier).all()
+
+    users_by_tier = {}
+    monthly_calls = 0
+    for tier_name, count, used in results:
+        users_by_tier[tier_name] = users_by_tier.get(tier_name, 0) + count
+        monthly_calls += int(used or 0)
+    return users_by_tier, monthly_calls
+
+
+def get_key_usage(key_ids, recent_days=30):
+    """
+    Total and recent usage for a set of API keys in one grouped query.
+
+    Returns:
+        dict of key_id -> {'total': int, 'last_<recent_days>_days': int}
+    """
+    if not key_ids:
+        return {}
+    since = datetime.utcnow() - timedelta(days=recent_days)
+    results = db.session.query(
+        UsageLog.api_key_id,
+        func.count(UsageLog.id),
+        func.coalesce(func.sum(case((UsageLog.timestamp >= since, 1), else_=0)), 0)
+    ).filter(
+        UsageLog.api_key_id.in_(key_ids)
+    ).group_by(
+        UsageLog.api_key_id
+    ).all()
+
+    recent_label = f'last_{recent_days}_days'
+    usage = {key_id: {'total': 0, recent_label: 0} for key_id in key_ids}
+    for key_id, total, recent in results:
+        usage[key_id] = {'total': total, recent_label: int(recent or 0)}
+    return usage
+
+
+def get_free_tier_keys_page(query, page=1, per_page=20):
+    """
+    Paginate an APIKey query and attach usage and granted_by emails.
+
+    The key page, the grant-email lookup and the usage counts are each one
+    query, so the cost is independent of per_page.
+
+    Returns:
+        (list of key dicts, flask-sqlalchemy Pagination)
+    """
+    pagination = query.paginate(page=page, per_page=per_page, error_out=False)
+    keys = pagination.items
+
+    usage = get_key_usage([key.id for key in keys])
+
+    granted_ids = {key.granted_by for key in keys if key.granted_by}
+    granted_emails = {}
+    if granted_ids:
+        granted_emails = dict(
+            db.session.query(User.id, User.email).filter(User.id.in_(granted_ids)).all()
+        )
+
+    result = []
+    for key in keys:
+        key_dict = key.to_dict(include_key=False)
+        key_dict['usage'] = usage.get(key.id, {'total': 0, 'last_30_days': 0})
+        if key.granted_by and key.granted_by in granted_emails:
+            key_dict['granted_by_email'] = granted_emails[key.granted_by]
+        result.append(key_dict)
+    return result, pagination
+
@@ -0,0 +1,258 @@
+"""
+Webhook delivery engine.
+
+Job events for the same endpoint are coalesced for COALESCE_WINDOW seconds
+(or until MAX_BATCH events) and delivered as one signed POST, over a pooled
+requests.Session per host, with at most MAX_CONCURRENCY_PER_ENDPOINT requests
+in flight per endpoint and a circuit breaker per endpoint so a dead receiver
+costs one probe per RESET_TIMEOUT instead of a timeout per event.
+
+A batch with one event is posted exactly as before (the event payload). A
+batch with several events is posted as {"event": "batch", "events": [...]}
+with an X-Webhook-Batch-Size header.
+
+The engine is storage-agnostic: webhooks.py wires on_result (persist
+failure_count/last_triggered) and on_retry (re-queue failed batches).
+"""
+import os
+import json
+import hmac
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+COALESCE_WINDOW = float(os.getenv('WEBHOOK_COALESCE_WINDOW', '1.0'))
+MAX_BATCH = int(os.getenv('WEBHOOK_MAX_BATCH', '50'))
+MAX_CONCURRENCY_PER_ENDPOINT = int(os.getenv('WEBHOOK_MAX_CONCURRENCY_PER_ENDPOINT', '2'))
+DELIVERY_WORKERS = int(os.getenv('WEBHOOK_DELIVERY_WORKERS', '8'))
+REQUEST_TIMEOUT = float(os.getenv('WEBHOOK_TIMEOUT', '10'))
+FAILURE_THRESHOLD = int(os.getenv('WEBHOOK_BREAKER_FAILURES', '5'))
+RESET_TIMEOUT = float(os.getenv('WEBHOOK_BREAKER_RESET_SECONDS', '60'))
+
+
+def sign_payload(body, secret):
+    """HMAC-SHA256 hex signature of the raw request body"""
+    return hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failure_threshold` consecutive failures; open rejects
+    deliveries until `reset_timeout` has passed, then lets one probe through
+    (half_open); the probe's outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if self.probing or self.clock() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self.probing = False
+
+
+class WebhookDeliveryService:
+    """
+    Coalescing, pooled webhook sender.
+
+    Endpoints are dicts with id, url and secret (a snapshot of the Webhook row,
+    so delivery never re-queries it).
+
+    Args:
+        on_result: on_result(endpoint, success, status_code, event_count) after each attempt
+        on_retry: on_retry(endpoint, payloads) for batches that failed or hit an open circuit
+    """
+
+    def __init__(self, window=COALESCE_WINDOW, max_batch=MAX_BATCH,
+                 max_concurrency_per_endpoint=MAX_CONCURRENCY_PER_ENDPOINT,
+                 workers=DELIVERY_WORKERS, timeout=REQUEST_TIMEOUT,
+                 on_result=None, on_retry=None, breaker_factory=CircuitBreaker):
+        self.window = window
+        self.max_batch = max_batch
+        self.max_concurrency_per_endpoint = max_concurrency_per_endpoint
+        self.timeout = timeout
+        self.on_result = on_result
+        self.on_retry = on_retry
+        self.breaker_factory = breaker_factory
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='webhook')
+        self._lock = threading.Lock()
+        self._buffers = {}      # endpoint id -> (endpoint, [payloads])
+        self._timer = None
+        self._sessions = {}     # scheme://host -> requests.Session
+        self._breakers = {}     # endpoint id -> CircuitBreaker
+        self._slots = {}        # endpoint id -> BoundedSemaphore
+        self.stats = {'events': 0, 'requests': 0, 'delivered': 0, 'failed': 0, 'short_circuited': 0}
+
+    # -- pooling -----------------------------------------------------------
+
+    def session_for(self, url):
+        """One keep-alive session per scheme://host, shared by all its endpoints"""
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        parts = urlsplit(url)
+        origin = f'{parts.scheme}://{parts.netloc}'
+        with self._lock:
+            session = self._sessions.get(origin)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(self.max_concurrency_per_endpoint, 4))
+                session.mount(f'{parts.scheme}://', adapter)
+                session.headers['User-Agent'] = 'Trevnoctilla-Webhook/1.0'
+                self._sessions[origin] = session
+            return session
+
+    def breaker_for(self, endpoint):
+        with self._lock:
+            breaker = self._breakers.get(endpoint['id'])
+            if breaker is None:
+                breaker = self._breakers[endpoint['id']] = self.breaker_factory()
+            return breaker
+
+    def _slot(self, endpoint):
+        with self._lock:
+            slot = self._slots.get(endpoint['id'])
+            if slot is None:
+                slot = self._slots[endpoint['id']] = threading.BoundedSemaphore(self.max_concurrency_per_endpoint)
+            return slot
+
+    # -- coalescing --------------------------------------------------------
+
+    def submit(self, endpoint, payload):
+        """Buffer an event for an endpoint; delivered within `window` seconds"""
+        ready = None
+        with self._lock:
+            self.stats['events'] += 1
+            _, payloads = self._buffers.setdefault(endpoint['id'], (endpoint, []))
+            payloads.append(payload)
+            if len(payloads) >= self.max_batch:
+                ready = self._buffers.pop(endpoint['id'])
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if ready:
+            self._executor.submit(self.deliver, *ready)
+
+    def flush(self, wait=False):
+        """Send every buffered batch; wait=True blocks until they are delivered"""
+        with self._lock:
+            batches, self._buffers = list(self._buffers.values()), {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        futures = [self._executor.submit(self.deliver, endpoint, payloads) for endpoint, payloads in batches]
+        if wait:
+            return [future.result() for future in futures]
+        return futures
+
+    # -- delivery ----------------------------------------------------------
+
+    def build_request(self, endpoint, payloads):
+        """(body, headers) for a batch"""
+        if len(payloads) == 1:
+            payload = payloads[0]
+            event_type = payload.get('event', '')
+        else:
+            payload = {'event': 'batch', 'events': payloads}
+            event_type = 'batch'
+        body = json.dumps(payload, sort_keys=True, default=str)
+        headers = {
+            'Content-Type': 'application/json',
+            'X-Webhook-Event': event_type,
+            'X-Webhook-Timestamp': str(int(time.time())),
+            'X-Webhook-Batch-Size': str(len(payloads)),
+        }
+        if endpoint.get('secret'):
+            headers['X-Webhook-Signature'] = f"sha256={sign_payload(body, endpoint['secret'])}"
+        return body, headers
+
+    def deliver(self, endpoint, payloads, retry=True):
+        """
+        POST a batch now (blocking). Returns a dict with success, status_code
+        and short_circuited; with retry=True failures are handed to on_retry.
+        """
+        breaker = self.breaker_for(endpoint)
+        if not breaker.allow():
+            with self._lock:
+                self.stats['short_circuited'] += 1
+            if retry:
+                self._retry(endpoint, payloads)
+            return {'webhook_id': endpoint['id'], 'success': False, 'status_code': None, 'short_circuited': True}
+
+        body, headers = self.build_request(endpoint, payloads)
+        status_code = None
+        with self._slot(endpoint):
+            try:
+                response = self.session_for(endpoint['url']).post(
+                    endpoint['url'], data=body, headers=headers, timeout=self.timeout
+                )
+                status_code = response.status_code
+            except Exception as e:
+                print(f"[WARN] [WEBHOOK] {endpoint['url']}: {e}")
+        success = status_code is not None and 200 <= status_code < 300
+
+        with self._lock:
+            self.stats['requests'] += 1
+            self.stats['delivered' if success else 'failed'] += len(payloads)
+        if success:
+            breaker.record_success()
+        else:
+            breaker.record_failure()
+            if retry:
+                self._retry(endpoint, payloads)
+        if self.on_result:
+            try:
+                self.on_result(endpoint, success, status_code, len(payloads))
+            except Exception as e:
+                print(f"[WARN] [WEBHOOK] Result callback failed: {e}")
+        return {'webhook_id': endpoint['id'], 'success': success, 'status_code': status_code, 'short_circuited': False}
+
+    def _retry(self, endpoint, payloads):
+        if self.on_retry:
+            try:
+                self.on_retry(endpoint, payloads)
+            except Exception as e:
+                print(f"[WARN] [WEBHOOK] Could not schedule retry for {endpoint['url']}: {e}")
+
+    def close(self):
+        self.flush(wait=True)
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            sessions, self._sessions = list(self._sessions.values()), {}
+        for session in sessions:
+            session.close()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Local webhook receiver for testing webhook delivery.
+
+Records every POST (path, headers, JSON body), can fail the first N requests
+or respond slowly, and reports how many requests were in flight at once.
+
+    python webhook_stub_receiver.py --port 8099 --fail-first 3
+    curl http://localhost:8099/_received     # recorded deliveries
+
+In tests:
+
+    with StubReceiver(fail_first=2) as stub:
+        url = stub.url('/hooks/a')
+        ...
+        stub.received  # list of {'path', 'headers', 'body'}
+"""
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubReceiver:
+    def __init__(self, host='127.0.0.1', port=0, status=200, fail_first=0, fail_status=500, delay=0.0):
+        self.status = status
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.delay = delay
+        self.received = []
+        self.connections = set()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                body = json.dumps(stub.received).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+                with stub._lock:
+                    stub.in_flight += 1
+                    stub.max_in_flight = max(stub.max_in_flight, stub.in_flight)
+                    stub.connections.add(self.client_address)
+                    failing = stub.fail_first > 0
+                    if failing:
+                        stub.fail_first -= 1
+                try:
+                    if stub.delay:
+                        time.sleep(stub.delay)
+                    with stub._lock:
+                        stub.received.append({
+                            'path': self.path,
+                            'headers': dict(self.headers),
+                            'body': json.loads(raw or b'null'),
+                            'failed': failing,
+                        })
+                    self.send_response(stub.fail_status if failing else stub.status)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                finally:
+                    with stub._lock:
+                        stub.in_flight -= 1
+
+        return Handler
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url(self, path='/'):
+        return f'http://127.0.0.1:{self.port}{path}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local webhook stub receiver')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--status', type=int, default=200)
+    parser.add_argument('--fail-first', type=int, default=0)
+    parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+    stub = StubReceiver(port=args.port, status=args.status, fail_first=args.fail_first, delay=args.delay)
+    print(f"Webhook stub receiver on {stub.url()} (GET /_received for deliveries)")
+    stub._server.serve_forever()
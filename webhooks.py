@@ -1,12 +1,17 @@
-import requests
-import json
+import os
 import hmac
+import json
+import atexit
 import hashlib
+import threading
 import time
 from datetime import datetime
+from flask import current_app
+from sqlalchemy import update
 from models import Webhook, Job, db
 from database import db as database
 from celery_app import celery_app
+from webhook_delivery import WebhookDeliveryService, COALESCE_WINDOW, MAX_BATCH
 
 def generate_webhook_secret():
     """Generate a secure webhook secret"""
@@ -26,85 +31,181 @@ def verify_webhook_signature(payload, signature, secret):
     expected_signature = create_webhook_signature(payload, secret)
     return hmac.compare_digest(signature, expected_signature)
 
-@celery_app.task(bind=True, max_retries=3)
-def send_webhook(self, webhook_id, job_id, event_type, payload):
-    """Send webhook notification"""
-    try:
-        webhook = Webhook.query.get(webhook_id)
-        if not webhook or not webhook.is_active:
-            return
-
-        # Check if webhook should be triggered for this event
-        if webhook.events and event_type not in webhook.events:
-            return
-
-        # Add webhook headers
-        headers = {
-            'Content-Type': 'application/json',
-            'User-Agent': 'Trevnoctilla-Webhook/1.0',
-            'X-Webhook-Event': event_type,
-            'X-Webhook-Timestamp': str(int(time.time())),
-        }
-
-        # Add signature if secret is configured
-        if webhook.secret:
-            payload_str = json.dumps(payload, sort_keys=True)
-            signature = create_webhook_signature(payload_str, webhook.secret)
-            headers['X-Webhook-Signature'] = f'sha256={signature}'
-
-        # Send webhook
-        response = requests.post(
-            webhook.url,
-            data=json.dumps(payload),
-            headers=headers,
-            timeout=30
+WEBHOOK_CACHE_TTL = 30  # seconds an API key's active webhook list is reused
+RETRY_BASE_DELAY = 60
+# Durable coalescing (Celery workers): payloads wait in a Redis list per endpoint and one
+# send_webhook_batch per endpoint per window drains it; the NX key marks that task as scheduled
+PENDING_KEY = 'webhooks:pending:{}'
+SCHEDULED_KEY = 'webhooks:scheduled:{}'
+SCHEDULED_TTL = 300  # a lost batch task only delays an endpoint's events this long
+PENDING_TTL = 86400
+
+_service = None
+_service_lock = threading.Lock()
+_webhook_cache = {}  # api_key_id -> (expires_at, [endpoint dicts])
+_app = None
+_redis_client = None
+_redis_checked = False
+
+
+def _endpoint(webhook):
+    """Snapshot of a Webhook row used by the delivery engine"""
+    return {'id': webhook.id, 'url': webhook.url, 'secret': webhook.secret, 'events': webhook.events}
+
+
+def _record_result(endpoint, success, status_code, event_count):
+    """Persist one delivery attempt with a single atomic UPDATE"""
+    app = _app
+    if app is None:
+        return
+    with app.app_context():
+        table = Webhook.__table__
+        values = {'last_triggered': datetime.utcnow()}
+        if success:
+            values['failure_count'] = 0
+        else:
+            values['failure_count'] = table.c.failure_count + 1
+            values['is_active'] = table.c.failure_count + 1 < 5
+        database.session.execute(update(table).where(table.c.id == endpoint['id']).values(values))
+        database.session.commit()
+        if not success:
+            _webhook_cache.clear()
+
+
+def _schedule_retry(endpoint, payloads):
+    """Re-queue a failed batch as one task (not one per event)"""
+    send_webhook_batch.apply_async(args=(endpoint['id'], payloads), countdown=RETRY_BASE_DELAY)
+
+
+def _redis():
+    """Redis on REDIS_URL (the Celery broker) for durable coalescing; None if unreachable (checked once)"""
+    global _redis_client, _redis_checked
+    if not _redis_checked:
+        _redis_checked = True
+        try:
+            import redis
+            client = redis.from_url(os.getenv('REDIS_URL', 'redis://localhost:6379/0'), decode_responses=True,
+                                    socket_connect_timeout=1, socket_timeout=2)
+            client.ping()
+            _redis_client = client
+        except Exception as e:
+            print(f"[WARN] [WEBHOOK] Redis unavailable ({e}), durable events are sent one task each")
+    return _redis_client
+
+
+def _queue_durable(endpoint_id, payload):
+    """
+    Add a payload to the endpoint's pending list; the first event of a window
+    schedules the one send_webhook_batch that will deliver them all.
+    """
+    client = _redis()
+    if client is None:
+        send_webhook_batch.apply_async(args=(endpoint_id, [payload]))
+        return
+    pending = PENDING_KEY.format(endpoint_id)
+    pipe = client.pipeline()
+    pipe.rpush(pending, json.dumps(payload, default=str))
+    pipe.expire(pending, PENDING_TTL)
+    pipe.execute()
+    if client.set(SCHEDULED_KEY.format(endpoint_id), '1', nx=True, ex=SCHEDULED_TTL):
+        send_webhook_batch.apply_async(args=(endpoint_id, None), countdown=COALESCE_WINDOW)
+
+
+def _take_pending(endpoint_id, limit=MAX_BATCH):
+    """
+    Pop up to `limit` pending payloads. The scheduled marker is cleared first,
+    so an event arriving meanwhile schedules a new batch instead of waiting;
+    a backlog larger than one batch schedules the next batch right away.
+    """
+    client = _redis()
+    if client is None:
+        return []
+    pending = PENDING_KEY.format(endpoint_id)
+    client.delete(SCHEDULED_KEY.format(endpoint_id))
+    pipe = client.pipeline()
+    pipe.lrange(pending, 0, limit - 1)
+    pipe.ltrim(pending, limit, -1)
+    pipe.llen(pending)
+    raw, _, remaining = pipe.execute()
+    if remaining and client.set(SCHEDULED_KEY.format(endpoint_id), '1', nx=True, ex=SCHEDULED_TTL):
+        send_webhook_batch.apply_async(args=(endpoint_id, None))
+    return [json.loads(item) for item in raw]
+
+
+def get_delivery_service():
+    """Process-wide WebhookDeliveryService (pooled sessions, breakers, coalescing)"""
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                _service = WebhookDeliveryService(on_result=_record_result, on_retry=_schedule_retry)
+                atexit.register(_service.close)
+    return _service
+
+
+def _active_endpoints(api_key_id):
+    """Active webhooks for an API key, cached for WEBHOOK_CACHE_TTL seconds"""
+    cached = _webhook_cache.get(api_key_id)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    endpoints = [_endpoint(w) for w in Webhook.query.filter_by(api_key_id=api_key_id, is_active=True).all()]
+    _webhook_cache[api_key_id] = (time.monotonic() + WEBHOOK_CACHE_TTL, endpoints)
+    return endpoints
+
+
+def _deliver(task, webhook_id, payloads, event_type=None, retry_args=None):
+    global _app
+    _app = _app or current_app._get_current_object()
+    webhook = Webhook.query.get(webhook_id)
+    if not webhook or not webhook.is_active:
+        return
+    if event_type and webhook.events and event_type not in webhook.events:
+        return
+
+    result = get_delivery_service().deliver(_endpoint(webhook), payloads, retry=False)
+    if not result['success']:
+        # Retry with exponential backoff
+        raise task.retry(
+            args=retry_args,
+            exc=Exception(f"Webhook {webhook_id} delivery failed (status {result['status_code']})"),
+            countdown=RETRY_BASE_DELAY * (2 ** task.request.retries),
         )
+    return result
 
-        # Update webhook status
-        webhook.last_triggered = datetime.utcnow()
-        if response.status_code >= 200 and response.status_code < 300:
-            webhook.failure_count = 0
-        else:
-            webhook.failure_count += 1
-            if webhook.failure_count >= 5:
-                webhook.is_active = False
 
-        database.session.commit()
+@celery_app.task(bind=True, max_retries=3)
+def send_webhook(self, webhook_id, job_id, event_type, payload):
+    """Send one webhook notification (kept for callers that enqueue single events)"""
+    return _deliver(self, webhook_id, [payload], event_type)
 
-        return {
-            'webhook_id': webhook_id,
-            'status_code': response.status_code,
-            'success': response.status_code < 300
-        }
 
-    except Exception as e:
-        # Update failure count
-        webhook = Webhook.query.get(webhook_id)
-        if webhook:
-            webhook.failure_count += 1
-            if webhook.failure_count >= 5:
-                webhook.is_active = False
-            database.session.commit()
+@celery_app.task(bind=True, max_retries=3)
+def send_webhook_batch(self, webhook_id, payloads=None):
+    """Deliver a batch of events to one webhook; payloads=None drains the endpoint's pending list"""
+    if payloads is None:
+        payloads = _take_pending(webhook_id)
+        if not payloads:
+            return None
+    # Retries carry the drained payloads: they are no longer in the pending list
+    return _deliver(self, webhook_id, payloads, retry_args=(webhook_id, payloads))
 
-        # Retry with exponential backoff
-        raise self.retry(
-            exc=e,
-            countdown=60 * (2 ** self.request.retries),
-            max_retries=3
-        )
 
-def trigger_webhooks(job_id, event_type, additional_data=None):
-    """Trigger webhooks for a job event"""
+def trigger_webhooks(job_id, event_type, additional_data=None, durable=False):
+    """
+    Queue a job event for the API key's webhooks. Events are coalesced per
+    endpoint and sent by the in-process delivery engine; no task is created
+    unless a delivery fails.
+
+    With durable=True (Celery workers, whose child processes can be recycled
+    before the in-memory window fires) events are coalesced in Redis instead:
+    one send_webhook_batch per endpoint per COALESCE_WINDOW delivers them.
+    """
+    global _app
     try:
         job = Job.query.filter_by(job_id=job_id).first()
         if not job:
             return
-
-        # Get all active webhooks for this API key
-        webhooks = Webhook.query.filter_by(
-            api_key_id=job.api_key_id,
-            is_active=True
-        ).all()
+        _app = _app or current_app._get_current_object()
 
         # Prepare payload
         payload = {
@@ -117,9 +218,14 @@ def trigger_webhooks(job_id, event_type, additional_data=None):
         if additional_data:
             payload.update(additional_data)
 
-        # Send webhooks asynchronously
-        for webhook in webhooks:
-            send_webhook.delay(webhook.id, job_id, event_type, payload)
+        service = None if durable else get_delivery_service()
+        for endpoint in _active_endpoints(job.api_key_id):
+            if endpoint['events'] and event_type not in endpoint['events']:
+                continue
+            if durable:
+                _queue_durable(endpoint['id'], payload)
+            else:
+                service.submit(endpoint, payload)
 
     except Exception as e:
         print(f"Error triggering webhooks: {e}")
@@ -139,6 +245,7 @@ def register_webhook(api_key_id, url, events=None, secret=None):
 
         database.session.add(webhook)
         database.session.commit()
+        _webhook_cache.pop(api_key_id, None)
 
         return webhook
 
@@ -161,6 +268,7 @@ def update_webhook(webhook_id, url=None, events=None, is_active=None):
             webhook.is_active = is_active
 
         database.session.commit()
+        _webhook_cache.pop(webhook.api_key_id, None)
         return webhook
 
     except Exception as e:
@@ -174,6 +282,7 @@ def delete_webhook(webhook_id):
         if webhook:
             database.session.delete(webhook)
             database.session.commit()
+            _webhook_cache.pop(webhook.api_key_id, None)
             return True
         return False
 